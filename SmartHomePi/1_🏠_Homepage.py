@@ -1,14 +1,25 @@
 import streamlit as st
-import threading
-from main import run_sensors, stop_thread_event  # Importiere das Stop-Event
+from supervisor import supervisor, ResourceConflictError
 from database.db import Database
+from database.retention import start_background_compaction
+from database.readings import get_storage_engine, start_online_migration
+from database.collector import start_collector
+from utils.metrics import start_metrics_exporter
 
 db = Database()
 
-# Flag zum Stoppen des Hintergrundthreads
-def stop_sensors():
-    st.session_state['sensor_running'] = False
-    stop_thread_event.set()  # Setze das Stop-Event, um den Thread zu stoppen
+# Abgelaufene Messwerte im Hintergrund löschen (läuft einmal je Prozess)
+start_background_compaction()
+
+# Messpunkte als Datei bzw. HTTP-Endpunkt bereitstellen, falls konfiguriert (läuft einmal je Prozess)
+start_metrics_exporter()
+
+# Lieferungen weiterer Geräte annehmen, falls SMARTHOME_COLLECTOR_PORT gesetzt ist (läuft einmal je Prozess)
+start_collector()
+
+# Eine unterbrochene Migration auf die kompakte Speicherung fortsetzen
+if get_storage_engine(db.reader) == "migrating":
+    start_online_migration()
 
 # Funktion für das Haupt-Dashboard
 def main():
@@ -18,31 +29,40 @@ def main():
         layout="centered"
     )
     st.title("🏠 Smart Home Dashboard")
-    
+
     st.write("Willkommen! Hier können Sie die Sensoren für einen Raum starten und die aktuellen Werte sehen.")
-    
+
     # Räume anzeigen und auswählen
-    rooms = db.connection.execute("SELECT id, name FROM rooms").fetchall()
+    rooms = db.reader.execute("SELECT id, name FROM rooms").fetchall()
     if rooms:
         room_names = [room_name for _, room_name in rooms]
         selected_room = st.selectbox("Raum auswählen", room_names)
 
-        # Speichern des aktuellen Status der Sensoren
-        if 'sensor_running' not in st.session_state:
-            st.session_state['sensor_running'] = False
+        # Der Status kommt vom Supervisor, damit er für alle Sitzungen und Räume stimmt
+        sensor_running = supervisor.is_running(selected_room)
 
         # Button für Start/Stop basierend auf dem aktuellen Zustand der Sensoren
-        button_text = "🚀 Sensoren starten" if not st.session_state['sensor_running'] else "🛑 Sensoren stoppen"
-        
-        if st.button(button_text):
-            if st.session_state['sensor_running']:
-                stop_sensors()
+        button_text = "🚀 Sensoren starten" if not sensor_running else "🛑 Sensoren stoppen"
+
+        if supervisor.is_stopping(selected_room):
+            st.info("Die Erfassung für diesen Raum wird gerade beendet.")
+        elif st.button(button_text):
+            if sensor_running:
+                supervisor.stop(selected_room)
                 st.rerun()
             else:
-                st.session_state['sensor_running'] = True
-                stop_thread_event.clear()
-                threading.Thread(target=run_sensors, args=(selected_room, stop_thread_event), daemon=True).start()
-                st.rerun()
+                try:
+                    supervisor.start(selected_room)
+                    st.rerun()
+                except ResourceConflictError as e:
+                    st.error(str(e))
+
+        # Übersicht aller laufenden Erfassungen
+        running_rooms = supervisor.running_rooms()
+        if running_rooms:
+            st.subheader("Aktive Räume")
+            for room_name in running_rooms:
+                st.write(f"🟢 {room_name}")
 
     else:
         st.warning("Es gibt keine verfügbaren Räume. Bitte erstellen Sie zuerst einen Raum unter ⚙️ Einstellungen.")
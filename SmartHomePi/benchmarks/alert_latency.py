@@ -0,0 +1,212 @@
+"""
+Benchmark der Alarmierung: Latenz vom Eintreffen eines Messwerts bis zur Benachrichtigung je Senke und
+Aufwand der Regelauswertung je Messwert.
+
+Aufruf aus dem Verzeichnis SmartHomePi:
+
+    python -m benchmarks.alert_latency --alerts 200 --output alert_report.json
+
+Mit --serve läuft nur der lokale Webhook-Empfänger und gibt eingehende Alarme aus, z.B. für eine laufende
+Erfassung mit SMARTHOME_ALERT_WEBHOOK=http://localhost:8765/alerts:
+
+    python -m benchmarks.alert_latency --serve 8765
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.alerts import AlertEngine, AlertRule, LogFileSink, WebhookSink, FIRED
+from utils.ring_buffer import ReadingsBuffer
+from benchmarks.run_benchmarks import measure
+
+
+class WebhookStub:
+    """
+    Lokaler HTTP-Empfänger für den WebhookSink. Merkt sich je Alarm den Empfangszeitpunkt.
+    """
+
+    def __init__(self, port=0, verbose=False):
+        """
+        :param port: Der Port (Standard: 0 = freier Port).
+        :param verbose: Eingehende Alarme ausgeben.
+        """
+        self.received = []
+        self._condition = threading.Condition()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received = time.time()
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                self.send_response(204)
+                self.end_headers()
+                with stub._condition:
+                    stub.received.append((received, payload))
+                    stub._condition.notify_all()
+                if verbose:
+                    print(f"{payload['room']}: {payload['rule']} {payload['state']} (Wert: {payload['value']})")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/alerts"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def wait_for(self, count, timeout=5.0):
+        """
+        Wartet, bis mindestens count Alarme empfangen wurden.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.received) >= count, timeout)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TimingSink:
+    """
+    Senke, die nur den Zeitpunkt der Benachrichtigung festhält.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.notified = []
+
+    def send(self, alert):
+        if self.sink is not None:
+            self.sink.send(alert)
+        self.notified.append(time.time())
+
+
+def summarize(durations):
+    # Kennzahlen in Millisekunden wie in run_benchmarks.measure
+    durations = sorted(durations)
+    return {
+        "min_ms": durations[0],
+        "median_ms": statistics.median(durations),
+        "p95_ms": durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))],
+        "max_ms": durations[-1],
+    }
+
+
+def run_latency(alerts, work_dir):
+    """
+    Speist abwechselnd normale Gaswerte und Spitzen in die AlertEngine ein und misst je Spitze die Zeit vom
+    Aufruf von process() bis zur Benachrichtigung durch die Logdatei, den Webhook und alle Senken zusammen.
+
+    :param alerts: Anzahl der ausgelösten Alarme.
+    :param work_dir: Verzeichnis für die Logdatei.
+    :return: Dictionary mit den Latenzen je Senke.
+    """
+    buffer = ReadingsBuffer()
+    buffer.attach(1)
+    stub = WebhookStub()
+    log_sink = TimingSink(LogFileSink(os.path.join(work_dir, "alerts.log")))
+    webhook_sink = TimingSink(WebhookSink(stub.url))
+    rule = AlertRule("Gaskonzentration hoch", "ppm", above=300, hysteresis=50, cooldown=0)
+    engine = AlertEngine(rules=[rule], sinks=[log_sink, webhook_sink], buffer=buffer)
+
+    arrivals = []
+    timestamp = 1_700_000_000_000
+    try:
+        for i in range(alerts):
+            # Spitze auslösen und wieder abklingen lassen (ausgelöst + aufgehoben)
+            for ppm in (80.0, 520.0, 60.0):
+                timestamp += 1000
+                arrived = time.time()
+                buffer.append(1, "gas_sensor_data", timestamp, ppm, ppm / 1000)
+                fired = engine.process(1, "Benchmark", "gas_sensor_data", timestamp, ppm, ppm / 1000)
+                if any(alert.state == FIRED for alert in fired):
+                    arrivals.append(arrived)
+            # Benachrichtigung abwarten, damit sich die Messungen nicht gegenseitig überlagern
+            stub.wait_for(2 * (i + 1))
+    finally:
+        engine.close()
+        stub.close()
+
+    fired_at = [received for received, payload in stub.received if payload["state"] == FIRED]
+    log_at = log_sink.notified[::2]
+    webhook_at = webhook_sink.notified[::2]
+    return {
+        "alerts": len(arrivals),
+        "log_file": summarize([(t - a) * 1000 for a, t in zip(arrivals, log_at)]),
+        "webhook_sent": summarize([(t - a) * 1000 for a, t in zip(arrivals, webhook_at)]),
+        "webhook_received": summarize([(t - a) * 1000 for a, t in zip(arrivals, fired_at)]),
+    }
+
+
+def run_evaluation(readings, repeat):
+    """
+    Misst den Aufwand von process() für Messwerte, die keinen Alarm auslösen, mit den Standardregeln.
+
+    :param readings: Anzahl der Messwerte je Messung.
+    :param repeat: Wiederholungen.
+    :return: Dictionary mit den Kennzahlen je Messwert in Mikrosekunden.
+    """
+    buffer = ReadingsBuffer()
+    buffer.attach(1)
+    engine = AlertEngine(buffer=buffer)
+    state = {"timestamp": 1_700_000_000_000}
+
+    def feed():
+        for _ in range(readings):
+            state["timestamp"] += 1000
+            buffer.append(1, "gas_sensor_data", state["timestamp"], 80.0, 0.08)
+            engine.process(1, "Benchmark", "gas_sensor_data", state["timestamp"], 80.0, 0.08)
+
+    try:
+        result = measure(feed, repeat)
+    finally:
+        engine.close()
+    return {key.replace("_ms", "_us_per_reading"): value * 1000 / readings for key, value in result.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der Latenz von der Erkennung bis zur Benachrichtigung.")
+    parser.add_argument("--alerts", type=int, default=200, help="Anzahl der ausgelösten Alarme")
+    parser.add_argument("--readings", type=int, default=10000, help="Messwerte je Messung der Regelauswertung")
+    parser.add_argument("--repeat", type=int, default=10, help="Wiederholungen der Regelauswertung")
+    parser.add_argument("--output", default=None, help="Pfad des JSON-Berichts")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT",
+                        help="Nur den Webhook-Empfänger auf diesem Port starten")
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        stub = WebhookStub(args.serve, verbose=True)
+        print(f"Webhook-Empfänger läuft: {stub.url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stub.close()
+        return
+
+    with tempfile.TemporaryDirectory(prefix="smarthome_alerts_") as work_dir:
+        report = {
+            "latency": run_latency(args.alerts, work_dir),
+            "evaluation": run_evaluation(args.readings, args.repeat),
+        }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Bericht gespeichert: {args.output}")
+
+    print(f"Latenz Messwert -> Benachrichtigung ({report['latency']['alerts']} Alarme):")
+    for sink in ("log_file", "webhook_sent", "webhook_received"):
+        result = report["latency"][sink]
+        print(f"  {sink:<18} median {result['median_ms']:8.3f} ms   p95 {result['p95_ms']:8.3f} ms"
+              f"   max {result['max_ms']:8.3f} ms")
+    result = report["evaluation"]
+    print(f"Regelauswertung je Messwert: median {result['median_us_per_reading']:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark des zentralen Collectors: viele Geräte liefern gleichzeitig über localhost an einen Collector.
+
+Gemessen werden Durchsatz (Lieferungen und Messwerte je Sekunde) und die Zeit bis zur Bestätigung je Lieferung.
+Anschließend wird geprüft, dass jeder Messwert genau einmal geschrieben wurde, auch wenn Lieferungen wiederholt
+gesendet werden (--duplicates). Der Ausfall-Test startet den Collector erst nach einer Unterbrechung und misst,
+wie lange die Forwarder brauchen, um ihre Outbox nachzuliefern.
+
+Aufruf aus dem Verzeichnis SmartHomePi:
+
+    python -m benchmarks.collector_load --rooms 300 --deliveries 20 --output collector_report.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from database.collector import Collector
+from database.compression import DEFAULT_COMPRESSION, table_settings
+from database.forwarder import Forwarder, pack_payload, post_payload
+from benchmarks.alert_latency import summarize
+
+# Messwerte je Raum und Sekunde im Betrieb (ein Messwert je Sensor und Intervall, siehe main.SAMPLING_PERIODS)
+SAMPLING_PERIODS = {"dht22_data": 30, "flame_sensor_data": 1, "gas_sensor_data": 1, "light_sensor_data": 10}
+READINGS_PER_ROOM_SECOND = sum(1 / period for period in SAMPLING_PERIODS.values())
+
+START = datetime(2024, 1, 1)
+
+
+def _readings(seconds, offset):
+    # Gas-Messwerte im Sekundentakt, ab offset Sekunden nach START
+    return {"gas_sensor_data": [
+        [(START + timedelta(seconds=offset + i)).strftime("%Y-%m-%d %H:%M:%S"), 80.0 + (offset + i) % 7, 0.08]
+        for i in range(seconds)
+    ]}
+
+
+def _stored_readings(db_file):
+    # Jeder angenommene Messwert wird genau einmal aggregiert, unabhängig von der Kompression
+    with sqlite3.connect(db_file) as connection:
+        return connection.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM sensor_rollups WHERE resolution = 'day' AND metric = 'ppm'"
+        ).fetchone()[0]
+
+
+def run_load(rooms, deliveries, readings, duplicates, compression, work_dir):
+    """
+    Lässt je Raum ein Gerät so schnell wie möglich Lieferungen an den Collector senden.
+
+    :param rooms: Anzahl der Räume (je Raum ein Gerät).
+    :param deliveries: Lieferungen je Gerät.
+    :param readings: Messwerte je Lieferung.
+    :param duplicates: Anteil der Lieferungen, die ein zweites Mal gesendet werden (verlorene Bestätigung).
+    :param compression: Kompressions-Einstellungen mitsenden.
+    :param work_dir: Verzeichnis für die Datenbank.
+    :return: Dictionary mit Durchsatz, Latenzen und dem Ergebnis der Prüfung.
+    """
+    db_file = os.path.join(work_dir, "collector.db")
+    collector = Collector(db_file, port=0, host="127.0.0.1")
+    settings = table_settings(DEFAULT_COMPRESSION, SAMPLING_PERIODS) if compression else None
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(rooms + 1)
+
+    def node(index):
+        rng = random.Random(index)
+        name, stream = f"pi-{index}", uuid.uuid4().hex
+        durations, counts = [], {}
+        barrier.wait()
+        for seq in range(1, deliveries + 1):
+            payload = pack_payload({f"Raum {index}": _readings(readings, (seq - 1) * readings)},
+                                   {f"Raum {index}": settings} if settings and seq == 1 else None)
+            for _ in range(2 if rng.random() < duplicates else 1):
+                started = time.perf_counter()
+                status = post_payload(collector.url, name, stream, seq, payload, timeout=60)["status"]
+                durations.append((time.perf_counter() - started) * 1000)
+                counts[status] = counts.get(status, 0) + 1
+        with lock:
+            latencies.extend(durations)
+            for status, count in counts.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=node, args=(i,)) for i in range(rooms)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    collector.close()
+
+    expected = rooms * deliveries * readings
+    stored = _stored_readings(db_file)
+    readings_per_second = expected / elapsed
+    return {
+        "rooms": rooms,
+        "requests": len(latencies),
+        "statuses": statuses,
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "readings_per_second": readings_per_second,
+        "sustainable_rooms": int(readings_per_second / READINGS_PER_ROOM_SECOND),
+        "ack": summarize(latencies),
+        "expected_readings": expected,
+        "stored_readings": stored,
+        "exactly_once": stored == expected,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_outage(rooms, outage, work_dir):
+    """
+    Startet je Raum einen Forwarder, während der Collector nicht erreichbar ist, und startet den Collector erst nach
+    outage Sekunden. Gemessen wird die Zeit vom Start des Collectors, bis alle Outboxen leer sind.
+
+    :param rooms: Anzahl der Räume (je Raum ein Gerät mit eigener Outbox).
+    :param outage: Dauer des Ausfalls in Sekunden.
+    :param work_dir: Verzeichnis für Datenbank und Outboxen.
+    :return: Dictionary mit der Nachlieferzeit und dem Ergebnis der Prüfung.
+    """
+    db_file = os.path.join(work_dir, "outage.db")
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/ingest"
+    forwarders = [Forwarder(url, f"pi-{i}", os.path.join(work_dir, f"outbox-{i}.db"), flush_interval=0.2,
+                            max_backoff=1.0) for i in range(rooms)]
+    writers = [forwarder.writer(f"Raum {i}") for i, forwarder in enumerate(forwarders)]
+
+    sent = 0
+    collector = None
+    started = time.perf_counter()
+    while time.perf_counter() - started < 2 * outage:
+        if collector is None and time.perf_counter() - started >= outage:
+            backlog = sum(forwarder.outbox.pending()[1] for forwarder in forwarders)
+            collector = Collector(db_file, port=port, host="127.0.0.1")
+            recovered = time.perf_counter()
+        for writer in writers:
+            for timestamp, value1, value2 in _readings(1, sent)["gas_sensor_data"]:
+                writer.insert_data("gas_sensor_data", None, value1, value2, timestamp)
+        sent += 1
+        time.sleep(0.05)
+
+    for forwarder in forwarders:
+        forwarder.flush()
+    while any(forwarder.outbox.pending()[0] for forwarder in forwarders):
+        time.sleep(0.05)
+    catch_up = time.perf_counter() - recovered
+    for forwarder in forwarders:
+        forwarder.close()
+    collector.close()
+
+    expected = rooms * sent
+    stored = _stored_readings(db_file)
+    return {
+        "rooms": rooms,
+        "outage_seconds": outage,
+        "backlog_readings": backlog,
+        "catch_up_seconds": catch_up,
+        "expected_readings": expected,
+        "stored_readings": stored,
+        "exactly_once": stored == expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des zentralen Collectors mit vielen Geräten.")
+    parser.add_argument("--rooms", type=int, default=300, help="Anzahl der Räume bzw. Geräte")
+    parser.add_argument("--deliveries", type=int, default=20, help="Lieferungen je Gerät")
+    parser.add_argument("--readings", type=int, default=60, help="Messwerte je Lieferung")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Anteil wiederholt gesendeter Lieferungen")
+    parser.add_argument("--compression", action="store_true", help="Kompressions-Einstellungen mitsenden")
+    parser.add_argument("--outage-rooms", type=int, default=20, help="Geräte im Ausfall-Test (0 = überspringen)")
+    parser.add_argument("--outage", type=float, default=3.0, help="Dauer des Ausfalls in Sekunden")
+    parser.add_argument("--output", default=None, help="Pfad des JSON-Berichts")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="smarthome_collector_") as work_dir:
+        report = {"load": run_load(args.rooms, args.deliveries, args.readings, args.duplicates, args.compression,
+                                   work_dir)}
+        if args.outage_rooms:
+            report["outage"] = run_outage(args.outage_rooms, args.outage, work_dir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Bericht gespeichert: {args.output}")
+
+    result = report["load"]
+    print(f"Last: {result['rooms']} Geräte, {result['requests']} Lieferungen in {result['seconds']:.1f} s "
+          f"({result['requests_per_second']:.0f}/s, {result['readings_per_second']:.0f} Messwerte/s, "
+          f"reicht für etwa {result['sustainable_rooms']} Räume)")
+    print(f"  Bestätigung: median {result['ack']['median_ms']:.1f} ms   p95 {result['ack']['p95_ms']:.1f} ms"
+          f"   max {result['ack']['max_ms']:.1f} ms   {result['statuses']}")
+    print(f"  Genau einmal geschrieben: {result['exactly_once']} "
+          f"({result['stored_readings']} von {result['expected_readings']} Messwerten)")
+    if "outage" in report:
+        result = report["outage"]
+        print(f"Ausfall: {result['rooms']} Geräte, {result['outage_seconds']:.0f} s ohne Collector, "
+              f"{result['backlog_readings']} Messwerte in den Outboxen, nachgeliefert in "
+              f"{result['catch_up_seconds']:.2f} s, genau einmal geschrieben: {result['exactly_once']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Erzeugt eine synthetische Messwert-Historie für Benchmarks.
+
+Die Rohdaten werden direkt in SQL (rekursive CTE) erzeugt, damit auch 50 Mio. Zeilen in vertretbarer Zeit
+entstehen. Anschließend werden Rollups und Sketches wie bei einer Migration aus den Rohdaten aufgebaut.
+"""
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from database.db import Database
+from database.schema import SENSOR_TABLES
+from database.rollups import create_rollup_table
+from database.sketches import create_sketch_table
+
+# Anteil der Zeilen je Sensor-Tabelle, entsprechend den Abtastintervallen in main.SAMPLING_PERIODS
+TABLE_SHARES = {
+    "dht22_data": 1 / 30,
+    "flame_sensor_data": 1,
+    "gas_sensor_data": 1,
+    "light_sensor_data": 1 / 10,
+}
+
+# SQL-Ausdrücke für (value1, value2) je Tabelle; n ist die laufende Nummer, phase der Tagesanteil (0..1)
+VALUE_EXPRESSIONS = {
+    "dht22_data": (
+        "round(21 + 3 * sin(6.283185 * (phase - 0.375)) + (random() % 100) / 250.0, 2)",
+        "round(45 - 8 * sin(6.283185 * (phase - 0.375)) + (random() % 100) / 50.0, 2)",
+    ),
+    "flame_sensor_data": (
+        "(abs(random()) % 2000 = 0)",
+        "0.95",
+    ),
+    "gas_sensor_data": (
+        "round(80 + abs(random()) % 1000 / 100.0, 2)",
+        "0.08",
+    ),
+    "light_sensor_data": (
+        "round(max(0, 800 * sin(6.283185 * (phase - 0.25))), 2)",
+        "round(1 - max(0, 0.8 * sin(6.283185 * (phase - 0.25))), 4)",
+    ),
+}
+
+
+def rows_per_table(total_rows, rooms):
+    """
+    Verteilt die Gesamtzahl der Zeilen auf Räume und Sensor-Tabellen.
+
+    :param total_rows: Gewünschte Gesamtzahl an Zeilen über alle Räume und Tabellen.
+    :param rooms: Anzahl der Räume.
+    :return: Dictionary {Tabellenname: Zeilen je Raum}
+    """
+    share_sum = sum(TABLE_SHARES.values())
+    return {
+        table: max(1, int(total_rows * share / share_sum / rooms))
+        for table, share in TABLE_SHARES.items()
+    }
+
+
+def generate_history(db_file, total_rows, rooms=4, days=365, end=None):
+    """
+    Legt eine neue Datenbank mit synthetischer Historie an. Eine vorhandene Datei wird überschrieben.
+
+    :param db_file: Pfad der Datenbank-Datei.
+    :param total_rows: Gesamtzahl der Rohdaten-Zeilen über alle Räume und Tabellen.
+    :param rooms: Anzahl der Räume (Standard: 4).
+    :param days: Länge der Historie in Tagen bis end (Standard: 365).
+    :param end: Ende der Historie als datetime (UTC, Standard: jetzt).
+    :return: Dictionary mit Dauer der Erzeugung (raw_seconds, rollup_seconds, sketch_seconds) und Dateigröße.
+    """
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    end_epoch = int(end.timestamp() if end.tzinfo else end.replace(tzinfo=timezone.utc).timestamp())
+    start_epoch = end_epoch - days * 86400
+
+    db = Database(db_file)
+    connection = db.connection
+    try:
+        connection.execute("SELECT sin(0)")
+    except sqlite3.OperationalError:
+        # SQLite ohne eingebaute Mathematik-Funktionen (SQLITE_ENABLE_MATH_FUNCTIONS)
+        connection.create_function("sin", 1, math.sin, deterministic=True)
+    room_ids = []
+    for number in range(1, rooms + 1):
+        db.insert_room(f"Raum {number}")
+        room_ids.append(db.get_room_id_by_name(f"Raum {number}"))
+
+    started = time.perf_counter()
+    with connection:
+        for table, count in rows_per_table(total_rows, rooms).items():
+            column1, column2 = SENSOR_TABLES[table]
+            value1, value2 = VALUE_EXPRESSIONS[table]
+            step = days * 86400 / count
+            for room_id in room_ids:
+                connection.execute(f"""
+                    WITH RECURSIVE series(n) AS (
+                        SELECT 0 UNION ALL SELECT n + 1 FROM series WHERE n + 1 < ?
+                    ),
+                    samples AS (
+                        SELECT n, CAST(? + n * ? AS INTEGER) AS epoch,
+                               ((? + n * ?) % 86400) / 86400.0 AS phase
+                        FROM series
+                    )
+                    INSERT INTO {table} (room_id, timestamp, {column1}, {column2})
+                    SELECT ?, strftime('%Y-%m-%d %H:%M:%S', epoch, 'unixepoch'), {value1}, {value2}
+                    FROM samples
+                """, (count, start_epoch, step, start_epoch, step, room_id))
+    raw_seconds = time.perf_counter() - started
+
+    # Rollups und Sketches einmalig aus den Rohdaten aufbauen (wie bei der Migration einer bestehenden Datenbank)
+    started = time.perf_counter()
+    with connection:
+        create_rollup_table(connection)
+    rollup_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with connection:
+        create_sketch_table(connection)
+    sketch_seconds = time.perf_counter() - started
+
+    connection.close()
+    return {
+        "raw_seconds": raw_seconds,
+        "rollup_seconds": rollup_seconds,
+        "sketch_seconds": sketch_seconds,
+        "db_size_bytes": os.path.getsize(db_file),
+    }
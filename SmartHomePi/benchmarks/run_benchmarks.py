@@ -0,0 +1,303 @@
+"""
+Benchmark-Suite für die Datenbank: Schreibdurchsatz je Ingestion-Modus, Latenz der Abfragen der Sensors-Seite
+und Aufbauzeit der DataFrames bei wachsender Datenmenge.
+
+Aufruf aus dem Verzeichnis SmartHomePi:
+
+    python -m benchmarks.run_benchmarks --rows 1000000 10000000 50000000 --output bench_report.json
+    python -m benchmarks.run_benchmarks --rows 1000000 --compare bench_report_alt.json
+
+Der Bericht ist eine JSON-Datei; mit --compare werden die Werte eines älteren Berichts gegenübergestellt und
+Verschlechterungen über der Toleranz gemeldet.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from database.db import Database
+from database.batch_writer import BatchWriter
+from utils.heatmap import build_time_bucket_matrix, build_weekly_profile
+from utils.sensor_snapshot import SensorSnapshot, SENSOR_COLUMNS
+from database.readings import migrate_to_narrow
+from database.retention import incremental_vacuum
+from database.archive import archive_closed_days, archive_summary, default_archive_dir
+from benchmarks.generate import generate_history
+
+# Messgrößen, wie sie die Sensors-Seite verwendet
+PAGE_METRICS = {name: column for name, (_, column) in SENSOR_COLUMNS.items()}
+
+
+def measure(function, repeat):
+    """
+    Führt eine Funktion mehrfach aus und misst die Laufzeit.
+
+    :param function: Funktion ohne Parameter.
+    :param repeat: Anzahl der Wiederholungen.
+    :return: Dictionary mit min, median, p95 und max in Millisekunden.
+    """
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return {
+        "min_ms": durations[0],
+        "median_ms": statistics.median(durations),
+        "p95_ms": durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))],
+        "max_ms": durations[-1],
+    }
+
+
+def _ingestion_rows(room_id, count, start):
+    # Gas-Messwerte im Sekundentakt nach dem Ende der Historie, damit sie die vorhandenen Daten nicht überlagern
+    return [
+        (room_id, (start + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S"), 100.0 + i % 50, 0.1)
+        for i in range(count)
+    ]
+
+
+def benchmark_ingestion(db_file, room_id, count, end):
+    """
+    Misst den Schreibdurchsatz (Zeilen pro Sekunde) je Ingestion-Modus:
+    einzelne insert_data-Aufrufe, insert_many mit Batches zu 100 Zeilen und der BatchWriter im Hintergrund.
+    """
+    results = {}
+
+    db = Database(db_file)
+    rows = _ingestion_rows(room_id, count, end + timedelta(days=1))
+    started = time.perf_counter()
+    for row_room_id, timestamp, value1, value2 in rows:
+        db.insert_data("gas_sensor_data", row_room_id, value1, value2, timestamp)
+    results["insert_data"] = count / (time.perf_counter() - started)
+
+    rows = _ingestion_rows(room_id, count, end + timedelta(days=2))
+    started = time.perf_counter()
+    for i in range(0, count, 100):
+        db.insert_many("gas_sensor_data", rows[i:i + 100])
+    results["insert_many_100"] = count / (time.perf_counter() - started)
+    db.connection.close()
+
+    rows = _ingestion_rows(room_id, count, end + timedelta(days=3))
+    started = time.perf_counter()
+    writer = BatchWriter(db_file, max_batch_size=100, flush_interval=0.5)
+    for row_room_id, timestamp, value1, value2 in rows:
+        writer.insert_data("gas_sensor_data", row_room_id, value1, value2, timestamp)
+    writer.close()
+    results["batch_writer"] = count / (time.perf_counter() - started)
+
+    return {mode: {"rows_per_second": rate} for mode, rate in results.items()}
+
+
+def benchmark_queries(db, room_id, end, repeat):
+    """
+    Misst die Latenz der einzelnen Abfragen, die die Sensors-Seite bei einem Seitenaufbau ausführt.
+    """
+    queries = {
+        "room_list": lambda: db.connection.execute("SELECT id, name FROM rooms").fetchall(),
+        "snapshot_1000": lambda: SensorSnapshot(db, room_id, limit=1000),
+    }
+    for label, span in (("1h", timedelta(hours=1)), ("24h", timedelta(days=1)), ("7d", timedelta(days=7)),
+                        ("30d", timedelta(days=30))):
+        queries[f"series_temperature_{label}"] = (
+            lambda span=span: db.get_series(room_id, "temperature", end - span, end, max_points=500))
+        queries[f"series_ppm_{label}"] = (
+            lambda span=span: db.get_series(room_id, "ppm", end - span, end, max_points=500))
+    queries["series_ppm_365d"] = (
+        lambda: db.get_series(room_id, "ppm", end - timedelta(days=365), end, max_points=500))
+    queries["available_days"] = lambda: db.get_available_days(room_id, "temperature")
+    queries["rollups_365d"] = lambda: db.get_rollup_data(room_id, "ppm", end - timedelta(days=365), end)
+    queries["heatmap_7d_1h"] = (
+        lambda: build_time_bucket_matrix(db, room_id, PAGE_METRICS, end - timedelta(days=7), end, 60))
+    queries["weekly_profile_30d"] = (
+        lambda: build_weekly_profile(db, room_id, "temperature", end - timedelta(days=30), end))
+    start_day = (end - timedelta(days=29)).date()
+    queries["distribution_30d"] = lambda: db.get_distribution(room_id, "temperature", start_day, end.date())
+
+    return {name: measure(query, repeat) for name, query in queries.items()}
+
+
+def benchmark_dataframes(db, room_id, end, repeat):
+    """
+    Misst die Aufbauzeit der DataFrames von der Abfrage bis zum fertigen Diagramm-Input.
+    """
+    def page_build():
+        # Alle Datensätze, die die Sensors-Seite mit Standard-Einstellungen lädt
+        snapshot = SensorSnapshot(db, room_id, limit=1000)
+        for table in ("dht22_data", "light_sensor_data", "gas_sensor_data"):
+            snapshot.frame(table)
+        for metric in PAGE_METRICS.values():
+            db.get_series(room_id, metric, end - timedelta(days=1), end, max_points=500)
+        build_time_bucket_matrix(db, room_id, PAGE_METRICS, end - timedelta(days=7), end, 60)
+        start_day = (end - timedelta(days=29)).date()
+        for metric in PAGE_METRICS.values():
+            db.get_distribution(room_id, metric, start_day, end.date())
+
+    return {
+        "snapshot_100000": measure(lambda: SensorSnapshot(db, room_id, limit=100000), repeat),
+        "sensors_page": measure(page_build, repeat),
+    }
+
+
+def run_scale(rows, rooms, days, repeat, ingest_rows, work_dir, storage="wide", archive=False):
+    """
+    Erzeugt eine Datenbank mit rows Zeilen und führt alle Benchmarks darauf aus.
+    Bei storage="narrow" wird die Historie vorher auf die kompakte Tabelle readings migriert,
+    bei archive=True werden alle abgeschlossenen Tage ins Parquet-Archiv ausgelagert.
+    """
+    db_file = os.path.join(work_dir, f"bench_{rows}.db")
+    end = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+    print(f"Erzeuge {rows} Zeilen für {rooms} Räume über {days} Tage ...")
+    generation = generate_history(db_file, rows, rooms=rooms, days=days, end=end)
+
+    db = Database(db_file)
+    if storage == "narrow":
+        print("Migriere auf die Tabelle readings ...")
+        started = time.perf_counter()
+        migrate_to_narrow(db.connection, chunk_size=50000, pause=0)
+        generation["migration_seconds"] = time.perf_counter() - started
+        incremental_vacuum(db.connection, pause=0)
+        generation["db_size_bytes"] = os.path.getsize(db_file)
+    if archive:
+        print("Lagere abgeschlossene Tage ins Parquet-Archiv aus ...")
+        started = time.perf_counter()
+        archive_closed_days(db.connection, db.archive_dir, chunk_size=50000, pause=0, now=end, min_age_days=1)
+        generation["archive_seconds"] = time.perf_counter() - started
+        generation["archive_bytes"] = archive_summary(db.connection)["bytes"]
+        incremental_vacuum(db.connection, pause=0)
+        generation["db_size_bytes"] = os.path.getsize(db_file)
+    room_id = db.get_room_id_by_name("Raum 1")
+    print("Messe Abfragen ...")
+    queries = benchmark_queries(db, room_id, end, repeat)
+    dataframes = benchmark_dataframes(db, room_id, end, repeat)
+    db.connection.close()
+
+    # Schreiben zuletzt messen, damit die Abfragen auf der unveränderten Historie laufen
+    print("Messe Schreibdurchsatz ...")
+    ingestion = benchmark_ingestion(db_file, room_id, ingest_rows, end)
+    os.remove(db_file)
+    shutil.rmtree(default_archive_dir(db_file), ignore_errors=True)
+
+    return {
+        "rows": rows,
+        "storage": storage,
+        "archive": archive,
+        "rooms": rooms,
+        "days": days,
+        "generation": generation,
+        "ingestion": ingestion,
+        "queries": queries,
+        "dataframes": dataframes,
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(report):
+    # Vergleichbare Messwerte als {(Zeilen, Bereich, Name, Kennzahl): Wert}
+    values = {}
+    for scale in report["results"]:
+        for section in ("ingestion", "queries", "dataframes"):
+            for name, metrics in scale[section].items():
+                for key, value in metrics.items():
+                    values[(scale["rows"], section, name, key)] = value
+    return values
+
+
+def compare_reports(old_report, new_report, tolerance=0.2):
+    """
+    Vergleicht zwei Berichte. Bei Latenzen gilt ein höherer Wert, beim Durchsatz ein niedrigerer als Verschlechterung.
+
+    :param old_report: Der ältere Bericht (Dictionary).
+    :param new_report: Der neue Bericht (Dictionary).
+    :param tolerance: Zulässige relative Abweichung (Standard: 0.2 = 20 %).
+    :return: Liste von Dictionaries mit den Verschlechterungen.
+    """
+    old_values, new_values = _flatten(old_report), _flatten(new_report)
+    regressions = []
+    for key, new in new_values.items():
+        old = old_values.get(key)
+        if not old or key[3] not in ("median_ms", "rows_per_second"):
+            continue
+        change = (new - old) / old
+        if key[3] == "rows_per_second":
+            change = -change
+        if change > tolerance:
+            rows, section, name, metric = key
+            regressions.append({"rows": rows, "section": section, "name": name, "metric": metric,
+                                "old": old, "new": new, "change": change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks für Schreibdurchsatz und Abfragelatenz der Datenbank.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000],
+                        help="Größen der synthetischen Historie (Gesamtzahl der Zeilen)")
+    parser.add_argument("--rooms", type=int, default=4, help="Anzahl der Räume")
+    parser.add_argument("--days", type=int, default=365, help="Länge der Historie in Tagen")
+    parser.add_argument("--repeat", type=int, default=10, help="Wiederholungen je Abfrage")
+    parser.add_argument("--ingest-rows", type=int, default=2000, help="Anzahl der Zeilen je Ingestion-Modus")
+    parser.add_argument("--storage", choices=["wide", "narrow"], default="wide",
+                        help="Speicherart der Messwerte (siehe database/readings.py)")
+    parser.add_argument("--archive", action="store_true",
+                        help="Abgeschlossene Tage vor den Messungen ins Parquet-Archiv auslagern")
+    parser.add_argument("--work-dir", default=None, help="Verzeichnis für die Benchmark-Datenbanken")
+    parser.add_argument("--output", default="bench_report.json", help="Pfad des JSON-Berichts")
+    parser.add_argument("--compare", default=None, help="Älterer JSON-Bericht zum Vergleich")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Toleranz für Verschlechterungen (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="smarthome_bench_")
+    report = {
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "version": git_version(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "results": [
+            run_scale(rows, args.rooms, args.days, args.repeat, args.ingest_rows, work_dir, args.storage,
+                      args.archive)
+            for rows in args.rows
+        ],
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Bericht gespeichert: {args.output}")
+
+    for scale in report["results"]:
+        print(f"\n{scale['rows']} Zeilen ({scale['storage']}), {scale['generation']['db_size_bytes']} Bytes:")
+        for mode, result in scale["ingestion"].items():
+            print(f"  {mode:<28} {result['rows_per_second']:>12.0f} Zeilen/s")
+        for section in ("queries", "dataframes"):
+            for name, result in scale[section].items():
+                print(f"  {name:<28} {result['median_ms']:>12.2f} ms (p95 {result['p95_ms']:.2f} ms)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_reports(json.load(f), report, args.tolerance)
+        if regressions:
+            print("\nVerschlechterungen gegenüber dem Vergleichsbericht:")
+            for r in regressions:
+                print(f"  {r['rows']} Zeilen {r['section']}/{r['name']} {r['metric']}: "
+                      f"{r['old']:.2f} -> {r['new']:.2f} ({r['change']:+.0%})")
+            raise SystemExit(1)
+        print("\nKeine Verschlechterungen gegenüber dem Vergleichsbericht.")
+
+
+if __name__ == "__main__":
+    main()
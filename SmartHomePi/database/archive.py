@@ -0,0 +1,398 @@
+"""
+Archiv der Rohdaten als Parquet-Dateien.
+
+Ältere Tage werden aus der SQLite-Datenbank in spaltenweise komprimierte Parquet-Dateien exportiert und danach aus
+den Rohdaten gelöscht, damit die Datenbank-Datei klein bleibt. Das Archiv ist standardmäßig ausgeschaltet und wird
+in den Einstellungen mit einem Mindestalter in Tagen aktiviert (siehe set_archive_after_days). Die
+Aufbewahrungsregeln der Rohdaten gelten auch für das Archiv (siehe delete_expired_archive), sodass dessen Größe
+ebenso begrenzt bleibt.
+Die Dateien sind nach Raum und Tag partitioniert (Hive-Schema, auch z.B. mit pandas oder DuckDB lesbar):
+
+    <archiv>/<sensor-tabelle>/room_id=<id>/date=<YYYY-MM-DD>/part-0.parquet
+
+Welche Tage archiviert sind, steht in der Tabelle archived_days. Database.get_raw_rows() und
+Database.get_series() lesen ältere Zeiträume aus den Parquet-Dateien und neuere aus SQLite. Innerhalb einer
+Datei sind die Zeilen nach Zeit sortiert und in Row Groups mit Min/Max-Statistik aufgeteilt, sodass ein
+Zeitfilter nur die betroffenen Row Groups liest. Rollups und Sketches bleiben vollständig in SQLite.
+
+pyarrow wird erst beim ersten Zugriff auf das Archiv importiert.
+"""
+import os
+import shutil
+import time
+from datetime import date, datetime, timedelta, timezone
+from database.schema import SENSOR_TABLES, to_timestamp, to_epoch_ms
+from database.readings import get_storage_engine, metric_ids
+from database.retention import delete_chunks
+
+# Zeilen je Row Group; ein Zeitfilter überspringt Row Groups außerhalb des Zeitraums anhand ihrer Statistik
+ROW_GROUP_SIZE = 10000
+
+# Vorschlag für das Mindestalter archivierter Tage beim Aktivieren des Archivs
+DEFAULT_ARCHIVE_AFTER_DAYS = 7
+
+
+def _import_pyarrow():
+    # Optionale Abhängigkeit erst bei Bedarf laden
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.parquet
+    return pyarrow, pyarrow.dataset, pyarrow.parquet
+
+
+def create_archive_table(connection):
+    """
+    Erstellt die Tabelle archived_days, in der die archivierten Tage je Raum verzeichnet sind.
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS archived_days (
+            room_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            PRIMARY KEY (room_id, day)
+        ) WITHOUT ROWID
+    """)
+
+
+def default_archive_dir(db_file):
+    """
+    Gibt das Archiv-Verzeichnis zu einer Datenbank-Datei zurück (z.B. "sensors_archive" für "sensors.db").
+
+    :param db_file: Der Dateiname der SQLite-Datenbank.
+    :return: Der Pfad des Archiv-Verzeichnisses oder None für eine In-Memory-Datenbank.
+    """
+    if db_file == ":memory:":
+        return None
+    return os.path.splitext(db_file)[0] + "_archive"
+
+
+def day_file(archive_dir, table, room_id, day):
+    """
+    Gibt den Pfad der Parquet-Datei eines Tages zurück.
+
+    :param archive_dir: Das Archiv-Verzeichnis.
+    :param table: Der Name der Sensor-Tabelle.
+    :param room_id: Die ID des Raums.
+    :param day: Der Tag als String "YYYY-MM-DD".
+    """
+    return os.path.join(archive_dir, table, f"room_id={room_id}", f"date={day}", "part-0.parquet")
+
+
+def archived_days(connection, room_id, start=None, end=None):
+    """
+    Gibt die archivierten Tage eines Raums zurück, die in einen Zeitraum fallen.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :param start: Optionaler Beginn des Zeitraums (datetime oder Zeitstempel-String, UTC).
+    :param end: Optionales Ende des Zeitraums (datetime oder Zeitstempel-String, UTC).
+    :return: Aufsteigend sortierte Liste von Tagen "YYYY-MM-DD".
+    """
+    conditions, params = ["room_id = ?"], [room_id]
+    if start is not None:
+        conditions.append("day >= ?")
+        params.append(to_timestamp(start)[:10])
+    if end is not None:
+        conditions.append("day <= ?")
+        params.append(to_timestamp(end)[:10])
+    rows = connection.execute(f"""
+        SELECT day FROM archived_days WHERE {" AND ".join(conditions)} ORDER BY day
+    """, params).fetchall()
+    return [day for day, in rows]
+
+
+def get_archive_after_days(connection):
+    """
+    Gibt das Mindestalter in Tagen zurück, ab dem Tage ins Archiv ausgelagert werden.
+
+    :param connection: Die SQLite-Verbindung.
+    :return: Das Mindestalter in Tagen oder None, falls das Archiv ausgeschaltet ist (Standard).
+    """
+    row = connection.execute("SELECT value FROM storage_settings WHERE key = 'archive_after_days'").fetchone()
+    return int(row[0]) if row else None
+
+
+def set_archive_after_days(connection, days):
+    """
+    Aktiviert das Archiv mit einem Mindestalter bzw. schaltet es aus. Gilt ab dem nächsten Durchlauf der
+    Kompaktierung; bereits archivierte Tage bleiben im Archiv.
+
+    :param connection: Die SQLite-Verbindung.
+    :param days: Das Mindestalter in Tagen (mindestens 1) oder None, um das Archiv auszuschalten.
+    """
+    with connection:
+        if days is None:
+            connection.execute("DELETE FROM storage_settings WHERE key = 'archive_after_days'")
+        else:
+            connection.execute("INSERT OR REPLACE INTO storage_settings (key, value) VALUES ('archive_after_days', ?)",
+                               (str(max(int(days), 1)),))
+
+
+def archive_summary(connection):
+    """
+    Gibt einen Überblick über das Archiv zurück.
+
+    :param connection: Die SQLite-Verbindung.
+    :return: Dictionary mit days (archivierte Raum-Tage), rows (Zeilen) und bytes (Größe der Parquet-Dateien).
+    """
+    days, rows, size = connection.execute("""
+        SELECT COUNT(*), IFNULL(SUM(rows), 0), IFNULL(SUM(bytes), 0) FROM archived_days
+    """).fetchone()
+    return {"days": days, "rows": rows, "bytes": size}
+
+
+def _day_bounds(day):
+    # Halboffenes Intervall [Tagesbeginn, Folgetag) als Zeitstempel-Strings
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    return f"{day} 00:00:00", f"{next_day} 00:00:00"
+
+
+def _read_day(connection, engine, table, room_id, day):
+    # Rohdaten eines Tages aus SQLite als Liste von Tupeln (Millisekunden seit 1970, value1, value2)
+    day_start, day_end = _day_bounds(day)
+    if engine == "narrow":
+        metric1, metric2 = metric_ids(table)
+        values = {}
+        for index, metric_id in enumerate((metric1, metric2)):
+            for ts, value in connection.execute("""
+                SELECT ts, value FROM readings WHERE room_id = ? AND metric_id = ? AND ts >= ? AND ts < ?
+            """, (room_id, metric_id, to_epoch_ms(day_start), to_epoch_ms(day_end))):
+                values.setdefault(ts, [ts, None, None])[index + 1] = value
+        return sorted(tuple(row) for row in values.values())
+
+    column1, column2 = SENSOR_TABLES[table]
+    return connection.execute(f"""
+        SELECT CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER), {column1}, {column2}
+        FROM {table}
+        WHERE room_id = ? AND timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp
+    """, (room_id, day_start, day_end)).fetchall()
+
+
+def _delete_day(connection, engine, table, room_id, day, chunk_size, pause, stop_event):
+    # Dieselben Zeilen wie in _read_day in kleinen Transaktionen löschen
+    day_start, day_end = _day_bounds(day)
+    if engine == "narrow":
+        deleted = 0
+        for metric_id in metric_ids(table):
+            deleted += delete_chunks(connection, """
+                DELETE FROM readings WHERE room_id = ? AND metric_id = ? AND ts IN (
+                    SELECT ts FROM readings WHERE room_id = ? AND metric_id = ? AND ts >= ? AND ts < ? LIMIT ?
+                )
+            """, (room_id, metric_id, room_id, metric_id, to_epoch_ms(day_start), to_epoch_ms(day_end)),
+                chunk_size, pause, stop_event)
+        return deleted
+
+    return delete_chunks(connection, f"""
+        DELETE FROM {table} WHERE id IN (
+            SELECT id FROM {table} WHERE room_id = ? AND timestamp >= ? AND timestamp < ? LIMIT ?
+        )
+    """, (room_id, day_start, day_end), chunk_size, pause, stop_event)
+
+
+def _write_day(archive_dir, table, room_id, day, rows):
+    # Schreibt die Zeilen eines Tages; bereits archivierte Zeilen desselben Tages werden übernommen
+    pa, _, pq = _import_pyarrow()
+    column1, column2 = SENSOR_TABLES[table]
+    timestamps, values1, values2 = zip(*rows)
+    data = pa.table({
+        "timestamp": pa.array(timestamps, pa.timestamp("ms")),
+        column1: pa.array(values1, pa.float64()),
+        column2: pa.array(values2, pa.float64()),
+    })
+
+    path = day_file(archive_dir, table, room_id, day)
+    if os.path.exists(path):
+        # Z.B. nach einem Abbruch zwischen Schreiben und Löschen: doppelte Zeilen nur einmal übernehmen
+        data = pa.concat_tables([pq.read_table(path), data])
+        data = data.group_by(data.column_names, use_threads=False).aggregate([])
+    data = data.sort_by("timestamp")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    pq.write_table(data, temp_path, compression="zstd", row_group_size=ROW_GROUP_SIZE)
+    os.replace(temp_path, path)
+
+
+def _day_stats(archive_dir, room_id, day):
+    # Zeilen und Dateigröße aller Parquet-Dateien eines Tages
+    _, _, pq = _import_pyarrow()
+    rows = size = 0
+    for table in SENSOR_TABLES:
+        path = day_file(archive_dir, table, room_id, day)
+        if os.path.exists(path):
+            rows += pq.read_metadata(path).num_rows
+            size += os.path.getsize(path)
+    return rows, size
+
+
+def archive_day(connection, archive_dir, room_id, day, chunk_size=500, pause=0.05, stop_event=None):
+    """
+    Archiviert die Rohdaten eines Raums für einen Tag: Export in Parquet, Eintrag in archived_days und
+    anschließendes Löschen der Rohdaten in kleinen Transaktionen.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :param archive_dir: Das Archiv-Verzeichnis.
+    :param room_id: Die ID des Raums.
+    :param day: Der Tag als String "YYYY-MM-DD" (UTC).
+    :param chunk_size: Maximale Anzahl gelöschter Zeilen je Transaktion (Standard: 500).
+    :param pause: Pause zwischen zwei Transaktionen in Sekunden (Standard: 0.05).
+    :param stop_event: Optionales threading.Event zum vorzeitigen Abbrechen.
+    :return: Anzahl der aus SQLite archivierten Zeilen.
+    """
+    engine = get_storage_engine(connection)
+    exported = {}
+    for table in SENSOR_TABLES:
+        rows = _read_day(connection, engine, table, room_id, day)
+        if rows:
+            _write_day(archive_dir, table, room_id, day, rows)
+            exported[table] = len(rows)
+    if not exported:
+        return 0
+
+    # Erst nach dem Schreiben aller Dateien verzeichnen und löschen; ein Abbruch verliert keine Daten
+    with connection:
+        connection.execute("""
+            INSERT OR REPLACE INTO archived_days (room_id, day, rows, bytes) VALUES (?, ?, ?, ?)
+        """, (room_id, day, *_day_stats(archive_dir, room_id, day)))
+    for table in exported:
+        _delete_day(connection, engine, table, room_id, day, chunk_size, pause, stop_event)
+    return sum(exported.values())
+
+
+def _oldest_day(connection, engine, room_id):
+    # Ältester Tag mit Rohdaten eines Raums über alle Sensor-Tabellen
+    oldest = []
+    for table in SENSOR_TABLES:
+        if engine == "narrow":
+            for metric_id in metric_ids(table):
+                ts = connection.execute("""
+                    SELECT MIN(ts) FROM readings WHERE room_id = ? AND metric_id = ?
+                """, (room_id, metric_id)).fetchone()[0]
+                if ts is not None:
+                    oldest.append(datetime.fromtimestamp(ts / 1000, timezone.utc).date().isoformat())
+        else:
+            timestamp = connection.execute(f"SELECT MIN(timestamp) FROM {table} WHERE room_id = ?",
+                                           (room_id,)).fetchone()[0]
+            if timestamp is not None:
+                oldest.append(str(timestamp)[:10])
+    return min(oldest) if oldest else None
+
+
+def archive_closed_days(connection, archive_dir, chunk_size=500, pause=0.05, stop_event=None, now=None,
+                        min_age_days=DEFAULT_ARCHIVE_AFTER_DAYS):
+    """
+    Archiviert alle Tage aller Räume, die mindestens min_age_days Tage vor dem aktuellen UTC-Tag liegen,
+    ältester Tag zuerst. Während einer Online-Migration der Speicherart (siehe database/readings.py) wird nichts
+    archiviert.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :param archive_dir: Das Archiv-Verzeichnis.
+    :param chunk_size: Maximale Anzahl gelöschter Zeilen je Transaktion (Standard: 500).
+    :param pause: Pause zwischen zwei Transaktionen in Sekunden (Standard: 0.05).
+    :param stop_event: Optionales threading.Event zum vorzeitigen Abbrechen.
+    :param now: Optionaler Bezugszeitpunkt (datetime, UTC, Standard: jetzt).
+    :param min_age_days: Mindestalter in Tagen (Standard: 7, 1 = alle abgeschlossenen Tage).
+    :return: Dictionary {(room_id, Tag): Anzahl archivierter Zeilen}.
+    """
+    engine = get_storage_engine(connection)
+    if engine == "migrating":
+        return {}
+    # Archiviert werden nur Tage vor diesem Tag
+    before = ((now or datetime.now(timezone.utc)).date() - timedelta(days=max(min_age_days, 1) - 1)).isoformat()
+
+    archived = {}
+    for room_id, in connection.execute("SELECT id FROM rooms").fetchall():
+        day = _oldest_day(connection, engine, room_id)
+        while day is not None and day < before:
+            if stop_event is not None and stop_event.is_set():
+                return archived
+            archived[(room_id, day)] = archive_day(connection, archive_dir, room_id, day, chunk_size, pause,
+                                                   stop_event)
+            next_day = _oldest_day(connection, engine, room_id)
+            if next_day == day:
+                # Löschen wurde unterbrochen, beim nächsten Durchlauf fortsetzen
+                break
+            day = next_day
+            time.sleep(pause)
+    return archived
+
+
+def delete_expired_archive(connection, archive_dir, table, keep_days, now=None):
+    """
+    Wendet die Aufbewahrungsdauer einer Sensor-Tabelle auf das Archiv an: Tage, die vollständig vor dem Stichtag
+    liegen, werden gelöscht. Einträge in archived_days werden entfernt, sobald keine Datei des Tages mehr existiert.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :param archive_dir: Das Archiv-Verzeichnis (None = kein Archiv).
+    :param table: Der Name der Sensor-Tabelle.
+    :param keep_days: Die Aufbewahrungsdauer in Tagen (None = nichts löschen).
+    :param now: Optionaler Bezugszeitpunkt (datetime, UTC, Standard: jetzt).
+    :return: Anzahl der gelöschten Zeilen.
+    """
+    if keep_days is None or archive_dir is None:
+        return 0
+    cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=keep_days)).date().isoformat()
+    expired = connection.execute("SELECT room_id, day FROM archived_days WHERE day < ?", (cutoff,)).fetchall()
+
+    deleted = 0
+    for room_id, day in expired:
+        path = day_file(archive_dir, table, room_id, day)
+        if os.path.exists(path):
+            _, _, pq = _import_pyarrow()
+            deleted += pq.read_metadata(path).num_rows
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        rows, size = _day_stats(archive_dir, room_id, day)
+        with connection:
+            if rows:
+                connection.execute("UPDATE archived_days SET rows = ?, bytes = ? WHERE room_id = ? AND day = ?",
+                                   (rows, size, room_id, day))
+            else:
+                connection.execute("DELETE FROM archived_days WHERE room_id = ? AND day = ?", (room_id, day))
+    return deleted
+
+
+def read_archive(archive_dir, table, room_id, days, start_ms=None, end_ms=None, columns=None):
+    """
+    Liest archivierte Rohdaten eines Raums. Nur die Dateien der angegebenen Tage werden geöffnet,
+    der Zeitfilter wird an den Parquet-Leser weitergegeben (Predicate Pushdown).
+
+    :param archive_dir: Das Archiv-Verzeichnis.
+    :param table: Der Name der Sensor-Tabelle.
+    :param room_id: Die ID des Raums.
+    :param days: Die zu lesenden Tage (siehe archived_days), aufsteigend sortiert.
+    :param start_ms: Optionaler Beginn des Zeitraums in Millisekunden seit 1970.
+    :param end_ms: Optionales Ende des Zeitraums in Millisekunden seit 1970 (einschließlich).
+    :param columns: Optionale Liste der zu lesenden Spalten (Standard: timestamp, value1, value2).
+    :return: Eine pyarrow.Table, aufsteigend nach Zeit sortiert, oder None, falls keine Datei vorhanden ist.
+    """
+    pa, ds, _ = _import_pyarrow()
+    paths = [path for path in (day_file(archive_dir, table, room_id, day) for day in days) if os.path.exists(path)]
+    if not paths:
+        return None
+
+    condition = None
+    if start_ms is not None:
+        condition = ds.field("timestamp") >= pa.scalar(start_ms, pa.timestamp("ms"))
+    if end_ms is not None:
+        upper = ds.field("timestamp") <= pa.scalar(end_ms, pa.timestamp("ms"))
+        condition = upper if condition is None else condition & upper
+
+    # Die Dateien liegen in Tagesreihenfolge vor und sind in sich sortiert
+    return ds.dataset(paths, format="parquet").to_table(columns=columns, filter=condition)
+
+
+def remove_room_files(archive_dir, room_id):
+    """
+    Löscht die Parquet-Dateien eines Raums. Die Einträge in archived_days entfernt Database.delete_room.
+
+    :param archive_dir: Das Archiv-Verzeichnis (None = kein Archiv).
+    :param room_id: Die ID des Raums.
+    """
+    if archive_dir is None:
+        return
+    for table in SENSOR_TABLES:
+        shutil.rmtree(os.path.join(archive_dir, table, f"room_id={room_id}"), ignore_errors=True)
@@ -0,0 +1,213 @@
+import queue
+import sqlite3
+import threading
+import time
+from database.db import Database, SENSOR_TABLES, current_timestamp
+from database.compression import TableCompressor
+from database.schema import to_epoch_ms
+from utils.metrics import metrics
+
+
+class BatchWriter:
+    """
+    Diese Klasse puffert Sensor-Messwerte in einer In-Memory-Queue und schreibt sie gesammelt
+    in die Datenbank (Write-Behind). Ein Hintergrund-Thread leert die Queue per executemany
+    in einer einzigen Transaktion, sobald entweder max_batch_size Messwerte vorliegen oder
+    flush_interval Sekunden seit dem letzten Schreiben vergangen sind.
+
+    Die Schnittstelle von insert_data entspricht Database.insert_data, sodass der Writer
+    in run_sensors direkt an Stelle der Datenbank verwendet werden kann.
+
+    Optional werden die Rohdaten vor dem Schreiben komprimiert (siehe database/compression.py): in die
+    Sensor-Tabellen gelangen nur die nötigen Messwerte, Rollups und Sketches erhalten weiterhin jeden Messwert.
+
+    Schlägt das Schreiben fehl (z.B. "database is locked"), bleibt der Puffer erhalten und wird mit wachsendem
+    Abstand erneut geschrieben. Erst wenn mehr als max_pending Messwerte ausstehen, werden die ältesten verworfen.
+    Die Kompressoren laufen bereits beim Einreihen; die von ihnen ausgewählten Messwerte liegen im Puffer und bleiben
+    bei einem Fehler mit ihm erhalten, ihr Zustand muss daher nicht zurückgesetzt werden.
+    """
+
+    # Art eines Eintrags in der Queue: speichern und aggregieren, nur speichern, nur aggregieren, vermerkter Ausfall
+    BOTH, STORE, AGGREGATE, GAP = range(4)
+
+    def __init__(self, db_file="sensors.db", max_batch_size=100, flush_interval=30.0, stop_event=None,
+                 compression=None, labels=None, max_pending=100000, max_backoff=60.0, close_timeout=30.0):
+        """
+        Initialisiert den Writer und startet den Hintergrund-Thread.
+
+        :param db_file: Der Dateiname der SQLite-Datenbank (Standard: "sensors.db")
+        :param max_batch_size: Anzahl gepufferter Messwerte, ab der sofort geschrieben wird.
+        :param flush_interval: Maximale Zeit in Sekunden, die ein Messwert im Puffer verbleibt.
+        :param stop_event: Optionales threading.Event. Wird es gesetzt, schreibt der Writer den Rest und beendet sich.
+        :param compression: Optionale Kompressions-Einstellungen je Sensor-Tabelle (siehe table_settings).
+        :param labels: Optionale Labels der Messpunkte, z.B. {"room": "Küche"}.
+        :param max_pending: Maximale Anzahl nicht geschriebener Messwerte; darüber werden die ältesten verworfen.
+        :param max_backoff: Maximaler Abstand in Sekunden zwischen zwei Schreibversuchen nach einem Fehler.
+        :param close_timeout: Maximale Zeit in Sekunden, die beim Beenden noch geschrieben wird.
+        """
+        self.db_file = db_file
+        self.compression = compression or {}
+        self._compressors = {}
+        self.labels = labels or {}
+        self._queue_depth = metrics.gauge("smarthome_writer_queue_depth", "Noch nicht geschriebene Messwerte")
+        self._flush_seconds = metrics.histogram("smarthome_writer_flush_seconds", "Dauer eines Batch-Schreibvorgangs")
+        self._batch_size = metrics.histogram("smarthome_writer_batch_size", "Einträge je Batch",
+                                             buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+        self._dropped = metrics.counter("smarthome_writer_dropped_total", "Wegen voller Queue verworfene Messwerte")
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.close_timeout = close_timeout
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self._queue = queue.Queue()
+        self._buffered = 0
+        self._thread = threading.Thread(target=self._run, name="BatchWriter", daemon=True)
+        self._thread.start()
+
+    def insert_data(self, table, room_id, value1, value2=None, timestamp=None):
+        """
+        Legt einen Messwert in den Puffer. Der Zeitstempel wird beim Einreihen gesetzt,
+        damit er dem Messzeitpunkt und nicht dem Schreibzeitpunkt entspricht.
+
+        :param table: Der Name der Sensor-Tabelle (siehe SENSOR_TABLES).
+        :param room_id: Die ID des Raums, in dem der Sensor gemessen hat.
+        :param value1: Der erste Wert (z.B. Temperatur, Feuerstatus, etc.)
+        :param value2: Ein optionaler zweiter Wert (z.B. Feuchtigkeit, Rohwert, etc.)
+        :param timestamp: Optionaler Zeitstempel der Messung (Standard: aktueller Zeitpunkt).
+        """
+        if table not in SENSOR_TABLES:
+            raise ValueError(f"Unbekannte Sensor-Tabelle: {table}")
+        if timestamp is None:
+            timestamp = current_timestamp()
+        if table not in self.compression:
+            self._queue.put((table, (room_id, timestamp, value1, value2), self.BOTH))
+            return
+
+        # Jeder Messwert wird aggregiert, gespeichert werden nur die vom Kompressor ausgewählten
+        self._queue.put((table, (room_id, timestamp, value1, value2), self.AGGREGATE))
+        compressor = self._compressors.get((room_id, table))
+        if compressor is None:
+            compressor = self._compressors[(room_id, table)] = TableCompressor(table, self.compression[table])
+        for _, value1, value2, timestamp in compressor.add((to_epoch_ms(timestamp), value1, value2, timestamp)):
+            self._queue.put((table, (room_id, timestamp, value1, value2), self.STORE))
+        for start_ms, end_ms in compressor.take_gaps():
+            self._queue.put((table, (room_id, start_ms, end_ms), self.GAP))
+
+    def pending(self):
+        """
+        Gibt die Anzahl der noch nicht geschriebenen Messwerte zurück.
+        """
+        return self._buffered + self._queue.qsize()
+
+    def close(self):
+        """
+        Setzt das Stop-Event, wartet bis alle gepufferten Messwerte geschrieben sind und beendet den Thread.
+        """
+        # Die zurückgehaltenen letzten Messwerte der Kompressoren speichern
+        for (room_id, table), compressor in self._compressors.items():
+            for _, value1, value2, timestamp in compressor.flush():
+                self._queue.put((table, (room_id, timestamp, value1, value2), self.STORE))
+        self.stop_event.set()
+        self._thread.join()
+
+        # Messwerte, die nach dem Beenden des Threads noch eingereiht wurden, direkt schreiben
+        if not self._queue.empty():
+            db = self._open()
+            self._drain(db, [])
+            db.connection.close()
+
+    def _run(self):
+        # Die SQLite-Verbindung muss in dem Thread erstellt werden, der sie benutzt
+        db = self._open()
+        buffer = []
+        last_flush = time.monotonic()
+        backoff = 0
+        retry_at = 0
+
+        while not self.stop_event.is_set():
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                buffer.append(self._queue.get(timeout=min(timeout, 1.0)))
+            except queue.Empty:
+                pass
+            self._limit(buffer)
+            self._buffered = len(buffer)
+
+            self._queue_depth.set(len(buffer) + self._queue.qsize(), **self.labels)
+            now = time.monotonic()
+            if now >= retry_at and (len(buffer) >= self.max_batch_size or now - last_flush >= self.flush_interval):
+                if self._flush(db, buffer):
+                    buffer = []
+                    self._buffered = backoff = 0
+                else:
+                    # Fehlgeschlagener Puffer bleibt erhalten und wird mit wachsendem Abstand erneut geschrieben
+                    backoff = min(max(backoff * 2, 1), self.max_backoff)
+                    retry_at = now + backoff
+                last_flush = now
+
+        # Beim Stoppen alles schreiben, was noch in der Queue liegt
+        self._drain(db, buffer)
+        db.connection.close()
+
+    def _open(self):
+        # Ist die Datenbank beim Start gesperrt, erneut versuchen; die Messwerte sammeln sich solange in der Queue
+        backoff = 0.1
+        while True:
+            try:
+                return Database(self.db_file)
+            except sqlite3.OperationalError as e:
+                metrics.record_error("batch_writer", f"Datenbank nicht verfügbar, neuer Versuch folgt: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _drain(self, db, buffer):
+        while True:
+            try:
+                buffer.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._limit(buffer)
+        # Beim Beenden bis close_timeout erneut versuchen, erst danach gehen die Messwerte verloren
+        deadline = time.monotonic() + self.close_timeout
+        backoff = 0.1
+        while not self._flush(db, buffer):
+            if time.monotonic() + backoff > deadline:
+                metrics.record_error("batch_writer", f"{len(buffer)} Messwerte beim Beenden nicht geschrieben")
+                break
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+        self._buffered = 0
+        self._queue_depth.set(0, **self.labels)
+
+    def _limit(self, buffer):
+        # Die Queue darf bei anhaltenden Schreibfehlern nicht unbegrenzt wachsen: älteste Messwerte verwerfen
+        excess = len(buffer) - self.max_pending
+        if excess > 0:
+            del buffer[:excess]
+            self._dropped.inc(excess, **self.labels)
+            metrics.record_error("batch_writer", f"Schreib-Queue voll, {excess} Messwerte verworfen")
+
+    def _flush(self, db, buffer):
+        # True, wenn der Puffer geschrieben wurde (oder leer war)
+        if not buffer:
+            return True
+        batch, aggregate, gaps = {}, {}, {}
+        for table, row, kind in buffer:
+            if kind == self.GAP:
+                gaps.setdefault(table, []).append(row)
+                continue
+            if kind != self.AGGREGATE:
+                batch.setdefault(table, []).append(row)
+            if kind != self.STORE:
+                aggregate.setdefault(table, []).append(row)
+        started = time.perf_counter()
+        try:
+            db.insert_batch(batch, aggregate, gaps=gaps)
+        except Exception as e:
+            metrics.record_error("batch_writer", f"Fehler beim Schreiben des Puffers ({len(buffer)} Messwerte), "
+                                                 f"neuer Versuch folgt: {e}")
+            return False
+        self._flush_seconds.observe(time.perf_counter() - started, **self.labels)
+        self._batch_size.observe(len(buffer), **self.labels)
+        return True
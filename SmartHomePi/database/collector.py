@@ -0,0 +1,443 @@
+"""
+Zentraler Collector für mehrere Geräte (ein Raspberry Pi je Raum).
+
+Die Geräte liefern ihre Messwerte gesammelt per HTTP an POST /ingest (gzip-komprimiertes JSON, gesendet von
+database/forwarder.py). Jede Lieferung trägt in den Kopfzeilen das Gerät (X-Node), den Datenstrom (X-Stream, eine
+zufällige Kennung der Outbox des Geräts) und eine fortlaufende Sequenznummer (X-Sequence). Der Collector speichert
+je Gerät und Datenstrom die höchste geschriebene Sequenznummer in derselben Transaktion wie die Messwerte;
+wiederholt gesendete Lieferungen werden bestätigt, aber nicht erneut geschrieben.
+
+Alle Lieferungen schreibt ein einziger Thread. Treffen während eines Commits weitere Lieferungen ein, werden sie
+gemeinsam in der nächsten Transaktion geschrieben (Group Commit), die Antwort folgt erst nach dem Commit.
+Räume werden über ihren Namen zugeordnet und bei Bedarf angelegt; die Namen müssen daher über alle Geräte eindeutig
+sein. Die Kompression der Rohdaten (siehe database/compression.py) übernimmt der Collector mit den Einstellungen,
+die das Gerät beim Start der Erfassung mitsendet (leere Einstellungen schalten sie aus).
+
+Aufruf aus dem Verzeichnis SmartHomePi:
+
+    python -m database.collector --port 8770
+
+Im Dashboard-Prozess startet start_collector() den Collector, wenn SMARTHOME_COLLECTOR_PORT gesetzt ist.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from database.db import Database
+from database.schema import SENSOR_TABLES, current_timestamp, to_epoch_ms
+from database.compression import (COMPRESSION_METHODS, TableCompressor, save_compression_settings,
+                                  load_compression_settings, compression_enabled)
+from utils.metrics import metrics
+
+DEFAULT_PORT = 8770
+
+# Obergrenzen einer Lieferung in Bytes (komprimiert bzw. entpackt)
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_PAYLOAD_BYTES = 64 * 1024 * 1024
+
+# Ergebnis einer Lieferung
+STORED, DUPLICATE = "stored", "duplicate"
+
+
+class InvalidDeliveryError(ValueError):
+    """
+    Wird ausgelöst, wenn eine Lieferung nicht dem erwarteten Format entspricht.
+    """
+
+
+def _is_value(value):
+    return value is None or isinstance(value, (int, float))
+
+
+def parse_payload(body, encoding=None):
+    """
+    Entpackt und prüft den Inhalt einer Lieferung.
+
+    :param body: Der Inhalt der Anfrage.
+    :param encoding: Der Wert der Kopfzeile Content-Encoding ("gzip" oder None).
+    :return: Tupel (rooms, settings): {Raumname: {Tabellenname: Liste von Tupeln (Millisekunden seit 1970, value1,
+             value2, timestamp)}} und {Raumname: Kompressions-Einstellungen je Tabelle}.
+    :raises InvalidDeliveryError: Bei ungültigem Inhalt.
+    """
+    try:
+        if encoding == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, MAX_PAYLOAD_BYTES)
+            if decompressor.unconsumed_tail:
+                raise InvalidDeliveryError("Lieferung entpackt zu groß")
+        elif encoding not in (None, "identity"):
+            raise InvalidDeliveryError(f"Nicht unterstützte Kodierung: {encoding}")
+        data = json.loads(body)
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise InvalidDeliveryError(f"Lieferung nicht lesbar: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("rooms"), dict):
+        raise InvalidDeliveryError("Feld 'rooms' fehlt")
+
+    rooms = {}
+    for room, tables in data["rooms"].items():
+        if not room or not isinstance(tables, dict):
+            raise InvalidDeliveryError(f"Ungültiger Raum: {room!r}")
+        for table, rows in tables.items():
+            if table not in SENSOR_TABLES or not isinstance(rows, list):
+                raise InvalidDeliveryError(f"Ungültige Sensor-Tabelle: {table!r}")
+            parsed = []
+            for row in rows:
+                if not (isinstance(row, list) and len(row) == 3 and isinstance(row[0], str)
+                        and _is_value(row[1]) and _is_value(row[2])):
+                    raise InvalidDeliveryError(f"Ungültiger Messwert in {table}: {row!r}")
+                try:
+                    parsed.append((to_epoch_ms(row[0]), row[1], row[2], row[0][:19]))
+                except ValueError as e:
+                    raise InvalidDeliveryError(f"Ungültiger Zeitstempel in {table}: {row[0]!r}") from e
+            rooms.setdefault(room, {})[table] = parsed
+
+    settings = data.get("settings") or {}
+    if not isinstance(settings, dict) or not all(isinstance(tables, dict) for tables in settings.values()):
+        raise InvalidDeliveryError("Ungültige Kompressions-Einstellungen")
+    for room, tables in settings.items():
+        for table, entry in tables.items():
+            if (table not in SENSOR_TABLES or not isinstance(entry, dict)
+                    or entry.get("method") not in COMPRESSION_METHODS
+                    or not isinstance(entry.get("tolerances"), dict)
+                    or any(column not in SENSOR_TABLES[table] for column in entry["tolerances"])
+                    or not all(isinstance(entry.get(key), (int, float)) for key in ("period", "max_gap"))):
+                raise InvalidDeliveryError(f"Ungültige Kompressions-Einstellungen für {room}/{table}")
+    return rooms, settings
+
+
+class _Server(ThreadingHTTPServer):
+    # Viele Geräte verbinden sich gleichzeitig, die Standard-Warteschlange von 5 Verbindungen reicht nicht
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class _Delivery:
+    # Eine Lieferung in der Warteschlange des Schreib-Threads
+    def __init__(self, node, stream, seq, rooms, settings):
+        self.node = node
+        self.stream = stream
+        self.seq = seq
+        self.rooms = rooms
+        self.settings = settings
+        self.size = sum(len(rows) for tables in rooms.values() for rows in tables.values())
+        self.done = threading.Event()
+        self.result = None
+
+
+class Collector:
+    """
+    Diese Klasse nimmt Lieferungen der Geräte über HTTP an und schreibt sie in die zentrale Datenbank.
+    """
+
+    def __init__(self, db_file="sensors.db", port=DEFAULT_PORT, host="0.0.0.0", max_group_size=5000,
+                 reply_timeout=30.0):
+        """
+        Startet den HTTP-Server und den Schreib-Thread.
+
+        :param db_file: Der Dateiname der zentralen SQLite-Datenbank (Standard: "sensors.db").
+        :param port: Der Port (Standard: 8770, 0 = freier Port).
+        :param host: Die Adresse, auf der der Collector lauscht (Standard: alle).
+        :param max_group_size: Maximale Anzahl an Messwerten, die gemeinsam in einer Transaktion geschrieben werden.
+        :param reply_timeout: Maximale Wartezeit einer Anfrage auf den Commit in Sekunden (Standard: 30).
+        """
+        self.db_file = db_file
+        self.max_group_size = max_group_size
+        self.reply_timeout = reply_timeout
+        self.nodes = {}
+        self.stop_event = threading.Event()
+        self._queue = queue.Queue()
+        self._deliveries = metrics.counter("smarthome_collector_deliveries_total", "Lieferungen je Ergebnis")
+        self._readings = metrics.counter("smarthome_collector_readings_total", "Geschriebene Messwerte je Gerät")
+        self._commit_seconds = metrics.histogram("smarthome_collector_commit_seconds",
+                                                 "Dauer einer Transaktion des Collectors")
+        self._group_size = metrics.histogram("smarthome_collector_group_size", "Lieferungen je Transaktion",
+                                             buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+        self._writer = threading.Thread(target=self._run, name="CollectorWriter", daemon=True)
+        self._writer.start()
+
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split("?")[0] != "/ingest":
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers["Content-Length"])
+                    if length > MAX_BODY_BYTES:
+                        self._reply(413, {"error": "Lieferung zu groß"})
+                        return
+                    node, stream = self.headers["X-Node"], self.headers["X-Stream"]
+                    seq = int(self.headers["X-Sequence"])
+                    if not node or not stream or seq < 1:
+                        raise InvalidDeliveryError("Kopfzeilen X-Node, X-Stream und X-Sequence erforderlich")
+                    rooms, settings = parse_payload(self.rfile.read(length), self.headers["Content-Encoding"])
+                except (TypeError, ValueError) as e:
+                    collector._deliveries.inc(status="rejected")
+                    self._reply(400, {"error": str(e)})
+                    return
+                try:
+                    status = collector.submit(node, stream, seq, rooms, settings)
+                except Exception as e:
+                    self._reply(503, {"error": str(e)})
+                    return
+                self._reply(200, {"status": status, "seq": seq})
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/status":
+                    self.send_error(404)
+                    return
+                self._reply(200, {"nodes": collector.nodes, "pending": collector._queue.qsize()})
+
+            def _reply(self, code, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server((host, port), Handler)
+        self.port = self.server.server_port
+        self.url = f"http://{'127.0.0.1' if host in ('', '0.0.0.0') else host}:{self.port}/ingest"
+        self._server_thread = threading.Thread(target=self.server.serve_forever, name="Collector", daemon=True)
+        self._server_thread.start()
+
+    def submit(self, node, stream, seq, rooms, settings=None):
+        """
+        Reiht eine Lieferung ein und wartet, bis sie geschrieben ist.
+
+        :param node: Das liefernde Gerät.
+        :param stream: Der Datenstrom des Geräts.
+        :param seq: Die Sequenznummer der Lieferung.
+        :param rooms: Die Messwerte (siehe parse_payload).
+        :param settings: Optionale Kompressions-Einstellungen je Raum (siehe parse_payload).
+        :return: STORED oder DUPLICATE (bereits geschrieben).
+        :raises TimeoutError: Falls die Lieferung nicht rechtzeitig geschrieben wurde.
+        """
+        delivery = _Delivery(node, stream, seq, rooms, settings or {})
+        self._queue.put(delivery)
+        if not delivery.done.wait(self.reply_timeout):
+            raise TimeoutError("Lieferung nicht rechtzeitig geschrieben")
+        if isinstance(delivery.result, Exception):
+            raise delivery.result
+        return delivery.result
+
+    def close(self):
+        """
+        Beendet den HTTP-Server, schreibt die eingereihten Lieferungen und beendet den Schreib-Thread.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        self.stop_event.set()
+        self._writer.join()
+
+    def _run(self):
+        # Die SQLite-Verbindung muss in dem Thread erstellt werden, der sie benutzt
+        db = Database(self.db_file)
+        state = {
+            "sequences": {(node, stream): seq for node, stream, seq in
+                          db.connection.execute("SELECT node, stream, seq FROM ingest_sequences")},
+            "rooms": {},
+            "compressors": {},
+        }
+        while not (self.stop_event.is_set() and self._queue.empty()):
+            try:
+                deliveries = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            # Alles, was während des letzten Commits eingetroffen ist, gemeinsam schreiben
+            size = deliveries[0].size
+            while size < self.max_group_size:
+                try:
+                    deliveries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                size += deliveries[-1].size
+            self._write(db, deliveries, state)
+
+        # Die zurückgehaltenen letzten Messwerte der Kompressoren speichern
+        batch = {}
+        for (room_id, table), compressor in state["compressors"].items():
+            if compressor is not None:
+                batch.setdefault(table, []).extend(
+                    (room_id, timestamp, value1, value2) for _, value1, value2, timestamp in compressor.flush()
+                )
+        try:
+            db.insert_batch(batch, {})
+        except Exception as e:
+            metrics.record_error("collector", f"Fehler beim Schreiben der letzten Messwerte: {e}")
+        db.connection.close()
+
+    def _room_id(self, db, state, room):
+        room_id = state["rooms"].get(room)
+        if room_id is None:
+            room_id = db.get_room_id_by_name(room)
+            if room_id is None:
+                db.insert_room(room)
+                room_id = db.get_room_id_by_name(room)
+                print(f"Collector: Raum {room} angelegt")
+            state["rooms"][room] = room_id
+        return room_id
+
+    def _compressor(self, db, state, room_id, table):
+        key = (room_id, table)
+        if key not in state["compressors"]:
+            settings = load_compression_settings(db.connection, room_id, table)
+            state["compressors"][key] = TableCompressor(table, settings) if compression_enabled(settings) else None
+        return state["compressors"][key]
+
+    def _remember(self, state, undo, key):
+        # Zustand eines Kompressors vor der ersten Änderung merken (None: noch nicht angelegt)
+        if key not in undo:
+            compressor = state["compressors"].get(key)
+            undo[key] = (compressor, compressor.snapshot() if compressor is not None else None)
+
+    def _restore(self, state, undo):
+        # Kompressoren auf den gemerkten Zustand zurücksetzen, damit eine erneut gesendete Lieferung dieselben
+        # Messwerte speichert wie beim ersten Versuch
+        for key, (compressor, snapshot) in undo.items():
+            if compressor is None:
+                state["compressors"].pop(key, None)
+            else:
+                compressor.restore(snapshot)
+                state["compressors"][key] = compressor
+
+    def _compress(self, db, state, delivery, undo):
+        # Messwerte einer Lieferung: (gespeicherte, aggregierte, vermerkte Ausfälle) je Tabelle
+        batch, aggregate, gaps = {}, {}, {}
+        for room, settings in delivery.settings.items():
+            # Neue Einstellungen: zurückgehaltene Messwerte speichern, Kompressoren neu anlegen
+            room_id = self._room_id(db, state, room)
+            # Die Erfassung begann mit dem ersten Messwert dieser Lieferung
+            first = [rows[0][0] for rows in delivery.rooms.get(room, {}).values() if rows]
+            save_compression_settings(db.connection, room_id, settings, min(first) if first else None)
+            for table in SENSOR_TABLES:
+                self._remember(state, undo, (room_id, table))
+                compressor = state["compressors"].pop((room_id, table), None)
+                if compressor is not None:
+                    batch.setdefault(table, []).extend(
+                        (room_id, timestamp, value1, value2) for _, value1, value2, timestamp in compressor.flush()
+                    )
+        for room, tables in delivery.rooms.items():
+            room_id = self._room_id(db, state, room)
+            for table, rows in tables.items():
+                self._remember(state, undo, (room_id, table))
+                compressor = self._compressor(db, state, room_id, table)
+                stored = batch.setdefault(table, [])
+                aggregated = aggregate.setdefault(table, [])
+                for row in rows:
+                    aggregated.append((room_id, row[3], row[1], row[2]))
+                    for _, value1, value2, timestamp in (compressor.add(row) if compressor else [row]):
+                        stored.append((room_id, timestamp, value1, value2))
+                if compressor:
+                    gaps.setdefault(table, []).extend(
+                        (room_id, start_ms, end_ms) for start_ms, end_ms in compressor.take_gaps()
+                    )
+        return batch, aggregate, gaps
+
+    def _write(self, db, deliveries, state):
+        batch, aggregate, gaps, sequences, accepted, counts = {}, {}, {}, {}, [], {}
+        undo = {}
+        # Räume je Transaktion neu zuordnen, damit ein zwischenzeitlich gelöschter Raum neu angelegt wird
+        state["rooms"] = {}
+        for delivery in deliveries:
+            key = (delivery.node, delivery.stream)
+            if delivery.seq <= sequences.get(key, state["sequences"].get(key, 0)):
+                delivery.result = DUPLICATE
+                continue
+            delivery_undo = {}
+            try:
+                parts = self._compress(db, state, delivery, delivery_undo)
+            except Exception as e:
+                # Nur diese Lieferung verwerfen, die übrigen der Transaktion werden geschrieben
+                self._restore(state, delivery_undo)
+                metrics.record_error("collector", f"Fehler bei der Lieferung {delivery.seq} von {delivery.node}: {e}")
+                delivery.result = e
+                continue
+            for compressor_key, saved in delivery_undo.items():
+                undo.setdefault(compressor_key, saved)
+            for merged, part in zip((batch, aggregate, gaps), parts):
+                for table, rows in part.items():
+                    merged.setdefault(table, []).extend(rows)
+            sequences[key] = delivery.seq
+            counts[delivery.node] = counts.get(delivery.node, 0) + delivery.size
+            accepted.append(delivery)
+
+        started = time.perf_counter()
+        try:
+            if accepted:
+                db.insert_batch(batch, aggregate, sequences, gaps)
+        except Exception as e:
+            # Die Geräte senden die Lieferungen erneut, die Kompressoren dürfen sie daher noch nicht gesehen haben
+            self._restore(state, undo)
+            metrics.record_error("collector", f"Fehler beim Schreiben von {len(accepted)} Lieferungen: {e}")
+            for delivery in accepted:
+                delivery.result = e
+        else:
+            state["sequences"].update(sequences)
+            now = current_timestamp()
+            for delivery in accepted:
+                delivery.result = STORED
+                self.nodes[delivery.node] = {"stream": delivery.stream, "seq": delivery.seq, "last_seen": now}
+            for node, count in counts.items():
+                self._readings.inc(count, node=node)
+            self._commit_seconds.observe(time.perf_counter() - started)
+            self._group_size.observe(len(deliveries))
+
+        for delivery in deliveries:
+            self._deliveries.inc(status=delivery.result if isinstance(delivery.result, str) else "failed")
+            delivery.done.set()
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def start_collector(port=None, db_file="sensors.db"):
+    """
+    Startet den Collector prozessweit, falls noch nicht geschehen. Ohne Port wird die Umgebungsvariable
+    SMARTHOME_COLLECTOR_PORT ausgewertet; ist auch diese nicht gesetzt, wird kein Collector gestartet.
+
+    :param port: Optionaler Port.
+    :param db_file: Der Dateiname der SQLite-Datenbank (Standard: "sensors.db").
+    :return: Der laufende Collector oder None.
+    """
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            if port is None and os.environ.get("SMARTHOME_COLLECTOR_PORT"):
+                port = int(os.environ["SMARTHOME_COLLECTOR_PORT"])
+            if port is not None:
+                try:
+                    _collector = Collector(db_file, port)
+                except OSError as e:
+                    metrics.record_error("collector", f"Collector auf Port {port} nicht verfügbar: {e}")
+        return _collector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nimmt die Messwerte mehrerer Geräte an und schreibt sie zentral.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port des Collectors")
+    parser.add_argument("--host", default="0.0.0.0", help="Adresse, auf der der Collector lauscht")
+    parser.add_argument("--db", default="sensors.db", help="Zentrale SQLite-Datenbank")
+    args = parser.parse_args()
+
+    collector = Collector(args.db, args.port, args.host)
+    print(f"Collector läuft: {collector.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        collector.close()
+
+
+if __name__ == "__main__":
+    main()
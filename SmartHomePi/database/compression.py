@@ -0,0 +1,451 @@
+"""
+Verlustbehaftete Kompression der Rohdaten beim Schreiben (Totband bzw. Swinging-Door).
+
+Gespeichert werden nur die Messwerte, die nötig sind, um den Verlauf innerhalb einer Toleranz je Messgröße
+wiederherzustellen:
+
+- "deadband": ein Messwert wird gespeichert, sobald er um mehr als die Toleranz vom zuletzt gespeicherten Wert
+  abweicht; dazwischen gilt der zuletzt gespeicherte Wert (Treppenfunktion)
+- "swinging_door": ein Messwert wird gespeichert, sobald die Gerade vom zuletzt gespeicherten Punkt zum aktuellen
+  Messwert nicht mehr alle seitdem gemessenen Werte innerhalb der Toleranz trifft; dazwischen wird linear
+  interpoliert. Anders als beim klassischen Verfahren wird dabei die tatsächliche Verbindungsgerade geprüft,
+  die Abweichung bleibt daher sicher innerhalb der Toleranz
+
+Das Verfahren gilt je Sensor-Tabelle, die Toleranzen je Messgröße. Der zweite Wert einer Zeile ohne eigene
+Toleranz (z.B. der Rohwert) wird nur mitgeführt. Spätestens nach max_gap Sekunden wird ein Messwert gespeichert.
+
+Die Kompression ist standardmäßig aus und wird je Raum und Messgröße in den Einstellungen aktiviert
+(siehe set_room_compression). Bleibt ein Messwert aus (fehlgeschlagene Messung, Neustart der Erfassung), speichert
+der Kompressor den letzten Messwert davor sowie den ersten danach und vermerkt die Lücke in der Tabelle sensor_gaps.
+
+Rollups und Sketches erhalten weiterhin jeden Messwert. Beim Lesen der Rohdaten füllt fill_gaps() die Lücken
+im Abtastintervall des Raums wieder auf, ausgenommen vermerkte Ausfälle und Zeiträume ohne Kompression; die
+Einstellungen dafür liegen je Raum in storage_settings.
+"""
+import json
+import numpy as np
+from database.schema import SENSOR_TABLES, METRICS, current_timestamp, to_epoch_ms
+
+COMPRESSION_METHODS = ("deadband", "swinging_door")
+
+# Messgröße -> (Verfahren, Toleranz); die Toleranzen liegen innerhalb der Messgenauigkeit bzw. des Rauschens
+# der Sensoren (DHT22: ±0.5 °C, ±2 % rF)
+DEFAULT_COMPRESSION = {
+    "temperature": ("swinging_door", 0.2),
+    "humidity": ("swinging_door", 1.0),
+    "fire_detected": ("deadband", 0),
+    "ppm": ("swinging_door", 10.0),
+    "lux": ("swinging_door", 20.0),
+}
+
+# Spätestens nach so vielen Sekunden wird ein Messwert gespeichert
+DEFAULT_MAX_GAP = 300
+
+
+def table_settings(compression, periods, max_gap=DEFAULT_MAX_GAP):
+    """
+    Fasst die Kompression je Messgröße zu Einstellungen je Sensor-Tabelle zusammen.
+
+    :param compression: Dictionary {Messgröße: (Verfahren, Toleranz)} (siehe DEFAULT_COMPRESSION).
+    :param periods: Dictionary {Sensor-Tabelle: Abtastintervall in Sekunden}.
+    :param max_gap: Maximaler Abstand zweier gespeicherter Messwerte in Sekunden (Standard: 300).
+    :return: Dictionary {Sensor-Tabelle: {"method", "period", "max_gap", "tolerances": {Spalte: Toleranz}}}.
+    :raises ValueError: Bei unbekannter Messgröße oder unterschiedlichen Verfahren innerhalb einer Tabelle.
+    """
+    settings = {}
+    for metric, (method, tolerance) in compression.items():
+        if metric not in METRICS:
+            raise ValueError(f"Unbekannte Messgröße: {metric}")
+        if method not in COMPRESSION_METHODS:
+            raise ValueError(f"Unbekanntes Kompressionsverfahren: {method}")
+        table, column = METRICS[metric]
+        if table not in periods:
+            continue
+        entry = settings.setdefault(table, {
+            "method": method, "period": periods[table], "max_gap": max_gap, "tolerances": {},
+        })
+        if entry["method"] != method:
+            raise ValueError(f"Tabelle {table}: alle Messgrößen müssen dasselbe Verfahren verwenden")
+        entry["tolerances"][column] = tolerance
+    return settings
+
+
+def get_room_compression(connection, room_id):
+    """
+    Gibt die in den Einstellungen gewählte Kompression eines Raums zurück.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :return: Dictionary {Messgröße: (Verfahren, Toleranz)} (siehe DEFAULT_COMPRESSION) oder None, falls die
+             Kompression für den Raum aus ist (Standard).
+    """
+    row = connection.execute("SELECT value FROM storage_settings WHERE key = ?",
+                             (f"compression_config:{room_id}",)).fetchone()
+    return {metric: tuple(entry) for metric, entry in json.loads(row[0]).items()} if row else None
+
+
+def set_room_compression(connection, room_id, compression):
+    """
+    Speichert die Kompression eines Raums je Messgröße. Gilt ab dem nächsten Start der Erfassung für den Raum.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :param compression: Dictionary {Messgröße: (Verfahren, Toleranz)} oder None bzw. leer, um die Kompression
+                        auszuschalten.
+    :raises ValueError: Bei ungültigen Einstellungen (siehe table_settings).
+    """
+    with connection:
+        if not compression:
+            connection.execute("DELETE FROM storage_settings WHERE key = ?", (f"compression_config:{room_id}",))
+            return
+        table_settings(compression, {table: 1 for table in SENSOR_TABLES})
+        connection.execute("INSERT OR REPLACE INTO storage_settings (key, value) VALUES (?, ?)",
+                           (f"compression_config:{room_id}", json.dumps(compression)))
+
+
+def _load_settings(connection, room_id):
+    row = connection.execute("SELECT value FROM storage_settings WHERE key = ?",
+                             (f"compression:{room_id}",)).fetchone()
+    return json.loads(row[0]) if row else {}
+
+
+def save_compression_settings(connection, room_id, settings, now=None):
+    """
+    Speichert die Kompressions-Einstellungen eines Raums beim Start der Erfassung, damit Lesezugriffe die Lücken
+    auffüllen können. Je Tabelle werden die Zeiträume mit Kompression vermerkt ("active"); Tabellen, die nicht mehr
+    komprimiert werden, behalten ihre Einstellungen für die bereits komprimierten Messwerte.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :param settings: Einstellungen je Sensor-Tabelle (siehe table_settings); leer, wenn nicht komprimiert wird.
+    :param now: Beginn der Erfassung in Millisekunden seit 1970 (Standard: jetzt).
+    """
+    now = to_epoch_ms(current_timestamp()) if now is None else now
+    with connection:
+        saved = {}
+        for table, entry in _load_settings(connection, room_id).items():
+            active = [list(interval) for interval in entry.get("active", [[None, None]])]
+            if table not in settings and active[-1][1] is None:
+                active[-1][1] = now
+            saved[table] = dict(entry, active=active)
+        for table, entry in settings.items():
+            active = saved[table]["active"] if table in saved else []
+            if not active or active[-1][1] is not None:
+                active.append([now, None])
+            saved[table] = dict(entry, active=active)
+        if saved:
+            connection.execute("INSERT OR REPLACE INTO storage_settings (key, value) VALUES (?, ?)",
+                               (f"compression:{room_id}", json.dumps(saved)))
+
+
+def load_compression_settings(connection, room_id, table):
+    """
+    Gibt die Kompressions-Einstellungen einer Sensor-Tabelle eines Raums zurück.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :param table: Der Name der Sensor-Tabelle.
+    :return: Die Einstellungen (siehe table_settings, zusätzlich "active") oder None, falls die Tabelle nie
+             komprimiert wurde.
+    """
+    return _load_settings(connection, room_id).get(table)
+
+
+def compression_enabled(settings):
+    """
+    Gibt zurück, ob mit den gespeicherten Einstellungen einer Tabelle derzeit komprimiert wird.
+
+    :param settings: Die Einstellungen (siehe load_compression_settings) oder None.
+    """
+    return settings is not None and settings.get("active", [[None, None]])[-1][1] is None
+
+
+def create_gap_table(connection):
+    """
+    Erstellt die Tabelle sensor_gaps, in der die Kompressoren ausgebliebene Messwerte vermerken. end_ms ist der
+    Zeitstempel des ersten gespeicherten Messwerts nach der Lücke, start_ms der des letzten davor (None beim Start
+    der Erfassung).
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS sensor_gaps (
+            room_id INTEGER NOT NULL,
+            table_name TEXT NOT NULL,
+            end_ms INTEGER NOT NULL,
+            start_ms INTEGER,
+            PRIMARY KEY (room_id, table_name, end_ms)
+        ) WITHOUT ROWID
+    """)
+
+
+def load_gaps(connection, room_id, table, start_ms=None, end_ms=None):
+    """
+    Gibt die vermerkten Lücken einer Sensor-Tabelle eines Raums zurück.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :param table: Der Name der Sensor-Tabelle.
+    :param start_ms: Optionaler Beginn des Zeitraums in Millisekunden seit 1970.
+    :param end_ms: Optionales Ende des Zeitraums in Millisekunden seit 1970.
+    :return: Set der Zeitstempel (Millisekunden), mit denen die Messwerte nach einer Lücke beginnen.
+    """
+    return {end for end, in connection.execute("""
+        SELECT end_ms FROM sensor_gaps WHERE room_id = ? AND table_name = ? AND end_ms >= ? AND end_ms <= ?
+    """, (room_id, table, -2 ** 63 if start_ms is None else start_ms, 2 ** 63 - 1 if end_ms is None else end_ms))}
+
+
+def _changed(value, reference):
+    # Fehlende Werte zählen als Änderung, wenn nur einer der beiden Werte fehlt
+    return (value is None) != (reference is None)
+
+
+class TableCompressor:
+    """
+    Diese Klasse entscheidet für die Messwerte einer Sensor-Tabelle eines Raums, welche gespeichert werden.
+    Beim Swinging-Door-Verfahren steht erst mit dem nächsten Messwert fest, ob ein Messwert gespeichert werden
+    muss; gespeichert wird dann der vorherige Messwert.
+
+    Liegt zwischen zwei Messwerten mehr als das 1,5-fache Abtastintervall, gilt das als Ausfall: beide Messwerte
+    werden gespeichert und die Lücke in gaps vermerkt (ebenso vor dem ersten Messwert), siehe take_gaps().
+    """
+
+    def __init__(self, table, settings):
+        """
+        :param table: Der Name der Sensor-Tabelle.
+        :param settings: Die Einstellungen der Tabelle (siehe table_settings).
+        """
+        columns = SENSOR_TABLES[table]
+        self.method = settings["method"]
+        self.period = settings["period"] * 1000
+        self.max_gap = settings["max_gap"] * 1000
+        self.tolerances = [(columns.index(column) + 1, tolerance)
+                           for column, tolerance in settings["tolerances"].items()]
+        self._archived = None
+        self._pending = None
+        self._slopes = {}
+        self._last = None
+        self.gaps = []
+
+    def add(self, row):
+        """
+        Nimmt einen Messwert entgegen.
+
+        :param row: Tupel (Millisekunden seit 1970, value1, value2, ...); weitere Elemente werden mitgeführt.
+        :return: Liste der zu speichernden Messwerte (leer, einer oder zwei).
+        """
+        last, self._last = self._last, row[0]
+        if last is None or row[0] - last > 1.5 * self.period:
+            # Erster Messwert bzw. Ausfall: den letzten Messwert davor und diesen speichern und die Lücke vermerken,
+            # damit sie beim Lesen nicht aufgefüllt wird
+            stored = self.flush()
+            self._archive(row)
+            self.gaps.append((last, row[0]))
+            return stored + [row]
+
+        archived = self._archived
+        if row[0] - archived[0] >= self.max_gap:
+            # Mindestabstand erreicht: auf jeden Fall speichern. Beim Swinging-Door-Verfahren
+            # auch den vorherigen Messwert, damit die Gerade bis dorthin gültig bleibt.
+            stored = [self._pending] if self._pending is not None and self.method == "swinging_door" else []
+            self._archive(row)
+            return stored + [row]
+
+        if self.method == "deadband":
+            if any(_changed(row[index], archived[index]) or
+                   (row[index] is not None and abs(row[index] - archived[index]) > tolerance)
+                   for index, tolerance in self.tolerances):
+                self._archive(row)
+                return [row]
+            self._pending = row
+            return []
+
+        if self._fits(row):
+            self._narrow(row)
+            self._pending = row
+            return []
+        if self._pending is None:
+            self._archive(row)
+            return [row]
+
+        # Der vorherige Messwert wird gespeichert und zum neuen Ausgangspunkt, der aktuelle öffnet die neue Tür
+        stored = self._pending
+        self._archive(stored)
+        if not self._fits(row):
+            self._archive(row)
+            return [stored, row]
+        self._narrow(row)
+        self._pending = row
+        return [stored]
+
+    def flush(self):
+        """
+        Gibt den letzten noch nicht gespeicherten Messwert zurück (z.B. beim Beenden der Erfassung).
+
+        :return: Liste mit höchstens einem Messwert.
+        """
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self._archive(pending)
+            return [pending]
+        return []
+
+    def take_gaps(self):
+        """
+        Gibt die seit dem letzten Aufruf vermerkten Lücken zurück.
+
+        :return: Liste von Tupeln (Zeitstempel des letzten Messwerts davor oder None, Zeitstempel des ersten danach)
+                 in Millisekunden seit 1970.
+        """
+        gaps, self.gaps = self.gaps, []
+        return gaps
+
+    def snapshot(self):
+        """
+        Gibt den Zustand des Kompressors zurück, z.B. um ihn zurückzusetzen, falls die ausgewählten Messwerte nicht
+        geschrieben werden konnten (siehe restore).
+
+        :return: Der Zustand (nur für restore bestimmt).
+        """
+        return self._archived, self._pending, dict(self._slopes), self._last, list(self.gaps)
+
+    def restore(self, state):
+        """
+        Setzt den Kompressor auf einen mit snapshot() gemerkten Zustand zurück.
+
+        :param state: Der Zustand.
+        """
+        self._archived, self._pending, slopes, self._last, gaps = state
+        self._slopes, self.gaps = dict(slopes), list(gaps)
+
+    def _archive(self, row):
+        self._archived = row
+        self._pending = None
+        self._slopes = {}
+
+    def _fits(self, row):
+        # Trifft die Gerade vom gespeicherten Punkt zu diesem Messwert alle Messwerte dazwischen innerhalb der Toleranz?
+        archived = self._archived
+        dt = row[0] - archived[0]
+        for index, tolerance in self.tolerances:
+            value, reference = row[index], archived[index]
+            if _changed(value, reference):
+                return False
+            if value is None:
+                continue
+            if dt <= 0:
+                if abs(value - reference) > tolerance:
+                    return False
+                continue
+            slope = (value - reference) / dt
+            lower, upper = self._slopes.get(index, (slope, slope))
+            if not lower <= slope <= upper:
+                return False
+        return True
+
+    def _narrow(self, row):
+        # Der Messwert liegt ab jetzt zwischen Ausgangspunkt und Endpunkt: zulässige Steigungen einschränken
+        archived = self._archived
+        dt = row[0] - archived[0]
+        if dt <= 0:
+            return
+        for index, tolerance in self.tolerances:
+            value, reference = row[index], archived[index]
+            if value is None:
+                continue
+            lower = (value - tolerance - reference) / dt
+            upper = (value + tolerance - reference) / dt
+            if index in self._slopes:
+                lower, upper = max(self._slopes[index][0], lower), min(self._slopes[index][1], upper)
+            self._slopes[index] = (lower, upper)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _compressed_gaps(x, settings, gaps):
+    # Lücken zwischen x[i] und x[i + 1], die durch die Kompression entstanden sind: länger als das Abtastintervall,
+    # höchstens max_gap, innerhalb eines Zeitraums mit Kompression und nicht als Ausfall vermerkt
+    period = settings["period"] * 1000
+    spans = np.diff(x)
+    compressed = (spans > 1.5 * period) & (spans <= settings["max_gap"] * 1000 + period)
+    active = np.zeros(len(spans), dtype=bool)
+    for since, until in settings.get("active", [[None, None]]):
+        within = np.ones(len(spans), dtype=bool)
+        if since is not None:
+            within &= x[:-1] >= since
+        if until is not None:
+            within &= x[1:] < until
+        active |= within
+    compressed &= active
+    if gaps:
+        compressed &= ~np.isin(x[1:], np.fromiter(gaps, dtype=np.int64, count=len(gaps)))
+    return compressed
+
+
+def fill_gaps(rows, settings, previous=None, gaps=None):
+    """
+    Füllt die durch die Kompression entstandenen Lücken im Abtastintervall wieder auf: beim Totband mit dem
+    vorherigen Wert, beim Swinging-Door-Verfahren linear interpoliert. Lücken über max_gap, vermerkte Ausfälle
+    und Lücken außerhalb der Zeiträume mit Kompression bleiben.
+
+    :param rows: Liste von Tupeln (Millisekunden seit 1970, value1, value2), aufsteigend nach Zeit.
+    :param settings: Die Einstellungen der Tabelle (siehe load_compression_settings).
+    :param previous: Optional der zuletzt vor rows gelesene Messwert, damit auch die erste Lücke gefüllt wird.
+    :param gaps: Optional die vermerkten Ausfälle (siehe load_gaps).
+    :return: Die aufgefüllte Liste (ohne previous).
+    """
+    if previous is not None:
+        rows = [previous] + list(rows)
+    if len(rows) < 2:
+        return rows[1:] if previous is not None else rows
+
+    period = settings["period"] * 1000
+    x = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    missing = np.flatnonzero(_compressed_gaps(x, settings, gaps))
+    if not len(missing):
+        return rows[1:] if previous is not None else rows
+
+    linear = settings["method"] == "swinging_door"
+    filled, last = [], 0
+    for i in missing:
+        filled.extend(rows[last:i + 1])
+        a, b = rows[i], rows[i + 1]
+        span = b[0] - a[0]
+        for k in range(1, int(round(span / period))):
+            ts = a[0] + k * period
+            if linear:
+                fraction = (ts - a[0]) / span
+                filled.append((ts, *(
+                    x + fraction * (y - x) if _is_number(x) and _is_number(y) else x
+                    for x, y in zip(a[1:], b[1:])
+                )))
+            else:
+                filled.append((ts, a[1], a[2]))
+        last = i + 1
+    filled.extend(rows[last:])
+    return filled[1:] if previous is not None else filled
+
+
+def step_corners(x, y, settings, gaps=None):
+    """
+    Ergänzt eine Treppenfunktion (Totband) um die Eckpunkte vor jeder Änderung, damit ein Liniendiagramm
+    zwischen zwei gespeicherten Messwerten nicht schräg verbindet. Vermerkte Ausfälle bleiben unverändert.
+
+    :param x: numpy-Array der Zeitstempel in Millisekunden, aufsteigend.
+    :param y: numpy-Array der Werte.
+    :param settings: Die Einstellungen der Tabelle (siehe load_compression_settings).
+    :param gaps: Optional die vermerkten Ausfälle (siehe load_gaps).
+    :return: Tupel (x, y) mit den ergänzten Punkten.
+    """
+    if len(x) < 2:
+        return x, y
+    period = settings["period"] * 1000
+    gaps = np.flatnonzero(_compressed_gaps(x, settings, gaps)) + 1
+    gaps = gaps[y[gaps] != y[gaps - 1]]
+    if not len(gaps):
+        return x, y
+    x = np.insert(x, gaps, x[gaps] - period)
+    y = np.insert(y, gaps, y[gaps - 1])
+    return x, y
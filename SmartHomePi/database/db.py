@@ -1,19 +1,184 @@
+import os
+import pathlib
 import sqlite3
+import threading
+import time
+import numpy as np
+from database.schema import (SENSOR_TABLES, METRICS, READING_METRIC_IDS, DEFAULT_HARDWARE, DEFAULT_RETENTION,
+                             current_timestamp, to_timestamp, to_epoch_ms, from_epoch_ms)
+from database.migrations import apply_migrations
+from database.rollups import update_rollups, choose_resolution, bucket_of
+from database.sketches import update_sketches, load_distribution, histogram_edges
+from database.readings import (get_storage_engine, insert_readings, metric_ids, migrate_to_narrow,
+                               start_online_migration)
+from database.archive import default_archive_dir, archived_days, read_archive, remove_room_files
+from database.compression import load_compression_settings, load_gaps, fill_gaps, step_corners
+from utils.downsampling import lttb
+from utils.metrics import metrics
+
+
+# Wartezeit auf eine Sperre, bevor eine Abfrage mit "database is locked" abbricht
+BUSY_TIMEOUT_MS = 5000
+# Seiten-Cache je Leseverbindung in KiB und per mmap gelesener Anteil der Datei in Bytes
+READER_CACHE_KIB = 16384
+READER_MMAP_BYTES = 64 * 1024 * 1024
+# Größe, auf die die WAL-Datei nach einem Checkpoint gekürzt wird, in Bytes
+WAL_SIZE_LIMIT = 64 * 1024 * 1024
+# Anzahl der Leseverbindungen, die nach dem Ende ihres Threads für den nächsten Thread offen bleiben
+MAX_IDLE_READERS = 4
+
+
+class ConnectionManager:
+    """
+    Diese Klasse verwaltet die SQLite-Verbindungen einer Datenbankdatei innerhalb des Prozesses.
+
+    Schreibzugriffe laufen über eigene Schreibverbindungen (open_writer()), Lesezugriffe über einen Pool
+    schreibgeschützter Leseverbindungen, von denen jeder Thread genau eine erhält. Die Datenbank läuft im WAL-Modus:
+    Leser sehen den zuletzt bestätigten Stand, ohne auf den Schreiber zu warten, und ein Schreiber wartet nicht auf
+    laufende Abfragen. Die Instanz bietet execute() und cursor() wie eine Verbindung an und verwendet dabei die
+    Leseverbindung des aufrufenden Threads; sie kann daher überall dort übergeben werden, wo nur gelesen wird.
+
+    Leseverbindungen beendeter Threads werden beim nächsten Bedarf eingesammelt und weiterverwendet.
+    Je Datei gibt es eine Instanz (siehe connection_manager()).
+    """
+
+    def __init__(self, db_file, max_idle_readers=MAX_IDLE_READERS):
+        """
+        :param db_file: Der Dateiname der SQLite-Datenbank.
+        :param max_idle_readers: Anzahl der offen gehaltenen, ungenutzten Leseverbindungen (Standard: 4).
+        """
+        self.db_file = os.path.abspath(db_file)
+        self.max_idle_readers = max_idle_readers
+        self._uri = pathlib.Path(self.db_file).as_uri() + "?mode=ro"
+        self._lock = threading.Lock()
+        self._readers = {}
+        self._idle = []
+        self._gauge = metrics.gauge("smarthome_db_reader_connections", "Offene Leseverbindungen je Zustand")
+
+    def open_writer(self):
+        """
+        Öffnet eine Schreibverbindung und schaltet die Datenbank in den WAL-Modus. Wie bisher gehört die Verbindung
+        dem Thread, der sie öffnet.
+
+        :return: Die sqlite3-Verbindung.
+        """
+        connection = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT_MS / 1000)
+        # Wirkt nur auf neuen Dateien vor allen Tabellen; bestehende Datenbanken werden nur über die Einstellungen
+        # umgestellt (siehe enable_incremental_vacuum), da dafür ein vollständiges VACUUM nötig ist
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("PRAGMA journal_mode = WAL")
+        # Im WAL-Modus bleibt die Datenbank auch mit NORMAL konsistent, synchronisiert wird beim Checkpoint
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA journal_size_limit = {WAL_SIZE_LIMIT}")
+        return connection
+
+    def reader(self):
+        """
+        Gibt die Leseverbindung des aufrufenden Threads zurück und öffnet sie bei Bedarf.
+
+        :return: Eine schreibgeschützte sqlite3-Verbindung.
+        """
+        thread = threading.current_thread()
+        connection = self._readers.get(thread)
+        if connection is not None:
+            return connection
+
+        with self._lock:
+            # Leseverbindungen beendeter Threads freigeben
+            for finished in [t for t in self._readers if not t.is_alive()]:
+                self._idle.append(self._readers.pop(finished))
+            while len(self._idle) > self.max_idle_readers:
+                self._idle.pop(0).close()
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._open_reader()
+        with self._lock:
+            self._readers[thread] = connection
+            self._gauge.set(len(self._readers), state="bound")
+            self._gauge.set(len(self._idle), state="idle")
+        return connection
+
+    def _open_reader(self):
+        # Die Verbindung wechselt zwischen Threads, wird aber immer nur von einem Thread zugleich benutzt
+        connection = sqlite3.connect(self._uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        connection.execute("PRAGMA query_only = ON")
+        connection.execute(f"PRAGMA cache_size = -{READER_CACHE_KIB}")
+        connection.execute(f"PRAGMA mmap_size = {READER_MMAP_BYTES}")
+        return connection
+
+    def execute(self, sql, parameters=()):
+        """
+        Führt eine lesende Abfrage über die Leseverbindung des aufrufenden Threads aus.
+
+        :return: Der sqlite3-Cursor.
+        """
+        return self.reader().execute(sql, parameters)
+
+    def cursor(self):
+        return self.reader().cursor()
+
+    def close_readers(self):
+        """
+        Schließt alle Leseverbindungen (z.B. vor dem Löschen der Datei).
+        """
+        with self._lock:
+            connections = list(self._readers.values()) + self._idle
+            self._readers, self._idle = {}, []
+        for connection in connections:
+            connection.close()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def connection_manager(db_file):
+    """
+    Gibt den ConnectionManager einer Datenbankdatei zurück und legt ihn beim ersten Aufruf an.
+
+    :param db_file: Der Dateiname der SQLite-Datenbank.
+    """
+    path = os.path.abspath(db_file)
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = ConnectionManager(path)
+        return manager
+
 
 class Database:
     """
     Diese Klasse verwaltet die SQLite-Datenbank für die Sensoren.
     Sie stellt Funktionen zur Verfügung, um Räume hinzuzufügen und Sensor-Daten zu speichern.
+
+    Geschrieben wird über connection, die Schreibverbindung der Instanz. Die Lesefunktionen verwenden reader,
+    also die schreibgeschützte Leseverbindung des aufrufenden Threads (siehe ConnectionManager), und warten daher
+    weder auf die Erfassung noch halten sie diese auf.
+
+    Als geclusterte Speicherung dient die Tabelle readings (siehe database/readings.py): Sie ist eine
+    WITHOUT-ROWID-Tabelle, deren Zeilen nach dem Primärschlüssel (room_id, metric_id, ts) gespeichert sind, sodass
+    die Messwerte eines Raums zeitlich geordnet beieinander liegen. Sie wird über enable_clustered_storage aktiviert.
     """
 
-    def __init__(self, db_file="sensors.db"):
+    def __init__(self, db_file="sensors.db", archive_dir=None):
         """
-        Initialisiert die Datenbankverbindung und erstellt die benötigten Tabellen, falls diese noch nicht existieren.
-        
+        Öffnet die Schreibverbindung, erstellt die benötigten Tabellen, falls diese noch nicht existieren,
+        und bringt das Schema per Migration auf den aktuellen Stand.
+
         :param db_file: Der Dateiname der SQLite-Datenbank (Standard: "sensors.db")
+        :param archive_dir: Verzeichnis des Parquet-Archivs (Standard: "<db_file ohne Endung>_archive")
         """
-        self.connection = sqlite3.connect(db_file)
+        self.db_file = db_file
+        self.archive_dir = archive_dir or default_archive_dir(db_file)
+        if db_file == ":memory:":
+            # Eine In-Memory-Datenbank existiert nur in dieser einen Verbindung
+            self.connection = sqlite3.connect(db_file)
+            self.reader = self.connection
+        else:
+            self.connection = connection_manager(db_file).open_writer()
+            self.reader = connection_manager(db_file)
         self.create_tables()
+        apply_migrations(self.connection)
 
     def create_tables(self):
         """
@@ -80,6 +245,23 @@ class Database:
                 VALUES (?)
             """, (room_name,))
 
+    def delete_room(self, room_id):
+        """
+        Löscht einen Raum mit allen zugehörigen Daten (Rohdaten, Rollups, Sketches, Hardware-Zuordnung,
+        Kompressions-Einstellungen, vermerkte Ausfälle und Archiv) in einer Transaktion. Die Parquet-Dateien werden
+        erst nach dem Commit entfernt.
+
+        :param room_id: Die ID des Raums.
+        """
+        with self.connection:
+            for table in (*SENSOR_TABLES, "readings", "sensor_rollups", "sensor_sketches", "room_hardware",
+                          "archived_days", "sensor_gaps"):
+                self.connection.execute(f"DELETE FROM {table} WHERE room_id = ?", (room_id,))
+            self.connection.executemany("DELETE FROM storage_settings WHERE key = ?",
+                                        [(f"compression:{room_id}",), (f"compression_config:{room_id}",)])
+            self.connection.execute("DELETE FROM rooms WHERE id = ?", (room_id,))
+        remove_room_files(self.archive_dir, room_id)
+
     def get_room_id_by_name(self, room_name):
         """
         Gibt die ID des Raums anhand des Namens zurück.
@@ -87,7 +269,7 @@ class Database:
         :param room_name: Der Name des Raumes, dessen ID abgerufen werden soll.
         :return: Die ID des Raums oder None, falls der Raum nicht existiert.
         """
-        cursor = self.connection.cursor()
+        cursor = self.reader.cursor()
         cursor.execute("SELECT id FROM rooms WHERE name = ?", (room_name,))
         result = cursor.fetchone()
         if result:
@@ -101,14 +283,87 @@ class Database:
         :param room_id: Die ID des Raumes, dessen Name abgerufen werden soll.
         :return: Der Name des Raums oder None, falls der Raum nicht existiert.
         """
-        cursor = self.connection.cursor()
+        cursor = self.reader.cursor()
         cursor.execute("SELECT name FROM rooms WHERE id = ?", (room_id,))
         result = cursor.fetchone()
         if result:
             return result[0]
         return None
 
-    def insert_data(self, table, room_id, value1, value2=None):
+    def get_room_hardware(self, room_id):
+        """
+        Gibt die Hardware-Zuordnung eines Raums zurück. Nicht gesetzte Felder werden mit DEFAULT_HARDWARE aufgefüllt.
+
+        :param room_id: Die ID des Raums.
+        :return: Dictionary mit den Schlüsseln aus DEFAULT_HARDWARE.
+        """
+        hardware = dict(DEFAULT_HARDWARE)
+        cursor = self.reader.execute(f"""
+            SELECT {", ".join(DEFAULT_HARDWARE)} FROM room_hardware WHERE room_id = ?
+        """, (room_id,))
+        result = cursor.fetchone()
+        if result:
+            hardware.update(zip(DEFAULT_HARDWARE, result))
+        return hardware
+
+    def set_room_hardware(self, room_id, hardware):
+        """
+        Speichert die Hardware-Zuordnung eines Raums.
+
+        :param room_id: Die ID des Raums.
+        :param hardware: Dictionary mit den Schlüsseln aus DEFAULT_HARDWARE.
+        """
+        values = [hardware.get(key, default) for key, default in DEFAULT_HARDWARE.items()]
+        with self.connection:
+            self.connection.execute(f"""
+                INSERT OR REPLACE INTO room_hardware (room_id, {", ".join(DEFAULT_HARDWARE)})
+                VALUES (?, {", ".join("?" for _ in DEFAULT_HARDWARE)})
+            """, (room_id, *values))
+
+    def get_retention_policies(self):
+        """
+        Gibt die Aufbewahrungsdauer je Datenbestand zurück.
+
+        :return: Dictionary {Datenbestand: Tage oder None für unbegrenzt} mit den Schlüsseln aus DEFAULT_RETENTION.
+        """
+        policies = dict(DEFAULT_RETENTION)
+        policies.update(self.reader.execute("SELECT name, keep_days FROM retention_policies").fetchall())
+        return policies
+
+    def set_retention_policy(self, name, keep_days):
+        """
+        Speichert die Aufbewahrungsdauer eines Datenbestands.
+
+        :param name: Der Datenbestand (siehe DEFAULT_RETENTION).
+        :param keep_days: Aufbewahrungsdauer in Tagen oder None für unbegrenzt.
+        """
+        if name not in DEFAULT_RETENTION:
+            raise ValueError(f"Unbekannter Datenbestand: {name}")
+        with self.connection:
+            self.connection.execute("""
+                INSERT OR REPLACE INTO retention_policies (name, keep_days) VALUES (?, ?)
+            """, (name, keep_days))
+
+    def is_clustered_storage(self):
+        """
+        :return: True, falls die Messwerte geclustert nach (room_id, metric_id, ts) in der Tabelle readings liegen.
+        """
+        return get_storage_engine(self.reader) == "narrow"
+
+    def enable_clustered_storage(self):
+        """
+        Stellt auf die geclusterte Speicherung in der WITHOUT-ROWID-Tabelle readings um. Die vorhandenen Messwerte
+        werden per Online-Migration im Hintergrund kopiert, die Erfassung läuft währenddessen weiter. Eine
+        In-Memory-Datenbank wird sofort umgestellt, da sie nur in dieser Verbindung existiert.
+
+        :return: Der Migrations-Thread oder None bei einer In-Memory-Datenbank.
+        """
+        if self.db_file == ":memory:":
+            migrate_to_narrow(self.connection, pause=0)
+            return None
+        return start_online_migration(self.db_file)
+
+    def insert_data(self, table, room_id, value1, value2=None, timestamp=None):
         """
         Fügt Sensor-Daten in die entsprechende Tabelle ein.
         
@@ -116,25 +371,403 @@ class Database:
         :param room_id: Die ID des Raums, in dem der Sensor gemessen hat.
         :param value1: Der erste Wert, der gespeichert werden soll (z.B. Temperatur, Feuerstatus, etc.)
         :param value2: Ein optionaler zweiter Wert (z.B. Feuchtigkeit, Rohwert, etc.)
+        :param timestamp: Optionaler Zeitstempel der Messung (Standard: aktueller Zeitpunkt).
         """
+        if timestamp is None:
+            timestamp = current_timestamp()
+        self.insert_many(table, [(room_id, timestamp, value1, value2)])
+
+    def insert_many(self, table, rows):
+        """
+        Fügt mehrere Messwerte in einer einzigen Transaktion (executemany) in eine Sensor-Tabelle ein.
+        
+        :param table: Der Name der Sensor-Tabelle (siehe SENSOR_TABLES).
+        :param rows: Liste von Tupeln (room_id, timestamp, value1, value2).
+        """
+        self.insert_batch({table: rows})
+
+    def insert_batch(self, batch, aggregate=None, sequences=None, gaps=None):
+        """
+        Schreibt die Messwerte mehrerer Sensor-Tabellen gemeinsam in einer Transaktion (ein Commit für alles).
+        
+        :param batch: Dictionary {Tabellenname: Liste von Tupeln (room_id, timestamp, value1, value2)}.
+        :param aggregate: Optional abweichende Messwerte für Rollups und Sketches im selben Format, z.B. alle
+                          Messwerte, wenn batch nur die nach der Kompression verbleibenden enthält (Standard: batch).
+        :param sequences: Optional {(Gerät, Datenstrom): Sequenznummer} der enthaltenen Lieferungen des Collectors;
+                          wird in derselben Transaktion gespeichert, damit keine Lieferung doppelt geschrieben wird.
+        :param gaps: Optional die von den Kompressoren vermerkten Ausfälle {Tabellenname: Liste von Tupeln
+                     (room_id, start_ms, end_ms)} (siehe TableCompressor.take_gaps).
+        """
+        aggregate = batch if aggregate is None else aggregate
+        for table in (*batch, *aggregate):
+            if table not in SENSOR_TABLES:
+                raise ValueError(f"Unbekannte Sensor-Tabelle: {table}")
+
+        started = time.perf_counter()
         with self.connection:
-            if table == "dht22_data":
-                self.connection.execute("""
-                    INSERT INTO dht22_data (room_id, temperature, humidity)
-                    VALUES (?, ?, ?)
-                """, (room_id, value1, value2))
-            elif table == "flame_sensor_data":
-                self.connection.execute("""
-                    INSERT INTO flame_sensor_data (room_id, fire_detected, raw_value)
-                    VALUES (?, ?, ?)
-                """, (room_id, value1, value2))
-            elif table == "gas_sensor_data":
-                self.connection.execute("""
-                    INSERT INTO gas_sensor_data (room_id, ppm, raw_value)
-                    VALUES (?, ?, ?)
-                """, (room_id, value1, value2))
-            elif table == "light_sensor_data":
-                self.connection.execute("""
-                    INSERT INTO light_sensor_data (room_id, lux, raw_value)
-                    VALUES (?, ?, ?)
-                """, (room_id, value1, value2))
+            # Speicherart innerhalb der Schreibsperre lesen, damit keine Zeile eine beginnende Migration verpasst
+            self.connection.execute("BEGIN IMMEDIATE")
+            engine = get_storage_engine(self.connection)
+            for table, rows in batch.items():
+                if not rows:
+                    continue
+                if engine != "narrow":
+                    column1, column2 = SENSOR_TABLES[table]
+                    self.connection.executemany(f"""
+                        INSERT INTO {table} (room_id, timestamp, {column1}, {column2})
+                        VALUES (?, ?, ?, ?)
+                    """, rows)
+                if engine != "wide":
+                    insert_readings(self.connection, table, rows)
+            for table, rows in aggregate.items():
+                if not rows:
+                    continue
+                update_rollups(self.connection, table, rows)
+                update_sketches(self.connection, table, rows)
+            for table, rows in (gaps or {}).items():
+                self.connection.executemany("""
+                    INSERT OR IGNORE INTO sensor_gaps (room_id, table_name, start_ms, end_ms) VALUES (?, ?, ?, ?)
+                """, [(room_id, table, start_ms, end_ms) for room_id, start_ms, end_ms in rows])
+            if sequences:
+                updated = current_timestamp()
+                self.connection.executemany("""
+                    INSERT OR REPLACE INTO ingest_sequences (node, stream, seq, updated) VALUES (?, ?, ?, ?)
+                """, [(node, stream, seq, updated) for (node, stream), seq in sequences.items()])
+            inserted = time.perf_counter()
+        committed = time.perf_counter()
+
+        # Dauer der Anweisungen (inkl. Warten auf die Schreibsperre) und des Commits getrennt erfassen
+        metrics.histogram("smarthome_db_insert_seconds", "Dauer der INSERTs eines Batches").observe(inserted - started)
+        metrics.histogram("smarthome_db_commit_seconds", "Dauer des Commits").observe(committed - inserted)
+        rows_written = metrics.counter("smarthome_db_rows_written_total", "In die Sensor-Tabellen geschriebene Zeilen")
+        for table, rows in batch.items():
+            rows_written.inc(len(rows), table=table)
+
+    def get_rollup_data(self, room_id, metric, start, end, resolution=None, min_points=100):
+        """
+        Gibt aggregierte Werte einer Messgröße für einen Zeitraum aus der Rollup-Tabelle zurück.
+        Ohne Angabe der Auflösung wird die gröbste Auflösung gewählt, die noch min_points Datenpunkte liefert.
+
+        :param room_id: Die ID des Raums.
+        :param metric: Die Messgröße (siehe METRICS, z.B. "temperature").
+        :param start: Beginn des Zeitraums (datetime oder Zeitstempel-String, UTC).
+        :param end: Ende des Zeitraums (datetime oder Zeitstempel-String, UTC).
+        :param resolution: Optionale feste Auflösung ("minute", "hour" oder "day").
+        :param min_points: Gewünschte Mindestanzahl an Datenpunkten (Standard: 100).
+        :return: Die gewählte Auflösung und eine Liste von Tupeln (bucket, min, max, avg, count).
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unbekannte Messgröße: {metric}")
+        if resolution is None:
+            resolution = choose_resolution(start, end, min_points)
+
+        rows = self.reader.execute("""
+            SELECT bucket, min_value, max_value, sum_value / count, count
+            FROM sensor_rollups
+            WHERE resolution = ? AND room_id = ? AND metric = ? AND bucket >= ? AND bucket <= ?
+            ORDER BY bucket
+        """, (resolution, room_id, metric, bucket_of(to_timestamp(start), resolution), to_timestamp(end))).fetchall()
+        return resolution, rows
+
+    def get_series(self, room_id, metric, start, end, max_points=500):
+        """
+        Gibt die Zeitreihe einer Messgröße für einen Zeitraum zurück. Der Zeitfilter wird in SQL ausgewertet,
+        anschließend wird die Reihe per Largest-Triangle-Three-Buckets auf höchstens max_points Punkte reduziert.
+        Die Datenmenge für das Diagramm bleibt damit unabhängig von der Länge des Verlaufs konstant.
+
+        :param room_id: Die ID des Raums.
+        :param metric: Die Messgröße (siehe METRICS, z.B. "temperature").
+        :param start: Beginn des Zeitraums (datetime oder Zeitstempel-String, UTC).
+        :param end: Ende des Zeitraums (datetime oder Zeitstempel-String, UTC).
+        :param max_points: Maximale Anzahl an zurückgegebenen Punkten (Standard: 500).
+        :return: Eine Liste von Tupeln (timestamp, value), aufsteigend nach Zeit sortiert.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unbekannte Messgröße: {metric}")
+        table, column = METRICS[metric]
+
+        engine = get_storage_engine(self.reader)
+        days = archived_days(self.reader, room_id, start, end)
+        settings = load_compression_settings(self.reader, room_id, table)
+        step = settings is not None and settings["method"] == "deadband"
+        if engine == "narrow" or days or step:
+            # Ganzzahlige Zeitstempel dienen direkt als x-Achse, formatiert werden nur die ausgewählten Punkte
+            start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+            if engine == "narrow":
+                rows = self.reader.execute("""
+                    SELECT ts, value FROM readings
+                    WHERE room_id = ? AND metric_id = ? AND ts >= ? AND ts <= ?
+                    ORDER BY ts
+                """, (room_id, READING_METRIC_IDS[(table, column)], start_ms, end_ms)).fetchall()
+            else:
+                rows = self.reader.execute(f"""
+                    SELECT CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER), {column}
+                    FROM {table}
+                    WHERE room_id = ? AND timestamp >= ? AND timestamp <= ? AND {column} IS NOT NULL
+                    ORDER BY timestamp
+                """, (room_id, to_timestamp(start), to_timestamp(end))).fetchall()
+            x = np.array([ts for ts, _ in rows], dtype=np.int64)
+            y = np.array([value for _, value in rows], dtype=float)
+
+            # Ältere Tage spaltenweise aus dem Parquet-Archiv, nur die benötigte Spalte
+            archived = read_archive(self.archive_dir, table, room_id, days, start_ms, end_ms,
+                                    columns=["timestamp", column]) if days else None
+            if archived is not None and archived.num_rows:
+                archived_x = archived.column("timestamp").to_numpy().astype(np.int64)
+                archived_y = archived.column(column).to_numpy(zero_copy_only=False)
+                x, y = np.concatenate([archived_x, x]), np.concatenate([archived_y, y])
+                valid = ~np.isnan(y)
+                x, y = x[valid], y[valid]
+                if np.any(np.diff(x) < 0):
+                    order = np.argsort(x, kind="stable")
+                    x, y = x[order], y[order]
+            if step and len(x):
+                # Mit Totband komprimierte Reihen als Treppe darstellen
+                x, y = step_corners(x, y, settings, load_gaps(self.reader, room_id, table, int(x[0]), int(x[-1])))
+
+            indices = lttb(x, y, max_points) if len(x) > max_points else range(len(x))
+            return [(from_epoch_ms(int(x[i])), float(y[i])) for i in indices]
+
+        rows = self.reader.execute(f"""
+            SELECT timestamp, julianday(timestamp), {column}
+            FROM {table}
+            WHERE room_id = ? AND timestamp >= ? AND timestamp <= ? AND {column} IS NOT NULL
+            ORDER BY timestamp
+        """, (room_id, to_timestamp(start), to_timestamp(end))).fetchall()
+
+        if len(rows) <= max_points:
+            return [(timestamp, value) for timestamp, _, value in rows]
+
+        _, x, y = zip(*rows)
+        return [(rows[i][0], rows[i][2]) for i in lttb(x, y, max_points)]
+
+    def get_raw_rows(self, table, room_id, start=None, end=None, limit=None, newest_first=False):
+        """
+        Gibt die Rohdaten einer Sensor-Tabelle zurück, unabhängig von der Speicherart (siehe database/readings.py).
+        Bereits archivierte Tage werden aus dem Parquet-Archiv gelesen (siehe database/archive.py), beim Schreiben
+        komprimierte Abschnitte im Abtastintervall aufgefüllt (siehe database/compression.py).
+
+        :param table: Der Name der Sensor-Tabelle (siehe SENSOR_TABLES).
+        :param room_id: Die ID des Raums.
+        :param start: Optionaler Beginn des Zeitraums (datetime oder Zeitstempel-String, UTC).
+        :param end: Optionales Ende des Zeitraums (datetime oder Zeitstempel-String, UTC).
+        :param limit: Optionale maximale Anzahl an Datensätzen.
+        :param newest_first: Neueste Datensätze zuerst (Standard: False).
+        :return: Eine Liste von Tupeln (Millisekunden seit 1970, value1, value2).
+        """
+        if table not in SENSOR_TABLES:
+            raise ValueError(f"Unbekannte Sensor-Tabelle: {table}")
+        rows = self._get_stored_rows(table, room_id, start, end, limit, newest_first)
+
+        settings = load_compression_settings(self.reader, room_id, table)
+        if settings is None or len(rows) < 2:
+            return rows
+        gaps = load_gaps(self.reader, room_id, table, min(rows[0][0], rows[-1][0]), max(rows[0][0], rows[-1][0]))
+        if newest_first:
+            rows = fill_gaps(rows[::-1], settings, gaps=gaps)[::-1]
+        else:
+            rows = fill_gaps(rows, settings, gaps=gaps)
+        return rows if limit is None else rows[:limit]
+
+    def _get_stored_rows(self, table, room_id, start, end, limit, newest_first):
+        # Gespeicherte Rohdaten aus SQLite und dem Parquet-Archiv, ohne aufgefüllte Lücken
+        rows = self._get_sqlite_rows(table, room_id, start, end, limit, newest_first)
+
+        days = archived_days(self.reader, room_id, start, end)
+        if not days:
+            return rows
+        archive_end = to_epoch_ms(f"{days[-1]} 00:00:00") + 86400000
+        if newest_first and limit is not None and len(rows) >= limit and rows[-1][0] >= archive_end:
+            # Die neuesten Datensätze liegen vollständig nach dem letzten archivierten Tag
+            return rows
+
+        start_ms = None if start is None else to_epoch_ms(start)
+        end_ms = None if end is None else to_epoch_ms(end)
+        if newest_first and limit is not None:
+            # Nur so viele Tage rückwärts lesen, bis genügend Datensätze vorliegen (1, 2, 4, ... Tage je Schritt)
+            archived_rows, batch_size = [], 1
+            while days and len(archived_rows) < limit:
+                batch, days = days[-batch_size:], days[:-batch_size]
+                archived_rows = self._read_archive_rows(table, room_id, batch, start_ms, end_ms) + archived_rows
+                batch_size *= 2
+        else:
+            archived_rows = self._read_archive_rows(table, room_id, days, start_ms, end_ms)
+        if not archived_rows:
+            return rows
+
+        if newest_first:
+            # Im Normalfall liegt das Archiv vollständig vor den Daten in SQLite und muss nur angehängt werden
+            if not rows or archived_rows[-1][0] < rows[-1][0]:
+                rows = rows + archived_rows[::-1]
+            else:
+                rows = sorted(archived_rows + rows, key=lambda row: row[0], reverse=True)
+        elif not rows or archived_rows[-1][0] < rows[0][0]:
+            rows = archived_rows + rows
+        else:
+            rows = sorted(archived_rows + rows, key=lambda row: row[0])
+        return rows if limit is None else rows[:limit]
+
+    def _read_archive_rows(self, table, room_id, days, start_ms, end_ms):
+        # Archivierte Rohdaten als Liste von Tupeln (Millisekunden seit 1970, value1, value2), aufsteigend
+        archived = read_archive(self.archive_dir, table, room_id, days, start_ms, end_ms)
+        if archived is None:
+            return []
+        column1, column2 = SENSOR_TABLES[table]
+        return list(zip(
+            archived.column("timestamp").to_numpy().astype(np.int64).tolist(),
+            archived.column(column1).to_pylist(),
+            archived.column(column2).to_pylist(),
+        ))
+
+    def _get_sqlite_rows(self, table, room_id, start, end, limit, newest_first):
+        # Rohdaten aus SQLite, je nach Speicherart aus readings oder der Sensor-Tabelle
+        order = "DESC" if newest_first else "ASC"
+
+        if get_storage_engine(self.reader) == "narrow":
+            # Zwei Bereichs-Scans über den Primärschlüssel statt eines Joins mit einem Lookup je Zeile
+            metric1, metric2 = metric_ids(table)
+            conditions, params = ["room_id = ?", "metric_id = ?"], [room_id, metric1]
+            if start is not None:
+                conditions.append("ts >= ?")
+                params.append(to_epoch_ms(start))
+            if end is not None:
+                conditions.append("ts <= ?")
+                params.append(to_epoch_ms(end))
+            sql = f"SELECT ts, value FROM readings WHERE {' AND '.join(conditions)} ORDER BY ts {order}"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            rows = self.reader.execute(sql, params).fetchall()
+            if not rows:
+                return []
+
+            first, last = (rows[-1][0], rows[0][0]) if newest_first else (rows[0][0], rows[-1][0])
+            values2 = dict(self.reader.execute("""
+                SELECT ts, value FROM readings WHERE room_id = ? AND metric_id = ? AND ts >= ? AND ts <= ?
+            """, (room_id, metric2, first, last)).fetchall())
+            return [(ts, value1, values2.get(ts)) for ts, value1 in rows]
+
+        # Die Zeitstempel-Spalten haben numerische Affinität, Grenzen daher nur mit echten Zeitstempeln vergleichen
+        column1, column2 = SENSOR_TABLES[table]
+        conditions, params = ["room_id = ?"], [room_id]
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(to_timestamp(start))
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(to_timestamp(end))
+        sql = f"""
+            SELECT CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER), {column1}, {column2}
+            FROM {table}
+            WHERE {" AND ".join(conditions)}
+            ORDER BY timestamp {order}
+        """
+
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self.reader.execute(sql, params).fetchall()
+
+    def get_rows_since(self, table, room_id, cursor=None):
+        """
+        Gibt die Rohdaten einer Sensor-Tabelle zurück, die seit einem früheren Aufruf geschrieben wurden
+        (z.B. für Live-Aktualisierungen). Der Lesezeiger ist die höchste gelesene ID der Sensor-Tabelle bzw. bei der
+        Speicherart "narrow" der höchste gelesene Zeitstempel; die Abfrage liest daher nur die neuen Zeilen.
+
+        :param table: Der Name der Sensor-Tabelle (siehe SENSOR_TABLES).
+        :param room_id: Die ID des Raums.
+        :param cursor: Der Lesezeiger eines früheren Aufrufs oder None für den aktuellen Stand ohne Zeilen.
+                       Er enthält zusätzlich den zuletzt gelesenen Messwert, ab dem komprimierte Abschnitte
+                       aufgefüllt werden.
+        :return: Tupel (Liste von Tupeln (Millisekunden seit 1970, value1, value2) aufsteigend nach Zeit, Lesezeiger).
+                 Statt der Liste wird None zurückgegeben, falls der Lesezeiger nach einem Wechsel der Speicherart
+                 ungültig ist; die Daten müssen dann neu geladen werden.
+        """
+        if table not in SENSOR_TABLES:
+            raise ValueError(f"Unbekannte Sensor-Tabelle: {table}")
+        engine = "narrow" if get_storage_engine(self.reader) == "narrow" else "wide"
+        settings = load_compression_settings(self.reader, room_id, table)
+
+        if cursor is None or cursor[0] != engine:
+            if engine == "narrow":
+                last = self.reader.execute("""
+                    SELECT IFNULL(MAX(ts), 0) FROM readings WHERE room_id = ? AND metric_id = ?
+                """, (room_id, metric_ids(table)[0])).fetchone()[0]
+            else:
+                last = self.reader.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0]
+            latest = self._get_sqlite_rows(table, room_id, None, None, 1, True) if settings else []
+            return (None if cursor else []), (engine, last, latest[0] if latest else None)
+
+        if engine == "narrow":
+            values = {}
+            for index, metric_id in enumerate(metric_ids(table)):
+                for ts, value in self.reader.execute("""
+                    SELECT ts, value FROM readings WHERE room_id = ? AND metric_id = ? AND ts > ?
+                """, (room_id, metric_id, cursor[1])):
+                    values.setdefault(ts, [ts, None, None])[index + 1] = value
+            rows = sorted(tuple(row) for row in values.values())
+            last = rows[-1][0] if rows else cursor[1]
+            return (self._fill_since(room_id, table, rows, settings, cursor),
+                    (engine, last, rows[-1] if rows else cursor[2]))
+        # Obergrenze vorab bestimmen: Der Lesezeiger rückt auch vor, wenn nur andere Räume geschrieben haben,
+        # und Zeilen, die während der Abfrage hinzukommen, werden beim nächsten Aufruf gelesen.
+        # "+room_id" verhindert, dass SQLite den Raum-Index statt des ID-Bereichs verwendet.
+        last = self.reader.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0]
+        column1, column2 = SENSOR_TABLES[table]
+        rows = self.reader.execute(f"""
+            SELECT CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER), {column1}, {column2}
+            FROM {table}
+            WHERE id > ? AND id <= ? AND +room_id = ?
+        """, (cursor[1], last, room_id)).fetchall()
+        rows.sort(key=lambda row: row[0])
+        return self._fill_since(room_id, table, rows, settings, cursor), (engine, last, rows[-1] if rows else cursor[2])
+
+    def _fill_since(self, room_id, table, rows, settings, cursor):
+        # Komprimierte Abschnitte ab dem zuletzt gelesenen Messwert auffüllen
+        if settings is None or not rows:
+            return rows
+        gaps = load_gaps(self.reader, room_id, table, rows[0][0], rows[-1][0])
+        return fill_gaps(rows, settings, previous=cursor[2], gaps=gaps)
+
+    def get_available_days(self, room_id, metric):
+        """
+        Gibt alle Tage zurück, für die Messwerte einer Messgröße vorliegen (aus den Tages-Rollups).
+
+        :param room_id: Die ID des Raums.
+        :param metric: Die Messgröße (siehe METRICS, z.B. "temperature").
+        :return: Eine aufsteigend sortierte Liste von Datums-Strings "YYYY-MM-DD".
+        """
+        rows = self.reader.execute("""
+            SELECT bucket FROM sensor_rollups
+            WHERE resolution = 'day' AND room_id = ? AND metric = ?
+            ORDER BY bucket
+        """, (room_id, metric)).fetchall()
+        return [bucket[:10] for bucket, in rows]
+
+    def get_distribution(self, room_id, metric, start_day, end_day):
+        """
+        Gibt die Verteilung einer Messgröße über einen Zeitraum aus den zusammengeführten Tages-Sketches zurück.
+
+        :param room_id: Die ID des Raums.
+        :param metric: Die Messgröße (z.B. "temperature").
+        :param start_day: Erster Tag (date oder String "YYYY-MM-DD").
+        :param end_day: Letzter Tag (date oder String "YYYY-MM-DD").
+        :return: Dictionary mit count, min, max, Quantilen (q01, q25, median, q75, q99),
+                 Bin-Grenzen (edges) und Bin-Zählwerten (histogram) oder None, falls keine Daten vorliegen.
+        """
+        histogram, digest = load_distribution(self.reader, room_id, metric, str(start_day)[:10], str(end_day)[:10])
+        if not digest.centroids:
+            return None
+
+        return {
+            "count": sum(histogram),
+            "min": digest.minimum,
+            "max": digest.maximum,
+            "q01": digest.quantile(0.01),
+            "q25": digest.quantile(0.25),
+            "median": digest.quantile(0.5),
+            "q75": digest.quantile(0.75),
+            "q99": digest.quantile(0.99),
+            "edges": histogram_edges(metric),
+            "histogram": histogram,
+        }
@@ -0,0 +1,440 @@
+"""
+Store-and-Forward-Client für den zentralen Collector (siehe database/collector.py).
+
+Statt in die lokale Datenbank schreibt run_sensors die Messwerte über einen RoomWriter in den Forwarder. Dieser fasst
+die Messwerte aller Räume des Geräts alle flush_interval Sekunden (bzw. ab max_batch_size Messwerten) zu einer
+Lieferung zusammen, komprimiert sie mit gzip und legt sie in einer lokalen SQLite-Warteschlange (Outbox) ab. Ein
+Hintergrund-Thread sendet die Lieferungen in der Reihenfolge ihrer Sequenznummern an den Collector und löscht sie
+erst nach dessen Bestätigung. Ist der Collector nicht erreichbar, bleiben die Lieferungen in der Outbox, auch über
+einen Neustart des Geräts hinweg, und werden mit wachsendem Abstand (bis max_backoff Sekunden) erneut gesendet.
+Da der Collector jede Sequenznummer nur einmal schreibt, ist erneutes Senden nach einer verlorenen Bestätigung
+unbedenklich. Lieferungen, die der Collector endgültig ablehnt (ungültiger Inhalt oder zu groß), werden in die
+Tabelle dead_letter der Outbox verschoben, damit sie die Warteschlange nicht blockieren und trotzdem erhalten bleiben.
+Alle anderen Fehler (z.B. 404, 408 oder 429 von einem Proxy) werden wie ein nicht erreichbarer Collector wiederholt.
+"""
+import gzip
+import json
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from database.schema import SENSOR_TABLES, current_timestamp
+from utils.metrics import metrics
+
+DEFAULT_OUTBOX = "outbox.db"
+
+# Maximale Anzahl Lieferungen in der Outbox; darüber werden die ältesten verworfen (bei 5 s etwa 11 Tage)
+MAX_PENDING = 200000
+
+# Ergebnisse eines Sendeversuchs
+DELIVERED = "delivered"
+DEAD_LETTER = "dead_letter"
+RETRY = "retry"
+
+
+def check_collector_url(url):
+    """
+    Prüft die Adresse des Collectors. Der Collector nimmt Lieferungen nur unter dem Pfad /ingest an; eine Adresse ohne
+    diesen Pfad würde dauerhaft mit 404 beantwortet.
+
+    :param url: Die Adresse des Collectors (z.B. "http://zentrale:8770/ingest").
+    :return: Die Adresse.
+    :raises ValueError: Falls die Adresse kein http(s)-Schema, keinen Host oder nicht den Pfad /ingest hat.
+    """
+    parts = urllib.parse.urlsplit(url or "")
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        raise ValueError(f"Ungültige Adresse des Collectors: {url!r}")
+    if not parts.path.endswith("/ingest"):
+        raise ValueError(f"Die Adresse des Collectors muss auf /ingest enden: {url!r}")
+    return url
+
+
+def pack_payload(rooms, settings=None):
+    """
+    Erstellt den gzip-komprimierten Inhalt einer Lieferung.
+
+    :param rooms: Messwerte {Raumname: {Tabellenname: Liste von [timestamp, value1, value2]}}.
+    :param settings: Optionale Kompressions-Einstellungen {Raumname: Einstellungen je Tabelle}.
+    :return: Der komprimierte Inhalt als bytes.
+    """
+    data = {"rooms": rooms}
+    if settings:
+        data["settings"] = settings
+    return gzip.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), compresslevel=6)
+
+
+def post_payload(url, node, stream, seq, payload, timeout=10.0):
+    """
+    Sendet eine Lieferung an den Collector.
+
+    :param url: Die Adresse des Collectors (z.B. "http://zentrale:8770/ingest").
+    :param node: Der Name des Geräts.
+    :param stream: Die Kennung des Datenstroms.
+    :param seq: Die Sequenznummer der Lieferung.
+    :param payload: Der Inhalt (siehe pack_payload).
+    :param timeout: Zeitlimit in Sekunden.
+    :return: Die Antwort des Collectors als Dictionary (z.B. {"status": "stored", "seq": 1}).
+    :raises urllib.error.HTTPError: Bei Ablehnung durch den Collector.
+    :raises OSError: Falls der Collector nicht erreichbar ist.
+    """
+    request = urllib.request.Request(url, data=payload, method="POST", headers={
+        "Content-Type": "application/json",
+        "Content-Encoding": "gzip",
+        "X-Node": node,
+        "X-Stream": stream,
+        "X-Sequence": str(seq),
+    })
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class Outbox:
+    """
+    Diese Klasse speichert die noch nicht bestätigten Lieferungen in einer lokalen SQLite-Datenbank.
+    """
+
+    def __init__(self, path=DEFAULT_OUTBOX, max_pending=MAX_PENDING):
+        """
+        Öffnet die Outbox und legt die Tabellen bei Bedarf an.
+
+        :param path: Der Dateiname der Outbox (Standard: "outbox.db").
+        :param max_pending: Maximale Anzahl gespeicherter Lieferungen.
+        """
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload BLOB NOT NULL,
+                    readings INTEGER NOT NULL,
+                    created TEXT NOT NULL
+                )
+            """)
+            # Vom Collector endgültig abgelehnte Lieferungen; sie werden nicht mehr gesendet, aber nicht gelöscht
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letter (
+                    seq INTEGER PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    readings INTEGER NOT NULL,
+                    created TEXT NOT NULL,
+                    rejected TEXT NOT NULL,
+                    reason TEXT
+                )
+            """)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS outbox_meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Die Kennung des Datenstroms bleibt über Neustarts erhalten, damit der Collector Duplikate erkennt
+            self.connection.execute("INSERT OR IGNORE INTO outbox_meta (key, value) VALUES ('stream', ?)",
+                                    (uuid.uuid4().hex,))
+        self.stream = self.connection.execute("SELECT value FROM outbox_meta WHERE key = 'stream'").fetchone()[0]
+
+    def put(self, payload, readings):
+        """
+        Legt eine Lieferung in die Outbox. Ist die Outbox voll, werden die ältesten Lieferungen verworfen.
+
+        :param payload: Der Inhalt (siehe pack_payload).
+        :param readings: Die Anzahl der enthaltenen Messwerte.
+        :return: Die Sequenznummer der Lieferung.
+        """
+        with self._lock, self.connection:
+            seq = self.connection.execute("INSERT INTO outbox (payload, readings, created) VALUES (?, ?, ?)",
+                                          (payload, readings, current_timestamp())).lastrowid
+            dropped = self.connection.execute("DELETE FROM outbox WHERE seq <= ?", (seq - self.max_pending,)).rowcount
+        if dropped:
+            metrics.record_error("forwarder", f"Outbox voll: {dropped} Lieferungen verworfen")
+        return seq
+
+    def peek(self):
+        """
+        :return: Die älteste Lieferung als Tupel (seq, payload, readings) oder None, falls die Outbox leer ist.
+        """
+        with self._lock:
+            return self.connection.execute(
+                "SELECT seq, payload, readings FROM outbox ORDER BY seq LIMIT 1"
+            ).fetchone()
+
+    def remove(self, seq):
+        """
+        Entfernt eine bestätigte Lieferung.
+
+        :param seq: Die Sequenznummer der Lieferung.
+        """
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def dead_letter(self, seq, reason):
+        """
+        Verschiebt eine vom Collector endgültig abgelehnte Lieferung in die Tabelle dead_letter.
+
+        :param seq: Die Sequenznummer der Lieferung.
+        :param reason: Der Grund der Ablehnung.
+        """
+        with self._lock, self.connection:
+            self.connection.execute("""
+                INSERT OR REPLACE INTO dead_letter (seq, payload, readings, created, rejected, reason)
+                SELECT seq, payload, readings, created, ?, ? FROM outbox WHERE seq = ?
+            """, (current_timestamp(), reason, seq))
+            self.connection.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def pending(self):
+        """
+        :return: Tupel (Anzahl Lieferungen, Anzahl Messwerte) in der Outbox.
+        """
+        with self._lock:
+            count, readings = self.connection.execute("SELECT COUNT(*), SUM(readings) FROM outbox").fetchone()
+        return count, readings or 0
+
+    def dead_letters(self):
+        """
+        :return: Tupel (Anzahl Lieferungen, Anzahl Messwerte) in der Tabelle dead_letter.
+        """
+        with self._lock:
+            count, readings = self.connection.execute("SELECT COUNT(*), SUM(readings) FROM dead_letter").fetchone()
+        return count, readings or 0
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class RoomWriter:
+    """
+    Schreibt die Messwerte eines Raums in den Forwarder. Die Schnittstelle von insert_data entspricht
+    BatchWriter.insert_data, sodass der Writer in run_sensors an Stelle des BatchWriters verwendet werden kann.
+    """
+
+    def __init__(self, forwarder, room_name):
+        self.forwarder = forwarder
+        self.room_name = room_name
+
+    def insert_data(self, table, room_id, value1, value2=None, timestamp=None):
+        """
+        Legt einen Messwert in den Puffer des Forwarders.
+
+        :param table: Der Name der Sensor-Tabelle (siehe SENSOR_TABLES).
+        :param room_id: Die lokale ID des Raums (wird nicht übertragen, der Collector ordnet über den Namen zu).
+        :param value1: Der erste Wert.
+        :param value2: Ein optionaler zweiter Wert.
+        :param timestamp: Optionaler Zeitstempel der Messung (Standard: aktueller Zeitpunkt).
+        """
+        if table not in SENSOR_TABLES:
+            raise ValueError(f"Unbekannte Sensor-Tabelle: {table}")
+        self.forwarder.add(self.room_name, table, timestamp or current_timestamp(), value1, value2)
+
+    def close(self):
+        """
+        Legt die gepufferten Messwerte in die Outbox. Gesendet wird weiterhin im Hintergrund.
+        """
+        self.forwarder.flush()
+
+
+class Forwarder:
+    """
+    Diese Klasse sammelt die Messwerte eines Geräts und liefert sie zuverlässig an den Collector.
+    """
+
+    def __init__(self, url, node=None, outbox_path=DEFAULT_OUTBOX, flush_interval=5.0, max_batch_size=1000,
+                 timeout=10.0, max_backoff=60.0, stop_event=None):
+        """
+        Öffnet die Outbox und startet den Hintergrund-Thread.
+
+        :param url: Die Adresse des Collectors (z.B. "http://zentrale:8770/ingest").
+        :param node: Der Name des Geräts (Standard: Hostname).
+        :param outbox_path: Der Dateiname der Outbox (Standard: "outbox.db").
+        :param flush_interval: Maximale Zeit in Sekunden, die ein Messwert im Puffer verbleibt.
+        :param max_batch_size: Anzahl gepufferter Messwerte, ab der sofort eine Lieferung erstellt wird.
+        :param timeout: Zeitlimit je Sendeversuch in Sekunden.
+        :param max_backoff: Maximaler Abstand zwischen zwei Sendeversuchen in Sekunden.
+        :param stop_event: Optionales threading.Event. Wird es gesetzt, beendet sich der Hintergrund-Thread.
+        :raises ValueError: Falls die Adresse des Collectors ungültig ist (siehe check_collector_url).
+        """
+        self.url = check_collector_url(url)
+        self.node = node or socket.gethostname()
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.outbox = Outbox(outbox_path)
+        self._lock = threading.Lock()
+        self._rooms = {}
+        self._settings = {}
+        self._count = 0
+        self._wake = threading.Event()
+        self._pending = metrics.gauge("smarthome_forwarder_pending", "Noch nicht bestätigte Lieferungen und Messwerte")
+        self._dead = metrics.gauge("smarthome_forwarder_dead_letter",
+                                   "Vom Collector endgültig abgelehnte Lieferungen und Messwerte")
+        self._sent = metrics.counter("smarthome_forwarder_deliveries_total", "Gesendete Lieferungen je Ergebnis")
+        self._send_seconds = metrics.histogram("smarthome_forwarder_send_seconds",
+                                               "Dauer vom Senden bis zur Bestätigung einer Lieferung")
+        self._update_pending()
+        self._thread = threading.Thread(target=self._run, name="Forwarder", daemon=True)
+        self._thread.start()
+
+    def writer(self, room_name, compression=None):
+        """
+        Gibt einen Writer für einen Raum zurück.
+
+        :param room_name: Der Name des Raums (muss über alle Geräte eindeutig sein).
+        :param compression: Optionale Kompressions-Einstellungen je Sensor-Tabelle (siehe table_settings). Sie werden
+                            mit der nächsten Lieferung übertragen und vom Collector angewendet; ohne Einstellungen
+                            schaltet der Collector die Kompression für den Raum aus.
+        :return: RoomWriter
+        """
+        with self._lock:
+            self._settings[room_name] = compression or {}
+        return RoomWriter(self, room_name)
+
+    def add(self, room_name, table, timestamp, value1, value2=None):
+        """
+        Legt einen Messwert in den Puffer.
+        """
+        with self._lock:
+            self._rooms.setdefault(room_name, {}).setdefault(table, []).append([timestamp, value1, value2])
+            self._count += 1
+            full = self._count >= self.max_batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Legt die gepufferten Messwerte als Lieferung in die Outbox.
+
+        :return: Die Sequenznummer der Lieferung oder None, falls der Puffer leer war.
+        """
+        with self._lock:
+            if not self._count and not self._settings:
+                return None
+            rooms, settings, count = self._rooms, self._settings, self._count
+            self._rooms, self._settings, self._count = {}, {}, 0
+        seq = self.outbox.put(pack_payload(rooms, settings), count)
+        self._update_pending()
+        self._wake.set()
+        return seq
+
+    def close(self, timeout=None):
+        """
+        Legt die gepufferten Messwerte in die Outbox und beendet den Hintergrund-Thread.
+
+        :param timeout: Optionale Zeit in Sekunden, in der noch gesendet wird, bis die Outbox leer ist.
+        """
+        self.flush()
+        deadline = time.monotonic() + (timeout or 0)
+        while timeout and self.outbox.pending()[0] and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.stop_event.set()
+        self._wake.set()
+        self._thread.join()
+        self.outbox.close()
+
+    def _update_pending(self):
+        count, readings = self.outbox.pending()
+        self._pending.set(count, unit="deliveries")
+        self._pending.set(readings, unit="readings")
+        count, readings = self.outbox.dead_letters()
+        self._dead.set(count, unit="deliveries")
+        self._dead.set(readings, unit="readings")
+
+    def _send(self, seq, payload):
+        # Tupel (Ergebnis, Grund): DELIVERED (bestätigt), DEAD_LETTER (endgültig abgelehnt) oder RETRY
+        started = time.perf_counter()
+        try:
+            post_payload(self.url, self.node, self.outbox.stream, seq, payload, self.timeout)
+        except urllib.error.HTTPError as e:
+            reason = _rejection(e)
+            if reason is not None:
+                metrics.record_error("forwarder", f"Lieferung {seq} vom Collector abgelehnt: {e.code} {reason}")
+                self._sent.inc(status="rejected")
+                return DEAD_LETTER, f"{e.code} {reason}"
+            if 400 <= e.code < 500:
+                # z.B. 404 (falscher Pfad), 408 oder 429 von einem Proxy: nicht endgültig, erneut versuchen
+                metrics.record_error("forwarder", f"Lieferung {seq} nicht angenommen: {e.code} {e.reason}")
+            self._sent.inc(status="failed")
+            return RETRY, None
+        except (OSError, ValueError):
+            self._sent.inc(status="failed")
+            return RETRY, None
+        self._send_seconds.observe(time.perf_counter() - started)
+        self._sent.inc(status="acknowledged")
+        return DELIVERED, None
+
+    def _run(self):
+        last_flush = time.monotonic()
+        backoff = 0
+        retry_at = 0
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval or self._count >= self.max_batch_size:
+                self.flush()
+                last_flush = now
+
+            entry = self.outbox.peek() if now >= retry_at else None
+            if entry is None:
+                wait = last_flush + self.flush_interval - now
+                if retry_at > now:
+                    wait = min(wait, retry_at - now)
+                self._wake.wait(max(wait, 0.01))
+                self._wake.clear()
+                continue
+
+            seq, payload, _ = entry
+            result, reason = self._send(seq, payload)
+            if result != RETRY:
+                if result == DEAD_LETTER:
+                    self.outbox.dead_letter(seq, reason)
+                else:
+                    self.outbox.remove(seq)
+                self._update_pending()
+                backoff = 0
+            else:
+                # Collector nicht erreichbar oder Lieferung nicht angenommen: mit wachsendem Abstand erneut versuchen
+                if not backoff:
+                    metrics.record_error("forwarder",
+                                         f"Collector {self.url} nicht erreichbar, Lieferungen bleiben in der Outbox.")
+                backoff = min(max(backoff * 2, 1), self.max_backoff)
+                retry_at = time.monotonic() + backoff
+
+
+def _rejection(error):
+    # Grund einer endgültigen Ablehnung durch den Collector selbst oder None: 400 (ungültiger Inhalt) bzw. 413
+    # (zu groß), jeweils mit JSON-Antwort {"error": ...}. Dieselben Codes ohne diese Antwort stammen z.B. von
+    # einem Proxy.
+    if error.code not in (400, 413):
+        return None
+    try:
+        body = json.loads(error.read())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(body, dict) or "error" not in body:
+        return None
+    return str(body["error"])
+
+
+_forwarder = None
+_forwarder_lock = threading.Lock()
+
+
+def start_forwarder(url, node=None, outbox_path=DEFAULT_OUTBOX):
+    """
+    Startet den Forwarder prozessweit, falls noch nicht geschehen. Alle Räume des Geräts teilen sich einen Forwarder
+    und damit eine Outbox.
+
+    :param url: Die Adresse des Collectors (muss auf /ingest enden).
+    :param node: Der Name des Geräts (Standard: Hostname).
+    :param outbox_path: Der Dateiname der Outbox (Standard: "outbox.db").
+    :return: Forwarder
+    :raises ValueError: Falls die Adresse des Collectors ungültig ist.
+    """
+    global _forwarder
+    check_collector_url(url)
+    with _forwarder_lock:
+        if _forwarder is None:
+            _forwarder = Forwarder(url, node, outbox_path)
+        return _forwarder
@@ -0,0 +1,104 @@
+"""
+Versionierte Schema-Migrationen für die Sensor-Datenbank.
+
+Die aktuelle Schema-Version wird in der SQLite-Kopfzeile (PRAGMA user_version) gespeichert.
+Beim Start werden alle Migrationen mit einer höheren Version als der gespeicherten der Reihe nach
+ausgeführt, jede in einer eigenen Transaktion. Bereits migrierte Datenbanken bleiben unverändert,
+bestehende sensors.db-Dateien werden an Ort und Stelle aktualisiert.
+"""
+from database.schema import SENSOR_TABLES
+from database.rollups import create_rollup_table
+from database.sketches import create_sketch_table
+from database.retention import create_retention_table
+from database.readings import create_readings_table
+from database.archive import create_archive_table
+from database.compression import create_gap_table
+
+
+def _add_room_timestamp_indexes(connection):
+    # Covering-Index: WHERE room_id = ? ORDER BY timestamp und die Wertespalten kommen ohne Tabellenzugriff aus
+    for table, (column1, column2) in SENSOR_TABLES.items():
+        connection.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_room_timestamp
+            ON {table} (room_id, timestamp, {column1}, {column2})
+        """)
+
+
+def _create_room_hardware_table(connection):
+    # Hardware-Zuordnung je Raum (Pins, ADC-Kanäle, LCD-Adresse, optionale Remote-Quelle)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS room_hardware (
+            room_id INTEGER PRIMARY KEY,
+            dht22_pin TEXT,
+            light_channel INTEGER,
+            flame_channel INTEGER,
+            gas_channel INTEGER,
+            lcd_address INTEGER,
+            remote_url TEXT,
+            FOREIGN KEY (room_id) REFERENCES rooms(id)
+        )
+    """)
+
+
+def _create_ingest_sequences_table(connection):
+    # Höchste geschriebene Sequenznummer je Gerät und Datenstrom des Collectors (siehe database/collector.py)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_sequences (
+            node TEXT NOT NULL,
+            stream TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            updated TEXT NOT NULL,
+            PRIMARY KEY (node, stream)
+        )
+    """)
+
+
+# Liste aller Migrationen: (Version, Beschreibung, Funktion). Neue Migrationen nur hinten anhängen!
+MIGRATIONS = [
+    (1, "Covering-Indizes (room_id, timestamp) für die Sensor-Tabellen", _add_room_timestamp_indexes),
+    (2, "Rollup-Tabelle (Minute/Stunde/Tag) anlegen und befüllen", create_rollup_table),
+    (3, "Verteilungs-Sketches (Histogramm + t-Digest) je Tag anlegen und befüllen", create_sketch_table),
+    (4, "Tabelle für die Hardware-Zuordnung je Raum anlegen", _create_room_hardware_table),
+    (5, "Tabelle für die Aufbewahrungsregeln anlegen", create_retention_table),
+    (6, "Schmale Tabelle readings mit ganzzahligen Zeitstempeln anlegen", create_readings_table),
+    (7, "Verzeichnis der ins Parquet-Archiv ausgelagerten Tage anlegen", create_archive_table),
+    (8, "Tabelle der Sequenznummern des Collectors anlegen", _create_ingest_sequences_table),
+    (9, "Tabelle der vermerkten Ausfälle komprimierter Messwerte anlegen", create_gap_table),
+]
+
+
+def get_schema_version(connection):
+    """
+    Gibt die aktuelle Schema-Version der Datenbank zurück.
+
+    :param connection: Die SQLite-Verbindung.
+    :return: Die Schema-Version (0 für eine noch nicht migrierte Datenbank).
+    """
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(connection, migrations=MIGRATIONS):
+    """
+    Führt alle noch nicht angewendeten Migrationen aus. Mehrfaches Aufrufen ist unbedenklich.
+
+    :param connection: Die SQLite-Verbindung.
+    :param migrations: Die Liste der Migrationen (Standard: MIGRATIONS).
+    :return: Die Schema-Version nach der Migration.
+    """
+    for version, description, migrate in migrations:
+        if version <= get_schema_version(connection):
+            continue
+
+        # IMMEDIATE sperrt die Datenbank für andere Schreiber, danach Version erneut prüfen
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if version > get_schema_version(connection):
+                migrate(connection)
+                connection.execute(f"PRAGMA user_version = {version}")
+                print(f"Datenbank migriert auf Version {version}: {description}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    return get_schema_version(connection)
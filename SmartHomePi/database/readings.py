@@ -0,0 +1,272 @@
+"""
+Kompakte, geclusterte Speicherung der Messwerte in einer schmalen Tabelle readings(room_id, metric_id, ts, value).
+
+Statt einer Tabelle je Sensor mit Text-Zeitstempeln wird jeder Messwert als eigene Zeile mit ganzzahligem
+Zeitstempel (Millisekunden seit 1970, UTC) gespeichert. Als WITHOUT-ROWID-Tabelle liegen die Zeilen direkt im
+B-Baum des Primärschlüssels (room_id, metric_id, ts), also geclustert nach Raum und Zeit. Zeitbereichs-Abfragen sind
+dadurch reine Ganzzahl-Vergleiche auf einem zusammenhängenden Bereich, und die Zeitstempel müssen beim Laden nicht
+mehr als Text geparst werden.
+
+Die Zeitstempel behalten die Millisekunden der Messung; die Zeitstempel der Erfassung haben allerdings wie in den
+Sensor-Tabellen eine Auflösung von einer Sekunde. Ist der Schlüssel eines Messwerts bereits belegt (z.B. zwei
+Messwerte in derselben Sekunde durch Jitter bei 1-Sekunden-Abtastung), wird sein Zeitstempel um so viele
+Millisekunden verschoben, bis er frei ist; es geht kein Messwert verloren. Verschobene Messwerte werden in
+smarthome_readings_collisions_total gezählt.
+
+Die Speicherart (storage_settings.engine) ist eine von:
+
+- "wide": bisherige Sensor-Tabellen (Standard)
+- "migrating": Online-Migration läuft; neue Messwerte werden in beide Speicherarten geschrieben,
+  gelesen wird weiterhin aus den Sensor-Tabellen
+- "narrow": nur noch die Tabelle readings
+
+Die Online-Migration kopiert die vorhandenen Zeilen in kleinen Transaktionen, während die Erfassung weiterläuft.
+"""
+import json
+import threading
+import time
+from database.schema import SENSOR_TABLES, READING_METRIC_IDS, to_epoch_ms
+from utils.metrics import metrics
+
+STORAGE_ENGINES = ("wide", "migrating", "narrow")
+
+
+def create_readings_table(connection):
+    """
+    Erstellt die Tabelle readings und die Tabelle storage_settings mit der Speicherart "wide".
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            room_id INTEGER NOT NULL,
+            metric_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            value REAL,
+            PRIMARY KEY (room_id, metric_id, ts)
+        ) WITHOUT ROWID
+    """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS storage_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    connection.execute("INSERT OR IGNORE INTO storage_settings (key, value) VALUES ('engine', 'wide')")
+
+
+def _get_setting(connection, key, default=None):
+    row = connection.execute("SELECT value FROM storage_settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_setting(connection, key, value):
+    connection.execute("INSERT OR REPLACE INTO storage_settings (key, value) VALUES (?, ?)", (key, value))
+
+
+def get_storage_engine(connection):
+    """
+    Gibt die aktuelle Speicherart zurück ("wide", "migrating" oder "narrow").
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    return _get_setting(connection, "engine", "wide")
+
+
+def metric_ids(table):
+    """
+    Gibt die Kennungen der beiden Wertespalten einer Sensor-Tabelle zurück.
+
+    :param table: Der Name der Sensor-Tabelle.
+    :return: Tupel (metric_id von value1, metric_id von value2).
+    """
+    column1, column2 = SENSOR_TABLES[table]
+    return READING_METRIC_IDS[(table, column1)], READING_METRIC_IDS[(table, column2)]
+
+
+def insert_readings(connection, table, rows):
+    """
+    Schreibt Messwerte einer Sensor-Tabelle in die Tabelle readings. Muss innerhalb einer Transaktion laufen.
+    Ist der Schlüssel (room_id, metric_id, ts) eines Messwerts bereits belegt, wird sein Zeitstempel um die nötigen
+    Millisekunden verschoben (beide Werte einer Zeile gemeinsam, damit sie zusammengehörig bleiben).
+
+    :param connection: Die SQLite-Verbindung.
+    :param table: Der Name der Sensor-Tabelle.
+    :param rows: Liste von Tupeln (room_id, timestamp, value1, value2).
+    :return: Anzahl der verschobenen Messwerte.
+    """
+    metric1, metric2 = metric_ids(table)
+    by_room = {}
+    for room_id, timestamp, value1, value2 in rows:
+        if value1 is not None or value2 is not None:
+            by_room.setdefault(room_id, []).append((to_epoch_ms(timestamp), value1, value2))
+
+    values, shifted = [], 0
+    for room_id, room_rows in by_room.items():
+        # Belegte Zeitstempel im betroffenen Bereich einmal lesen; verschoben wird höchstens um len(room_rows) ms
+        first = min(ts for ts, _, _ in room_rows)
+        last = max(ts for ts, _, _ in room_rows) + len(room_rows)
+        taken = {ts for ts, in connection.execute("""
+            SELECT ts FROM readings WHERE room_id = ? AND metric_id IN (?, ?) AND ts >= ? AND ts <= ?
+        """, (room_id, metric1, metric2, first, last))}
+        for ts, value1, value2 in room_rows:
+            if ts in taken:
+                shifted += 1
+                while ts in taken:
+                    ts += 1
+            taken.add(ts)
+            if value1 is not None:
+                values.append((room_id, metric1, ts, float(value1)))
+            if value2 is not None:
+                values.append((room_id, metric2, ts, float(value2)))
+    connection.executemany("INSERT INTO readings (room_id, metric_id, ts, value) VALUES (?, ?, ?, ?)", values)
+    if shifted:
+        metrics.counter("smarthome_readings_collisions_total",
+                        "Messwerte, deren Zeitstempel wegen eines belegten Schlüssels verschoben wurde"
+                        ).inc(shifted, table=table)
+    return shifted
+
+
+def _copyable_rows(connection, table, start, end):
+    # Zeilen mit start < id <= end, die sich in readings übernehmen lassen, als (id, room_id, timestamp, v1, v2)
+    column1, column2 = SENSOR_TABLES[table]
+    rows = []
+    for row in connection.execute(f"""
+        SELECT id, room_id, timestamp, {column1}, {column2} FROM {table} WHERE id > ? AND id <= ? ORDER BY id
+    """, (start, end)):
+        row_id, room_id, timestamp, value1, value2 = row
+        if room_id is None or timestamp is None or (value1 is None and value2 is None):
+            continue
+        try:
+            to_epoch_ms(timestamp)
+            [float(value) for value in (value1, value2) if value is not None]
+        except (TypeError, ValueError):
+            continue
+        rows.append(row)
+    return rows
+
+
+def begin_migration(connection):
+    """
+    Beginnt die Online-Migration: Ab sofort schreiben alle Verbindungen in beide Speicherarten. Für jede
+    Sensor-Tabelle wird die höchste vorhandene ID gespeichert; nur Zeilen bis zu dieser ID müssen kopiert werden.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :return: Die Speicherart nach dem Aufruf.
+    """
+    # IMMEDIATE sperrt die Datenbank für andere Schreiber, damit keine Zeile zwischen Stichtag und Umstellung fehlt
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        engine = get_storage_engine(connection)
+        if engine == "wide":
+            high_water = {
+                table: connection.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0]
+                for table in SENSOR_TABLES
+            }
+            _set_setting(connection, "high_water", json.dumps(high_water))
+            _set_setting(connection, "progress", json.dumps({table: 0 for table in SENSOR_TABLES}))
+            _set_setting(connection, "engine", "migrating")
+            engine = "migrating"
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return engine
+
+
+def migration_progress(connection):
+    """
+    Gibt den Fortschritt der Online-Migration zurück.
+
+    :param connection: Die SQLite-Verbindung.
+    :return: Dictionary mit engine, copied (bereits kopierte IDs) und total (zu kopierende IDs).
+    """
+    high_water = json.loads(_get_setting(connection, "high_water", "{}"))
+    progress = json.loads(_get_setting(connection, "progress", "{}"))
+    return {
+        "engine": get_storage_engine(connection),
+        "copied": sum(progress.values()),
+        "total": sum(high_water.values()),
+    }
+
+
+def migrate_to_narrow(connection, chunk_size=5000, pause=0.01, stop_event=None, keep_legacy=False):
+    """
+    Führt die Online-Migration aus bzw. setzt eine unterbrochene Migration fort. Jeder Chunk wird zusammen mit dem
+    Fortschritt in einer eigenen Transaktion kopiert; die Erfassung wird dazwischen nicht blockiert.
+    Nach dem Umstellen auf "narrow" werden die alten Sensor-Tabellen ebenfalls in Chunks geleert.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :param chunk_size: Anzahl der Zeilen (IDs) je Transaktion (Standard: 5000).
+    :param pause: Pause zwischen zwei Transaktionen in Sekunden (Standard: 0.01).
+    :param stop_event: Optionales threading.Event zum Unterbrechen; die Migration kann später fortgesetzt werden.
+    :param keep_legacy: Die alten Sensor-Tabellen nach der Migration nicht leeren (Standard: False).
+    :return: True, wenn die Migration abgeschlossen ist.
+    """
+    if begin_migration(connection) == "narrow":
+        return True
+
+    high_water = json.loads(_get_setting(connection, "high_water"))
+    progress = json.loads(_get_setting(connection, "progress"))
+
+    for table in SENSOR_TABLES:
+        while progress[table] < high_water[table]:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            start, end = progress[table], min(progress[table] + chunk_size, high_water[table])
+            with connection:
+                # Über insert_readings, damit Messwerte mit belegtem Zeitstempel verschoben statt verworfen werden
+                insert_readings(connection, table, [row[1:] for row in _copyable_rows(connection, table, start, end)])
+                progress[table] = end
+                _set_setting(connection, "progress", json.dumps(progress))
+            time.sleep(pause)
+
+    with connection:
+        _set_setting(connection, "engine", "narrow")
+    print("Speicherung auf die Tabelle readings umgestellt.")
+
+    if not keep_legacy:
+        # Die Sensor-Tabellen werden nicht mehr gelesen; in kleinen Schritten leeren. Gelöscht werden nur Zeilen,
+        # die in readings übernommen wurden; nicht übernehmbare Zeilen (z.B. ungültiger Zeitstempel) bleiben stehen.
+        for table in SENSOR_TABLES:
+            max_id = connection.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0]
+            for end in range(chunk_size, max_id + chunk_size, chunk_size):
+                if stop_event is not None and stop_event.is_set():
+                    return True
+                with connection:
+                    copied = _copyable_rows(connection, table, end - chunk_size, end)
+                    connection.executemany(f"DELETE FROM {table} WHERE id = ?", [(row[0],) for row in copied])
+                time.sleep(pause)
+    return True
+
+
+_migration_thread = None
+_migration_lock = threading.Lock()
+
+
+def start_online_migration(db_file="sensors.db", chunk_size=5000):
+    """
+    Startet bzw. setzt die Online-Migration im Hintergrund fort, falls sie nicht bereits läuft.
+
+    :param db_file: Der Dateiname der SQLite-Datenbank (Standard: "sensors.db").
+    :param chunk_size: Anzahl der Zeilen je Transaktion (Standard: 5000).
+    :return: Der Migrations-Thread.
+    """
+    global _migration_thread
+
+    def run():
+        # Die SQLite-Verbindung muss in dem Thread erstellt werden, der sie benutzt
+        from database.db import Database
+        db = Database(db_file)
+        try:
+            migrate_to_narrow(db.connection, chunk_size)
+        except Exception as e:
+            print(f"Fehler bei der Migration auf die Tabelle readings: {e}")
+        finally:
+            db.connection.close()
+
+    with _migration_lock:
+        if _migration_thread is None or not _migration_thread.is_alive():
+            _migration_thread = threading.Thread(target=run, name="ReadingsMigration", daemon=True)
+            _migration_thread.start()
+    return _migration_thread
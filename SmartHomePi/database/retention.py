@@ -0,0 +1,320 @@
+"""
+Aufbewahrungsregeln (Retention) und Kompaktierung der Sensor-Datenbank.
+
+Für jeden Datenbestand (Rohdaten-Tabellen, Rollups je Auflösung, Sketches) wird eine Aufbewahrungsdauer in Tagen
+gespeichert (siehe DEFAULT_RETENTION). Die Rohdaten sind beim Löschen bereits in die Rollups und Sketches
+eingeflossen, da diese in derselben Transaktion wie die Rohdaten fortgeschrieben werden.
+
+Der RetentionCompactor lagert, falls in den Einstellungen aktiviert, ältere Tage zunächst ins Parquet-Archiv aus
+(siehe database/archive.py), löscht abgelaufene Daten in SQLite und im Archiv im Hintergrund in kleinen
+Transaktionen, damit der Writer nie lange blockiert wird,
+und gibt den frei gewordenen Speicher per inkrementellem VACUUM zurück. Bestehende Datenbanken ohne inkrementelles
+VACUUM werden dafür nicht automatisch umgestellt (siehe enable_incremental_vacuum).
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from database.schema import SENSOR_TABLES, DEFAULT_RETENTION, TIMESTAMP_FORMAT, to_epoch_ms
+from database.rollups import ROLLUP_RESOLUTIONS
+from database.readings import metric_ids
+from utils.metrics import metrics
+
+# Rollup-Auflösung je Datenbestand
+ROLLUP_TARGETS = {f"rollups_{resolution}": resolution for resolution in ROLLUP_RESOLUTIONS}
+
+
+def create_retention_table(connection):
+    """
+    Erstellt die Tabelle retention_policies und trägt die Standard-Aufbewahrungsdauern ein. Enthält die Datenbank
+    bereits Messwerte (Aktualisierung einer bestehenden Installation), werden die Rohdaten nicht automatisch gelöscht:
+    Ihre Aufbewahrungsdauer bleibt unbegrenzt, bis sie in den Einstellungen festgelegt wird.
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS retention_policies (
+            name TEXT PRIMARY KEY,
+            keep_days INTEGER
+        )
+    """)
+    policies = dict(DEFAULT_RETENTION)
+    if any(connection.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in SENSOR_TABLES):
+        policies.update(dict.fromkeys(SENSOR_TABLES))
+        print("Bestehende Rohdaten werden unbegrenzt aufbewahrt; die Aufbewahrungsdauer lässt sich in den "
+              "Einstellungen festlegen.")
+    connection.executemany("""
+        INSERT OR IGNORE INTO retention_policies (name, keep_days) VALUES (?, ?)
+    """, list(policies.items()))
+
+
+def enable_incremental_vacuum(connection):
+    """
+    Stellt die Datenbank auf inkrementelles VACUUM um. Bei einer bestehenden Datenbank ist dafür einmalig ein
+    vollständiges VACUUM nötig, das die Datei neu schreibt und währenddessen alle anderen Zugriffe blockiert.
+    Neue Datenbanken werden bereits beim Anlegen umgestellt (siehe ConnectionManager.open_writer); für bestehende
+    wird die Umstellung nur ausdrücklich über die Einstellungen ausgelöst, nie automatisch.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :return: True, falls die Datenbank umgestellt wurde, False, falls sie bereits umgestellt war.
+    """
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    print("Datenbank wird einmalig auf inkrementelles VACUUM umgestellt ...")
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("VACUUM")
+    return True
+
+
+def _cutoff(keep_days, now=None):
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    return (now - timedelta(days=keep_days)).strftime(TIMESTAMP_FORMAT)
+
+
+def delete_chunks(connection, delete_sql, params, chunk_size, pause, stop_event):
+    """
+    Führt eine DELETE-Anweisung wiederholt in Transaktionen zu höchstens chunk_size Zeilen aus,
+    bis nichts mehr zu löschen ist.
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :param delete_sql: Die DELETE-Anweisung; ihr letzter Parameter ist das LIMIT der Unterabfrage.
+    :param params: Die übrigen Parameter der Anweisung.
+    :param chunk_size: Maximale Anzahl gelöschter Zeilen je Transaktion.
+    :param pause: Pause zwischen zwei Transaktionen in Sekunden.
+    :param stop_event: Optionales threading.Event zum vorzeitigen Abbrechen.
+    :return: Anzahl der gelöschten Zeilen.
+    """
+    deleted = 0
+    while stop_event is None or not stop_event.is_set():
+        with connection:
+            count = connection.execute(delete_sql, (*params, chunk_size)).rowcount
+        deleted += count
+        if count < chunk_size:
+            break
+        # Dem Writer zwischen den Chunks Gelegenheit zum Schreiben geben
+        time.sleep(pause)
+    return deleted
+
+
+def _room_ids(connection, table):
+    # Räume über den führenden room_id-Index bzw. -Schlüssel ermitteln, ohne die Tabelle vollständig zu lesen
+    room_ids = []
+    room_id = connection.execute(f"SELECT MIN(room_id) FROM {table}").fetchone()[0]
+    while room_id is not None:
+        room_ids.append(room_id)
+        room_id = connection.execute(f"SELECT MIN(room_id) FROM {table} WHERE room_id > ?", (room_id,)).fetchone()[0]
+    return room_ids
+
+
+def delete_expired(connection, name, keep_days, chunk_size=500, pause=0.05, stop_event=None, now=None):
+    """
+    Löscht alle Daten eines Datenbestands, die älter als die Aufbewahrungsdauer sind.
+
+    :param connection: Die SQLite-Verbindung.
+    :param name: Der Datenbestand (siehe DEFAULT_RETENTION).
+    :param keep_days: Die Aufbewahrungsdauer in Tagen (None = nichts löschen).
+    :param chunk_size: Maximale Anzahl gelöschter Zeilen je Transaktion (Standard: 500).
+    :param pause: Pause zwischen zwei Transaktionen in Sekunden (Standard: 0.05).
+    :param stop_event: Optionales threading.Event zum vorzeitigen Abbrechen.
+    :param now: Optionaler Bezugszeitpunkt (datetime, UTC, Standard: jetzt).
+    :return: Anzahl der gelöschten Zeilen.
+    """
+    if keep_days is None:
+        return 0
+    cutoff = _cutoff(keep_days, now)
+    deleted = 0
+
+    if name in SENSOR_TABLES:
+        for room_id in _room_ids(connection, name):
+            deleted += delete_chunks(connection, f"""
+                DELETE FROM {name} WHERE id IN (
+                    SELECT id FROM {name} WHERE room_id = ? AND timestamp < ? ORDER BY timestamp LIMIT ?
+                )
+            """, (room_id, cutoff), chunk_size, pause, stop_event)
+
+        # Dieselben Messwerte in der kompakten Speicherung (siehe database/readings.py)
+        for room_id in _room_ids(connection, "readings"):
+            for metric_id in metric_ids(name):
+                deleted += delete_chunks(connection, """
+                    DELETE FROM readings WHERE room_id = ? AND metric_id = ? AND ts IN (
+                        SELECT ts FROM readings WHERE room_id = ? AND metric_id = ? AND ts < ? ORDER BY ts LIMIT ?
+                    )
+                """, (room_id, metric_id, room_id, metric_id, to_epoch_ms(cutoff)), chunk_size, pause, stop_event)
+
+        # Vermerkte Ausfälle der Kompression (siehe database/compression.py) zählen nicht als Datensätze
+        for room_id in _room_ids(connection, "sensor_gaps"):
+            delete_chunks(connection, """
+                DELETE FROM sensor_gaps WHERE room_id = ? AND table_name = ? AND end_ms IN (
+                    SELECT end_ms FROM sensor_gaps WHERE room_id = ? AND table_name = ? AND end_ms < ?
+                    ORDER BY end_ms LIMIT ?
+                )
+            """, (room_id, name, room_id, name, to_epoch_ms(cutoff)), chunk_size, pause, stop_event)
+
+    elif name in ROLLUP_TARGETS:
+        resolution = ROLLUP_TARGETS[name]
+        keys = connection.execute("""
+            SELECT DISTINCT room_id, metric FROM sensor_rollups WHERE resolution = 'day'
+        """).fetchall()
+        for room_id, metric in keys:
+            deleted += delete_chunks(connection, """
+                DELETE FROM sensor_rollups WHERE resolution = ? AND room_id = ? AND metric = ? AND bucket IN (
+                    SELECT bucket FROM sensor_rollups
+                    WHERE resolution = ? AND room_id = ? AND metric = ? AND bucket < ?
+                    ORDER BY bucket LIMIT ?
+                )
+            """, (resolution, room_id, metric, resolution, room_id, metric, cutoff), chunk_size, pause, stop_event)
+
+    elif name == "sensor_sketches":
+        keys = connection.execute("SELECT DISTINCT room_id, metric FROM sensor_sketches").fetchall()
+        for room_id, metric in keys:
+            deleted += delete_chunks(connection, """
+                DELETE FROM sensor_sketches WHERE room_id = ? AND metric = ? AND day IN (
+                    SELECT day FROM sensor_sketches WHERE room_id = ? AND metric = ? AND day < ? ORDER BY day LIMIT ?
+                )
+            """, (room_id, metric, room_id, metric, cutoff[:10]), chunk_size, pause, stop_event)
+
+    else:
+        raise ValueError(f"Unbekannter Datenbestand: {name}")
+
+    return deleted
+
+
+def incremental_vacuum(connection, pages_per_step=1000, pause=0.05, stop_event=None):
+    """
+    Gibt freie Seiten der Datenbank-Datei schrittweise an das Dateisystem zurück.
+    Wirkt nur, wenn die Datenbank auf inkrementelles VACUUM umgestellt ist (siehe enable_incremental_vacuum).
+
+    :param connection: Die SQLite-Verbindung (ohne offene Transaktion).
+    :param pages_per_step: Anzahl freigegebener Seiten je Schritt (Standard: 1000).
+    :param pause: Pause zwischen zwei Schritten in Sekunden (Standard: 0.05).
+    :param stop_event: Optionales threading.Event zum vorzeitigen Abbrechen.
+    :return: Anzahl der freigegebenen Seiten.
+    """
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+
+    freed = 0
+    while stop_event is None or not stop_event.is_set():
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages == 0:
+            break
+        # execute() würde das PRAGMA nur einen Schritt weit ausführen (eine Seite), executescript() vollständig
+        connection.executescript(f"PRAGMA incremental_vacuum({min(free_pages, pages_per_step)})")
+        remaining = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free_pages:
+            break
+        freed += free_pages - remaining
+        time.sleep(pause)
+    return freed
+
+
+class RetentionCompactor:
+    """
+    Diese Klasse wendet die Aufbewahrungsregeln in einem Hintergrund-Thread in festen Abständen an.
+    Die Regeln werden bei jedem Durchlauf neu aus der Datenbank gelesen, Änderungen in den Einstellungen
+    gelten daher ab dem nächsten Durchlauf.
+    """
+
+    def __init__(self, db_file="sensors.db", interval=3600.0, chunk_size=500, pause=0.05, stop_event=None,
+                 archive_after_days=None):
+        """
+        Startet den Hintergrund-Thread.
+
+        :param db_file: Der Dateiname der SQLite-Datenbank (Standard: "sensors.db").
+        :param interval: Abstand zwischen zwei Durchläufen in Sekunden (Standard: 3600).
+        :param chunk_size: Maximale Anzahl gelöschter Zeilen je Transaktion (Standard: 500).
+        :param pause: Pause zwischen zwei Transaktionen in Sekunden (Standard: 0.05).
+        :param stop_event: Optionales threading.Event zum Beenden des Threads.
+        :param archive_after_days: Optionales Mindestalter in Tagen für das Parquet-Archiv; ohne Angabe gilt die
+                                   Einstellung in der Datenbank (siehe set_archive_after_days, Standard: aus).
+        """
+        self.db_file = db_file
+        self.archive_after_days = archive_after_days
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.stop_event = stop_event or threading.Event()
+        self.last_run = None
+        self._thread = threading.Thread(target=self._run, name="RetentionCompactor", daemon=True)
+        self._thread.start()
+
+    def run_once(self, db):
+        """
+        Wendet alle Aufbewahrungsregeln einmal an.
+
+        :param db: Die Datenbank-Instanz.
+        :return: Dictionary mit den archivierten Zeilen, den gelöschten Zeilen je Datenbestand,
+                 den freigegebenen Seiten und der Dauer.
+        """
+        from database.archive import archive_closed_days, delete_expired_archive, get_archive_after_days
+        started = time.monotonic()
+        archived = 0
+        archive_after_days = self.archive_after_days or get_archive_after_days(db.connection)
+        if archive_after_days and db.archive_dir is not None:
+            # Vor den Aufbewahrungsregeln, damit keine Rohdaten ungesichert gelöscht werden
+            try:
+                archived = sum(archive_closed_days(db.connection, db.archive_dir, self.chunk_size, self.pause,
+                                                   self.stop_event, min_age_days=archive_after_days).values())
+            except ImportError as e:
+                metrics.record_error("retention", f"Parquet-Archiv nicht verfügbar (pyarrow fehlt?): {e}")
+
+        deleted = {}
+        for name, keep_days in db.get_retention_policies().items():
+            if self.stop_event.is_set():
+                break
+            deleted[name] = delete_expired(db.connection, name, keep_days, self.chunk_size, self.pause, self.stop_event)
+            if name in SENSOR_TABLES:
+                # Die Aufbewahrungsdauer der Rohdaten gilt auch für bereits archivierte Tage
+                deleted[name] += delete_expired_archive(db.connection, db.archive_dir, name, keep_days)
+        freed_pages = incremental_vacuum(db.connection, pause=self.pause, stop_event=self.stop_event)
+
+        self.last_run = {
+            "finished": datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT),
+            "archived": archived,
+            "deleted": deleted,
+            "freed_pages": freed_pages,
+            "seconds": time.monotonic() - started,
+        }
+        return self.last_run
+
+    def stop(self):
+        """
+        Beendet den Hintergrund-Thread nach dem laufenden Chunk.
+        """
+        self.stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        # Die SQLite-Verbindung muss in dem Thread erstellt werden, der sie benutzt
+        from database.db import Database
+        db = Database(self.db_file)
+        while not self.stop_event.is_set():
+            try:
+                result = self.run_once(db)
+                if result["archived"]:
+                    print(f"Archiv: {result['archived']} Datensätze ins Parquet-Archiv ausgelagert")
+                total = sum(result["deleted"].values())
+                if total:
+                    print(f"Aufbewahrung: {total} abgelaufene Datensätze gelöscht, "
+                          f"{result['freed_pages']} Seiten freigegeben")
+            except Exception as e:
+                metrics.record_error("retention", f"Fehler bei der Kompaktierung: {e}")
+            self.stop_event.wait(self.interval)
+        db.connection.close()
+
+
+_compactor = None
+_compactor_lock = threading.Lock()
+
+
+def start_background_compaction(db_file="sensors.db", interval=3600.0):
+    """
+    Startet den prozessweiten RetentionCompactor, falls er noch nicht läuft.
+    Streamlit führt die Seiten bei jedem Rerun neu aus, der Compactor wird aber nur einmal gestartet.
+
+    :return: Der laufende RetentionCompactor.
+    """
+    global _compactor
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = RetentionCompactor(db_file, interval)
+    return _compactor
@@ -0,0 +1,129 @@
+"""
+Inkrementell gepflegte Aggregat-Tabelle (Rollups) für die Sensor-Daten.
+
+Für jede Messgröße (siehe METRICS) werden pro Raum Minimum, Maximum, Summe und Anzahl in Minuten-,
+Stunden- und Tages-Buckets gespeichert. Die Buckets werden beim Einfügen neuer Messwerte in derselben
+Transaktion per UPSERT fortgeschrieben, ohne die Rohdaten erneut zu lesen.
+"""
+from datetime import datetime
+from database.schema import SENSOR_TABLES, METRICS, TIMESTAMP_FORMAT, to_timestamp
+
+# Auflösung -> (Bucket-Länge in Sekunden, Länge des Zeitstempel-Präfixes, Auffüllung, SQLite-Format)
+ROLLUP_RESOLUTIONS = {
+    "minute": (60, 16, ":00", "%Y-%m-%d %H:%M:00"),
+    "hour": (3600, 13, ":00:00", "%Y-%m-%d %H:00:00"),
+    "day": (86400, 10, " 00:00:00", "%Y-%m-%d 00:00:00"),
+}
+
+
+def create_rollup_table(connection):
+    """
+    Erstellt die Tabelle sensor_rollups und befüllt sie einmalig aus den vorhandenen Rohdaten.
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS sensor_rollups (
+            resolution TEXT NOT NULL,
+            room_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            bucket DATETIME NOT NULL,
+            min_value REAL NOT NULL,
+            max_value REAL NOT NULL,
+            sum_value REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (resolution, room_id, metric, bucket)
+        ) WITHOUT ROWID
+    """)
+
+    for metric, (table, column) in METRICS.items():
+        for resolution, (_, _, _, sql_format) in ROLLUP_RESOLUTIONS.items():
+            connection.execute(f"""
+                INSERT OR REPLACE INTO sensor_rollups
+                    (resolution, room_id, metric, bucket, min_value, max_value, sum_value, count)
+                SELECT ?, room_id, ?, strftime('{sql_format}', timestamp),
+                       MIN({column}), MAX({column}), SUM({column}), COUNT({column})
+                FROM {table}
+                WHERE room_id IS NOT NULL AND timestamp IS NOT NULL AND {column} IS NOT NULL
+                GROUP BY room_id, strftime('{sql_format}', timestamp)
+            """, (resolution, metric))
+
+
+def bucket_of(timestamp, resolution):
+    """
+    Gibt den Beginn des Buckets zurück, in den ein Zeitstempel fällt.
+
+    :param timestamp: Der Zeitstempel als String "YYYY-MM-DD HH:MM:SS".
+    :param resolution: Die Auflösung ("minute", "hour" oder "day").
+    :return: Der Bucket-Beginn als String.
+    """
+    _, prefix_length, suffix, _ = ROLLUP_RESOLUTIONS[resolution]
+    return timestamp[:prefix_length] + suffix
+
+
+def update_rollups(connection, table, rows):
+    """
+    Schreibt die Rollups für frisch eingefügte Messwerte fort. Die Messwerte werden zuerst im Speicher
+    je Bucket zusammengefasst, sodass ein Batch nur wenige UPSERTs auslöst.
+    Muss innerhalb der Transaktion aufgerufen werden, in der die Rohdaten eingefügt wurden.
+
+    :param connection: Die SQLite-Verbindung.
+    :param table: Der Name der Sensor-Tabelle.
+    :param rows: Liste von Tupeln (room_id, timestamp, value1, value2).
+    """
+    metrics = [
+        (metric, SENSOR_TABLES[table].index(column))
+        for metric, (metric_table, column) in METRICS.items() if metric_table == table
+    ]
+
+    aggregates = {}
+    for row in rows:
+        room_id, timestamp = row[0], row[1]
+        for metric, value_index in metrics:
+            value = row[2 + value_index]
+            if value is None:
+                continue
+            value = float(value)
+            for resolution in ROLLUP_RESOLUTIONS:
+                key = (resolution, room_id, metric, bucket_of(timestamp, resolution))
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregates[key] = [value, value, value, 1]
+                else:
+                    aggregate[0] = min(aggregate[0], value)
+                    aggregate[1] = max(aggregate[1], value)
+                    aggregate[2] += value
+                    aggregate[3] += 1
+
+    if not aggregates:
+        return
+
+    connection.executemany("""
+        INSERT INTO sensor_rollups (resolution, room_id, metric, bucket, min_value, max_value, sum_value, count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (resolution, room_id, metric, bucket) DO UPDATE SET
+            min_value = MIN(min_value, excluded.min_value),
+            max_value = MAX(max_value, excluded.max_value),
+            sum_value = sum_value + excluded.sum_value,
+            count = count + excluded.count
+    """, [key + tuple(aggregate) for key, aggregate in aggregates.items()])
+
+
+def choose_resolution(start, end, min_points=100):
+    """
+    Wählt die gröbste Auflösung, die für den Zeitraum noch mindestens min_points Buckets liefert.
+
+    :param start: Beginn des Zeitraums (datetime oder Zeitstempel-String).
+    :param end: Ende des Zeitraums (datetime oder Zeitstempel-String).
+    :param min_points: Gewünschte Mindestanzahl an Datenpunkten (Standard: 100).
+    :return: Die Auflösung ("minute", "hour" oder "day").
+    """
+    span = (
+        datetime.strptime(to_timestamp(end)[:19], TIMESTAMP_FORMAT)
+        - datetime.strptime(to_timestamp(start)[:19], TIMESTAMP_FORMAT)
+    ).total_seconds()
+
+    for resolution in ("day", "hour"):
+        if span / ROLLUP_RESOLUTIONS[resolution][0] >= min_points:
+            return resolution
+    return "minute"
@@ -0,0 +1,113 @@
+"""
+Gemeinsame Schema-Konstanten und Hilfsfunktionen der Sensor-Datenbank.
+"""
+import calendar
+from datetime import datetime, timezone
+
+# Wertespalten je Sensor-Tabelle (value1, value2)
+SENSOR_TABLES = {
+    "dht22_data": ("temperature", "humidity"),
+    "flame_sensor_data": ("fire_detected", "raw_value"),
+    "gas_sensor_data": ("ppm", "raw_value"),
+    "light_sensor_data": ("lux", "raw_value"),
+}
+
+# Auswertbare Messgrößen: Name -> (Tabelle, Spalte)
+METRICS = {
+    "temperature": ("dht22_data", "temperature"),
+    "humidity": ("dht22_data", "humidity"),
+    "fire_detected": ("flame_sensor_data", "fire_detected"),
+    "ppm": ("gas_sensor_data", "ppm"),
+    "lux": ("light_sensor_data", "lux"),
+}
+
+# Standard-Hardware-Zuordnung eines Raums (entspricht der ursprünglichen Verkabelung)
+DEFAULT_HARDWARE = {
+    "dht22_pin": "D4",
+    "light_channel": 0,
+    "flame_channel": 1,
+    "gas_channel": 2,
+    "lcd_address": 0x27,
+    "remote_url": None,
+}
+
+# Standard-Aufbewahrungsdauer in Tagen je Datenbestand (None = unbegrenzt).
+# Rohdaten werden nach 30 Tagen gelöscht, ihre Werte bleiben in den Rollups und Sketches erhalten. Gilt nur für neue
+# Datenbanken; bestehende behalten ihre Rohdaten unbegrenzt, bis eine Dauer eingestellt wird (create_retention_table).
+DEFAULT_RETENTION = {
+    "dht22_data": 30,
+    "flame_sensor_data": 30,
+    "gas_sensor_data": 30,
+    "light_sensor_data": 30,
+    "rollups_minute": 90,
+    "rollups_hour": None,
+    "rollups_day": None,
+    "sensor_sketches": None,
+}
+
+# Kennung je Messwert-Spalte für die kompakte Speicherung in der Tabelle readings (siehe database/readings.py).
+# Die Kennungen werden in der Datenbank gespeichert und dürfen nicht mehr geändert werden.
+READING_METRIC_IDS = {
+    ("dht22_data", "temperature"): 1,
+    ("dht22_data", "humidity"): 2,
+    ("flame_sensor_data", "fire_detected"): 3,
+    ("flame_sensor_data", "raw_value"): 4,
+    ("gas_sensor_data", "ppm"): 5,
+    ("gas_sensor_data", "raw_value"): 6,
+    ("light_sensor_data", "lux"): 7,
+    ("light_sensor_data", "raw_value"): 8,
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def current_timestamp():
+    """
+    Gibt den aktuellen Zeitpunkt im selben Format wie SQLite CURRENT_TIMESTAMP zurück (UTC, "YYYY-MM-DD HH:MM:SS").
+    """
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def to_timestamp(value):
+    """
+    Wandelt einen Zeitpunkt (datetime, date oder String) in das Zeitstempel-Format der Datenbank um.
+    Zeitzonenbehaftete Werte werden nach UTC umgerechnet, naive Werte gelten bereits als UTC.
+
+    :param value: Der Zeitpunkt.
+    :return: Der Zeitstempel als String "YYYY-MM-DD HH:MM:SS".
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value.strftime("%Y-%m-%d 00:00:00")
+
+
+def to_epoch_ms(value):
+    """
+    Wandelt einen Zeitpunkt (datetime, date oder Zeitstempel-String, UTC) in Millisekunden seit 1970 um.
+    Millisekunden bleiben erhalten, bei Strings auch Sekundenbruchteile wie "YYYY-MM-DD HH:MM:SS.123".
+
+    :param value: Der Zeitpunkt.
+    :return: Die Millisekunden seit 1970-01-01 00:00:00 UTC als Ganzzahl.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return calendar.timegm(value.timetuple()) * 1000 + value.microsecond // 1000
+    text = to_timestamp(value)
+    parsed = datetime.strptime(text[:19], TIMESTAMP_FORMAT)
+    fraction = text[20:23] if text[19:20] == "." else ""
+    return calendar.timegm(parsed.timetuple()) * 1000 + (int(fraction.ljust(3, "0")) if fraction.isdigit() else 0)
+
+
+def from_epoch_ms(value):
+    """
+    Wandelt Millisekunden seit 1970 in das Zeitstempel-Format der Datenbank um.
+
+    :param value: Die Millisekunden seit 1970-01-01 00:00:00 UTC.
+    :return: Der Zeitstempel als String "YYYY-MM-DD HH:MM:SS".
+    """
+    return datetime.fromtimestamp(value / 1000, timezone.utc).strftime(TIMESTAMP_FORMAT)
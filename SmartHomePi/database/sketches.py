@@ -0,0 +1,276 @@
+"""
+Mergebare Verteilungs-Sketches je Raum, Messgröße und Tag.
+
+Für jede Messgröße werden pro Tag ein Histogramm mit festen Bins sowie ein t-Digest (Quantil-Sketch)
+gespeichert. Beide lassen sich über beliebige Tage zusammenführen, sodass Histogramme und Boxplots für
+einen Zeitraum ohne Zugriff auf die Rohdaten berechnet werden können. Die Sketches werden beim Einfügen
+neuer Messwerte in derselben Transaktion fortgeschrieben.
+"""
+import json
+import math
+from database.schema import SENSOR_TABLES, METRICS
+
+# Messgröße -> (untere Grenze, obere Grenze, Anzahl Bins); Werte außerhalb landen im ersten bzw. letzten Bin
+HISTOGRAM_BINS = {
+    "temperature": (-40.0, 80.0, 240),
+    "humidity": (0.0, 100.0, 200),
+    "lux": (0.0, 1000.0, 200),
+    "ppm": (0.0, 1000.0, 200),
+}
+
+# Kompressionsparameter des t-Digest (mehr = genauer, aber größer)
+TDIGEST_COMPRESSION = 100
+
+
+class TDigest:
+    """
+    Diese Klasse implementiert einen mergebaren t-Digest (Merging-Variante nach Dunning) zur Schätzung von Quantilen.
+    Die Werte werden zu gewichteten Zentroiden zusammengefasst; an den Rändern der Verteilung bleiben die Zentroide
+    klein, sodass auch Quantile wie 1 % oder 99 % genau bleiben.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION, centroids=None, minimum=math.inf, maximum=-math.inf):
+        """
+        :param compression: Der Kompressionsparameter (Standard: TDIGEST_COMPRESSION).
+        :param centroids: Optionale Liste von Zentroiden [Mittelwert, Gewicht].
+        :param minimum: Kleinster bisher gesehener Wert.
+        :param maximum: Größter bisher gesehener Wert.
+        """
+        self.compression = compression
+        self.centroids = centroids or []
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @property
+    def count(self):
+        return sum(weight for _, weight in self.centroids)
+
+    def add_many(self, values):
+        """
+        Fügt mehrere Werte hinzu und komprimiert anschließend.
+
+        :param values: Iterierbare Menge von Zahlen.
+        """
+        values = [float(value) for value in values]
+        if not values:
+            return
+        self.minimum = min(self.minimum, min(values))
+        self.maximum = max(self.maximum, max(values))
+        self._compress(self.centroids + [[value, 1] for value in values])
+
+    def merge(self, other):
+        """
+        Führt einen anderen t-Digest in diesen zusammen.
+
+        :param other: Der andere TDigest.
+        """
+        if not other.centroids:
+            return
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._compress(self.centroids + [list(centroid) for centroid in other.centroids])
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _k_inverse(self, k):
+        return (math.sin(min(k, self.compression / 4) * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self, centroids):
+        centroids.sort(key=lambda centroid: centroid[0])
+        total = sum(weight for _, weight in centroids)
+        result = []
+        weight_so_far = 0
+        current = list(centroids[0])
+        q_limit = self._k_inverse(self._k(0) + 1)
+
+        for mean, weight in centroids[1:]:
+            if (weight_so_far + current[1] + weight) / total <= q_limit:
+                # Zentroid in den aktuellen einrechnen (gewichteter Mittelwert)
+                current[0] += (mean - current[0]) * weight / (current[1] + weight)
+                current[1] += weight
+            else:
+                weight_so_far += current[1]
+                result.append(current)
+                q_limit = self._k_inverse(self._k(weight_so_far / total) + 1)
+                current = [mean, weight]
+
+        result.append(current)
+        self.centroids = result
+
+    def quantile(self, q):
+        """
+        Schätzt das q-Quantil der bisher gesehenen Werte.
+
+        :param q: Das Quantil zwischen 0 und 1.
+        :return: Der geschätzte Wert oder None, falls der Digest leer ist.
+        """
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        target = q * self.count
+        cumulative = 0
+        previous_center, previous_mean = 0, self.minimum
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2
+            if target <= center:
+                if center == previous_center:
+                    return mean
+                fraction = (target - previous_center) / (center - previous_center)
+                return previous_mean + fraction * (mean - previous_mean)
+            cumulative += weight
+            previous_center, previous_mean = center, mean
+
+        # Zwischen dem Zentrum des letzten Zentroids und dem Maximum interpolieren
+        if cumulative == previous_center:
+            return self.maximum
+        fraction = (target - previous_center) / (cumulative - previous_center)
+        return previous_mean + fraction * (self.maximum - previous_mean)
+
+    def to_json(self):
+        return json.dumps({
+            "c": [[round(mean, 4), weight] for mean, weight in self.centroids],
+            "min": self.minimum,
+            "max": self.maximum,
+        })
+
+    @classmethod
+    def from_json(cls, text, compression=TDIGEST_COMPRESSION):
+        data = json.loads(text)
+        return cls(compression, data["c"], data["min"], data["max"])
+
+
+def histogram_edges(metric):
+    """
+    Gibt die Bin-Grenzen des Histogramms einer Messgröße zurück.
+
+    :param metric: Die Messgröße (siehe HISTOGRAM_BINS).
+    :return: Liste mit Anzahl Bins + 1 Grenzen.
+    """
+    low, high, bins = HISTOGRAM_BINS[metric]
+    width = (high - low) / bins
+    return [low + i * width for i in range(bins + 1)]
+
+
+def _bin_index(metric, value):
+    low, high, bins = HISTOGRAM_BINS[metric]
+    index = int((value - low) / (high - low) * bins)
+    return min(max(index, 0), bins - 1)
+
+
+def create_sketch_table(connection):
+    """
+    Erstellt die Tabelle sensor_sketches und befüllt sie einmalig aus den vorhandenen Rohdaten.
+
+    :param connection: Die SQLite-Verbindung.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS sensor_sketches (
+            room_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            day DATE NOT NULL,
+            count INTEGER NOT NULL,
+            histogram TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            PRIMARY KEY (room_id, metric, day)
+        ) WITHOUT ROWID
+    """)
+
+    for metric in HISTOGRAM_BINS:
+        table, column = METRICS[metric]
+        cursor = connection.execute(f"""
+            SELECT room_id, substr(timestamp, 1, 10), {column}
+            FROM {table}
+            WHERE room_id IS NOT NULL AND timestamp IS NOT NULL AND {column} IS NOT NULL
+            ORDER BY room_id, timestamp
+        """)
+
+        # Rohdaten tageweise streamen, damit nie mehr als ein Tag im Speicher liegt
+        current_key, values = None, []
+        for room_id, day, value in cursor:
+            if (room_id, day) != current_key:
+                if values:
+                    _merge_values(connection, current_key[0], metric, current_key[1], values)
+                current_key, values = (room_id, day), []
+            values.append(value)
+        if values:
+            _merge_values(connection, current_key[0], metric, current_key[1], values)
+
+
+def _merge_values(connection, room_id, metric, day, values):
+    row = connection.execute("""
+        SELECT histogram, digest FROM sensor_sketches WHERE room_id = ? AND metric = ? AND day = ?
+    """, (room_id, metric, day)).fetchone()
+
+    if row:
+        histogram = json.loads(row[0])
+        digest = TDigest.from_json(row[1])
+    else:
+        histogram = [0] * HISTOGRAM_BINS[metric][2]
+        digest = TDigest()
+
+    for value in values:
+        histogram[_bin_index(metric, value)] += 1
+    digest.add_many(values)
+
+    connection.execute("""
+        INSERT OR REPLACE INTO sensor_sketches (room_id, metric, day, count, histogram, digest)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (room_id, metric, day, sum(histogram), json.dumps(histogram), digest.to_json()))
+
+
+def update_sketches(connection, table, rows):
+    """
+    Schreibt die Sketches für frisch eingefügte Messwerte fort (ein Lese- und Schreibzugriff je Raum, Messgröße und Tag).
+    Muss innerhalb der Transaktion aufgerufen werden, in der die Rohdaten eingefügt wurden.
+
+    :param connection: Die SQLite-Verbindung.
+    :param table: Der Name der Sensor-Tabelle.
+    :param rows: Liste von Tupeln (room_id, timestamp, value1, value2).
+    """
+    metrics = [
+        (metric, SENSOR_TABLES[table].index(column))
+        for metric, (metric_table, column) in METRICS.items()
+        if metric_table == table and metric in HISTOGRAM_BINS
+    ]
+
+    groups = {}
+    for row in rows:
+        for metric, value_index in metrics:
+            value = row[2 + value_index]
+            if value is not None:
+                groups.setdefault((row[0], metric, row[1][:10]), []).append(value)
+
+    for (room_id, metric, day), values in groups.items():
+        _merge_values(connection, room_id, metric, day, values)
+
+
+def load_distribution(connection, room_id, metric, start_day, end_day):
+    """
+    Führt die Sketches einer Messgröße über einen Zeitraum von Tagen zusammen.
+
+    :param connection: Die SQLite-Verbindung.
+    :param room_id: Die ID des Raums.
+    :param metric: Die Messgröße (siehe HISTOGRAM_BINS).
+    :param start_day: Erster Tag als String "YYYY-MM-DD".
+    :param end_day: Letzter Tag als String "YYYY-MM-DD".
+    :return: Das zusammengeführte Histogramm (Liste der Bin-Zählwerte) und der zusammengeführte TDigest.
+    """
+    if metric not in HISTOGRAM_BINS:
+        raise ValueError(f"Keine Sketches für die Messgröße: {metric}")
+
+    histogram = [0] * HISTOGRAM_BINS[metric][2]
+    digest = TDigest()
+    rows = connection.execute("""
+        SELECT histogram, digest FROM sensor_sketches
+        WHERE room_id = ? AND metric = ? AND day >= ? AND day <= ?
+    """, (room_id, metric, start_day, end_day))
+
+    for histogram_json, digest_json in rows:
+        for i, count in enumerate(json.loads(histogram_json)):
+            histogram[i] += count
+        digest.merge(TDigest.from_json(digest_json))
+
+    return histogram, digest
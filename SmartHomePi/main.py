@@ -1,72 +1,241 @@
-import time
-import board
+import os
+import socket
 import threading
-import streamlit as st
-from sensors.dht22 import DHT22Sensor
+import time
+from sensors.dht22 import DHT22Sensor, DHT22Service
 from sensors.flame_sensor import FlameSensor
 from sensors.gas_sensor import GasSensor
 from sensors.light_sensor import LightSensor
+from sensors.mcp3008 import MCP3008Reader
+from sensors.remote_source import RemoteSource
+from sensors.backends import get_default_backend
 from database.db import Database
+from database.batch_writer import BatchWriter
+from database.forwarder import start_forwarder
+from database.compression import table_settings, save_compression_settings, get_room_compression
 from sensors.lcd_display import LCDDisplay
+from utils.scheduler import DeadlineScheduler
+from utils.ring_buffer import readings_buffer
+from utils.alerts import AlertEngine, LogFileSink, LCDSink, WebhookSink
+from database.schema import to_epoch_ms
+from utils.metrics import metrics
 
-# Globale Event-Variable für den Stop-Mechanismus
-stop_thread_event = threading.Event()
+# Messwerte gepuffert über den BatchWriter schreiben (ein Commit pro Batch statt pro Messwert)
+BATCH_INGESTION = True
 
-def run_sensors(selected_room, stop_event):
-    db = Database()
+# Kompression der Rohdaten je Messgröße für alle Räume (siehe database/compression.py, z.B. DEFAULT_COMPRESSION);
+# None = die in den Einstellungen je Raum gewählte Kompression (Standard: jeden Messwert speichern).
+# Wirkt nur zusammen mit BATCH_INGESTION oder COLLECTOR_URL.
+COMPRESSION = None
 
-    # ID des ausgewählten Raums holen
-    room_id = db.get_room_id_by_name(selected_room)
+# Intervall in Sekunden, in dem je Sensor ein Messwert gespeichert wird
+SAMPLING_PERIODS = {
+    "dht22_data": 30,  # Der DHT22 liefert höchstens alle 2 Sekunden einen neuen Wert
+    "flame_sensor_data": 1,
+    "gas_sensor_data": 1,
+    "light_sensor_data": 10,
+}
+
+# Zeitlimit je Lesevorgang in Sekunden
+READ_TIMEOUTS = {
+    "dht22_data": 0.5,  # Liest nur den zwischengespeicherten Wert des DHT22Service
+    "adc": 0.5,
+}
 
-    # Sensoren initialisieren
-    dht22 = DHT22Sensor(pin=board.D4)
-    light_sensor = LightSensor(channel=0)
-    flame_sensor = FlameSensor(channel=1)
-    gas_sensor = GasSensor(channel=2)
+# Der DHT22Service misst doppelt so oft, wie gespeichert wird, und wiederholt fehlgeschlagene Messungen.
+# Gespeichert wird der letzte gültige Wert, solange er nicht älter als DHT22_MAX_AGE Sekunden ist.
+DHT22_TIMEOUT = 5.0
+DHT22_MAX_AGE = 60
 
-    # LCD Display initialisieren
-    lcd = LCDDisplay(selected_room, {"temperature": 0.0, "humidity": 0.0}, 0.0, 0.0)
+# Die ADC-Sensoren werden gemeinsam in einem Scan gelesen (siehe MCP3008Reader):
+# Scan-Intervall in Sekunden, Wandlungen je Kanal und Scan sowie Filter (None, "median" oder "ewma")
+ADC_SCAN_PERIOD = 1
+ADC_OVERSAMPLING = 4
+ADC_FILTER = "median"
 
-    # Starte die Anzeige im Hintergrund 
-    lcd_process = threading.Thread(target=lcd.run)
-    lcd_process.start()
+# Abfrageintervall für Räume mit Remote-Quelle in Sekunden
+REMOTE_PERIOD = 60
 
-    while not stop_event.is_set():  # Überprüfe regelmäßig, ob das Event gesetzt wurde
-        try:
-            # DHT22 (Temperatur/Feuchtigkeit)
-            dht_data = dht22.read_data()
-            if dht_data:
-                db.insert_data("dht22_data", room_id, dht_data["temperature"], dht_data["humidity"])
+# Alarme (siehe utils/alerts.py): Logdatei und optionaler Webhook (z.B. http://localhost:8765/alerts)
+ALERT_LOG = "alerts.log"
+ALERT_WEBHOOK_URL = os.environ.get("SMARTHOME_ALERT_WEBHOOK")
 
-                # Update die LCD-Anzeige mit den neuesten Werten
-                lcd.dht_data = dht_data
+# Mehrere Geräte: Messwerte an einen zentralen Collector liefern statt lokal zu speichern (siehe database/collector.py),
+# z.B. http://zentrale:8770/ingest. Bis zur Bestätigung bleiben sie in der lokalen Outbox (siehe database/forwarder.py).
+COLLECTOR_URL = os.environ.get("SMARTHOME_COLLECTOR")
+NODE_NAME = os.environ.get("SMARTHOME_NODE", socket.gethostname())
 
-            # Flame-Sensor (Feuer erkannt?)
-            fire_detected = flame_sensor.is_fire_detected()
-            fs_raw = flame_sensor.read_raw_value()
-            db.insert_data("flame_sensor_data", room_id, fire_detected, fs_raw)
+def create_readers(dht22_service, flame_sensor, gas_sensor, light_sensor, clock=time.monotonic):
+    """
+    Erstellt die Leseaufgaben für die angeschlossenen Sensoren. Nicht vorhandene Sensoren (None) werden übersprungen.
+    Die ADC-Sensoren teilen sich den SPI-Bus des MCP3008 und werden gemeinsam in einem Scan gelesen; jeder Sensor
+    leitet seine Werte aus demselben Rohwert ab und wird in seinem eigenen Intervall (SAMPLING_PERIODS) gespeichert.
 
-            # MQ-2 Gas-Sensor (PPM)
-            gas_level = gas_sensor.read_gas_level()
-            gas_raw = gas_sensor.read_raw_value()
-            db.insert_data("gas_sensor_data", room_id, gas_level, gas_raw)
+    :param clock: Die monotone Uhr des Schedulers (Standard: time.monotonic), nach der die Intervalle gelten.
+    :return: Dictionary {Aufgabe: (Intervall, Zeitlimit, Funktion, die {Tabellenname: (value1, value2)} zurückgibt)}
+    """
+    readers = {}
 
-            # KYR-08 Licht-Sensor (LUX)
-            light_level = light_sensor.read_light_level()
-            light_raw = light_sensor.read_raw_value()
-            db.insert_data("light_sensor_data", room_id, light_level, light_raw)
+    # DHT22 (Temperatur/Feuchtigkeit)
+    if dht22_service:
+        def read_dht22():
+            dht_data = dht22_service.latest(max_age=DHT22_MAX_AGE)
+            if not dht_data:
+                return {}
+            return {"dht22_data": (dht_data["temperature"], dht_data["humidity"])}
+        readers["dht22_data"] = (SAMPLING_PERIODS["dht22_data"], READ_TIMEOUTS["dht22_data"], read_dht22)
 
-            # Update die LCD-Anzeige mit den neuesten Licht- und Gaswerten
-            lcd.light_level = light_level
-            lcd.gas_level = gas_level
+    # Flame-Sensor (Feuer erkannt?), MQ-2 Gas-Sensor (PPM) und KYR-08 Licht-Sensor (LUX)
+    adc_sensors = {
+        table: sensor for table, sensor in (
+            ("flame_sensor_data", flame_sensor),
+            ("gas_sensor_data", gas_sensor),
+            ("light_sensor_data", light_sensor),
+        ) if sensor
+    }
+    if adc_sensors:
+        reader = MCP3008Reader([sensor.sensor for sensor in adc_sensors.values()],
+                               oversampling=ADC_OVERSAMPLING, filter=ADC_FILTER)
+        convert = {
+            "flame_sensor_data": lambda raw: flame_sensor.is_fire_detected(raw_value=raw),
+            "gas_sensor_data": lambda raw: gas_sensor.read_gas_level(raw_value=raw),
+            "light_sensor_data": lambda raw: light_sensor.read_light_level(raw_value=raw),
+        }
+        start = []
+        due = {table: 0 for table in adc_sensors}
 
-        except Exception as e:
-            print(f"Fehler beim Auslesen eines Sensors: {str(e)}")
+        def read_adc():
+            # Jeder Scan glättet die Filter; gespeichert wird je Sensor nur in seinem eigenen Intervall. Die Zeit seit
+            # dem ersten Scan stammt von der Uhr (auf das Scan-Raster gerundet), nicht aus der Zahl der Scans, damit
+            # ausgelassene Scans die Intervalle nicht verschieben; ein ausgelassener Termin holt der nächste Scan nach.
+            now = clock()
+            if not start:
+                start.append(now)
+            elapsed = round((now - start[0]) / ADC_SCAN_PERIOD) * ADC_SCAN_PERIOD
+            values = reader.scan()
+            readings = {}
+            for table, sensor in adc_sensors.items():
+                if elapsed >= due[table]:
+                    due[table] = (elapsed // SAMPLING_PERIODS[table] + 1) * SAMPLING_PERIODS[table]
+                    raw = values[sensor.sensor.channel]
+                    readings[table] = (convert[table](raw), raw)
+            return readings
+        readers["adc"] = (ADC_SCAN_PERIOD, READ_TIMEOUTS["adc"], read_adc)
 
-        time.sleep(60)
+    return readers
+
+def run_sensors(selected_room, stop_event, hardware=None, backend=None):
+    """
+    Erfasst die Messwerte eines Raums, bis stop_event gesetzt wird.
+
+    :param selected_room: Der Name des Raums.
+    :param stop_event: threading.Event zum Beenden der Erfassung.
+    :param hardware: Optionale Hardware-Zuordnung (siehe DEFAULT_HARDWARE), sonst die gespeicherte Zuordnung des Raums.
+    :param backend: Optionales Sensor-Backend (Standard: über SMARTHOME_BACKEND gewählt, siehe sensors.backends).
+    """
+    db = Database()
+    backend = backend or get_default_backend()
+
+    # ID des ausgewählten Raums holen
+    room_id = db.get_room_id_by_name(selected_room)
+    if hardware is None:
+        hardware = db.get_room_hardware(room_id)
+
+    # Ziel für die Messwerte: Collector, gepufferter Writer oder direkt die Datenbank
+    compression = None
+    config = COMPRESSION or get_room_compression(db.connection, room_id)
+    if (BATCH_INGESTION or COLLECTOR_URL) and config:
+        periods = {table: REMOTE_PERIOD for table in SAMPLING_PERIODS} if hardware["remote_url"] else SAMPLING_PERIODS
+        compression = table_settings(config, periods)
+    # Auch ohne Kompression speichern, damit Lücken ab jetzt nicht mehr als komprimiert aufgefüllt werden
+    save_compression_settings(db.connection, room_id, compression or {}, to_epoch_ms(backend.clock.timestamp()))
+    labels = {"room": selected_room}
+    if COLLECTOR_URL:
+        writer = start_forwarder(COLLECTOR_URL, NODE_NAME).writer(selected_room, compression)
+    elif BATCH_INGESTION:
+        writer = BatchWriter(stop_event=stop_event, compression=compression, labels=labels)
+    else:
+        writer = db
+    handle_seconds = metrics.histogram("smarthome_reading_handle_seconds",
+                                       "Verarbeitung eines Messwerts (Writer, Ringpuffer, Alarme, LCD)")
+
+    # Sensoren initialisieren (lokal oder über eine Remote-Quelle)
+    dht22 = dht22_service = light_sensor = flame_sensor = gas_sensor = remote_source = None
+    if hardware["remote_url"]:
+        remote_source = RemoteSource(hardware["remote_url"])
+    else:
+        if hardware["dht22_pin"]:
+            dht22 = DHT22Sensor(pin=hardware["dht22_pin"], backend=backend)
+            dht22_service = DHT22Service(dht22, interval=SAMPLING_PERIODS["dht22_data"] / 2, timeout=DHT22_TIMEOUT)
+            dht22_service.start()
+        if hardware["light_channel"] is not None:
+            light_sensor = LightSensor(channel=hardware["light_channel"], backend=backend)
+        if hardware["flame_channel"] is not None:
+            flame_sensor = FlameSensor(channel=hardware["flame_channel"], backend=backend)
+        if hardware["gas_channel"] is not None:
+            gas_sensor = GasSensor(channel=hardware["gas_channel"], backend=backend)
+
+    # LCD Display initialisieren und im Hintergrund starten
+    lcd = lcd_process = None
+    if hardware["lcd_address"] is not None:
+        lcd = LCDDisplay(selected_room, {"temperature": 0.0, "humidity": 0.0}, 0.0, 0.0,
+                         address=hardware["lcd_address"], backend=backend,
+                         buffer=readings_buffer, room_id=room_id)
+        lcd_process = threading.Thread(target=lcd.run)
+        lcd_process.start()
+
+    # Alarmregeln werden bei jedem Messwert sofort ausgewertet, nicht erst beim nächsten Speichern
+    sinks = [LogFileSink(ALERT_LOG)]
+    if lcd:
+        sinks.append(LCDSink(lcd))
+    if ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+    alerts = AlertEngine(sinks=sinks)
+
+    def handle_readings(readings):
+        started = time.perf_counter()
+        # Zeitstempel von der Uhr des Backends, damit simulierte Läufe im Zeitraffer stimmige Zeitreihen erzeugen
+        timestamp = backend.clock.timestamp()
+        ts = to_epoch_ms(timestamp)
+        for table, (value1, value2) in readings.items():
+            writer.insert_data(table, room_id, value1, value2, timestamp)
+            readings_buffer.append(room_id, table, ts, value1, value2)
+            alerts.process(room_id, selected_room, table, ts, value1, value2)
+
+        # Das LCD liest die neuesten Werte selbst aus dem Ringpuffer und muss nur neu zeichnen
+        if lcd:
+            lcd.update()
+        handle_seconds.observe(time.perf_counter() - started, **labels)
+
+    # Jeder Sensor wird mit eigenem Intervall und Zeitlimit abgetastet, bis das Stop-Event gesetzt wird
+    scheduler = DeadlineScheduler(clock=backend.clock.monotonic, speed=backend.clock.speed, labels=labels)
+    if remote_source:
+        scheduler.add_task("remote", REMOTE_PERIOD, remote_source.read_data, handle_readings,
+                           timeout=remote_source.timeout + 1)
+    else:
+        readers = create_readers(dht22_service, flame_sensor, gas_sensor, light_sensor, backend.clock.monotonic)
+        for name, (period, timeout, read) in readers.items():
+            scheduler.add_task(name, period, read, handle_readings, timeout=timeout)
+
+    # Ringpuffer der aktuellen Werte einmal aus der Datenbank füllen (Kaltstart), danach nur noch aus der Erfassung
+    readings_buffer.attach(room_id, db)
+    try:
+        scheduler.run(stop_event)
+    finally:
+        readings_buffer.detach(room_id)
 
     # WICHTIG: DHT22 muss immer mit exit geschlossen werden sonst pin 4 error + LCD cleanup
-    print("Sensorprozess gestoppt.")
-    lcd.stop()
-    dht22.exit()
-    lcd_process.join()
+    print(f"Sensorprozess für Raum {selected_room} gestoppt.")
+    alerts.close()
+    if lcd:
+        lcd.stop()
+    if dht22_service:
+        dht22_service.stop()
+    if dht22:
+        dht22.exit()
+    if lcd_process:
+        lcd_process.join()
+
+    # Restliche gepufferte Messwerte schreiben
+    if writer is not db:
+        writer.close()
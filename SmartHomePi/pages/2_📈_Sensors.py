@@ -1,50 +1,28 @@
 import streamlit as st
 from database.db import Database
+from database.schema import SENSOR_TABLES
+from utils.sensor_snapshot import SensorSnapshot, SENSOR_COLUMNS
+from utils.live_series import LiveSeries
+from utils.ring_buffer import readings_buffer
+from utils.heatmap import build_time_bucket_matrix, build_weekly_profile
+from utils.profiler import RenderProfiler, profiling_default, show_profile
 import pandas as pd
 import plotly.express as px
-import time
+import plotly.graph_objects as go
+from datetime import datetime, timedelta, timezone
 
 db = Database()
+profiler = RenderProfiler("Sensors")
 
-def get_sensor_data(room_id, sensor_table, limit=100):
-    """
-    Holt die Sensor-Daten aus der entsprechenden Tabelle basierend auf der Raumnummer.
-    
-    :param room_id: Die ID des Raums.
-    :param sensor_table: Die Tabelle, aus der die Daten abgefragt werden.
-    :param limit: Die Anzahl der Datensätze, die abgefragt werden (Standard: 100).
-    :return: Die Sensor-Daten oder eine leere Liste, falls ein Fehler auftritt.
-    """
-    try:
-        if sensor_table == 'flame_sensor_data':
-            query = f"SELECT timestamp, fire_detected FROM {sensor_table} WHERE room_id = ? ORDER BY timestamp DESC LIMIT ?"
-        elif sensor_table == 'dht22_data':
-            query = f"SELECT timestamp, temperature, humidity FROM {sensor_table} WHERE room_id = ? ORDER BY timestamp DESC LIMIT ?"
-        elif sensor_table == 'gas_sensor_data':
-            query = f"SELECT timestamp, ppm FROM {sensor_table} WHERE room_id = ? ORDER BY timestamp DESC LIMIT ?"
-        elif sensor_table == 'light_sensor_data':
-            query = f"SELECT timestamp, lux FROM {sensor_table} WHERE room_id = ? ORDER BY timestamp DESC LIMIT ?"
-        else:
-            st.error(f"Unbekannte Sensor-Tabelle: {sensor_table}")
-            return []
-        
-        result = db.connection.execute(query, (room_id, limit)).fetchall()
-        
-        if not result:
-            st.error(f"Keine Daten für Raum {room_id} und Sensor-Tabelle {sensor_table}.")
-        
-        return result
-    
-    except Exception as e:
-        st.error(f"Fehler beim Abrufen der Daten: {e}")
-        return []
+# Abstand der Aktualisierungen im Live-Modus in Sekunden
+LIVE_INTERVAL = 10
 
 def get_selected_room():
     """
     Funktion, um den Raum auszuwählen.
     Gibt den Namen des ausgewählten Raums zurück.
     """
-    rooms = db.connection.execute("SELECT id, name FROM rooms").fetchall()
+    rooms = db.reader.execute("SELECT id, name FROM rooms").fetchall()
     if not rooms:
         st.warning("Es gibt keine verfügbaren Räume. Bitte erstellen Sie zuerst einen Raum unter ⚙️ Einstellungen.")
         return None
@@ -54,37 +32,48 @@ def get_selected_room():
     
     return selected_room_name
 
-def get_sensor_metric(sensor_table, room_id):
+def get_sensor_metric(snapshot, sensor_table):
     """
     Holt den aktuellen Wert und den vorherigen Wert für einen bestimmten Sensor und berechnet die Differenz.
+    Läuft die Erfassung des Raums in diesem Prozess, kommen die Werte aus dem Ringpuffer, sonst aus dem Snapshot.
     
+    :param snapshot: Der SensorSnapshot des aktuellen Seitenaufbaus.
     :param sensor_table: Die Tabelle des Sensors (z.B. 'dht22_data' für Temperatur oder Luftfeuchtigkeit).
-    :param room_id: Die ID des Raums.
-    :return: Der aktuelle Wert, der vorherige Wert und die Differenz.
+    :return: Der aktuelle Wert und die Differenz (bei 'dht22_data' je ein Paar für Temperatur und Luftfeuchtigkeit).
     """
     # Holen der letzten beiden Werte
-    sensor_data = get_sensor_data(room_id, sensor_table, limit=2)
+    rows = readings_buffer.latest(snapshot.room_id, sensor_table, 2)
+    if rows is not None:
+        columns = ["timestamp", *SENSOR_TABLES[sensor_table]]
+        # Fehlende Werte wie im Snapshot als NaN darstellen
+        sensor_data = [dict(zip(columns, (float("nan") if value is None else value for value in row)))
+                       for row in rows]
+    else:
+        frame = snapshot.latest(sensor_table, 2)
+        sensor_data = [frame.iloc[0], frame.iloc[1]] if len(frame) >= 2 else []
     
     if len(sensor_data) < 2:
-        return None, None, None
+        if sensor_table == 'dht22_data':
+            return (None, None), (None, None)
+        return None, None
     
     current_value = sensor_data[0]
     previous_value = sensor_data[1]
     
     # Berechne die Differenz
     if sensor_table == 'dht22_data':
-        temperature_diff = current_value[1] - previous_value[1]
-        humidity_diff = current_value[2] - previous_value[2]
-        return (current_value[1], temperature_diff), (current_value[2], humidity_diff)
+        temperature_diff = current_value['temperature'] - previous_value['temperature']
+        humidity_diff = current_value['humidity'] - previous_value['humidity']
+        return (current_value['temperature'], temperature_diff), (current_value['humidity'], humidity_diff)
     elif sensor_table == 'light_sensor_data':
-        lux_diff = current_value[1] - previous_value[1]
-        return current_value[1], lux_diff
+        lux_diff = current_value['lux'] - previous_value['lux']
+        return current_value['lux'], lux_diff
     elif sensor_table == 'gas_sensor_data':
-        ppm_diff = current_value[1] - previous_value[1]
-        return current_value[1], ppm_diff
-    return None, None, None
+        ppm_diff = current_value['ppm'] - previous_value['ppm']
+        return current_value['ppm'], ppm_diff
+    return None, None
 
-def show_sensor_metrics(room_id):
+def show_sensor_metrics(snapshot):
     """
     Zeigt die Metriken für Temperatur, Luftfeuchtigkeit, Lichtintensität und Gas an und vergleicht sie mit den vorherigen Werten.
     """ 
@@ -92,19 +81,18 @@ def show_sensor_metrics(room_id):
     st.write("")
     col1, col2, col3, col4 = st.columns(4)
 
-    temp, temp_diff = get_sensor_metric('dht22_data', room_id)[0]
+    (temp, temp_diff), (humidity, humidity_diff) = get_sensor_metric(snapshot, 'dht22_data')
     if temp is not None:
         col1.metric("Temperatur (°C)", f"{temp:.1f}", f"{temp_diff:.1f}°", delta_color="normal")
 
-    humidity, humidity_diff = get_sensor_metric('dht22_data', room_id)[1]
     if humidity is not None:
         col2.metric("Luftfeuchtigkeit (%)", f"{humidity:.1f}", f"{humidity_diff:.1f}%", delta_color="normal")
 
-    lux, lux_diff = get_sensor_metric('light_sensor_data', room_id)
+    lux, lux_diff = get_sensor_metric(snapshot, 'light_sensor_data')
     if lux is not None:
         col3.metric("Lichtintensität (Lux)", f"{lux:.1f}", f"{lux_diff:.1f}", delta_color="normal")
 
-    ppm, ppm_diff = get_sensor_metric('gas_sensor_data', room_id)
+    ppm, ppm_diff = get_sensor_metric(snapshot, 'gas_sensor_data')
     if ppm is not None:
         col4.metric("Gas (ppm)", f"{ppm:.1f}", f"{ppm_diff:.1f}", delta_color="normal")
 
@@ -118,17 +106,53 @@ def get_even_spacing_for_sections(amount_of_spaces=None):
         for i in range(amount_of_spaces):
             st.write("")
 
-def refresh_data():
+def get_snapshot(db, room_id):
     """
-    Holt die neuesten Daten und sorgt dafür, dass die Seite alle 60 Sekunden aktualisiert wird.
+    Gibt den SensorSnapshot des Raums aus der Sitzung zurück. Ein vorhandener Snapshot wird nicht neu geladen,
+    es werden nur die seitdem geschriebenen Messwerte ergänzt.
+
+    :param db: Die Datenbank-Instanz.
+    :param room_id: Die ID des Raums.
     """
-    while True:
-        time.sleep(60)
-        st.rerun()
+    snapshot = st.session_state.get("snapshot")
+    with profiler.measure("dataframe"):
+        if snapshot is None or snapshot.room_id != room_id:
+            # Verteilungen kommen aus den Sketches, daher genügen die neuesten 1000 Werte
+            snapshot = SensorSnapshot(db, room_id, limit=1000)
+            st.session_state["snapshot"] = snapshot
+        else:
+            snapshot.refresh(db)
+    return snapshot
 
-def show_sensor_data_line_chart_limit(room_id):
+def show_live_sections(room_id):
     """
-    Zeigt die Sensor-Daten als Liniendiagramm an, basierend auf der Raumauswahl, dem Sensor und dem Limit.
+    Zeigt die Metriken und das Liniendiagramm an. Im Live-Modus läuft diese Funktion als Fragment alle
+    LIVE_INTERVAL Sekunden erneut, ohne die übrige Seite neu aufzubauen; dabei werden nur neue Messwerte geladen.
+
+    :param room_id: Die ID des Raums.
+    """
+    # Gelesen wird nur über db.reader: der ConnectionManager gibt jedem Thread eine eigene Leseverbindung aus dem
+    # Pool, daher kann auch ein Fragment in einem anderen Thread die Datenbank der Seite verwenden
+    # Läuft das Fragment allein neu, wird es als eigener Seitenaufbau protokolliert
+    with profiler.run(scope="live"), profiler.watch(db):
+        with profiler.section("get_snapshot"):
+            snapshot = get_snapshot(db, room_id)
+        with profiler.section("show_sensor_metrics"):
+            show_sensor_metrics(snapshot)
+
+        get_even_spacing_for_sections()
+        with profiler.section("show_sensor_data_line_chart_limit"):
+            show_sensor_data_line_chart_limit(db, room_id)
+
+def show_sensor_data_line_chart_limit(db, room_id):
+    """
+    Zeigt die Sensor-Daten als Liniendiagramm an, basierend auf der Raumauswahl, dem Sensor und dem Zeitraum.
+    Die Daten werden in der Datenbank nach Zeit gefiltert und per LTTB auf eine feste Punktzahl reduziert.
+    Reihe und Diagramm bleiben in der Sitzung erhalten; bei unveränderter Auswahl werden nur neue Messwerte
+    angehängt.
+
+    :param db: Die Datenbank-Instanz.
+    :param room_id: Die ID des Raums.
     """
     room_name = db.get_room_name_by_id(room_id)
     st.subheader(f"🗂️ Sensor-Daten für Raum: {room_name}")
@@ -149,61 +173,70 @@ def show_sensor_data_line_chart_limit(room_id):
 
     sensor_table, value_column, y_label = sensor_mapping[sensor_option]
 
-    # Maximale Anzahl der Datensätze für den ausgewählten Sensor aus der Datenbank holen
-    max_records_query = f"SELECT COUNT(*) FROM {sensor_table} WHERE room_id = ?"
-    try:
-        max_records = db.connection.execute(max_records_query, (room_id,)).fetchone()[0]
-    except Exception as e:
-        st.error(f"Fehler beim Abrufen der Datensatzanzahl: {e}")
-        return
-
-    # Slider für die Anzahl der Datensätze
-    limit = st.slider(
-        "Anzahl der anzuzeigenden Datensätze",
-        min_value=1,
-        max_value=max_records,
-        value=min(100, max_records),  # Standardwert ist 100 oder weniger, falls weniger Datensätze vorhanden sind
-        step=1
+    # Zeitraum und maximale Punktzahl für das Diagramm
+    time_ranges = {
+        "Letzte Stunde": timedelta(hours=1),
+        "Letzte 24 Stunden": timedelta(days=1),
+        "Letzte 7 Tage": timedelta(days=7),
+        "Letzte 30 Tage": timedelta(days=30),
+        "Gesamter Verlauf": None,
+    }
+    time_range = st.selectbox("Zeitraum auswählen", list(time_ranges), index=1)
+    max_points = st.slider(
+        "Maximale Anzahl der anzuzeigenden Datenpunkte",
+        min_value=50,
+        max_value=2000,
+        value=500,
+        step=50
     )
 
-    sensor_data = get_sensor_data(room_id, sensor_table, limit)
-
-    if not sensor_data:
-        st.warning(f"Keine Daten für den Sensor {sensor_option}.")
+    key = (room_id, value_column, time_range, max_points)
+    try:
+        with profiler.measure("dataframe"):
+            series = st.session_state.get("line_chart_series")
+            if series is None or st.session_state.get("line_chart_key") != key:
+                series = LiveSeries(db, room_id, value_column, time_ranges[time_range], max_points)
+                st.session_state["line_chart_series"] = series
+                st.session_state["line_chart_key"] = key
+            else:
+                series.refresh(db)
+    except Exception as e:
+        st.error(f"Fehler beim Abrufen der Daten: {e}")
         return
 
-    # Daten in DataFrame umwandeln
-    if sensor_table == 'dht22_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'temperature', 'humidity'])
-    elif sensor_table == 'flame_sensor_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'fire_detected'])
-    elif sensor_table == 'gas_sensor_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'ppm'])
-    elif sensor_table == 'light_sensor_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'lux'])
-
-    # Zeitstempel umwandeln und leere DataFrame überprüfen
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = series.frame
     if df.empty:
-        st.warning("Keine Daten zum Anzeigen.")
+        st.warning(f"Keine Daten für den Sensor {sensor_option} im gewählten Zeitraum.")
         return
 
-    # Plotly-Diagramm erstellen
-    fig = px.line(
-        df, 
-        x='timestamp', 
-        y=value_column, 
-        title=f"{sensor_option} über die Zeit",
-        labels={'timestamp': 'Zeit', value_column: y_label},
-        markers=True
-    )
+    cached = st.session_state.get("line_chart_figure")
+    with profiler.measure("figure"):
+        if cached is not None and cached[0] == (key, series.version):
+            fig = cached[1]
+        elif cached is not None and cached[0][0] == key:
+            # Gleiche Auswahl, nur neue Werte: vorhandenes Diagramm weiterverwenden und die Daten ersetzen
+            fig = cached[1]
+            fig.update_traces(x=df['timestamp'], y=df[value_column],
+                              mode="lines+markers" if len(df) <= 100 else "lines")
+        else:
+            # Plotly-Diagramm erstellen (Marker nur bei wenigen Punkten)
+            fig = px.line(
+                df, 
+                x='timestamp', 
+                y=value_column, 
+                title=f"{sensor_option} über die Zeit",
+                labels={'timestamp': 'Zeit', value_column: y_label},
+                markers=len(df) <= 100
+            )
+    st.session_state["line_chart_figure"] = ((key, series.version), fig)
     
     # Diagramm in der App anzeigen
-    st.plotly_chart(fig, use_container_width=True)
+    profiler.plotly_chart(fig, use_container_width=True)
 
 def show_area_graph_with_filters(room_id):
     """
     Zeigt einen Area-Graph mit Sensor- und Datumsauswahl an, wobei die Felder neben dem Graphen angeordnet sind.
+    Die verfügbaren Tage kommen aus den Tages-Rollups, die Werte je Tag werden in SQL gefiltert und per LTTB reduziert.
     :param room_id: Die ID des Raums.
     """
     st.header("📅 Graph mit genauer Datumsauswahl")
@@ -230,26 +263,12 @@ def show_area_graph_with_filters(room_id):
         return
 
     sensor_table, value_column, y_label = sensor_mapping[sensor_option]
-    sensor_data = get_sensor_data(room_id, sensor_table, limit=100000)
+    available_dates = db.get_available_days(room_id, value_column)
 
-    if not sensor_data:
+    if not available_dates:
         col1.warning("Keine Sensordaten verfügbar.")
         return
 
-    # Daten in DataFrame laden
-    if sensor_table == 'dht22_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'temperature', 'humidity'])
-    elif sensor_table == 'flame_sensor_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'fire_detected'])
-    elif sensor_table == 'gas_sensor_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'ppm'])
-    elif sensor_table == 'light_sensor_data':
-        df = pd.DataFrame(sensor_data, columns=['timestamp', 'lux'])
-
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['date'] = df['timestamp'].dt.date  # Nur das Datum extrahieren
-    available_dates = df['date'].drop_duplicates().sort_values()
-
     with col1:
         # Auswahl der Anzahl der Tage
         num_days = st.number_input(
@@ -271,188 +290,184 @@ def show_area_graph_with_filters(room_id):
             key="date_multiselect_key"
         )
 
-    # Daten nach den ausgewählten Tagen filtern
-    filtered_df = df[df['date'].isin(selected_dates)]
+    # Nur die ausgewählten Tage abfragen, Punktbudget gleichmäßig auf die Tage verteilen
+    sensor_data = []
+    with profiler.measure("dataframe"):
+        if selected_dates:
+            points_per_day = max(50, 1000 // len(selected_dates))
+            for date in sorted(selected_dates):
+                sensor_data += db.get_series(
+                    room_id, value_column, f"{date} 00:00:00", f"{date} 23:59:59", max_points=points_per_day
+                )
+        filtered_df = pd.DataFrame(sensor_data, columns=['timestamp', 'value'])
+        filtered_df['timestamp'] = pd.to_datetime(filtered_df['timestamp'])
 
     with col2:
         if not filtered_df.empty:
-            # Spalte 'value' dynamisch erstellen basierend auf dem ausgewählten Sensor
-            filtered_df['value'] = filtered_df[value_column]  # 'value' auf den Wert des gewählten Sensors setzen
-
             # Area-Graph anzeigen
-            fig = px.area(
-                filtered_df,
-                x='timestamp',
-                y='value',
-                labels={'value': y_label, 'timestamp': 'Zeitpunkt'},
-                markers=True
-            )
-            st.plotly_chart(fig)
+            with profiler.measure("figure"):
+                fig = px.area(
+                    filtered_df,
+                    x='timestamp',
+                    y='value',
+                    labels={'value': y_label, 'timestamp': 'Zeitpunkt'},
+                    markers=len(filtered_df) <= 100
+                )
+            profiler.plotly_chart(fig)
         else:
             st.warning("Keine Daten für die ausgewählten Tage.")
 
 def show_sensor_heatmap(room_id):
     """
     Zeigt eine interaktive Heatmap der Sensorwerte an, die über verschiedene Sensoren und Zeiträume hinweg aggregiert sind.
+    Alle Sensoren werden in gemeinsame Zeit-Buckets gemittelt, alternativ als Tagesprofil (Stunde × Wochentag).
     
     :param room_id: Die ID des Raums, für den die Heatmap erstellt werden soll.
     """
-    sensor_data = {
-        'Temperatur': get_sensor_data(room_id, 'dht22_data', limit=100000),
-        'Luftfeuchtigkeit': get_sensor_data(room_id, 'dht22_data', limit=100000),
-        'Lichtintensität': get_sensor_data(room_id, 'light_sensor_data', limit=100000),
-        'Gas': get_sensor_data(room_id, 'gas_sensor_data', limit=100000),
-    }
-
-    if not any(sensor_data.values()):
-        st.warning("Keine Sensordaten verfügbar.")
-        return
-
-    df = pd.DataFrame()
-
-    # Daten aus Tabellen holen
-    temp_data = pd.DataFrame(sensor_data['Temperatur'], columns=['timestamp', 'temperature', 'humidity'])
-    if not temp_data.empty:
-        df['Temperatur'] = temp_data['temperature']
-        df['Luftfeuchtigkeit'] = temp_data['humidity']
-
-    lux_data = pd.DataFrame(sensor_data['Lichtintensität'], columns=['timestamp', 'lux'])
-    if not lux_data.empty:
-        df['Lichtintensität'] = lux_data['lux']
-
-    gas_data = pd.DataFrame(sensor_data['Gas'], columns=['timestamp', 'ppm'])
-    if not gas_data.empty:
-        df['Gas'] = gas_data['ppm']
-
-    # Zeitstempel in das richtige Format umwandeln
-    df['timestamp'] = pd.to_datetime(temp_data['timestamp'])
-    df.set_index('timestamp', inplace=True)
-
-    # Heatmap-Daten vorbereiten, falls keine Daten vorhanden sind, wird eine Warnung ausgegeben
-    if df.empty:
-        st.warning("Keine Daten zum Erstellen einer Heatmap.")
-        return
-
-    # Interaktive Heatmap mit Plotly erstellen
     st.header("Interaktive Heatmap der Sensorwerte")
 
-    fig = px.imshow(
-        df.transpose(),  # Transponieren, um Sensoren auf der y-Achse anzuzeigen
-        labels={'x': 'Zeit', 'y': 'Sensoren'},
-        color_continuous_scale='Viridis',
-        color_continuous_midpoint=500,  # Mittelwert für eine feinere Abstufung
-        range_color=[0, 1000],  # Wertebereich für die Farbskala
-        aspect='auto'  # Automatische Skalierung
-    )
+    col1, col2, col3 = st.columns(3)
+    view = col1.radio("Ansicht", ["Zeitverlauf", "Tagesprofil (Stunde × Wochentag)"], key="heatmap_view_key")
+    num_days = col2.number_input("Anzahl der letzten Tage", min_value=1, max_value=365, value=7, key="heatmap_days_key")
+
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=num_days)
+    metrics = {name: column for name, (_, column) in SENSOR_COLUMNS.items()}
+
+    if view == "Zeitverlauf":
+        bucket_options = {"5 Minuten": 5, "15 Minuten": 15, "1 Stunde": 60, "1 Tag": 1440}
+        bucket = col3.selectbox("Zeitraster", list(bucket_options), index=2, key="heatmap_bucket_key")
+        with profiler.measure("dataframe"):
+            df = build_time_bucket_matrix(db, room_id, metrics, start, end, bucket_options[bucket])
+
+        if df.empty:
+            st.warning("Keine Daten zum Erstellen einer Heatmap.")
+            return
+
+        with profiler.measure("dataframe"):
+            # Jede Zeile auf 0..1 normieren, damit Sensoren mit unterschiedlichen Einheiten vergleichbar sind
+            row_min = df.min(axis=1)
+            row_range = (df.max(axis=1) - row_min).replace(0, 1)
+            normalized = df.sub(row_min, axis=0).div(row_range, axis=0)
+
+        with profiler.measure("figure"):
+            fig = px.imshow(
+                normalized,
+                labels={'x': 'Zeit', 'y': 'Sensoren', 'color': 'Relativer Wert'},
+                color_continuous_scale='Viridis',
+                range_color=[0, 1],
+                aspect='auto'  # Automatische Skalierung
+            )
+            # Tatsächliche Messwerte im Tooltip anzeigen
+            fig.update_traces(
+                customdata=df.values,
+                hovertemplate="Zeit: %{x}<br>Sensor: %{y}<br>Wert: %{customdata:.1f}<extra></extra>"
+            )
+    else:
+        sensor = col3.selectbox("Sensor", list(metrics), key="heatmap_sensor_key")
+        with profiler.measure("dataframe"):
+            df = build_weekly_profile(db, room_id, metrics[sensor], start, end)
+
+        if df.isna().all().all():
+            st.warning("Keine Daten zum Erstellen einer Heatmap.")
+            return
+
+        with profiler.measure("figure"):
+            fig = px.imshow(
+                df,
+                labels={'x': 'Stunde (UTC)', 'y': 'Wochentag', 'color': sensor},
+                color_continuous_scale='Viridis',
+                aspect='auto'
+            )
 
-    # Farbskala für feinere Abstufungen (bis 1000)
-    fig.update_layout(
-        coloraxis_colorbar_tickvals=[0, 250, 500, 750, 1000],  # Tick-Werte definieren
-        coloraxis_colorbar_ticktext=['0', '250', '500', '750', '1000']  # Tick-Beschriftungen
-    )
+    profiler.plotly_chart(fig)
 
-    st.plotly_chart(fig)
+def get_distribution_range():
+    """
+    Auswahl des Zeitraums (in Tagen) für Histogramme und Boxplots.
+    :return: Erster und letzter Tag des Zeitraums (UTC).
+    """
+    num_days = st.number_input(
+        "Zeitraum für Verteilungen (letzte Tage):",
+        min_value=1,
+        max_value=3650,
+        value=30,
+        key="distribution_days_key"
+    )
+    end_day = datetime.now(timezone.utc).date()
+    return end_day - timedelta(days=num_days - 1), end_day
 
-def show_sensor_histogram(room_id):
+def show_sensor_histogram(room_id, start_day, end_day):
     """
     Zeigt ein Histogramm zur Verteilung der Sensordaten für verschiedene Sensoren an, das die Häufigkeit der Werte über verschiedene Intervalle hinweg darstellt.
+    Die Verteilung wird aus den Tages-Sketches zusammengeführt und nicht aus den Rohdaten berechnet.
     
     :param room_id: Die ID des Raums, für den das Histogramm erstellt werden soll.
+    :param start_day: Erster Tag des Zeitraums.
+    :param end_day: Letzter Tag des Zeitraums.
     """
-    sensor_data = {
-        'Temperatur': get_sensor_data(room_id, 'dht22_data', limit=100000),
-        'Luftfeuchtigkeit': get_sensor_data(room_id, 'dht22_data', limit=100000),
-        'Lichtintensität': get_sensor_data(room_id, 'light_sensor_data', limit=100000),
-        'Gas': get_sensor_data(room_id, 'gas_sensor_data', limit=100000),
-    }
-
-    if not any(sensor_data.values()):
-        st.warning("Keine Sensordaten verfügbar.")
-        return
-
-    df = pd.DataFrame()
-
-    # Daten aus Tabellen holen
-    temp_data = pd.DataFrame(sensor_data['Temperatur'], columns=['timestamp', 'temperature', 'humidity'])
-    if not temp_data.empty:
-        df['Temperatur'] = temp_data['temperature']
-        df['Luftfeuchtigkeit'] = temp_data['humidity']
-
-    lux_data = pd.DataFrame(sensor_data['Lichtintensität'], columns=['timestamp', 'lux'])
-    if not lux_data.empty:
-        df['Lichtintensität'] = lux_data['lux']
+    with profiler.measure("dataframe"):
+        distributions = {
+            sensor: db.get_distribution(room_id, column, start_day, end_day)
+            for sensor, (_, column) in SENSOR_COLUMNS.items()
+        }
 
-    gas_data = pd.DataFrame(sensor_data['Gas'], columns=['timestamp', 'ppm'])
-    if not gas_data.empty:
-        df['Gas'] = gas_data['ppm']
-
-    if df.empty:
+    if not any(distributions.values()):
         st.warning("Keine Sensordaten zum Erstellen der Histogramme.")
         return
 
     # Erstelle die Histogramme für jeden Sensor
     st.header("🔂 Histogramme der Sensordaten")
 
-    for sensor in df.columns:
-        fig = px.histogram(
-            df, 
-            x=sensor, 
-            nbins=30,  # Anzahl der Bins für die Aufteilung
-            title=f"Verteilung der {sensor} Werte",
-            labels={sensor: f"{sensor} Wert"},
-            color_discrete_sequence=['#FF7F46']  # Farbwahl für das Histogramm
-        )
-        st.plotly_chart(fig)
+    for sensor, distribution in distributions.items():
+        if distribution is None:
+            continue
+
+        with profiler.measure("dataframe"):
+            # Leere Bins an den Rändern abschneiden
+            counts = distribution["histogram"]
+            used = [i for i, count in enumerate(counts) if count]
+            first, last = used[0], used[-1] + 1
+            edges = distribution["edges"]
+            df = pd.DataFrame({
+                sensor: [(edges[i] + edges[i + 1]) / 2 for i in range(first, last)],
+                'Anzahl': counts[first:last],
+            })
+
+        with profiler.measure("figure"):
+            fig = px.bar(
+                df,
+                x=sensor,
+                y='Anzahl',
+                title=f"Verteilung der {sensor} Werte",
+                labels={sensor: f"{sensor} Wert"},
+                color_discrete_sequence=['#FF7F46']  # Farbwahl für das Histogramm
+            )
+            fig.update_layout(bargap=0)
+        profiler.plotly_chart(fig)
 
-def show_sensor_boxplots(room_id):
+def show_sensor_boxplots(room_id, start_day, end_day):
     """
-    Zeigt Boxplots für die Verteilung der Sensordaten an, inklusive Quartilen, Median und Ausreißern,
-    basierend auf der Auswahl des Benutzers (nur 1 Sensor).
+    Zeigt Boxplots für die Verteilung der Sensordaten an, inklusive Quartilen, Median und Whiskern,
+    basierend auf der Auswahl des Benutzers (nur 1 Sensor). Die Quantile stammen aus den zusammengeführten
+    t-Digest-Sketches und decken damit den gesamten gewählten Zeitraum ab.
     
     :param room_id: Die ID des Raums, für den die Boxplots erstellt werden sollen.
+    :param start_day: Erster Tag des Zeitraums.
+    :param end_day: Letzter Tag des Zeitraums.
     """
-    sensor_data = {
-        'Temperatur': get_sensor_data(room_id, 'dht22_data', limit=1000),
-        'Luftfeuchtigkeit': get_sensor_data(room_id, 'dht22_data', limit=1000),
-        'Lichtintensität': get_sensor_data(room_id, 'light_sensor_data', limit=1000),
-        'Gas': get_sensor_data(room_id, 'gas_sensor_data', limit=1000),
-    }
-
-    if not any(sensor_data.values()):
-        st.warning("Keine Sensordaten verfügbar.")
-        return
-
-    # Daten aus Tabellen holen
-    df = pd.DataFrame()
-
-    temp_data = pd.DataFrame(sensor_data['Temperatur'], columns=['timestamp', 'temperature', 'humidity'])
-    if not temp_data.empty:
-        df['Temperatur'] = temp_data['temperature']
-        df['Luftfeuchtigkeit'] = temp_data['humidity']
-
-    lux_data = pd.DataFrame(sensor_data['Lichtintensität'], columns=['timestamp', 'lux'])
-    if not lux_data.empty:
-        df['Lichtintensität'] = lux_data['lux']
-
-    gas_data = pd.DataFrame(sensor_data['Gas'], columns=['timestamp', 'ppm'])
-    if not gas_data.empty:
-        df['Gas'] = gas_data['ppm']
-
-    if df.empty:
-        st.warning("Keine Daten zum Erstellen eines Boxplots.")
-        return
-
     # Interaktive Auswahl eines Sensors
     st.header("🔲 Wähle einen Sensor für die Boxplot-Darstellung")
     sensors = ['Temperatur', 'Luftfeuchtigkeit', 'Lichtintensität', 'Gas']
     selected_sensor = st.selectbox("Wähle einen Sensor", sensors)
 
-    selected_data = df[[selected_sensor]]
+    with profiler.measure("dataframe"):
+        distribution = db.get_distribution(room_id, SENSOR_COLUMNS[selected_sensor][1], start_day, end_day)
 
     # Boxplot erstellen
     st.subheader(f"Boxplot der {selected_sensor} Werte")
 
-    if not selected_data.empty:
+    if distribution:
         # Festlegen der richtigen Einheit basierend auf dem ausgewählten Sensor
         if selected_sensor == 'Temperatur':
             y_axis_label = 'Temperatur (°C)'
@@ -463,71 +478,54 @@ def show_sensor_boxplots(room_id):
         else:  # Gas
             y_axis_label = 'Gas (ppm)'
 
-        # Plotly Boxplot mit Ausreißern und zentrierter Darstellung
-        fig = px.box(
-            selected_data,
-            labels={'value': y_axis_label, 'variable': 'Sensor'},
-            points="outliers"  # Nur Ausreißer anzeigen, keine normalen Punkte
-        )
-
-        # Logarithmische Skalierung für die y-Achse (optional, um Ausreißer zu komprimieren)
-        fig.update_layout(
-            xaxis=dict(tickmode='array', tickvals=[0]),  # Zentrieren der Boxen auf der x-Achse
-            yaxis_title=y_axis_label,
-            yaxis=dict(
-                type="log",  # Logarithmische Skalierung
-                autorange=True
+        # Whisker nach Tukey (1,5 × IQR), begrenzt auf Minimum und Maximum
+        iqr = distribution["q75"] - distribution["q25"]
+        with profiler.measure("figure"):
+            fig = go.Figure(go.Box(
+                name=selected_sensor,
+                q1=[distribution["q25"]],
+                median=[distribution["median"]],
+                q3=[distribution["q75"]],
+                lowerfence=[max(distribution["min"], distribution["q25"] - 1.5 * iqr)],
+                upperfence=[min(distribution["max"], distribution["q75"] + 1.5 * iqr)],
+            ))
+
+            # Logarithmische Skalierung für die y-Achse (optional, um Ausreißer zu komprimieren)
+            fig.update_layout(
+                yaxis_title=y_axis_label,
+                yaxis=dict(
+                    type="log",  # Logarithmische Skalierung
+                    autorange=True
+                )
             )
-        )
 
         # Boxplot anzeigen
-        st.plotly_chart(fig)
+        profiler.plotly_chart(fig)
+        st.caption(f"{distribution['count']} Messwerte, Minimum {distribution['min']:.1f}, Maximum {distribution['max']:.1f}")
     else:
         st.warning(f"Keine Daten für den Sensor {selected_sensor}.")
 
-def show_sensor_scatterplot(room_id):
-    sensor_data = {
-        'Temperatur': get_sensor_data(room_id, 'dht22_data', limit=1000),
-        'Luftfeuchtigkeit': get_sensor_data(room_id, 'dht22_data', limit=1000),
-        'Lichtintensität': get_sensor_data(room_id, 'light_sensor_data', limit=1000),
-        'Gas': get_sensor_data(room_id, 'gas_sensor_data', limit=1000),
-    }
+def show_sensor_scatterplot(snapshot):
+    """
+    Zeigt einen Scatterplot der neuesten 1000 Werte eines ausgewählten Sensors über die Zeit an.
 
-    if not any(sensor_data.values()):
+    :param snapshot: Der SensorSnapshot des aktuellen Seitenaufbaus.
+    """
+    if snapshot.is_empty():
         st.warning("Keine Sensordaten verfügbar.")
         return
 
-    # Daten aus Tabellen holen
-    df = pd.DataFrame()
-    temp_data = pd.DataFrame(sensor_data['Temperatur'], columns=['timestamp', 'temperature', 'humidity'])
-    if not temp_data.empty:
-        df['Temperatur'] = temp_data['temperature']
-        df['Luftfeuchtigkeit'] = temp_data['humidity']
-        # Sicherstellen, dass der Zeitstempel als datetime interpretiert wird
-        df['timestamp'] = pd.to_datetime(temp_data['timestamp'], errors='coerce')
-
-    lux_data = pd.DataFrame(sensor_data['Lichtintensität'], columns=['timestamp', 'lux'])
-    if not lux_data.empty:
-        df['Lichtintensität'] = lux_data['lux']
-        # Zeitstempel als datetime konvertieren
-        df['timestamp'] = pd.to_datetime(lux_data['timestamp'], errors='coerce')
-
-    gas_data = pd.DataFrame(sensor_data['Gas'], columns=['timestamp', 'ppm'])
-    if not gas_data.empty:
-        df['Gas'] = gas_data['ppm']
-        # Zeitstempel als datetime konvertieren
-        df['timestamp'] = pd.to_datetime(gas_data['timestamp'], errors='coerce')
-
-    if df.empty:
-        st.warning("Keine Daten für den Scatterplot.")
-        return
-
     # Interaktive Auswahl eines Sensors mit Radiobuttons
     st.header("Wähle einen Sensor für den Scatterplot")
     sensors = ['Temperatur', 'Luftfeuchtigkeit', 'Lichtintensität', 'Gas']
     selected_sensor = st.radio("Wähle einen Sensor", sensors)
 
-    selected_data = df[['timestamp', selected_sensor]]
+    # Zeitstempel und Werte stammen aus derselben Tabelle
+    sensor_table, value_column = SENSOR_COLUMNS[selected_sensor]
+    with profiler.measure("dataframe"):
+        selected_data = snapshot.frame(sensor_table, limit=1000)[['timestamp', value_column]].rename(
+            columns={value_column: selected_sensor}
+        )
 
     if not selected_data.empty:
         # Min- und Max-Werte des Sensors für die Farbskalierung
@@ -544,26 +542,27 @@ def show_sensor_scatterplot(room_id):
         else:  # Gas
             y_axis_label = 'Gas (ppm)'
 
-        # Scatterplot mit Plotly
-        fig = px.scatter(
-            selected_data,
-            x='timestamp',  # Verwende den Zeitstempel als x-Achse
-            y=selected_sensor,  # Sensorwerte als y-Achse
-            color=selected_sensor,  # Farbskala basierend auf den Sensorwerten
-            color_continuous_scale="Viridis",  # Farbskala, kann nach Wunsch geändert werden
-            range_color=[min_value, max_value],  # Min- und Max-Werte definieren den Farbraum
-            labels={selected_sensor: y_axis_label},
-        )
+        with profiler.measure("figure"):
+            # Scatterplot mit Plotly
+            fig = px.scatter(
+                selected_data,
+                x='timestamp',  # Verwende den Zeitstempel als x-Achse
+                y=selected_sensor,  # Sensorwerte als y-Achse
+                color=selected_sensor,  # Farbskala basierend auf den Sensorwerten
+                color_continuous_scale="Viridis",  # Farbskala, kann nach Wunsch geändert werden
+                range_color=[min_value, max_value],  # Min- und Max-Werte definieren den Farbraum
+                labels={selected_sensor: y_axis_label},
+            )
 
-        # Layout anpassen
-        fig.update_layout(
-            xaxis_title="Zeitpunkt",
-            yaxis_title=y_axis_label,
-            xaxis=dict(tickformat="%Y-%m-%d %H:%M:%S"),  # Zeitformat für x-Achse mit Datum und Zeit
-        )
+            # Layout anpassen
+            fig.update_layout(
+                xaxis_title="Zeitpunkt",
+                yaxis_title=y_axis_label,
+                xaxis=dict(tickformat="%Y-%m-%d %H:%M:%S"),  # Zeitformat für x-Achse mit Datum und Zeit
+            )
 
         # Scatterplot anzeigen
-        st.plotly_chart(fig)
+        profiler.plotly_chart(fig)
     else:
         st.warning(f"Keine Daten für den Sensor {selected_sensor}.")
 def main():
@@ -577,37 +576,53 @@ def main():
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
     st.title("📊 Sensor-Daten Visualisierung")
-    selected_room_name = get_selected_room()
-
-    if selected_room_name:
-        room_id = db.get_room_id_by_name(selected_room_name)
-
-        # Sensor-Metriken anzeigen
-        show_sensor_metrics(room_id)
-
-        # Sensor-Daten anzeigen
-        get_even_spacing_for_sections()
-        show_sensor_data_line_chart_limit(room_id)
-
-        # Sensor-Daten nach Datum filtern
-        get_even_spacing_for_sections()
-        show_area_graph_with_filters(room_id)
 
-        # Heatmap über Verlauf
-        get_even_spacing_for_sections()
-        show_sensor_heatmap(room_id)
-
-        # Histogram um Anzahl Datenpunkte zu sehen
-        get_even_spacing_for_sections()
-        show_sensor_histogram(room_id)
-
-        # Boxplot um Quartile, Median etc. auszugeben
-        get_even_spacing_for_sections()
-        show_sensor_boxplots(room_id)
-
-        # Scatterplot für die Sensorwerte anzeigen
-        get_even_spacing_for_sections()
-        show_sensor_scatterplot(room_id)
+    # Zeiten je Abschnitt messen (SQL, DataFrame, Diagramm, Serialisierung) und protokollieren
+    profiler.enabled = st.sidebar.toggle("⏱️ Render-Profiling", value=profiling_default(), key="profiling_key",
+                                         help=f"Misst den Seitenaufbau je Abschnitt und protokolliert ihn in "
+                                              f"{profiler.log_path}.")
+
+    with profiler.run(), profiler.watch(db):
+        with profiler.section("get_selected_room"):
+            selected_room_name = get_selected_room()
+
+        if selected_room_name:
+            profiler.note(room=selected_room_name)
+            room_id = db.get_room_id_by_name(selected_room_name)
+
+            # Metriken und Liniendiagramm; im Live-Modus werden nur diese Abschnitte regelmäßig aktualisiert
+            live = st.toggle("🔴 Live-Modus", key="live_mode_key",
+                             help=f"Aktualisiert Metriken und Liniendiagramm alle {LIVE_INTERVAL} Sekunden.")
+            st.fragment(show_live_sections, run_every=LIVE_INTERVAL if live else None)(room_id)
+            snapshot = st.session_state["snapshot"]
+
+            # Sensor-Daten nach Datum filtern
+            get_even_spacing_for_sections()
+            with profiler.section("show_area_graph_with_filters"):
+                show_area_graph_with_filters(room_id)
+
+            # Heatmap über Verlauf
+            get_even_spacing_for_sections()
+            with profiler.section("show_sensor_heatmap"):
+                show_sensor_heatmap(room_id)
+
+            # Histogram um Anzahl Datenpunkte zu sehen
+            get_even_spacing_for_sections()
+            with profiler.section("show_sensor_histogram"):
+                start_day, end_day = get_distribution_range()
+                show_sensor_histogram(room_id, start_day, end_day)
+
+            # Boxplot um Quartile, Median etc. auszugeben
+            get_even_spacing_for_sections()
+            with profiler.section("show_sensor_boxplots"):
+                show_sensor_boxplots(room_id, start_day, end_day)
+
+            # Scatterplot für die Sensorwerte anzeigen
+            get_even_spacing_for_sections()
+            with profiler.section("show_sensor_scatterplot"):
+                show_sensor_scatterplot(snapshot)
+
+    show_profile(profiler)
 
 if __name__ == "__main__":
     main()
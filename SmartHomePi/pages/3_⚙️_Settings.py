@@ -1,5 +1,13 @@
+import sqlite3
 import streamlit as st
 from database.db import Database
+from database.readings import migration_progress
+from database.archive import (archive_summary, get_archive_after_days, set_archive_after_days,
+                              DEFAULT_ARCHIVE_AFTER_DAYS)
+from database.retention import enable_incremental_vacuum
+from database.schema import SENSOR_TABLES
+from database.compression import (COMPRESSION_METHODS, DEFAULT_COMPRESSION, get_room_compression,
+                                  set_room_compression)
 
 db = Database()
 
@@ -26,7 +34,7 @@ def main():
 
     # Alle Räume anzeigen lassen
     st.header("Vorhandene Räume")
-    rooms = db.connection.execute("SELECT id, name FROM rooms").fetchall()
+    rooms = db.reader.execute("SELECT id, name FROM rooms").fetchall()
     for room_id, room_name in rooms:
         with st.container():
             st.subheader(room_name)
@@ -35,14 +43,185 @@ def main():
                 st.write(f"**ID:** {room_id}")
             with col2:
                 if st.button("🗑️ Entfernen", key=f"delete_{room_id}"):
-                    db.connection.execute("DELETE FROM rooms WHERE id = ?", (room_id,))
-                    db.connection.execute("DELETE FROM dht22_data WHERE room_id = ?", (room_id,))
-                    db.connection.execute("DELETE FROM flame_sensor_data WHERE room_id = ?", (room_id,))
-                    db.connection.execute("DELETE FROM gas_sensor_data WHERE room_id = ?", (room_id,))
-                    db.connection.execute("DELETE FROM light_sensor_data WHERE room_id = ?", (room_id,))
-                    db.connection.commit()
+                    db.delete_room(room_id)
                     
                     st.rerun()
-                    
+
+            show_hardware_settings(room_id)
+            show_compression_settings(room_id)
+
+    show_retention_settings()
+    show_storage_settings()
+
+def show_hardware_settings(room_id):
+    """
+    Zeigt die Hardware-Zuordnung eines Raums (GPIO-Pin, ADC-Kanäle, LCD, Remote-Quelle) zum Bearbeiten an.
+    Änderungen gelten beim nächsten Start der Erfassung für den Raum.
+
+    :param room_id: Die ID des Raums.
+    """
+    hardware = db.get_room_hardware(room_id)
+    channels = [None] + list(range(8))
+
+    def channel_label(channel):
+        return "nicht angeschlossen" if channel is None else f"Kanal {channel}"
+
+    with st.expander("🔌 Hardware-Zuordnung"):
+        dht22_pin = st.text_input("DHT22-Pin (leer = keiner)", value=hardware["dht22_pin"] or "", key=f"dht22_pin_{room_id}")
+        col1, col2, col3 = st.columns(3)
+        light_channel = col1.selectbox("Lichtsensor", channels, index=channels.index(hardware["light_channel"]),
+                                       format_func=channel_label, key=f"light_channel_{room_id}")
+        flame_channel = col2.selectbox("Flammensensor", channels, index=channels.index(hardware["flame_channel"]),
+                                       format_func=channel_label, key=f"flame_channel_{room_id}")
+        gas_channel = col3.selectbox("Gassensor", channels, index=channels.index(hardware["gas_channel"]),
+                                     format_func=channel_label, key=f"gas_channel_{room_id}")
+        lcd_address = st.text_input("LCD I2C-Adresse (leer = kein LCD)",
+                                    value="" if hardware["lcd_address"] is None else hex(hardware["lcd_address"]),
+                                    key=f"lcd_address_{room_id}")
+        remote_url = st.text_input("Remote-Quelle (URL, ersetzt die lokalen Sensoren)", value=hardware["remote_url"] or "",
+                                   key=f"remote_url_{room_id}")
+
+        if st.button("💾 Speichern", key=f"save_hardware_{room_id}"):
+            try:
+                db.set_room_hardware(room_id, {
+                    "dht22_pin": dht22_pin.strip() or None,
+                    "light_channel": light_channel,
+                    "flame_channel": flame_channel,
+                    "gas_channel": gas_channel,
+                    "lcd_address": int(lcd_address, 0) if lcd_address.strip() else None,
+                    "remote_url": remote_url.strip() or None,
+                })
+                st.success("Hardware-Zuordnung gespeichert.")
+            except ValueError:
+                st.error("Ungültige LCD-Adresse (z.B. 0x27).")
+
+def show_compression_settings(room_id):
+    """
+    Zeigt die Kompression der Rohdaten eines Raums je Messgröße zum Bearbeiten an (standardmäßig aus).
+    Änderungen gelten beim nächsten Start der Erfassung für den Raum.
+
+    :param room_id: Die ID des Raums.
+    """
+    labels = {
+        "temperature": "Temperatur (°C)",
+        "humidity": "Luftfeuchtigkeit (%)",
+        "fire_detected": "Feuer erkannt",
+        "ppm": "Gas (ppm)",
+        "lux": "Licht (lux)",
+    }
+    method_labels = {"deadband": "Totband", "swinging_door": "Swinging-Door"}
+    compression = get_room_compression(db.reader, room_id) or {}
+
+    with st.expander("🗜️ Kompression der Rohdaten"):
+        st.caption("Speichert nur die Messwerte, die nötig sind, um den Verlauf innerhalb der Toleranz "
+                   "wiederherzustellen. Ausgebliebene Messwerte werden beim Lesen nicht aufgefüllt.")
+        selected = {}
+        for metric, (default_method, default_tolerance) in DEFAULT_COMPRESSION.items():
+            method, tolerance = compression.get(metric, (default_method, default_tolerance))
+            col1, col2, col3 = st.columns([2, 2, 1])
+            enabled = col1.checkbox(labels.get(metric, metric), value=metric in compression,
+                                    key=f"compression_{metric}_{room_id}")
+            method = col2.selectbox("Verfahren", COMPRESSION_METHODS, index=COMPRESSION_METHODS.index(method),
+                                    format_func=method_labels.get, disabled=not enabled,
+                                    key=f"compression_method_{metric}_{room_id}")
+            tolerance = col3.number_input("Toleranz", min_value=0.0, value=float(tolerance), disabled=not enabled,
+                                          key=f"compression_tolerance_{metric}_{room_id}")
+            if enabled:
+                selected[metric] = (method, tolerance)
+
+        if st.button("💾 Speichern", key=f"save_compression_{room_id}"):
+            try:
+                set_room_compression(db.connection, room_id, selected)
+                st.success("Kompression gespeichert. Sie gilt ab dem nächsten Start der Erfassung.")
+            except ValueError as e:
+                st.error(f"Ungültige Einstellungen: {e}")
+
+def show_retention_settings():
+    """
+    Zeigt die Aufbewahrungsdauer je Datenbestand zum Bearbeiten an (0 = unbegrenzt).
+    Abgelaufene Daten werden vom RetentionCompactor im Hintergrund gelöscht.
+    """
+    st.header("Datenaufbewahrung")
+    labels = {
+        "dht22_data": "Rohdaten DHT22",
+        "flame_sensor_data": "Rohdaten Flammensensor",
+        "gas_sensor_data": "Rohdaten Gassensor",
+        "light_sensor_data": "Rohdaten Lichtsensor",
+        "rollups_minute": "Minuten-Aggregate",
+        "rollups_hour": "Stunden-Aggregate",
+        "rollups_day": "Tages-Aggregate",
+        "sensor_sketches": "Verteilungen (Histogramme)",
+    }
+    policies = db.get_retention_policies()
+
+    with st.expander("🗄️ Aufbewahrungsdauer in Tagen (0 = unbegrenzt)"):
+        if not any(policies.get(table) for table in SENSOR_TABLES):
+            st.caption("Rohdaten werden derzeit unbegrenzt aufbewahrt. Mit einer Aufbewahrungsdauer löscht die "
+                       "Kompaktierung ältere Rohdaten; ihre Werte bleiben in den Aggregaten erhalten.")
+        values = {}
+        col1, col2 = st.columns(2)
+        for i, (name, keep_days) in enumerate(policies.items()):
+            column = col1 if i % 2 == 0 else col2
+            values[name] = column.number_input(labels.get(name, name), min_value=0, value=keep_days or 0,
+                                               key=f"retention_{name}")
+
+        if st.button("💾 Speichern", key="save_retention"):
+            for name, keep_days in values.items():
+                db.set_retention_policy(name, keep_days or None)
+            st.success("Aufbewahrungsregeln gespeichert. Sie gelten ab dem nächsten Durchlauf der Kompaktierung.")
+
+def show_storage_settings():
+    """
+    Zeigt die Speicherart der Messwerte an und startet die Online-Migration auf die geclusterte Tabelle readings.
+    """
+    st.header("Speicherung")
+    progress = migration_progress(db.reader)
+
+    if progress["engine"] == "narrow":
+        st.write("Die Messwerte werden geclustert nach Raum und Zeit in der Tabelle readings (WITHOUT ROWID) "
+                 "gespeichert.")
+    elif progress["engine"] == "migrating":
+        total = max(progress["total"], 1)
+        st.progress(min(progress["copied"] / total, 1.0),
+                    text=f"Migration läuft: {progress['copied']} von {progress['total']} Zeilen kopiert")
+        # Eine unterbrochene Migration (z.B. nach einem Neustart) wird fortgesetzt
+        db.enable_clustered_storage()
+    else:
+        st.write("Die Messwerte werden je Sensor in eigenen Tabellen gespeichert.")
+        if st.button("🗜️ Geclusterte Speicherung aktivieren", key="migrate_storage",
+                     help="Kopiert die Messwerte in die Tabelle readings, geordnet nach Raum, Messgröße und Zeit."):
+            db.enable_clustered_storage()
+            st.success("Die Migration läuft im Hintergrund, die Erfassung wird nicht unterbrochen.")
+
+    # Ohne inkrementelles VACUUM bleibt der Speicher gelöschter Messwerte in der Datei reserviert
+    if db.reader.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        st.write("Speicher gelöschter Messwerte wird erst nach einer einmaligen Umstellung an das System zurückgegeben.")
+        if st.button("🧹 Inkrementelles VACUUM aktivieren", key="enable_vacuum",
+                     help="Schreibt die Datenbank-Datei einmal neu. Erfassung und Dashboard warten so lange."):
+            with st.spinner("Datenbank wird neu geschrieben ..."):
+                try:
+                    enable_incremental_vacuum(db.connection)
+                    st.success("Inkrementelles VACUUM ist aktiv.")
+                except sqlite3.OperationalError as e:
+                    st.error(f"Umstellung fehlgeschlagen: {e}")
+
+    # Ältere Tage lagert der RetentionCompactor ins Parquet-Archiv aus, falls aktiviert
+    archive_after_days = get_archive_after_days(db.reader)
+    with st.expander("📦 Parquet-Archiv"):
+        st.caption("Lagert Rohdaten ab einem Mindestalter aus der Datenbank in Parquet-Dateien aus. "
+                   "Die Aufbewahrungsdauer der Rohdaten gilt auch für das Archiv.")
+        enabled = st.toggle("Archiv aktivieren", value=archive_after_days is not None, key="archive_enabled")
+        days = st.number_input("Auslagern nach (Tagen)", min_value=1,
+                               value=archive_after_days or DEFAULT_ARCHIVE_AFTER_DAYS, disabled=not enabled,
+                               key="archive_after_days")
+        if st.button("💾 Speichern", key="save_archive"):
+            set_archive_after_days(db.connection, days if enabled else None)
+            st.success("Gespeichert. Die Einstellung gilt ab dem nächsten Durchlauf der Kompaktierung.")
+
+        archive = archive_summary(db.reader)
+        if archive["days"]:
+            st.caption(f"Archiv: {archive['days']} Tage, {archive['rows']} Datensätze, "
+                       f"{archive['bytes'] / 1024 / 1024:.1f} MB Parquet in {db.archive_dir}")
+
 if __name__ == "__main__":
     main()
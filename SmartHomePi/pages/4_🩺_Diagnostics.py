@@ -0,0 +1,149 @@
+import streamlit as st
+import pandas as pd
+from supervisor import supervisor
+from utils.metrics import metrics, start_metrics_exporter
+
+# Abstand der Aktualisierungen bei automatischer Aktualisierung in Sekunden
+REFRESH_INTERVAL = 5
+
+def summary_frame(histogram_name, label_names):
+    """
+    Fasst ein Histogramm je Label-Kombination als DataFrame mit Millisekunden zusammen.
+
+    :param histogram_name: Der Name des Histogramms (z.B. "smarthome_sensor_read_seconds").
+    :param label_names: Die Labels, die als Spalten ausgegeben werden (z.B. ["room", "task"]).
+    :return: DataFrame mit den Label-Spalten und Anzahl, Mittelwert, p50, p95 und Maximum in ms (leer ohne Werte).
+    """
+    histogram = metrics.get(histogram_name)
+    rows = []
+    if histogram is not None:
+        for key, summary in histogram.summary().items():
+            labels = dict(key)
+            rows.append({
+                **{name: labels.get(name, "") for name in label_names},
+                "Anzahl": summary["count"],
+                "Mittel (ms)": summary["mean"] * 1000,
+                "p50 (ms)": summary["p50"] * 1000,
+                "p95 (ms)": summary["p95"] * 1000,
+                "Max (ms)": summary["max"] * 1000,
+            })
+    return pd.DataFrame(rows)
+
+def counter_frame(counter_name, label_names, value_name):
+    """
+    Gibt die Werte eines Zählers oder Messwerts je Label-Kombination als DataFrame zurück.
+    """
+    counter = metrics.get(counter_name)
+    rows = []
+    if counter is not None:
+        for key, value in counter.values().items():
+            labels = dict(key)
+            rows.append({**{name: labels.get(name, "") for name in label_names}, value_name: value})
+    return pd.DataFrame(rows)
+
+def show_table(df, empty_text):
+    if df.empty:
+        st.caption(empty_text)
+    else:
+        st.dataframe(df, hide_index=True, use_container_width=True)
+
+def show_acquisition():
+    """
+    Zeigt Lesedauer, Jitter und verworfene Messungen je Raum und Sensor-Aufgabe an.
+    """
+    st.header("Erfassung")
+    running = supervisor.running_rooms()
+    st.write(f"**Laufende Erfassungen:** {', '.join(running) if running else 'keine'}")
+
+    st.subheader("Lesedauer je Sensor")
+    show_table(summary_frame("smarthome_sensor_read_seconds", ["room", "task"]), "Noch keine Lesevorgänge erfasst.")
+
+    st.subheader("Jitter (Verspätung gegenüber dem Termin)")
+    show_table(summary_frame("smarthome_schedule_jitter_seconds", ["room", "task"]), "Noch keine Termine erfasst.")
+
+    st.subheader("Verworfene Messungen")
+    show_table(counter_frame("smarthome_samples_dropped_total", ["room", "task", "reason"], "Anzahl"),
+               "Keine verworfenen Messungen.")
+
+    st.subheader("Verarbeitung je Messwert")
+    show_table(summary_frame("smarthome_reading_handle_seconds", ["room"]), "Noch keine Messwerte verarbeitet.")
+
+def show_database():
+    """
+    Zeigt die Schreiblatenz der Datenbank, die Länge der Schreib-Queue und die offenen Leseverbindungen an.
+    """
+    st.header("Datenbank")
+    st.subheader("INSERT und Commit je Batch")
+    frames = []
+    for name, step in (("smarthome_db_insert_seconds", "INSERT"), ("smarthome_db_commit_seconds", "Commit"),
+                       ("smarthome_writer_flush_seconds", "Batch gesamt")):
+        df = summary_frame(name, [])
+        if not df.empty:
+            df.insert(0, "Schritt", step)
+            frames.append(df)
+    show_table(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(), "Noch nichts geschrieben.")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.subheader("Schreib-Queue")
+        show_table(counter_frame("smarthome_writer_queue_depth", ["room"], "Messwerte"), "Kein BatchWriter aktiv.")
+    with col2:
+        st.subheader("Geschriebene Zeilen")
+        show_table(counter_frame("smarthome_db_rows_written_total", ["table"], "Zeilen"), "Noch nichts geschrieben.")
+    with col3:
+        st.subheader("Leseverbindungen")
+        show_table(counter_frame("smarthome_db_reader_connections", ["state"], "Verbindungen"),
+                   "Noch keine Leseverbindung geöffnet.")
+
+def show_errors():
+    """
+    Zeigt die Fehlermeldungen der Hintergrund-Threads an, neueste zuerst.
+    """
+    st.header("Fehler")
+    show_table(counter_frame("smarthome_errors_total", ["source"], "Anzahl"), "Keine Fehler seit dem Start.")
+    errors = list(metrics.errors)[::-1]
+    if errors:
+        st.dataframe(pd.DataFrame(errors, columns=["Zeitpunkt (UTC)", "Quelle", "Meldung"]),
+                     hide_index=True, use_container_width=True)
+
+def show_rendering():
+    """
+    Zeigt die Dauer des Seitenaufbaus je Abschnitt an (nur bei aktivem Render-Profiling erfasst).
+    """
+    st.header("Seitenaufbau")
+    show_table(summary_frame("smarthome_render_seconds", ["page", "section"]),
+               "Kein Seitenaufbau gemessen (Render-Profiling auf der Seite Sensors aktivieren).")
+
+def show_diagnostics():
+    show_acquisition()
+    show_database()
+    show_rendering()
+    show_errors()
+
+    with st.expander("Prometheus-Format"):
+        text = metrics.render()
+        st.download_button("⬇️ Herunterladen", text, file_name="smarthome.prom", mime="text/plain")
+        st.code(text, language="text")
+
+def main():
+    st.set_page_config(
+        page_title="Diagnostics",
+        page_icon="🩺",
+        layout="wide"
+    )
+    st.title("🩺 Diagnose")
+
+    exporter = start_metrics_exporter()
+    targets = []
+    if exporter["port"]:
+        targets.append(f"http://127.0.0.1:{exporter['port']}/metrics")
+    if exporter["textfile"]:
+        targets.append(exporter["textfile"])
+    st.caption("Messpunkte dieses Prozesses. Export: " + (", ".join(targets) if targets else
+               "nicht aktiv (SMARTHOME_METRICS_PORT bzw. SMARTHOME_METRICS_FILE setzen)"))
+
+    live = st.toggle("🔄 Automatisch aktualisieren", key="diagnostics_refresh")
+    st.fragment(show_diagnostics, run_every=REFRESH_INTERVAL if live else None)()
+
+if __name__ == "__main__":
+    main()
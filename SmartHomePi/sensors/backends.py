@@ -0,0 +1,393 @@
+"""
+Hardware-Abstraktion für die Sensoren.
+
+Die Sensor-Klassen sprechen die Geräte nicht direkt an, sondern lassen sie von einem Backend erzeugen:
+
+- HardwareBackend: die echte Hardware des Raspberry Pi (adafruit_dht, board, gpiozero, RPLCD)
+- SyntheticBackend: ein konfigurierbarer Generator für künstliche Messwerte
+- TraceReplayBackend: spielt aufgezeichnete Messwerte (CSV) wieder ab, auch schneller als in Echtzeit
+
+Jedes Backend besitzt eine Uhr. Bei simulierten Backends kann die Uhr beschleunigt laufen (speed), damit lässt
+sich die gesamte Kette Erfassung → Datenbank → Dashboard z.B. mit 100-facher Geschwindigkeit ohne Pi testen.
+"""
+import bisect
+import csv
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from database.schema import SENSOR_TABLES, DEFAULT_HARDWARE, TIMESTAMP_FORMAT, from_epoch_ms
+
+
+class Clock:
+    """
+    Uhr eines Backends. speed > 1 lässt die Zeit schneller als in Echtzeit laufen.
+    """
+
+    def __init__(self, speed=1.0, start=None):
+        """
+        :param speed: Zeitraffer-Faktor (Standard: 1.0 = Echtzeit).
+        :param start: Optionaler Startzeitpunkt der Uhr (datetime, UTC). Standard: jetzt.
+        """
+        self.speed = speed
+        self._start = start or datetime.now(timezone.utc).replace(tzinfo=None)
+        self._real_start = time.monotonic()
+
+    def monotonic(self):
+        """
+        Monotone Zeit in (simulierten) Sekunden.
+        """
+        return (time.monotonic() - self._real_start) * self.speed
+
+    def now(self):
+        """
+        Aktueller (simulierter) Zeitpunkt als datetime (UTC, ohne Zeitzone).
+        """
+        return self._start + timedelta(seconds=self.monotonic())
+
+    def timestamp(self):
+        """
+        Aktueller (simulierter) Zeitpunkt im Zeitstempel-Format der Datenbank.
+        """
+        return self.now().strftime(TIMESTAMP_FORMAT)
+
+    def sleep(self, seconds):
+        """
+        Wartet die angegebene (simulierte) Zeit.
+        """
+        time.sleep(seconds / self.speed)
+
+
+class SensorBackend:
+    """
+    Schnittstelle der Backends. Die erzeugten Geräte verhalten sich wie die der echten Bibliotheken:
+    DHT22 mit temperature, humidity und exit(), ADC-Kanal mit value (0..1), LCD mit clear(), write_string(),
+    cursor_pos und close().
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or Clock()
+
+    def dht22(self, pin):
+        raise NotImplementedError
+
+    def mcp3008(self, channel):
+        raise NotImplementedError
+
+    def lcd(self, address):
+        raise NotImplementedError
+
+
+class HardwareBackend(SensorBackend):
+    """
+    Backend für die echte Hardware des Raspberry Pi. Die Hardware-Bibliotheken werden erst bei Bedarf importiert.
+    """
+
+    def dht22(self, pin):
+        import adafruit_dht
+        import board
+        if isinstance(pin, str):
+            pin = getattr(board, pin)
+        return adafruit_dht.DHT22(pin)
+
+    def mcp3008(self, channel):
+        from gpiozero import MCP3008
+        return MCP3008(channel=channel)
+
+    def lcd(self, address):
+        from RPLCD.i2c import CharLCD
+        return CharLCD('PCF8574', address)
+
+
+class SimulatedDHT22:
+    """
+    Nachbildung von adafruit_dht.DHT22. Wirft wie das Original gelegentlich RuntimeError.
+    """
+
+    def __init__(self, read, failure_rate=0.0, rng=None):
+        """
+        :param read: Funktion, die (Temperatur, Feuchtigkeit) zurückgibt.
+        :param failure_rate: Anteil fehlschlagender Lesevorgänge (Standard: 0.0).
+        :param rng: Zufallsgenerator des Backends, damit Läufe mit demselben Startwert reproduzierbar sind.
+        """
+        self._read = read
+        self.failure_rate = failure_rate
+        self.rng = rng or random.Random()
+        self._values = None
+
+    def _measure(self):
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise RuntimeError("Checksum did not validate. Try again.")
+        self._values = self._read()
+
+    @property
+    def temperature(self):
+        self._measure()
+        return self._values[0]
+
+    @property
+    def humidity(self):
+        # Wie beim Original stammt die Feuchtigkeit aus derselben Messung wie die zuletzt gelesene Temperatur
+        if self._values is None:
+            self._measure()
+        return self._values[1]
+
+    def exit(self):
+        pass
+
+
+class SimulatedADCChannel:
+    """
+    Nachbildung eines gpiozero.MCP3008-Kanals.
+    """
+
+    def __init__(self, read):
+        self._read = read
+
+    @property
+    def value(self):
+        return min(max(self._read(), 0.0), 1.0)
+
+
+class SimulatedLCD:
+    """
+    Nachbildung von RPLCD.i2c.CharLCD (16×2). Hält den Bildschirminhalt vor und zählt die geschriebenen Zeichen,
+    damit sich der I2C-Verkehr messen lässt.
+    """
+
+    def __init__(self, rows=2, cols=16):
+        self.rows = rows
+        self.cols = cols
+        self.screen = [[" "] * cols for _ in range(rows)]
+        self._cursor = (0, 0)
+        self.chars_written = 0
+        self.clears = 0
+
+    @property
+    def cursor_pos(self):
+        return self._cursor
+
+    @cursor_pos.setter
+    def cursor_pos(self, position):
+        self._cursor = position
+
+    def clear(self):
+        self.screen = [[" "] * self.cols for _ in range(self.rows)]
+        self._cursor = (0, 0)
+        self.clears += 1
+
+    def write_string(self, text):
+        row, col = self._cursor
+        for char in text:
+            if char == "\n":
+                row, col = row + 1, 0
+                continue
+            if row < self.rows and col < self.cols:
+                self.screen[row][col] = char
+            col += 1
+            self.chars_written += 1
+        self._cursor = (row, col)
+
+    def close(self, clear=False):
+        if clear:
+            self.clear()
+
+    def text(self):
+        return ["".join(row) for row in self.screen]
+
+
+def _default_channel_tables():
+    # ADC-Kanal -> Sensor-Tabelle entsprechend der Standard-Verkabelung
+    return {
+        DEFAULT_HARDWARE["light_channel"]: "light_sensor_data",
+        DEFAULT_HARDWARE["flame_channel"]: "flame_sensor_data",
+        DEFAULT_HARDWARE["gas_channel"]: "gas_sensor_data",
+    }
+
+
+class SyntheticBackend(SensorBackend):
+    """
+    Backend mit künstlichen Messwerten: Tagesgang für Temperatur, Feuchtigkeit und Licht, Rauschen sowie
+    gelegentliche Gas-Spitzen und Flammen-Ereignisse. Alle Werte hängen von der (ggf. beschleunigten) Uhr ab.
+    """
+
+    def __init__(self, speed=1.0, seed=None, dht_failure_rate=0.1, gas_spike_rate=0.001, fire_rate=0.0005,
+                 channel_tables=None, clock=None):
+        """
+        :param speed: Zeitraffer-Faktor der Uhr (Standard: 1.0).
+        :param seed: Optionaler Startwert des Zufallsgenerators für reproduzierbare Läufe.
+        :param dht_failure_rate: Anteil fehlschlagender DHT22-Lesevorgänge (Standard: 0.1).
+        :param gas_spike_rate: Wahrscheinlichkeit einer Gas-Spitze je Lesevorgang (Standard: 0.001).
+        :param fire_rate: Wahrscheinlichkeit eines Flammen-Ereignisses je Lesevorgang (Standard: 0.0005).
+        :param channel_tables: Zuordnung ADC-Kanal -> Sensor-Tabelle (Standard: Standard-Verkabelung).
+        :param clock: Optionale eigene Uhr (überschreibt speed).
+        """
+        super().__init__(clock or Clock(speed))
+        self.rng = random.Random(seed)
+        self.dht_failure_rate = dht_failure_rate
+        self.gas_spike_rate = gas_spike_rate
+        self.fire_rate = fire_rate
+        self.channel_tables = channel_tables or _default_channel_tables()
+
+    def _day_phase(self):
+        # 0 um Mitternacht, 1 nach 24 Stunden (simulierte Zeit)
+        now = self.clock.now()
+        return (now.hour * 3600 + now.minute * 60 + now.second) / 86400
+
+    def _read_dht22(self):
+        phase = self._day_phase()
+        temperature = 21 + 3 * math.sin(2 * math.pi * (phase - 0.375)) + self.rng.gauss(0, 0.2)
+        humidity = 45 - 8 * math.sin(2 * math.pi * (phase - 0.375)) + self.rng.gauss(0, 1.0)
+        return temperature, min(max(humidity, 0.0), 100.0)
+
+    def _read_channel(self, table):
+        if table == "light_sensor_data":
+            # Hell am Tag, dunkel in der Nacht (Rohwert 1 = dunkel)
+            daylight = max(0.0, math.sin(2 * math.pi * (self._day_phase() - 0.25)))
+            return 1 - 0.8 * daylight + self.rng.gauss(0, 0.01)
+        if table == "gas_sensor_data":
+            spike = self.rng.uniform(0.3, 0.6) if self.rng.random() < self.gas_spike_rate else 0.0
+            return 0.08 + spike + self.rng.gauss(0, 0.005)
+        if table == "flame_sensor_data":
+            # Niedriger Rohwert = Feuer
+            return 0.2 if self.rng.random() < self.fire_rate else 0.95 + self.rng.gauss(0, 0.01)
+        return self.rng.random()
+
+    def dht22(self, pin):
+        return SimulatedDHT22(self._read_dht22, self.dht_failure_rate, self.rng)
+
+    def mcp3008(self, channel):
+        table = self.channel_tables.get(channel)
+        return SimulatedADCChannel(lambda: self._read_channel(table))
+
+    def lcd(self, address):
+        return SimulatedLCD()
+
+
+class TraceReplayBackend(SensorBackend):
+    """
+    Backend, das eine aufgezeichnete Messreihe wiedergibt. Die Uhr startet beim ersten Zeitstempel der Aufzeichnung
+    und läuft mit dem Faktor speed; jedes Gerät liefert den zuletzt aufgezeichneten Wert vor der aktuellen Uhrzeit.
+    Die ADC-Kanäle geben die aufgezeichneten Rohwerte (value2) wieder, sodass die Umrechnung in Lux/ppm erneut läuft.
+
+    Format der Aufzeichnung (CSV mit Kopfzeile): timestamp,table,value1,value2
+    """
+
+    def __init__(self, trace_file, speed=1.0, loop=True, channel_tables=None):
+        """
+        :param trace_file: Pfad zur CSV-Aufzeichnung.
+        :param speed: Zeitraffer-Faktor (Standard: 1.0).
+        :param loop: Nach dem Ende der Aufzeichnung wieder von vorne beginnen (Standard: True).
+        :param channel_tables: Zuordnung ADC-Kanal -> Sensor-Tabelle (Standard: Standard-Verkabelung).
+        """
+        self.series = load_trace(trace_file)
+        if not self.series:
+            raise ValueError(f"Die Aufzeichnung {trace_file} enthält keine Messwerte.")
+
+        self.start = min(times[0] for times, _ in self.series.values())
+        self.end = max(times[-1] for times, _ in self.series.values())
+        self.loop = loop
+        self.channel_tables = channel_tables or _default_channel_tables()
+        super().__init__(Clock(speed, start=self.start))
+
+    def _trace_time(self):
+        now = self.clock.now()
+        duration = (self.end - self.start).total_seconds()
+        if self.loop and duration > 0 and now > self.end:
+            now = self.start + timedelta(seconds=(now - self.start).total_seconds() % duration)
+        return now
+
+    def value_at(self, table):
+        """
+        Gibt die aufgezeichneten Werte (value1, value2) einer Tabelle zur aktuellen Uhrzeit zurück.
+        """
+        times, values = self.series[table]
+        index = bisect.bisect_right(times, self._trace_time()) - 1
+        return values[max(index, 0)]
+
+    def dht22(self, pin):
+        if "dht22_data" not in self.series:
+            raise ValueError("Die Aufzeichnung enthält keine DHT22-Werte.")
+        return SimulatedDHT22(lambda: self.value_at("dht22_data"))
+
+    def mcp3008(self, channel):
+        table = self.channel_tables.get(channel)
+        if table not in self.series:
+            raise ValueError(f"Die Aufzeichnung enthält keine Werte für ADC-Kanal {channel}.")
+        return SimulatedADCChannel(lambda: self.value_at(table)[1])
+
+    def lcd(self, address):
+        return SimulatedLCD()
+
+
+def load_trace(trace_file):
+    """
+    Lädt eine CSV-Aufzeichnung (timestamp,table,value1,value2).
+
+    :param trace_file: Pfad zur CSV-Datei.
+    :return: Dictionary {Tabelle: (sortierte Zeitpunkte, Liste von (value1, value2))}
+    """
+    rows = {}
+    with open(trace_file, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["table"] not in SENSOR_TABLES:
+                continue
+            timestamp = datetime.strptime(row["timestamp"][:19], TIMESTAMP_FORMAT)
+            value1 = float(row["value1"]) if row["value1"] not in ("", "None") else None
+            value2 = float(row["value2"]) if row["value2"] not in ("", "None") else None
+            rows.setdefault(row["table"], []).append((timestamp, (value1, value2)))
+
+    series = {}
+    for table, entries in rows.items():
+        entries.sort(key=lambda entry: entry[0])
+        series[table] = ([timestamp for timestamp, _ in entries], [values for _, values in entries])
+    return series
+
+
+def export_trace(db, room_id, trace_file, start=None, end=None):
+    """
+    Schreibt die Messwerte eines Raums aus der Datenbank als Aufzeichnung für das TraceReplayBackend.
+
+    :param db: Die Datenbank-Instanz.
+    :param room_id: Die ID des Raums.
+    :param trace_file: Pfad der zu schreibenden CSV-Datei.
+    :param start: Optionaler Beginn des Zeitraums (Zeitstempel-String).
+    :param end: Optionales Ende des Zeitraums (Zeitstempel-String).
+    :return: Anzahl der geschriebenen Messwerte.
+    """
+    count = 0
+    with open(trace_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "table", "value1", "value2"])
+        for table in SENSOR_TABLES:
+            for ts, value1, value2 in db.get_raw_rows(table, room_id, start, end):
+                writer.writerow([from_epoch_ms(ts), table, value1, value2])
+                count += 1
+    return count
+
+
+_default_backend = None
+
+
+def get_default_backend():
+    """
+    Gibt das prozessweite Standard-Backend zurück. Es wird über Umgebungsvariablen gewählt:
+
+    - SMARTHOME_BACKEND: "hardware" (Standard), "synthetic" oder "replay"
+    - SMARTHOME_SPEED: Zeitraffer-Faktor für "synthetic" und "replay" (Standard: 1)
+    - SMARTHOME_TRACE: Pfad zur CSV-Aufzeichnung für "replay"
+    """
+    global _default_backend
+    if _default_backend is None:
+        kind = os.environ.get("SMARTHOME_BACKEND", "hardware")
+        speed = float(os.environ.get("SMARTHOME_SPEED", "1"))
+        if kind == "synthetic":
+            _default_backend = SyntheticBackend(speed=speed)
+        elif kind == "replay":
+            _default_backend = TraceReplayBackend(os.environ["SMARTHOME_TRACE"], speed=speed)
+        elif kind == "hardware":
+            _default_backend = HardwareBackend()
+        else:
+            raise ValueError(f"Unbekanntes Backend: {kind}")
+    return _default_backend
@@ -1,30 +1,41 @@
-import time
-import adafruit_dht
-import board
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from sensors.backends import HardwareBackend
+from utils.metrics import metrics
 
 class DHT22Sensor:
-    def __init__(self, pin):
+    def __init__(self, pin, backend=None):
         """
         Initialisiert den DHT22-Sensor.
-        :param pin: GPIO-Pin, an den der Sensor angeschlossen ist (als board.Pin-Objekt).
+        :param pin: GPIO-Pin, an den der Sensor angeschlossen ist (als board.Pin-Objekt oder Name wie "D4").
+        :param backend: Optionales Sensor-Backend (Standard: HardwareBackend).
         """
-        self.dht_device = adafruit_dht.DHT22(pin)
+        backend = backend or HardwareBackend()
+        self.dht_device = backend.dht22(pin)
+        self.clock = backend.clock
         self.is_active = True
 
+    def measure(self):
+        """
+        Liest Temperatur und Luftfeuchtigkeit aus und gibt Fehler des Sensors weiter.
+        :return: Ein Dictionary mit Temperatur und Luftfeuchtigkeit oder None, falls der Sensor keine Werte liefert.
+        :raises RuntimeError: Falls der Lesevorgang fehlschlägt (beim DHT22 häufig, z.B. Prüfsummenfehler).
+        """
+        temperature = self.dht_device.temperature
+        humidity = self.dht_device.humidity
+        if temperature is not None and humidity is not None:
+            return {"temperature": round(temperature, 2), "humidity": round(humidity, 2)}
+        return None
+
     def read_data(self):
         """
         Liest Temperatur und Luftfeuchtigkeit aus.
         :return: Ein Dictionary mit Temperatur und Luftfeuchtigkeit oder None bei Fehlern.
         """
         try:
-            temperature = self.dht_device.temperature
-            humidity = self.dht_device.humidity
-            if temperature is not None and humidity is not None:
-                return {"temperature": round(temperature, 2), "humidity": round(humidity, 2)}
-            else:
-                return None
+            return self.measure()
         except RuntimeError as e:
-            print(f"Fehler beim DHT22 Sensor: {e}")
+            metrics.record_error("dht22", f"Fehler beim DHT22 Sensor: {e}")
             return None
 
     def exit(self):
@@ -32,4 +43,153 @@ class DHT22Sensor:
         Stopt den Sensor und räumt auf, indem die Ressourcen freigegeben werden.
         """
         self.dht_device.exit()
-        print("Sensor gestoppt.")
\ No newline at end of file
+        print("Sensor gestoppt.")
+
+
+class DHT22Service:
+    """
+    Diese Klasse liest den DHT22 in einem eigenen Thread und stellt den letzten gültigen Messwert samt Alter bereit.
+    Schlägt ein Lesevorgang fehl, wird mit wachsendem Abstand erneut gelesen, frühestens nach dem Mindestabstand
+    des Sensors von 2 Sekunden. Hängt ein Lesevorgang länger als das Zeitlimit, wird er als Fehler gewertet.
+    Abfragen über latest() blockieren nie.
+    """
+
+    # Der DHT22 liefert höchstens alle 2 Sekunden einen neuen Wert
+    MIN_INTERVAL = 2.0
+
+    def __init__(self, sensor, interval=30.0, max_retries=5, backoff=1.5, timeout=5.0):
+        """
+        :param sensor: Die DHT22Sensor-Instanz.
+        :param interval: Abstand zwischen zwei regulären Messungen in Sekunden (Standard: 30).
+        :param max_retries: Maximale Anzahl an Wiederholungen nach einem Fehler je Messung (Standard: 5).
+        :param backoff: Faktor, um den der Abstand zwischen zwei Wiederholungen wächst (Standard: 1.5).
+        :param timeout: Maximale Dauer eines Lesevorgangs in Sekunden (Standard: 5.0).
+        """
+        self.sensor = sensor
+        self.clock = sensor.clock
+        self.interval = interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._pending = None
+        self._last_value = None
+        self._last_time = None
+
+        # Statistik
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.missed = 0
+        self.consecutive_failures = 0
+
+    def start(self):
+        """
+        Startet den Lese-Thread.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DHT22Read")
+        self._thread = threading.Thread(target=self._run, name="DHT22Service", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Beendet den Lese-Thread. Ein hängender Lesevorgang wird nicht abgewartet.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def latest(self, max_age=None):
+        """
+        Gibt den letzten gültigen Messwert zurück, ohne zu blockieren.
+
+        :param max_age: Optionales Höchstalter in Sekunden; ältere Werte werden nicht zurückgegeben.
+        :return: Dictionary mit temperature, humidity und age (Sekunden) oder None.
+        """
+        with self._lock:
+            if self._last_value is None:
+                return None
+            age = self.clock.monotonic() - self._last_time
+            if max_age is not None and age > max_age:
+                return None
+            return {**self._last_value, "age": age}
+
+    def stats(self):
+        """
+        Gibt die Fehlerstatistik des Sensors zurück.
+        :return: Dictionary mit attempts, successes, failures, timeouts, missed (Messungen ohne gültigen Wert
+                 nach allen Wiederholungen) und consecutive_failures.
+        """
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "missed": self.missed,
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+    def _wait(self, seconds):
+        # Wartet die angegebene Zeit der Sensor-Uhr, bricht beim Stoppen sofort ab
+        return self._stop_event.wait(seconds / self.clock.speed)
+
+    def _attempt(self):
+        # Ein einzelner Lesevorgang mit hartem Zeitlimit; ein hängender Vorgang blockiert weitere Versuche
+        if self._pending is not None and not self._pending.done():
+            with self._lock:
+                self.timeouts += 1
+            return None
+        self._pending = self._executor.submit(self.sensor.measure)
+        with self._lock:
+            self.attempts += 1
+        try:
+            return self._pending.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            metrics.record_error("dht22", f"Zeitüberschreitung beim DHT22 Sensor (> {self.timeout:.1f} s)")
+        except RuntimeError as e:
+            metrics.record_error("dht22", f"Fehler beim DHT22 Sensor: {e}")
+        return None
+
+    def _measure_with_retries(self, deadline):
+        # Wiederholungen nur bis zur nächsten regulären Messung
+        delay = self.MIN_INTERVAL
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                if self.clock.monotonic() + delay >= deadline or self._wait(delay):
+                    return None
+                delay *= self.backoff
+
+            value = self._attempt()
+            with self._lock:
+                if value is not None:
+                    self._last_value = value
+                    self._last_time = self.clock.monotonic()
+                    self.successes += 1
+                    self.consecutive_failures = 0
+                    return value
+                self.failures += 1
+                self.consecutive_failures += 1
+        return None
+
+    def _run(self):
+        next_time = self.clock.monotonic()
+        while not self._stop_event.is_set():
+            if self._measure_with_retries(next_time + self.interval) is None and not self._stop_event.is_set():
+                with self._lock:
+                    self.missed += 1
+
+            # Nächste Messung auf dem festen Raster; verpasste Termine werden übersprungen
+            next_time += self.interval
+            now = self.clock.monotonic()
+            if next_time < now:
+                next_time += ((now - next_time) // self.interval + 1) * self.interval
+            self._wait(next_time - now)
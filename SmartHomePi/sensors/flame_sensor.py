@@ -1,18 +1,19 @@
 from sensors.mcp3008 import MCP3008Sensor
 
 class FlameSensor:
-    def __init__(self, channel):
-        from gpiozero import MCP3008
-        self.sensor = MCP3008(channel=channel)
+    def __init__(self, channel, backend=None):
+        self.sensor = MCP3008Sensor(channel, backend)
 
     def read_raw_value(self):
         """Lese den Rohwert (zwischen 0 und 1) vom Sensor."""
-        return self.sensor.value
+        return self.sensor.read_value()
 
-    def is_fire_detected(self, threshold=0.5):
+    def is_fire_detected(self, threshold=0.5, raw_value=None):
         """
         Ermittelt, ob ein Feuer erkannt wurde.
         :param threshold: Schwelle für Feuererkennung (niedriger Wert = Feuer).
+        :param raw_value: Optionaler bereits gelesener Rohwert (z.B. aus MCP3008Reader.scan), sonst wird neu gelesen.
         """
-        raw_value = self.read_raw_value()
+        if raw_value is None:
+            raw_value = self.read_raw_value()
         return raw_value < threshold
@@ -1,68 +1,176 @@
-import time
 import threading
-from RPLCD.i2c import CharLCD
+import time
+from sensors.backends import HardwareBackend
+from utils.metrics import metrics
 
 class LCDDisplay:
     """
     Diese Klasse übernimmt die Steuerung des LCD-Displays.
     Sie zeigt die Daten der verschiedenen Sensoren auf dem LCD an.
+
+    Der Inhalt des 16×2-Displays wird in einem Framebuffer gespiegelt; beim Zeichnen werden nur die Zeichen
+    übertragen, die sich gegenüber dem Framebuffer geändert haben. Die Seiten wechseln in einem Intervall,
+    das über ein Event jederzeit unterbrochen werden kann, sodass stop() sofort wirkt.
     """
 
-    def __init__(self, room_name, dht_data, light_level, gas_level):
+    ROWS = 2
+    COLS = 16
+
+    # Anzeigedauer einer Seite in Sekunden
+    PAGE_DURATION = 3.0
+
+    # Maximale Lücke zwischen zwei geänderten Zeichen, bis zu der sie gemeinsam geschrieben werden.
+    # Ein Cursor-Sprung kostet auf dem I2C-Bus etwa so viel wie ein Zeichen.
+    MAX_GAP = 1
+
+    def __init__(self, room_name, dht_data, light_level, gas_level, address=0x27, backend=None,
+                 buffer=None, room_id=None):
         """
         Initialisiert das LCD und zeigt den Raumnamen und Sensorwerte an.
-        
+
         :param room_name: Der Name des Raumes.
         :param dht_data: Die Daten vom DHT22 Sensor (Temperatur und Feuchtigkeit).
         :param light_level: Der Lichtwert vom Lichtsensor (LUX).
         :param gas_level: Der Gaswert vom Gassensor (PPM).
+        :param address: Die I2C-Adresse des LCD (Standard: 0x27).
+        :param backend: Optionales Sensor-Backend (Standard: HardwareBackend).
+        :param buffer: Optionaler ReadingsBuffer, aus dem die neuesten Werte des Raums gelesen werden.
+        :param room_id: Die ID des Raums im ReadingsBuffer.
         """
-        self.lcd = CharLCD('PCF8574', 0x27)  # LCD über I2C
+        backend = backend or HardwareBackend()
+        self.lcd = backend.lcd(address)  # LCD über I2C
         self.room_name = room_name
         self.dht_data = dht_data
         self.light_level = light_level
         self.gas_level = gas_level
+        self.buffer = buffer
+        self.room_id = room_id
+        self.page = 0
+        self._alert = None
+        self._framebuffer = None
         self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+
+        # Statistik über den I2C-Verkehr
+        self.chars_written = 0
+        self.cursor_moves = 0
+
+    def update(self, dht_data=None, light_level=None, gas_level=None):
+        """
+        Übernimmt neue Sensorwerte und zeichnet die aktuelle Seite sofort neu.
+        Mit ReadingsBuffer genügt ein Aufruf ohne Werte; gelesen wird dann beim Zeichnen aus dem Puffer.
+        """
+        if dht_data is not None:
+            self.dht_data = dht_data
+        if light_level is not None:
+            self.light_level = light_level
+        if gas_level is not None:
+            self.gas_level = gas_level
+        self._wakeup.set()
+
+    def _values(self):
+        # Neueste Werte aus dem Ringpuffer; fehlende Werte aus den zuletzt übergebenen Werten
+        values = {
+            "temperature": self.dht_data["temperature"],
+            "humidity": self.dht_data["humidity"],
+            "lux": self.light_level,
+            "ppm": self.gas_level,
+        }
+        if self.buffer is not None:
+            for metric in values:
+                latest = self.buffer.latest_value(self.room_id, metric)
+                if latest is not None and latest[1] is not None:
+                    values[metric] = latest[1]
+        return values
+
+    def pages(self):
+        """
+        Gibt den Inhalt aller Seiten zurück.
+        :return: Liste von Seiten, jede Seite als Liste von zwei Zeilen.
+        """
+        values = self._values()
+        room_display = "Raum: {}".format(self.room_name)
+        return [
+            [room_display[:self.COLS], room_display[self.COLS:]],
+            ["Temp: {:.1f}C".format(values["temperature"]), "Humid: {}%".format(values["humidity"])],
+            ["Licht: {:.1f} LUX".format(values["lux"]), "Gas: {:.1f} PPM".format(values["ppm"])],
+        ]
+
+    def show_alert(self, lines):
+        """
+        Zeigt eine Alarmmeldung anstelle der Seiten an, bis clear_alert() aufgerufen wird.
+
+        :param lines: Die beiden Zeilen der Meldung.
+        """
+        self._alert = list(lines)
+        self._wakeup.set()
+
+    def clear_alert(self):
+        """
+        Beendet die Anzeige der Alarmmeldung; danach werden wieder die Seiten angezeigt.
+        """
+        self._alert = None
+        self._wakeup.set()
 
     def display(self):
+        """
+        Zeichnet die aktuelle Seite bzw. die Alarmmeldung. Übertragen werden nur die Zeichen, die sich geändert haben.
+        """
         try:
-            self.lcd.clear()
-    
-            room_display = "Raum: {}".format(self.room_name)
-    
-            if len(room_display) > 16:
-                self.lcd.write_string(room_display[:16])
-                self.lcd.cursor_pos = (1, 0)
-                self.lcd.write_string(room_display[16:])
-            else:
-                self.lcd.write_string(room_display)
-    
-            time.sleep(3)
-    
-            self.lcd.clear()
-            self.lcd.write_string("Temp: {:.1f}C".format(self.dht_data["temperature"]))
-            self.lcd.cursor_pos = (1, 0)
-            self.lcd.write_string("Humid: {}%".format(self.dht_data["humidity"]))
-            time.sleep(3)
-    
-            self.lcd.clear()
-            self.lcd.write_string("Licht: {:.1f} LUX".format(self.light_level))
-            self.lcd.cursor_pos = (1, 0)
-            self.lcd.write_string("Gas: {:.1f} PPM".format(self.gas_level))
-            time.sleep(3)
-    
+            lines = self._alert or self.pages()[self.page]
+            if self._framebuffer is None:
+                # Unbekannter Inhalt (z.B. nach dem Start): einmal leeren
+                self.lcd.clear()
+                self._framebuffer = [[" "] * self.COLS for _ in range(self.ROWS)]
+
+            for row, line in enumerate(lines):
+                target = line[:self.COLS].ljust(self.COLS)
+                for start, text in self._changed_runs(self._framebuffer[row], target):
+                    self.lcd.cursor_pos = (row, start)
+                    self.lcd.write_string(text)
+                    self.cursor_moves += 1
+                    self.chars_written += len(text)
+                    self._framebuffer[row][start:start + len(text)] = list(text)
+
         except Exception as e:
-            print(f"Fehler beim Anzeigen auf dem LCD: {e}")
+            # Inhalt des Displays unbekannt, beim nächsten Mal vollständig neu zeichnen
+            self._framebuffer = None
+            metrics.record_error("lcd", f"Fehler beim Anzeigen auf dem LCD: {e}")
 
+    def _changed_runs(self, current, target):
+        # Zusammenhängende Abschnitte geänderter Zeichen als (Startspalte, Text)
+        runs = []
+        start = end = None
+        for col in range(self.COLS):
+            if current[col] == target[col]:
+                continue
+            if start is not None and col - end - 1 <= self.MAX_GAP:
+                end = col
+            else:
+                if start is not None:
+                    runs.append((start, target[start:end + 1]))
+                start = end = col
+        if start is not None:
+            runs.append((start, target[start:end + 1]))
+        return runs
 
     def run(self):
         """
         Führt die Anzeige der Werte in regelmäßigen Abständen aus.
         Der Prozess kann über das _stop_event gestoppt werden.
         """
+        page_end = time.monotonic() + self.PAGE_DURATION
         while not self._stop_event.is_set():
+            self._wakeup.clear()
             self.display()
-            time.sleep(3)
+
+            # Bis zum Seitenwechsel warten; neue Werte oder stop() unterbrechen das Warten
+            remaining = page_end - time.monotonic()
+            if remaining > 0 and self._wakeup.wait(remaining):
+                continue
+            if time.monotonic() >= page_end:
+                self.page = (self.page + 1) % len(self.pages())
+                page_end = time.monotonic() + self.PAGE_DURATION
         print("LCD Display wurde gestoppt.")
 
     def stop(self):
@@ -70,4 +178,4 @@ class LCDDisplay:
         Stoppt das kontinuierliche Ausführen der Anzeige.
         """
         self._stop_event.set()
-
+        self._wakeup.set()
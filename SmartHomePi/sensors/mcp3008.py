@@ -1,4 +1,9 @@
-from gpiozero import MCP3008
+import statistics
+import threading
+from sensors.backends import HardwareBackend
+
+# Unterstützte Filter des MCP3008Reader
+ADC_FILTERS = (None, "median", "ewma")
 
 class MCP3008Sensor:
     """
@@ -6,13 +11,16 @@ class MCP3008Sensor:
     über den SPI-Bus des Raspberry Pi.
     """
 
-    def __init__(self, channel):
+    def __init__(self, channel, backend=None):
         """
         Initialisiert den MCP3008-Sensor und legt den Kanal fest, auf dem der Sensor angeschlossen ist.
         
         :param channel: Der Kanal des MCP3008, der den Sensorwert liest (0 bis 7).
+        :param backend: Optionales Sensor-Backend (Standard: HardwareBackend).
         """
-        self.sensor = MCP3008(channel=channel)
+        backend = backend or HardwareBackend()
+        self.channel = channel
+        self.sensor = backend.mcp3008(channel)
 
     def read_value(self):
         """
@@ -23,3 +31,61 @@ class MCP3008Sensor:
         """
         return self.sensor.value
 
+
+class MCP3008Reader:
+    """
+    Gemeinsamer Leser für mehrere Kanäle des MCP3008. Ein Aufruf von scan() liest alle Kanäle in einem Durchgang
+    unter einer gemeinsamen Sperre des SPI-Busses und liefert einen zusammengehörigen Satz von Rohwerten,
+    aus dem alle Sensoren ihre Werte ableiten (statt jeden Kanal je abgeleitetem Wert erneut zu lesen).
+
+    Jeder Kanal kann mehrfach gewandelt werden (Oversampling). Die Einzelwerte werden gemittelt bzw. beim Filter
+    "median" per Median zusammengefasst; der Filter "ewma" glättet zusätzlich über aufeinanderfolgende Scans.
+    """
+
+    def __init__(self, sensors, oversampling=1, filter=None, alpha=0.3):
+        """
+        :param sensors: Liste der MCP3008Sensor-Instanzen der zu lesenden Kanäle.
+        :param oversampling: Anzahl der Wandlungen je Kanal und Scan (Standard: 1).
+        :param filter: None (Mittelwert), "median" (Median der Wandlungen) oder "ewma" (Mittelwert, über die Scans
+                       exponentiell geglättet) (Standard: None).
+        :param alpha: Glättungsfaktor für "ewma" zwischen 0 und 1, höher = schnellere Reaktion (Standard: 0.3).
+        """
+        if filter not in ADC_FILTERS:
+            raise ValueError(f"Unbekannter Filter: {filter}")
+        if oversampling < 1:
+            raise ValueError("oversampling muss mindestens 1 sein.")
+        self.sensors = {sensor.channel: sensor for sensor in sensors}
+        self.oversampling = oversampling
+        self.filter = filter
+        self.alpha = alpha
+        self.conversions = 0
+        self._smoothed = {}
+        self._lock = threading.Lock()
+
+    def scan(self):
+        """
+        Liest alle Kanäle in einem Durchgang.
+
+        :return: Dictionary {Kanal: gefilterter Rohwert zwischen 0 und 1}
+        """
+        with self._lock:
+            samples = {
+                channel: [sensor.read_value() for _ in range(self.oversampling)]
+                for channel, sensor in self.sensors.items()
+            }
+            self.conversions += self.oversampling * len(samples)
+
+            values = {}
+            for channel, channel_samples in samples.items():
+                if self.filter == "median":
+                    value = statistics.median(channel_samples)
+                else:
+                    value = sum(channel_samples) / len(channel_samples)
+
+                if self.filter == "ewma":
+                    previous = self._smoothed.get(channel)
+                    if previous is not None:
+                        value = self.alpha * value + (1 - self.alpha) * previous
+                    self._smoothed[channel] = value
+                values[channel] = value
+            return values
@@ -0,0 +1,34 @@
+import requests
+from database.schema import SENSOR_TABLES
+from utils.metrics import metrics
+
+
+class RemoteSource:
+    """
+    Diese Klasse liest die Messwerte eines Raums von einem entfernten Gerät über HTTP, statt lokale Hardware anzusprechen.
+    Der Endpunkt muss ein JSON-Objekt der Form {"dht22_data": [temperatur, feuchtigkeit], "gas_sensor_data": [ppm, rohwert], ...}
+    liefern; fehlende Tabellen werden in diesem Zyklus übersprungen.
+    """
+
+    def __init__(self, url, timeout=5.0):
+        """
+        :param url: Die URL des entfernten Endpunkts.
+        :param timeout: Zeitlimit für eine Anfrage in Sekunden (Standard: 5).
+        """
+        self.url = url
+        self.timeout = timeout
+
+    def read_data(self):
+        """
+        Liest einen Satz Messwerte vom entfernten Gerät.
+        :return: Dictionary {Tabellenname: (value1, value2)} oder ein leeres Dictionary bei Fehlern.
+        """
+        try:
+            response = requests.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            metrics.record_error("remote", f"Fehler beim Abrufen der Remote-Messwerte von {self.url}: {e}")
+            return {}
+
+        return {table: tuple(values) for table, values in data.items() if table in SENSOR_TABLES and len(values) == 2}
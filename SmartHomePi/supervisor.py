@@ -0,0 +1,164 @@
+import threading
+from database.db import Database
+from utils.metrics import metrics
+
+
+class ResourceConflictError(Exception):
+    """
+    Wird ausgelöst, wenn ein Raum Hardware benötigt, die bereits von einem anderen Raum belegt ist.
+    """
+
+    def __init__(self, resource, owner):
+        self.resource = resource
+        self.owner = owner
+        super().__init__(f"Hardware {resource[0]} {resource[1]} wird bereits von Raum '{owner}' verwendet.")
+
+
+def hardware_resources(hardware):
+    """
+    Gibt die Hardware-Ressourcen zurück, die ein Raum mit der gegebenen Zuordnung exklusiv belegt.
+    Räume mit Remote-Quelle belegen keine lokale Hardware außer einem optionalen LCD.
+
+    :param hardware: Die Hardware-Zuordnung (siehe DEFAULT_HARDWARE).
+    :return: Liste von Tupeln (Art, Kennung), z.B. ("gpio", "D4") oder ("adc", 1).
+    """
+    resources = []
+    if not hardware["remote_url"]:
+        if hardware["dht22_pin"]:
+            resources.append(("gpio", hardware["dht22_pin"]))
+        for key in ("light_channel", "flame_channel", "gas_channel"):
+            if hardware[key] is not None:
+                resources.append(("adc", hardware[key]))
+    if hardware["lcd_address"] is not None:
+        resources.append(("i2c", hardware["lcd_address"]))
+    return resources
+
+
+class AcquisitionSupervisor:
+    """
+    Diese Klasse verwaltet je Raum einen eigenen Erfassungs-Thread mit eigenem Stop-Event.
+    Jede Hardware-Ressource (GPIO-Pin, ADC-Kanal, I2C-Adresse) darf nur von einem Raum gleichzeitig belegt werden;
+    die Belegung wird beim Beenden eines Threads automatisch wieder freigegeben.
+    """
+
+    def __init__(self, target=None):
+        """
+        :param target: Die Erfassungsfunktion mit der Signatur (room_name, stop_event, hardware) (Standard: main.run_sensors).
+        """
+        if target is None:
+            from main import run_sensors
+            target = run_sensors
+        self.target = target
+        self._lock = threading.Lock()
+        self._workers = {}
+        self._owners = {}
+
+    def start(self, room_name, hardware=None):
+        """
+        Startet die Erfassung für einen Raum.
+
+        :param room_name: Der Name des Raums.
+        :param hardware: Optionale Hardware-Zuordnung, sonst die in der Datenbank gespeicherte Zuordnung.
+        :return: False, falls für den Raum bereits eine Erfassung läuft, sonst True.
+        :raises ResourceConflictError: Falls benötigte Hardware bereits von einem anderen Raum belegt ist.
+        """
+        if hardware is None:
+            db = Database()
+            hardware = db.get_room_hardware(db.get_room_id_by_name(room_name))
+            db.connection.close()
+
+        resources = hardware_resources(hardware)
+        with self._lock:
+            if room_name in self._workers:
+                return False
+            for resource in resources:
+                if resource in self._owners:
+                    raise ResourceConflictError(resource, self._owners[resource])
+
+            for resource in resources:
+                self._owners[resource] = room_name
+            stop_event = threading.Event()
+            thread = threading.Thread(
+                target=self._run_worker,
+                args=(room_name, stop_event, hardware, resources),
+                name=f"Acquisition-{room_name}",
+                daemon=True
+            )
+            self._workers[room_name] = (thread, stop_event)
+            thread.start()
+        return True
+
+    def _run_worker(self, room_name, stop_event, hardware, resources):
+        try:
+            self.target(room_name, stop_event, hardware)
+        except Exception as e:
+            metrics.record_error("supervisor", f"Erfassung für Raum {room_name} abgebrochen: {e}")
+        finally:
+            # Hardware und Eintrag wieder freigeben, auch wenn der Thread mit einem Fehler endet
+            with self._lock:
+                for resource in resources:
+                    if self._owners.get(resource) == room_name:
+                        del self._owners[resource]
+                self._workers.pop(room_name, None)
+
+    def stop(self, room_name, timeout=None):
+        """
+        Stoppt die Erfassung für einen Raum.
+
+        :param room_name: Der Name des Raums.
+        :param timeout: Optionale maximale Wartezeit in Sekunden auf das Ende des Threads (None = nicht warten).
+        :return: False, falls für den Raum keine Erfassung läuft, sonst True.
+        """
+        with self._lock:
+            worker = self._workers.get(room_name)
+        if worker is None:
+            return False
+
+        thread, stop_event = worker
+        stop_event.set()
+        if timeout is not None:
+            thread.join(timeout)
+        return True
+
+    def stop_all(self, timeout=None):
+        """
+        Stoppt die Erfassung für alle Räume.
+
+        :param timeout: Optionale maximale Wartezeit je Thread in Sekunden.
+        """
+        for room_name in self.running_rooms():
+            self.stop(room_name, timeout)
+
+    def is_running(self, room_name):
+        """
+        Prüft, ob für einen Raum eine Erfassung läuft (auch wenn sie gerade gestoppt wird).
+        """
+        with self._lock:
+            return room_name in self._workers
+
+    def is_stopping(self, room_name):
+        """
+        Prüft, ob die Erfassung eines Raums gestoppt wurde, der Thread aber noch aufräumt.
+        """
+        with self._lock:
+            worker = self._workers.get(room_name)
+        return worker is not None and worker[1].is_set()
+
+    def running_rooms(self):
+        """
+        Gibt die Namen aller Räume mit laufender Erfassung zurück.
+        """
+        with self._lock:
+            return list(self._workers)
+
+    def resource_owners(self):
+        """
+        Gibt die aktuelle Belegung der Hardware zurück.
+        :return: Dictionary {(Art, Kennung): Raumname}
+        """
+        with self._lock:
+            return dict(self._owners)
+
+
+# Prozessweite Instanz: Streamlit führt die Seiten bei jedem Rerun neu aus, Module werden aber nur einmal importiert
+supervisor = AcquisitionSupervisor()
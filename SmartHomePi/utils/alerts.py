@@ -0,0 +1,328 @@
+"""
+Alarmregeln für Gas, Feuer und Raumklima, die bei jedem eingehenden Messwert ausgewertet werden.
+
+Eine AlertRule prüft genau eine Bedingung auf einer Messgröße (siehe METRICS):
+
+- above / below: Schwellwert mit Hysterese; aufgehoben wird erst, wenn der Wert die Schwelle um hysteresis
+  unter- bzw. überschreitet
+- rate: Änderungsrate in Einheiten pro Sekunde über die letzten window Sekunden (positiv = steigend,
+  negativ = fallend); die Werte dafür kommen aus dem ReadingsBuffer
+
+Mit duration muss die Bedingung so viele Sekunden ununterbrochen erfüllt sein, bevor der Alarm ausgelöst wird.
+Die Engine meldet nur Zustandswechsel (ausgelöst / aufgehoben) und unterdrückt ein erneutes Auslösen derselben
+Regel innerhalb von cooldown Sekunden. Gemeldet wird an austauschbare Senken (Logdatei, LCD, Webhook) in einem
+eigenen Thread, damit eine langsame Senke die Erfassung nicht aufhält.
+"""
+import json
+import queue
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from database.schema import SENSOR_TABLES, METRICS
+from utils.ring_buffer import readings_buffer
+from utils.metrics import metrics
+
+FIRED = "ausgelöst"
+CLEARED = "aufgehoben"
+
+
+class AlertRule:
+    """
+    Diese Klasse beschreibt eine Alarmregel für eine Messgröße.
+    """
+
+    def __init__(self, name, metric, above=None, below=None, rate=None, hysteresis=0.0, window=10.0,
+                 duration=0.0, cooldown=300.0, severity="warnung"):
+        """
+        :param name: Der Name der Regel (eindeutig, erscheint in der Meldung).
+        :param metric: Die Messgröße (siehe METRICS, z.B. "ppm").
+        :param above: Auslösen, wenn der Wert mindestens above beträgt.
+        :param below: Auslösen, wenn der Wert höchstens below beträgt.
+        :param rate: Auslösen, wenn sich der Wert um mindestens rate Einheiten pro Sekunde ändert.
+        :param hysteresis: Abstand zur Schwelle, ab dem ein Schwellwert-Alarm aufgehoben wird (Standard: 0).
+        :param window: Zeitraum in Sekunden, über den die Änderungsrate bestimmt wird (Standard: 10).
+        :param duration: Dauer in Sekunden, die die Bedingung erfüllt sein muss (Standard: 0 = sofort).
+        :param cooldown: Mindestabstand in Sekunden zwischen zwei Auslösungen (Standard: 300).
+        :param severity: Die Dringlichkeit, z.B. "warnung" oder "kritisch".
+        :raises ValueError: Bei unbekannter Messgröße oder nicht genau einer Bedingung.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unbekannte Messgröße: {metric}")
+        if sum(condition is not None for condition in (above, below, rate)) != 1:
+            raise ValueError(f"Regel {name}: genau eine der Bedingungen above, below oder rate angeben")
+        self.name = name
+        self.metric = metric
+        self.table, column = METRICS[metric]
+        self.index = SENSOR_TABLES[self.table].index(column) + 1
+        self.above = above
+        self.below = below
+        self.rate = rate
+        self.hysteresis = hysteresis
+        self.window = window
+        self.duration = duration
+        self.cooldown = cooldown
+        self.severity = severity
+
+    def check(self, value, active, rate=None):
+        """
+        Prüft die Bedingung für einen Messwert.
+
+        :param value: Der Messwert.
+        :param active: Ob der Alarm bereits ausgelöst ist (für die Hysterese).
+        :param rate: Die Änderungsrate pro Sekunde (nur für rate-Regeln).
+        :return: True, solange die Bedingung erfüllt ist; None, falls sie nicht geprüft werden kann.
+        """
+        if self.rate is not None:
+            if rate is None:
+                return None
+            return rate >= self.rate if self.rate > 0 else rate <= self.rate
+        if self.above is not None:
+            return value >= (self.above - self.hysteresis if active else self.above)
+        return value <= (self.below + self.hysteresis if active else self.below)
+
+
+# Standardregeln; die Schwellen orientieren sich an den Messbereichen der angeschlossenen Sensoren
+DEFAULT_RULES = [
+    AlertRule("Feuer erkannt", "fire_detected", above=0.5, cooldown=60, severity="kritisch"),
+    AlertRule("Gaskonzentration hoch", "ppm", above=300, hysteresis=50, duration=3, severity="kritisch"),
+    AlertRule("Gaskonzentration steigt schnell", "ppm", rate=20, window=5, cooldown=120),
+    AlertRule("Temperatur hoch", "temperature", above=35, hysteresis=1, duration=120),
+    AlertRule("Temperatur niedrig", "temperature", below=5, hysteresis=1, duration=120),
+    AlertRule("Luftfeuchtigkeit hoch", "humidity", above=70, hysteresis=5, duration=600),
+]
+
+
+class Alert:
+    """
+    Diese Klasse beschreibt einen Zustandswechsel einer Alarmregel.
+    """
+
+    def __init__(self, rule, state, room_id, room_name, value, timestamp):
+        """
+        :param rule: Die AlertRule.
+        :param state: FIRED oder CLEARED.
+        :param room_id: Die ID des Raums.
+        :param room_name: Der Name des Raums.
+        :param value: Der auslösende Messwert.
+        :param timestamp: Zeitstempel des Messwerts in Millisekunden seit 1970.
+        """
+        self.rule = rule
+        self.state = state
+        self.room_id = room_id
+        self.room_name = room_name
+        self.value = value
+        self.timestamp = timestamp
+        # Zeitpunkt der Erkennung (Unix-Zeit in Sekunden) für die Messung der Benachrichtigungslatenz
+        self.detected = time.time()
+
+    def message(self):
+        """
+        Gibt die Meldung als einzeiligen Text zurück.
+        """
+        return f"[{self.rule.severity}] {self.room_name}: {self.rule.name} {self.state} (Wert: {self.value})"
+
+    def to_dict(self):
+        """
+        Gibt den Alarm als JSON-fähiges Dictionary zurück.
+        """
+        return {
+            "rule": self.rule.name,
+            "metric": self.rule.metric,
+            "severity": self.rule.severity,
+            "state": self.state,
+            "room_id": self.room_id,
+            "room": self.room_name,
+            "value": float(self.value),
+            "timestamp": self.timestamp,
+            "detected": self.detected,
+        }
+
+
+class LogFileSink:
+    """
+    Schreibt jeden Alarm als Zeile in eine Logdatei.
+    """
+
+    def __init__(self, path="alerts.log"):
+        """
+        :param path: Der Pfad der Logdatei (Standard: "alerts.log").
+        """
+        self.path = path
+
+    def send(self, alert):
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{now} {alert.message()}\n")
+
+
+class LCDSink:
+    """
+    Zeigt ausgelöste Alarme anstelle der normalen Seiten auf dem LCD an, bis sie aufgehoben werden.
+    """
+
+    def __init__(self, lcd):
+        """
+        :param lcd: Die LCDDisplay-Instanz des Raums.
+        """
+        self.lcd = lcd
+        self._active = {}
+
+    def send(self, alert):
+        if alert.state == FIRED:
+            self._active[alert.rule.name] = alert
+        else:
+            self._active.pop(alert.rule.name, None)
+
+        if self._active:
+            # Der zuletzt ausgelöste Alarm wird angezeigt
+            latest = list(self._active.values())[-1]
+            self.lcd.show_alert(["ALARM " + latest.rule.name, "Wert: {}".format(latest.value)])
+        else:
+            self.lcd.clear_alert()
+
+
+class WebhookSink:
+    """
+    Sendet jeden Alarm als JSON per HTTP POST an eine URL.
+    """
+
+    def __init__(self, url, timeout=2.0):
+        """
+        :param url: Die Ziel-URL des Webhooks.
+        :param timeout: Zeitlimit je Anfrage in Sekunden (Standard: 2).
+        """
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(alert.to_dict()).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class AlertEngine:
+    """
+    Diese Klasse wertet die Alarmregeln bei jedem Messwert aus und meldet Zustandswechsel an die Senken.
+    process() muss nach dem Schreiben des Messwerts in den ReadingsBuffer aufgerufen werden; die Senken werden
+    in einem eigenen Thread bedient, process() selbst blockiert nicht.
+    """
+
+    def __init__(self, rules=None, sinks=None, buffer=None):
+        """
+        :param rules: Liste von AlertRules (Standard: DEFAULT_RULES).
+        :param sinks: Liste von Senken mit einer Methode send(alert).
+        :param buffer: Der ReadingsBuffer für die Änderungsraten (Standard: prozessweite Instanz).
+        """
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.sinks = sinks or []
+        self.buffer = buffer or readings_buffer
+        self._rules_by_table = {}
+        for rule in self.rules:
+            self._rules_by_table.setdefault(rule.table, []).append(rule)
+
+        # Zustand je (Raum, Regel): Beginn der erfüllten Bedingung, ausgelöst?, letzte Auslösung
+        self._state = {}
+        self._queue = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="AlertDispatcher", daemon=True)
+        self._dispatcher.start()
+
+        # Statistik
+        self.fired = 0
+        self.suppressed = 0
+        self.sink_errors = 0
+
+    def process(self, room_id, room_name, table, timestamp, value1, value2):
+        """
+        Wertet die Regeln einer Sensor-Tabelle für einen neuen Messwert aus.
+
+        :param room_id: Die ID des Raums.
+        :param room_name: Der Name des Raums.
+        :param table: Der Name der Sensor-Tabelle.
+        :param timestamp: Zeitstempel des Messwerts in Millisekunden seit 1970.
+        :param value1: Der erste Wert (z.B. Temperatur).
+        :param value2: Der zweite Wert (z.B. Luftfeuchtigkeit).
+        :return: Liste der gemeldeten Alerts.
+        """
+        alerts = []
+        values = (timestamp, value1, value2)
+        for rule in self._rules_by_table.get(table, ()):
+            value = values[rule.index]
+            if value is None:
+                continue
+            key = (room_id, rule.name)
+            since, active, last_fired = self._state.get(key, (None, False, None))
+
+            rate = self._rate(room_id, rule, timestamp, value) if rule.rate is not None else None
+            holds = rule.check(value, active, rate)
+            if holds is None:
+                continue
+
+            if holds:
+                since = timestamp if since is None else since
+                if not active and timestamp - since >= rule.duration * 1000:
+                    if last_fired is not None and timestamp - last_fired < rule.cooldown * 1000:
+                        # Innerhalb der Sperrzeit nicht erneut melden
+                        self.suppressed += 1
+                    else:
+                        active, last_fired = True, timestamp
+                        alerts.append(Alert(rule, FIRED, room_id, room_name, value, timestamp))
+                        self.fired += 1
+            else:
+                since = None
+                if active:
+                    active = False
+                    alerts.append(Alert(rule, CLEARED, room_id, room_name, value, timestamp))
+            self._state[key] = (since, active, last_fired)
+
+        for alert in alerts:
+            self._queue.put(alert)
+        return alerts
+
+    def _rate(self, room_id, rule, timestamp, value):
+        # Änderung pro Sekunde gegenüber dem ältesten Messwert im Zeitfenster
+        rows = self.buffer.latest(room_id, rule.table, self.buffer.capacity)
+        if not rows:
+            return None
+        oldest = None
+        for row in rows:
+            if timestamp - row[0] > rule.window * 1000:
+                break
+            if row[rule.index] is not None:
+                oldest = row
+        if oldest is None or oldest[0] >= timestamp:
+            return None
+        return (value - oldest[rule.index]) / ((timestamp - oldest[0]) / 1000)
+
+    def active_alerts(self):
+        """
+        Gibt die aktuell ausgelösten Regeln zurück.
+        :return: Liste von Tupeln (room_id, Regelname).
+        """
+        return [key for key, (_, active, _) in self._state.items() if active]
+
+    def _dispatch(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                break
+            for sink in self.sinks:
+                try:
+                    sink.send(alert)
+                except Exception as e:
+                    self.sink_errors += 1
+                    metrics.record_error("alerts", f"Fehler beim Melden des Alarms an {type(sink).__name__}: {e}")
+
+    def close(self, timeout=5.0):
+        """
+        Meldet noch ausstehende Alarme und beendet den Melde-Thread.
+
+        :param timeout: Maximale Wartezeit in Sekunden.
+        """
+        self._queue.put(None)
+        self._dispatcher.join(timeout)
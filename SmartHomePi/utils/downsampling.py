@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """
+    Reduziert eine Zeitreihe mit dem Largest-Triangle-Three-Buckets-Verfahren auf threshold Punkte.
+    Erster und letzter Punkt bleiben erhalten; aus jedem Bucket dazwischen wird der Punkt gewählt,
+    der mit dem zuvor gewählten Punkt und dem Mittelwert des nächsten Buckets das größte Dreieck bildet.
+    Dadurch bleiben Spitzen und Verlaufsform sichtbar, obwohl nur ein Bruchteil der Punkte übertragen wird.
+
+    :param x: Die x-Werte (aufsteigend sortiert, numerisch, z.B. Julianisches Datum).
+    :param y: Die y-Werte.
+    :param threshold: Die gewünschte Anzahl an Punkten.
+    :return: Ein NumPy-Array mit den Indizes der ausgewählten Punkte.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        # Mittelwert des nächsten Buckets als dritter Eckpunkt
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        # Punkt des aktuellen Buckets mit der größten Dreiecksfläche wählen
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        area = np.abs(
+            (x[a] - avg_x) * (y[range_start:range_end] - y[a])
+            - (x[a] - x[range_start:range_end]) * (avg_y - y[a])
+        )
+        a = range_start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from database.schema import METRICS, to_timestamp
+
+WEEKDAYS = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+
+
+def _source_resolution(bucket_minutes):
+    # Gröbste Rollup-Auflösung, aus der sich die gewünschten Buckets exakt zusammensetzen lassen
+    if bucket_minutes % 1440 == 0:
+        return "day"
+    if bucket_minutes % 60 == 0:
+        return "hour"
+    return "minute"
+
+
+def build_time_bucket_matrix(db, room_id, metrics, start, end, bucket_minutes=60):
+    """
+    Aggregiert mehrere Messgrößen in gemeinsame Zeit-Buckets und gibt sie als kompakte Matrix zurück.
+    Alle Messgrößen werden über denselben Bucket-Zeitpunkt ausgerichtet; fehlende Buckets bleiben leer (NaN).
+    Die Aggregation erfolgt in SQL auf den Rollups, es werden keine Rohdaten geladen.
+
+    :param db: Die Datenbank-Instanz.
+    :param room_id: Die ID des Raums.
+    :param metrics: Dictionary {Anzeigename: Messgröße} (z.B. {"Temperatur": "temperature"}).
+    :param start: Beginn des Zeitraums (datetime oder Zeitstempel-String, UTC).
+    :param end: Ende des Zeitraums (datetime oder Zeitstempel-String, UTC).
+    :param bucket_minutes: Bucket-Länge in Minuten (Standard: 60).
+    :return: DataFrame mit einer Zeile je Messgröße und einer Spalte je Bucket (Mittelwerte).
+    """
+    for metric in metrics.values():
+        if metric not in METRICS:
+            raise ValueError(f"Unbekannte Messgröße: {metric}")
+
+    bucket_seconds = bucket_minutes * 60
+    placeholders = ", ".join("?" for _ in metrics)
+    rows = db.reader.execute(f"""
+        SELECT metric,
+               (CAST(strftime('%s', bucket) AS INTEGER) / ?) * ? AS bucket_epoch,
+               SUM(sum_value) / SUM(count)
+        FROM sensor_rollups
+        WHERE resolution = ? AND room_id = ? AND metric IN ({placeholders})
+          AND bucket >= ? AND bucket <= ?
+        GROUP BY metric, bucket_epoch
+    """, (
+        bucket_seconds, bucket_seconds, _source_resolution(bucket_minutes), room_id, *metrics.values(),
+        to_timestamp(start), to_timestamp(end),
+    )).fetchall()
+
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows, columns=["metric", "bucket", "value"])
+    matrix = df.pivot(index="metric", columns="bucket", values="value")
+
+    # Lückenlose Zeitachse, damit leere Buckets als Lücke und nicht zusammengeschoben erscheinen
+    full_range = np.arange(matrix.columns.min(), matrix.columns.max() + bucket_seconds, bucket_seconds)
+    matrix = matrix.reindex(columns=full_range)
+    matrix.columns = pd.to_datetime(matrix.columns, unit="s")
+
+    names = {metric: name for name, metric in metrics.items()}
+    matrix = matrix.rename(index=names)
+    return matrix.reindex([name for name in metrics if name in matrix.index])
+
+
+def build_weekly_profile(db, room_id, metric, start, end):
+    """
+    Berechnet das mittlere Tagesprofil einer Messgröße als Matrix Wochentag × Stunde (UTC) aus den Stunden-Rollups.
+
+    :param db: Die Datenbank-Instanz.
+    :param room_id: Die ID des Raums.
+    :param metric: Die Messgröße (siehe METRICS, z.B. "temperature").
+    :param start: Beginn des Zeitraums (datetime oder Zeitstempel-String, UTC).
+    :param end: Ende des Zeitraums (datetime oder Zeitstempel-String, UTC).
+    :return: DataFrame mit 7 Zeilen (Mo-So) und 24 Spalten (0-23 Uhr), leere Zellen als NaN.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unbekannte Messgröße: {metric}")
+
+    rows = db.reader.execute("""
+        SELECT CAST(strftime('%w', bucket) AS INTEGER), CAST(strftime('%H', bucket) AS INTEGER),
+               SUM(sum_value) / SUM(count)
+        FROM sensor_rollups
+        WHERE resolution = 'hour' AND room_id = ? AND metric = ? AND bucket >= ? AND bucket <= ?
+        GROUP BY 1, 2
+    """, (room_id, metric, to_timestamp(start), to_timestamp(end))).fetchall()
+
+    matrix = np.full((7, 24), np.nan)
+    for weekday, hour, value in rows:
+        # SQLite zählt Sonntag als 0, die Matrix beginnt mit Montag
+        matrix[(weekday - 1) % 7, hour] = value
+    return pd.DataFrame(matrix, index=WEEKDAYS, columns=range(24))
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from database.schema import SENSOR_TABLES, METRICS
+from utils.downsampling import lttb
+
+
+class LiveSeries:
+    """
+    Diese Klasse hält die Zeitreihe einer Messgröße für ein Liniendiagramm, das live aktualisiert wird.
+    Beim Erstellen wird die Reihe einmal per Database.get_series() geladen und auf max_points Punkte reduziert;
+    refresh() hängt danach nur die neu geschriebenen Messwerte an und verschiebt bei einem gleitenden Zeitraum
+    den Beginn. Wächst die Reihe über das Doppelte von max_points, wird sie erneut per LTTB reduziert.
+    """
+
+    def __init__(self, db, room_id, metric, span=None, max_points=500):
+        """
+        :param db: Die Datenbank-Instanz.
+        :param room_id: Die ID des Raums.
+        :param metric: Die Messgröße (siehe METRICS, z.B. "temperature").
+        :param span: Optionaler gleitender Zeitraum als timedelta (None = gesamter Verlauf).
+        :param max_points: Maximale Anzahl an Punkten im Diagramm (Standard: 500).
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unbekannte Messgröße: {metric}")
+        self.room_id = room_id
+        self.metric = metric
+        self.table, self.column = METRICS[metric]
+        self.span = span
+        self.max_points = max_points
+        self.version = 0
+        self._load(db)
+
+    def _load(self, db):
+        # Lesezeiger vor dem Laden setzen; doppelt gelesene Zeilen verwirft refresh() anhand des Zeitstempels
+        _, self.cursor = db.get_rows_since(self.table, self.room_id)
+        end = datetime.now(timezone.utc)
+        start = end - self.span if self.span else datetime(1970, 1, 1)
+        rows = db.get_series(self.room_id, self.metric, start, end, max_points=self.max_points)
+
+        self.frame = pd.DataFrame(rows, columns=["timestamp", self.column])
+        self.frame["timestamp"] = pd.to_datetime(self.frame["timestamp"], format="ISO8601")
+        self.version += 1
+
+    def refresh(self, db):
+        """
+        Hängt die seit dem letzten Aufruf geschriebenen Messwerte an die Reihe an.
+
+        :param db: Die Datenbank-Instanz.
+        :return: True, falls sich die Reihe geändert hat.
+        """
+        rows, self.cursor = db.get_rows_since(self.table, self.room_id, self.cursor)
+        if rows is None:
+            # Speicherart gewechselt, Reihe vollständig neu laden
+            self._load(db)
+            return True
+
+        index = SENSOR_TABLES[self.table].index(self.column) + 1
+        new = pd.DataFrame([(row[0], row[index]) for row in rows if row[index] is not None],
+                           columns=["timestamp", self.column])
+        new["timestamp"] = pd.to_datetime(new["timestamp"], unit="ms")
+        new[self.column] = new[self.column].astype("float64")
+        frame = self.frame
+        if not frame.empty:
+            new = new[new["timestamp"] > frame["timestamp"].iloc[-1]]
+
+        changed = not new.empty
+        if changed:
+            frame = pd.concat([frame, new], ignore_index=True)
+        if self.span and not frame.empty:
+            start = datetime.now(timezone.utc).replace(tzinfo=None) - self.span
+            if frame["timestamp"].iloc[0] < start:
+                frame = frame[frame["timestamp"] >= start].reset_index(drop=True)
+                changed = True
+
+        if len(frame) > 2 * self.max_points:
+            x = frame["timestamp"].to_numpy().astype("datetime64[ms]").astype(np.int64)
+            frame = frame.iloc[lttb(x, frame[self.column].to_numpy(), self.max_points)].reset_index(drop=True)
+
+        if changed:
+            self.frame = frame
+            self.version += 1
+        return changed
@@ -0,0 +1,326 @@
+"""
+Prozessweite Messpunkte (Zähler, Messwerte und Histogramme) für die Erfassung und die Datenbank.
+
+Die Erfassungs-Threads, der BatchWriter und die Streamlit-Seiten laufen im selben Prozess und teilen sich die
+Instanz metrics. Die Werte stehen im Textformat von Prometheus zur Verfügung (render()), optional als Datei für
+den Textfile-Collector des node_exporter oder über einen lokalen HTTP-Endpunkt (start_metrics_exporter()).
+Fehlermeldungen, die bisher nur per print() im Thread ausgegeben wurden, werden zusätzlich mit Zeitpunkt
+gesammelt (record_error()), damit sie auf der Diagnose-Seite sichtbar sind.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (1 ms bis 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Ein monoton steigender Zähler je Label-Kombination.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help = help_text
+        self._lock = lock
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        """
+        Erhöht den Zähler.
+
+        :param amount: Der Betrag (Standard: 1).
+        :param labels: Die Labels, z.B. room="Küche".
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        """
+        Gibt die Werte je Label-Kombination zurück.
+        :return: Dictionary {Tupel der Labels: Wert}
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def _render(self):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self.values().items()]
+
+
+class Gauge(Counter):
+    """
+    Ein Messwert, der steigen und fallen kann (z.B. die Länge einer Queue).
+    """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        """
+        Setzt den Messwert.
+
+        :param value: Der neue Wert.
+        :param labels: Die Labels, z.B. room="Küche".
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """
+    Ein Histogramm mit festen Bucket-Grenzen je Label-Kombination. Zusätzlich zum Prometheus-Format werden das
+    Maximum und Quantil-Schätzungen für die Diagnose-Seite bereitgestellt.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, lock, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._lock = lock
+        self._series = {}
+
+    def observe(self, value, **labels):
+        """
+        Erfasst einen Wert.
+
+        :param value: Der Wert (bei Dauern in Sekunden).
+        :param labels: Die Labels, z.B. task="adc".
+        """
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0,
+                                              "count": 0, "max": value}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    def summary(self):
+        """
+        Gibt je Label-Kombination Anzahl, Mittelwert, Median, 95 %-Quantil und Maximum zurück.
+        Die Quantile werden innerhalb des Buckets linear interpoliert.
+
+        :return: Dictionary {Tupel der Labels: {"count", "mean", "p50", "p95", "max"}}
+        """
+        with self._lock:
+            series = {key: dict(value, counts=list(value["counts"])) for key, value in self._series.items()}
+        return {
+            key: {
+                "count": value["count"],
+                "mean": value["sum"] / value["count"],
+                "p50": self._quantile(value, 0.5),
+                "p95": self._quantile(value, 0.95),
+                "max": value["max"],
+            }
+            for key, value in series.items() if value["count"]
+        }
+
+    def _quantile(self, series, q):
+        rank = q * series["count"]
+        seen = 0
+        for index, count in enumerate(series["counts"]):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else series["max"]
+                return min(lower + (upper - lower) * (rank - seen) / count, series["max"])
+            seen += count
+        return series["max"]
+
+    def _render(self):
+        with self._lock:
+            series = {key: (list(value["counts"]), value["sum"], value["count"]) for key, value in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Diese Klasse verwaltet alle Messpunkte eines Prozesses. counter(), gauge() und histogram() legen einen
+    Messpunkt beim ersten Aufruf an und geben danach dieselbe Instanz zurück.
+    """
+
+    def __init__(self, max_errors=100):
+        """
+        :param max_errors: Anzahl der aufbewahrten Fehlermeldungen (Standard: 100).
+        """
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.errors = deque(maxlen=max_errors)
+        self.started = time.time()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, threading.Lock(), **kwargs)
+            elif not isinstance(metric, cls) or metric.kind != cls.kind:
+                raise ValueError(f"Messpunkt {name} ist bereits als {metric.kind} angelegt")
+        return metric
+
+    def counter(self, name, help_text=""):
+        """
+        Gibt den Zähler name zurück und legt ihn bei Bedarf an.
+        """
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        """
+        Gibt den Messwert name zurück und legt ihn bei Bedarf an.
+        """
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        """
+        Gibt das Histogramm name zurück und legt es bei Bedarf an.
+        """
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def get(self, name):
+        """
+        Gibt einen vorhandenen Messpunkt zurück oder None.
+        """
+        with self._lock:
+            return self._metrics.get(name)
+
+    def record_error(self, source, message):
+        """
+        Gibt eine Fehlermeldung aus, zählt sie und bewahrt sie für die Diagnose-Seite auf.
+
+        :param source: Die Quelle, z.B. "scheduler" oder "batch_writer".
+        :param message: Die Fehlermeldung.
+        """
+        print(message)
+        self.counter("smarthome_errors_total", "Anzahl der Fehlermeldungen je Quelle").inc(source=source)
+        self.errors.append((datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), source, message))
+
+    def render(self):
+        """
+        Gibt alle Messpunkte im Textformat von Prometheus zurück.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric._render())
+        lines.append("# HELP smarthome_uptime_seconds Laufzeit des Prozesses")
+        lines.append("# TYPE smarthome_uptime_seconds gauge")
+        lines.append(f"smarthome_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """
+        Schreibt alle Messpunkte atomar in eine Datei (z.B. für den Textfile-Collector des node_exporter).
+
+        :param path: Der Pfad der Datei, üblicherweise mit der Endung .prom.
+        """
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+
+# Prozessweite Instanz, wie beim Supervisor werden Module nur einmal importiert
+metrics = MetricsRegistry()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_metrics_exporter(port=None, textfile=None, interval=15.0, registry=None):
+    """
+    Stellt die Messpunkte prozessweit bereit, falls noch nicht geschehen: über einen lokalen HTTP-Endpunkt
+    (http://127.0.0.1:<port>/metrics) und/oder als regelmäßig geschriebene Datei. Ohne Angaben werden die
+    Umgebungsvariablen SMARTHOME_METRICS_PORT und SMARTHOME_METRICS_FILE ausgewertet.
+
+    :param port: Optionaler Port des HTTP-Endpunkts.
+    :param textfile: Optionaler Pfad der Datei im Prometheus-Textformat.
+    :param interval: Abstand in Sekunden, in dem die Datei geschrieben wird (Standard: 15).
+    :param registry: Die MetricsRegistry (Standard: prozessweite Instanz).
+    :return: Dictionary mit "port" und "textfile" der laufenden Bereitstellung.
+    """
+    global _exporter
+    registry = registry or metrics
+    with _exporter_lock:
+        if _exporter is not None:
+            return _exporter
+
+        if port is None and os.environ.get("SMARTHOME_METRICS_PORT"):
+            port = int(os.environ["SMARTHOME_METRICS_PORT"])
+        textfile = textfile or os.environ.get("SMARTHOME_METRICS_FILE")
+        _exporter = {"port": None, "textfile": textfile}
+
+        if port is not None:
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = registry.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+                threading.Thread(target=server.serve_forever, name="MetricsExporter", daemon=True).start()
+                _exporter["port"] = server.server_port
+            except OSError as e:
+                registry.record_error("metrics", f"Metrik-Endpunkt auf Port {port} nicht verfügbar: {e}")
+
+        if textfile:
+            def write():
+                while True:
+                    try:
+                        registry.write_textfile(textfile)
+                    except OSError as e:
+                        registry.record_error("metrics", f"Fehler beim Schreiben von {textfile}: {e}")
+                    time.sleep(interval)
+
+            threading.Thread(target=write, name="MetricsTextfile", daemon=True).start()
+        return _exporter
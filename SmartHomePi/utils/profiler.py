@@ -0,0 +1,377 @@
+"""
+Zuschaltbares Profiling des Seitenaufbaus der Streamlit-Seiten.
+
+Ist das Profiling aktiv, misst RenderProfiler je Abschnitt einer Seite (section()) die Gesamtzeit und teilt sie auf:
+
+- "sql": alle Abfragen über die überwachten Datenbankverbindungen (watch()), inklusive Lesen der Ergebniszeilen
+- "dataframe": Aufbereitung der Daten und Aufbau der DataFrames (per measure() markiert)
+- "figure": Erstellen und Anpassen der Plotly-Diagramme (per measure() markiert)
+- "serialize": Übergabe der Diagramme an Streamlit (plotly_chart()), dabei wird das Diagramm als JSON serialisiert
+- "other": der Rest des Abschnitts (Widgets, Layout, Ringpuffer)
+
+Verschachtelte Messungen werden nur einmal gezählt, SQL innerhalb eines DataFrame-Aufbaus zählt z.B. als SQL.
+Zusätzlich werden je Abschnitt die Anzahl der Abfragen und die Größe der Diagrammdaten erfasst.
+
+Jeder Seitenaufbau wird als JSON-Zeile an PROFILE_LOG angehängt und fließt in das Histogramm
+smarthome_render_seconds der prozessweiten Messpunkte ein. Ohne aktives Profiling sind alle Aufrufe leere
+Kontexte und die Seite läuft unverändert.
+"""
+import itertools
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import streamlit as st
+from utils.metrics import metrics
+
+# Protokoll der gemessenen Seitenaufbauten (eine JSON-Zeile je Seitenaufbau)
+PROFILE_LOG = "render_profile.log"
+
+CATEGORIES = ("sql", "dataframe", "figure", "serialize")
+
+# Spaltennamen der Aufschlüsselung
+CATEGORY_LABELS = {
+    "sql": "SQL",
+    "dataframe": "DataFrame",
+    "figure": "Diagramm",
+    "serialize": "Serialisierung",
+    "other": "Sonstiges",
+}
+
+
+def profiling_default():
+    """
+    Gibt zurück, ob das Profiling standardmäßig aktiv ist (Umgebungsvariable SMARTHOME_PROFILE=1).
+    """
+    return os.environ.get("SMARTHOME_PROFILE", "") not in ("", "0")
+
+
+class _TimedCursor:
+    """
+    Cursor, der jede Abfrage als SQL-Zeit erfasst. Die Ergebniszeilen werden dabei sofort gelesen, da SQLite
+    die eigentliche Arbeit erst beim Lesen erledigt.
+    """
+
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._rows = iter(())
+
+    def execute(self, sql, parameters=()):
+        with self._profiler.measure("sql"):
+            self._cursor.execute(sql, parameters)
+            self._rows = iter(self._cursor.fetchall())
+        self._profiler.count_query()
+        return self
+
+    def executemany(self, sql, parameters):
+        with self._profiler.measure("sql"):
+            self._cursor.executemany(sql, parameters)
+        self._profiler.count_query()
+        return self
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=None):
+        return list(itertools.islice(self._rows, size or self._cursor.arraysize))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TimedConnection:
+    """
+    Hülle um eine SQLite-Verbindung, deren Abfragen über _TimedCursor laufen. Alle übrigen Attribute werden an
+    die Verbindung weitergereicht.
+    """
+
+    def __init__(self, connection, profiler):
+        self._connection = connection
+        self._profiler = profiler
+
+    def cursor(self):
+        return _TimedCursor(self._connection.cursor(), self._profiler)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, script):
+        with self._profiler.measure("sql"):
+            return self._connection.executescript(script)
+
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._connection.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class RenderProfiler:
+    """
+    Diese Klasse misst den Seitenaufbau einer Streamlit-Seite je Abschnitt. Wie die Datenbank-Instanz der Seiten
+    wird sie bei jedem Seitenaufbau neu angelegt; Fragmente, die allein neu laufen, verwenden die Instanz des
+    letzten vollständigen Seitenaufbaus und werden als eigener Lauf protokolliert.
+    """
+
+    def __init__(self, page, log_path=PROFILE_LOG):
+        """
+        :param page: Der Name der Seite im Protokoll (z.B. "Sensors").
+        :param log_path: Der Pfad des Protokolls (Standard: "render_profile.log").
+        """
+        self.page = page
+        self.log_path = log_path
+        self.enabled = False
+        self.last_run = None
+        self._run = None
+        self._section = None
+        self._stack = []
+
+    @contextmanager
+    def run(self, scope="page"):
+        """
+        Misst einen Seitenaufbau und protokolliert ihn am Ende. Innerhalb eines laufenden Seitenaufbaus (z.B. ein
+        Fragment beim vollständigen Seitenaufbau) gehören die Abschnitte zum äußeren Lauf.
+
+        :param scope: Die Art des Laufs im Protokoll, z.B. "page" oder "live" für ein Fragment.
+        """
+        if not self.enabled or self._run is not None:
+            yield
+            return
+        self._run = {"time": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), "page": self.page,
+                     "scope": scope, "sections": []}
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            run, self._run = self._run, None
+            run["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self._finish(run)
+
+    def note(self, **values):
+        """
+        Ergänzt den laufenden Seitenaufbau im Protokoll um weitere Angaben (z.B. room="Küche").
+        """
+        if self._run is not None:
+            self._run.update(values)
+
+    def section(self, name):
+        """
+        Misst einen Abschnitt der Seite. Verschachtelte Abschnitte zählen zum äußeren Abschnitt.
+
+        :param name: Der Name des Abschnitts (z.B. "show_sensor_heatmap").
+        :return: Kontextmanager.
+        """
+        if self._run is None or self._stack:
+            return nullcontext()
+        return self._measure_section(name)
+
+    @contextmanager
+    def _measure_section(self, name):
+        self._section = {"section": name, "queries": 0, "charts": 0, "payload_bytes": 0,
+                         **{category: 0.0 for category in (*CATEGORIES, "overhead")}}
+        frame = {"start": time.perf_counter(), "nested": 0.0}
+        self._stack = [frame]
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame["start"]
+            section, self._section, self._stack = self._section, None, []
+            total = elapsed - section.pop("overhead")
+            result = {"section": name, "total_ms": round(total * 1000, 2)}
+            for category in CATEGORIES:
+                result[f"{category}_ms"] = round(section[category] * 1000, 2)
+            result["other_ms"] = round(max(total - sum(section[category] for category in CATEGORIES), 0) * 1000, 2)
+            result.update(queries=section["queries"], charts=section["charts"], payload_bytes=section["payload_bytes"])
+            self._run["sections"].append(result)
+
+    def measure(self, category):
+        """
+        Ordnet die Zeit eines Code-Blocks innerhalb eines Abschnitts einer Kategorie zu.
+
+        :param category: "sql", "dataframe", "figure" oder "serialize".
+        :return: Kontextmanager (ohne laufenden Abschnitt wirkungslos).
+        """
+        if not self._stack:
+            return nullcontext()
+        return self._measure(category)
+
+    @contextmanager
+    def _measure(self, category):
+        frame = {"start": time.perf_counter(), "nested": 0.0}
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame["start"]
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["nested"] += elapsed
+                self._section[category] += elapsed - frame["nested"]
+
+    def count_query(self):
+        if self._section is not None:
+            self._section["queries"] += 1
+
+    def plotly_chart(self, fig, **kwargs):
+        """
+        Zeigt ein Plotly-Diagramm wie st.plotly_chart an und erfasst dabei die Serialisierung und die Größe der
+        Diagrammdaten.
+
+        :param fig: Das Plotly-Diagramm.
+        :param kwargs: Weitere Argumente für st.plotly_chart.
+        """
+        if self._section is None:
+            return st.plotly_chart(fig, **kwargs)
+        with self.measure("overhead"):
+            # Gleiche Serialisierung wie in st.plotly_chart, nur für die Größe; zählt nicht zum Abschnitt
+            self._section["payload_bytes"] += len(pio.to_json(fig, validate=False).encode("utf-8"))
+            self._section["charts"] += 1
+        with self.measure("serialize"):
+            return st.plotly_chart(fig, **kwargs)
+
+    @contextmanager
+    def watch(self, db):
+        """
+        Erfasst während des Blocks alle Abfragen über db.connection und db.reader als SQL-Zeit.
+
+        :param db: Die Datenbank-Instanz.
+        """
+        if not self.enabled or isinstance(db.connection, _TimedConnection):
+            yield db
+            return
+        connection, reader = db.connection, db.reader
+        db.connection = _TimedConnection(connection, self)
+        db.reader = db.connection if reader is connection else _TimedConnection(reader, self)
+        try:
+            yield db
+        finally:
+            db.connection, db.reader = connection, reader
+
+    def _finish(self, run):
+        histogram = metrics.histogram("smarthome_render_seconds", "Dauer des Seitenaufbaus je Seite und Abschnitt")
+        for section in run["sections"]:
+            histogram.observe(section["total_ms"] / 1000, page=self.page, section=section["section"])
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        except OSError as e:
+            metrics.record_error("profiler", f"Fehler beim Schreiben von {self.log_path}: {e}")
+        if run["scope"] == "page":
+            self.last_run = run
+
+
+def load_profile_log(path, page=None, limit=200):
+    """
+    Liest die letzten Einträge des Protokolls.
+
+    :param path: Der Pfad des Protokolls.
+    :param page: Optional nur Einträge dieser Seite.
+    :param limit: Maximale Anzahl der Einträge (Standard: 200).
+    :return: Liste der Einträge, älteste zuerst.
+    """
+    entries = deque(maxlen=limit)
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if page is None or entry.get("page") == page:
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return list(entries)
+
+
+def breakdown_frame(run):
+    """
+    Gibt die Aufschlüsselung eines Seitenaufbaus je Abschnitt als DataFrame zurück.
+
+    :param run: Ein Eintrag des Protokolls.
+    :return: DataFrame mit Gesamtzeit, Zeit je Kategorie in ms, Abfragen, Diagrammen und Diagrammdaten in KB.
+    """
+    rows = []
+    for section in run["sections"]:
+        rows.append({
+            "Abschnitt": section["section"],
+            "Gesamt (ms)": section["total_ms"],
+            **{f"{label} (ms)": section[f"{category}_ms"] for category, label in CATEGORY_LABELS.items()},
+            "Abfragen": section["queries"],
+            "Diagramme": section["charts"],
+            "Diagrammdaten (KB)": section["payload_bytes"] / 1024,
+        })
+    return pd.DataFrame(rows)
+
+
+def history_frame(entries):
+    """
+    Fasst die Abschnitte mehrerer Seitenaufbauten zusammen.
+
+    :param entries: Einträge des Protokolls (siehe load_profile_log).
+    :return: DataFrame je Abschnitt mit Anzahl, Mittelwert, 95 %-Quantil und Maximum der Gesamtzeit, mittleren
+             Zeiten je Kategorie und mittlerer Größe der Diagrammdaten.
+    """
+    sections = pd.DataFrame([section for entry in entries for section in entry.get("sections", [])])
+    if sections.empty:
+        return sections
+    grouped = sections.groupby("section", sort=False)
+    history = pd.DataFrame({
+        "Läufe": grouped.size(),
+        "Mittel (ms)": grouped["total_ms"].mean(),
+        "p95 (ms)": grouped["total_ms"].quantile(0.95),
+        "Max (ms)": grouped["total_ms"].max(),
+        **{f"Ø {label} (ms)": grouped[f"{category}_ms"].mean() for category, label in CATEGORY_LABELS.items()},
+        "Ø Diagrammdaten (KB)": grouped["payload_bytes"].mean() / 1024,
+    })
+    return history.rename_axis("Abschnitt").reset_index()
+
+
+def show_profile(profiler, history=200):
+    """
+    Zeigt die Aufschlüsselung des letzten Seitenaufbaus und den Verlauf aus dem Protokoll an.
+
+    :param profiler: Der RenderProfiler der Seite.
+    :param history: Anzahl der Seitenaufbauten im Verlauf (Standard: 200).
+    """
+    run = profiler.last_run
+    if run is None:
+        return
+
+    with st.expander("⏱️ Render-Profil", expanded=True):
+        st.caption(f"Letzter Seitenaufbau: {run['total_ms']:.0f} ms. Protokoll: {profiler.log_path}")
+        breakdown = breakdown_frame(run)
+        st.dataframe(breakdown, hide_index=True, use_container_width=True)
+
+        parts = breakdown.melt(
+            id_vars="Abschnitt",
+            value_vars=[f"{label} (ms)" for label in CATEGORY_LABELS.values()],
+            var_name="Anteil",
+            value_name="Zeit (ms)",
+        )
+        fig = px.bar(parts, x="Zeit (ms)", y="Abschnitt", color="Anteil", orientation="h")
+        fig.update_layout(yaxis={"autorange": "reversed"})
+        st.plotly_chart(fig, use_container_width=True)
+
+        entries = load_profile_log(profiler.log_path, profiler.page, history)
+        st.subheader(f"Verlauf der letzten {len(entries)} Seitenaufbauten")
+        st.dataframe(history_frame(entries), hide_index=True, use_container_width=True)
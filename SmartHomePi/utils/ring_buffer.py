@@ -0,0 +1,119 @@
+import threading
+from collections import deque
+from database.schema import SENSOR_TABLES, METRICS, to_epoch_ms
+
+
+class ReadingsBuffer:
+    """
+    Diese Klasse hält je Raum und Sensor-Tabelle die letzten Messwerte im Speicher, damit die Anzeige der
+    aktuellen Werte (LCD, Metriken der Sensors-Seite, Alarme) keine Datenbank-Abfrage braucht.
+    Die Erfassung schreibt jeden Messwert mit append() in einen Ringpuffer fester Größe; gelesen wird mit
+    latest() bzw. latest_value() unter einer gemeinsamen Sperre.
+
+    Die Datenbank wird nur beim Kaltstart gelesen: attach() füllt die Puffer eines Raums einmal mit den
+    neuesten gespeicherten Messwerten. Für Räume ohne laufende Erfassung in diesem Prozess geben die
+    Lesemethoden None zurück, der Aufrufer liest dann wie bisher aus der Datenbank.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        :param capacity: Anzahl der Messwerte je Raum und Sensor-Tabelle (Standard: 64).
+        """
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._live = set()
+
+    def attach(self, room_id, db=None):
+        """
+        Meldet die Erfassung eines Raums an und füllt dessen Puffer (Kaltstart) aus der Datenbank.
+
+        :param room_id: Die ID des Raums.
+        :param db: Optionale Datenbank-Instanz für den Kaltstart (None = mit leeren Puffern beginnen).
+        """
+        loaded = {}
+        if db is not None:
+            for table in SENSOR_TABLES:
+                try:
+                    rows = db.get_raw_rows(table, room_id, limit=self.capacity, newest_first=True)
+                except Exception as e:
+                    print(f"Fehler beim Laden der letzten Messwerte aus {table}: {e}")
+                    rows = []
+                loaded[table] = rows[::-1]
+
+        with self._lock:
+            for table in SENSOR_TABLES:
+                self._rows[(room_id, table)] = deque(loaded.get(table, ()), maxlen=self.capacity)
+            self._live.add(room_id)
+
+    def detach(self, room_id):
+        """
+        Meldet die Erfassung eines Raums ab. Die Werte werden danach wieder aus der Datenbank gelesen.
+
+        :param room_id: Die ID des Raums.
+        """
+        with self._lock:
+            self._live.discard(room_id)
+            for table in SENSOR_TABLES:
+                self._rows.pop((room_id, table), None)
+
+    def is_live(self, room_id):
+        """
+        Prüft, ob die Puffer eines Raums von einer laufenden Erfassung aktuell gehalten werden.
+        """
+        with self._lock:
+            return room_id in self._live
+
+    def append(self, room_id, table, timestamp, value1, value2):
+        """
+        Speichert einen Messwert. Messwerte für nicht angemeldete Räume werden ignoriert.
+
+        :param room_id: Die ID des Raums.
+        :param table: Der Name der Sensor-Tabelle.
+        :param timestamp: Der Zeitstempel (String, datetime oder Millisekunden seit 1970).
+        :param value1: Der erste Wert (z.B. Temperatur).
+        :param value2: Der zweite Wert (z.B. Luftfeuchtigkeit).
+        """
+        ts = timestamp if isinstance(timestamp, int) else to_epoch_ms(timestamp)
+        with self._lock:
+            rows = self._rows.get((room_id, table))
+            if rows is not None:
+                rows.append((ts, value1, value2))
+
+    def latest(self, room_id, table, count=2):
+        """
+        Gibt die count neuesten Messwerte einer Sensor-Tabelle zurück.
+
+        :param room_id: Die ID des Raums.
+        :param table: Der Name der Sensor-Tabelle.
+        :param count: Anzahl der Messwerte (Standard: 2).
+        :return: Liste von Tupeln (Millisekunden seit 1970, value1, value2), neueste zuerst,
+                 oder None, falls für den Raum keine Erfassung läuft.
+        """
+        with self._lock:
+            if room_id not in self._live:
+                return None
+            rows = self._rows[(room_id, table)]
+            return [rows[-i] for i in range(1, min(count, len(rows)) + 1)]
+
+    def latest_value(self, room_id, metric):
+        """
+        Gibt den neuesten Wert einer Messgröße zurück.
+
+        :param room_id: Die ID des Raums.
+        :param metric: Die Messgröße (siehe METRICS, z.B. "temperature").
+        :return: Tupel (Millisekunden seit 1970, Wert), (None, None) ohne Messwert
+                 oder None, falls für den Raum keine Erfassung läuft.
+        """
+        table, column = METRICS[metric]
+        rows = self.latest(room_id, table, 1)
+        if rows is None:
+            return None
+        if not rows:
+            return None, None
+        index = SENSOR_TABLES[table].index(column) + 1
+        return rows[0][0], rows[0][index]
+
+
+# Prozessweite Instanz: die Erfassungs-Threads des Supervisors und die Streamlit-Seiten laufen im selben Prozess
+readings_buffer = ReadingsBuffer()
@@ -0,0 +1,193 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import metrics
+
+
+class ScheduledTask:
+    """
+    Eine periodische Leseaufgabe des DeadlineScheduler (z.B. ein Sensor).
+    """
+
+    def __init__(self, name, period, read, on_result, timeout=None):
+        """
+        :param name: Der Name der Aufgabe (z.B. "dht22_data").
+        :param period: Das Abtastintervall in Sekunden.
+        :param read: Funktion ohne Parameter, die den Messwert liest (läuft im Thread-Pool).
+        :param on_result: Funktion, die mit dem Messwert aufgerufen wird (läuft im Scheduler-Thread).
+        :param timeout: Maximale Dauer eines Lesevorgangs in Sekunden (Standard: das Abtastintervall).
+        """
+        self.name = name
+        self.period = period
+        self.read = read
+        self.on_result = on_result
+        self.timeout = timeout if timeout is not None else period
+        self.deadline = None
+        self.future = None
+        self.started = None
+        self.timed_out = False
+
+        # Statistik
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.skipped = 0
+
+
+class DeadlineScheduler:
+    """
+    Dieser Scheduler führt Leseaufgaben mit eigenem Abtastintervall aus. Die Fälligkeiten liegen auf einem festen
+    Raster (Startzeitpunkt + n × Intervall) der monotonen Uhr, daher driftet der Takt nicht um die Lesedauer.
+    Die Lesevorgänge laufen parallel in einem Thread-Pool, sodass ein langsamer Sensor (DHT22) die schnellen
+    ADC-Sensoren nicht aufhält. Ergebnisse werden im Thread des Schedulers weiterverarbeitet.
+
+    Überschreitet ein Lesevorgang sein Zeitlimit, wird sein Ergebnis verworfen. Ist er zum nächsten Termin noch
+    nicht beendet, wird dieser Termin übersprungen statt einen weiteren Lesevorgang zu stapeln.
+
+    Lesedauer, Abweichung vom Termin (Jitter) und verworfene Messungen werden in utils.metrics erfasst.
+    """
+
+    def __init__(self, max_workers=None, clock=time.monotonic, poll_interval=0.25, speed=1.0, labels=None):
+        """
+        :param max_workers: Größe des Thread-Pools (Standard: eine Worker-Thread je Aufgabe + 1).
+        :param clock: Die monotone Uhr (Standard: time.monotonic).
+        :param poll_interval: Maximale Wartezeit in Sekunden, bevor das Stop-Event erneut geprüft wird.
+        :param speed: Zeitraffer-Faktor der Uhr, z.B. bei simulierten Sensoren (Standard: 1.0 = Echtzeit).
+        :param labels: Optionale zusätzliche Labels der Messpunkte, z.B. {"room": "Küche"}.
+        """
+        self.max_workers = max_workers
+        self.labels = labels or {}
+        self._read_seconds = metrics.histogram("smarthome_sensor_read_seconds", "Dauer eines Lesevorgangs")
+        self._jitter_seconds = metrics.histogram("smarthome_schedule_jitter_seconds",
+                                                 "Verspätung eines Lesevorgangs gegenüber seinem Termin")
+        self._reads = metrics.counter("smarthome_sensor_reads_total", "Abgeschlossene Lesevorgänge")
+        self._dropped = metrics.counter("smarthome_samples_dropped_total",
+                                        "Verworfene bzw. ausgelassene Messungen nach Grund")
+        self.clock = clock
+        self.speed = speed
+        self.poll_interval = poll_interval
+        self.tasks = []
+        self._wakeup = threading.Event()
+
+    def add_task(self, name, period, read, on_result, timeout=None):
+        """
+        Fügt eine periodische Leseaufgabe hinzu (siehe ScheduledTask).
+        :return: Die angelegte ScheduledTask.
+        """
+        task = ScheduledTask(name, period, read, on_result, timeout)
+        self.tasks.append(task)
+        return task
+
+    def run(self, stop_event):
+        """
+        Führt die Aufgaben aus, bis stop_event gesetzt wird. Blockiert den aufrufenden Thread.
+
+        :param stop_event: threading.Event zum Beenden.
+        """
+        if not self.tasks:
+            return
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers or len(self.tasks) + 1, thread_name_prefix="SensorRead")
+        start = self.clock()
+        for task in self.tasks:
+            task.deadline = start
+
+        try:
+            while not stop_event.is_set():
+                self._wakeup.clear()
+                now = self.clock()
+                for task in self.tasks:
+                    self._collect(task, now)
+                    if now >= task.deadline:
+                        self._dispatch(pool, task, now)
+
+                next_event = min(self._next_event(task) for task in self.tasks)
+                # Wartezeit der Uhr in echte Sekunden umrechnen
+                wait = min(max(0.0, next_event - self.clock()) / self.speed, self.poll_interval)
+                if wait > 0:
+                    self._wakeup.wait(wait)
+        finally:
+            # Hängende Lesevorgänge nicht abwarten, damit der Stopp sofort greift
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _timed_read(self, task):
+        # Läuft im Thread-Pool; gemessen wird die echte Dauer des Lesevorgangs
+        started = time.perf_counter()
+        try:
+            return task.read()
+        finally:
+            self._read_seconds.observe(time.perf_counter() - started, task=task.name, **self.labels)
+
+    def _dispatch(self, pool, task, now):
+        if task.future is None:
+            self._jitter_seconds.observe((now - task.deadline) / self.speed, task=task.name, **self.labels)
+            task.started = now
+            task.timed_out = False
+            task.future = pool.submit(self._timed_read, task)
+            task.future.add_done_callback(lambda _: self._wakeup.set())
+        else:
+            # Der vorherige Lesevorgang läuft noch: Termin auslassen
+            task.skipped += 1
+            self._dropped.inc(task=task.name, reason="skipped", **self.labels)
+
+        # Nächster Termin auf dem festen Raster; verpasste Termine werden übersprungen
+        task.deadline += task.period
+        if task.deadline <= now:
+            missed = int((now - task.deadline) // task.period) + 1
+            task.skipped += missed
+            self._dropped.inc(missed, task=task.name, reason="skipped", **self.labels)
+            task.deadline += missed * task.period
+
+    def _collect(self, task, now):
+        future = task.future
+        if future is None:
+            return
+
+        if not future.done():
+            # Das Zeitlimit gilt in echten Sekunden, da die Lesevorgänge auch im Zeitraffer in Echtzeit laufen
+            if not task.timed_out and (now - task.started) / self.speed > task.timeout:
+                task.timed_out = True
+                task.timeouts += 1
+                self._dropped.inc(task=task.name, reason="timeout", **self.labels)
+                metrics.record_error("scheduler",
+                                     f"Zeitüberschreitung beim Lesen von {task.name} (> {task.timeout:.1f} s)")
+            return
+
+        task.future = None
+        if task.timed_out:
+            # Verspätetes Ergebnis verwerfen, der Messzeitpunkt passt nicht mehr zum Takt
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            task.failed += 1
+            self._dropped.inc(task=task.name, reason="error", **self.labels)
+            metrics.record_error("scheduler", f"Fehler beim Auslesen von {task.name}: {e}")
+            return
+
+        task.completed += 1
+        self._reads.inc(task=task.name, **self.labels)
+        try:
+            task.on_result(result)
+        except Exception as e:
+            metrics.record_error("scheduler", f"Fehler beim Verarbeiten des Messwerts von {task.name}: {e}")
+
+    def _next_event(self, task):
+        if task.future is not None and not task.timed_out:
+            return min(task.deadline, task.started + task.timeout * self.speed)
+        return task.deadline
+
+    def stats(self):
+        """
+        Gibt die Statistik aller Aufgaben zurück.
+        :return: Dictionary {Name: {"completed", "failed", "timeouts", "skipped"}}
+        """
+        return {
+            task.name: {
+                "completed": task.completed,
+                "failed": task.failed,
+                "timeouts": task.timeouts,
+                "skipped": task.skipped,
+            }
+            for task in self.tasks
+        }
@@ -0,0 +1,106 @@
+import pandas as pd
+from database.schema import SENSOR_TABLES
+
+# Anzeigename -> (Tabelle, Spalte) der Messgrößen, die auf der Sensors-Seite ausgewertet werden
+SENSOR_COLUMNS = {
+    "Temperatur": ("dht22_data", "temperature"),
+    "Luftfeuchtigkeit": ("dht22_data", "humidity"),
+    "Lichtintensität": ("light_sensor_data", "lux"),
+    "Gas": ("gas_sensor_data", "ppm"),
+}
+
+
+class SensorSnapshot:
+    """
+    Diese Klasse lädt die Sensor-Daten eines Raums einmal pro Seitenaufbau und stellt sie allen
+    Abschnitten der Sensors-Seite als typisierte DataFrames zur Verfügung. Jede Sensor-Tabelle wird
+    genau einmal abgefragt, die Zeitstempel werden genau einmal in datetime umgewandelt.
+    Mit refresh() werden später nur die seitdem geschriebenen Messwerte nachgeladen.
+    """
+
+    def __init__(self, db, room_id, limit=100000):
+        """
+        Lädt die neuesten Messwerte aller Sensor-Tabellen für einen Raum.
+
+        :param db: Die Datenbank-Instanz.
+        :param room_id: Die ID des Raums.
+        :param limit: Maximale Anzahl an Datensätzen je Tabelle (Standard: 100000).
+        """
+        self.room_id = room_id
+        self.limit = limit
+        self.cursors = {}
+        self.frames = {table: self._load(db, table) for table in SENSOR_TABLES}
+
+    def _load(self, db, table):
+        # Lesezeiger vor dem Laden setzen; doppelt gelesene Zeilen verwirft refresh() anhand des Zeitstempels
+        _, self.cursors[table] = db.get_rows_since(table, self.room_id)
+        rows = db.get_raw_rows(table, self.room_id, limit=self.limit, newest_first=True)
+        return self._to_frame(table, rows)
+
+    def _to_frame(self, table, rows):
+        column1, column2 = SENSOR_TABLES[table]
+
+        # Die Zeitstempel kommen als Millisekunden seit 1970 und müssen nicht als Text geparst werden
+        df = pd.DataFrame(rows, columns=["timestamp", column1, column2])
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+        for column in (column1, column2):
+            if column == "fire_detected":
+                df[column] = df[column].fillna(0).astype(bool)
+            else:
+                df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+        return df
+
+    def refresh(self, db):
+        """
+        Lädt nur die Messwerte nach, die seit dem Laden bzw. dem letzten refresh() geschrieben wurden,
+        und stellt sie den DataFrames voran.
+
+        :param db: Die Datenbank-Instanz.
+        :return: Anzahl der neuen Datensätze über alle Tabellen.
+        """
+        added = 0
+        for table in SENSOR_TABLES:
+            rows, self.cursors[table] = db.get_rows_since(table, self.room_id, self.cursors[table])
+            if rows is None:
+                # Speicherart gewechselt, Tabelle vollständig neu laden
+                self.frames[table] = self._load(db, table)
+                continue
+            if not rows:
+                continue
+
+            df = self.frames[table]
+            new = self._to_frame(table, rows[::-1])
+            if not df.empty:
+                new = new[new["timestamp"] > df["timestamp"].iloc[0]]
+            if new.empty:
+                continue
+            self.frames[table] = pd.concat([new, df], ignore_index=True).head(self.limit)
+            added += len(new)
+        return added
+
+    def frame(self, table, limit=None):
+        """
+        Gibt die Messwerte einer Tabelle zurück, neueste zuerst.
+
+        :param table: Der Name der Sensor-Tabelle.
+        :param limit: Optionale Begrenzung auf die neuesten limit Datensätze.
+        :return: DataFrame mit den Spalten timestamp, value1, value2.
+        """
+        df = self.frames[table]
+        return df if limit is None else df.head(limit)
+
+    def latest(self, table, count=2):
+        """
+        Gibt die count neuesten Datensätze einer Tabelle zurück.
+
+        :param table: Der Name der Sensor-Tabelle.
+        :param count: Anzahl der Datensätze (Standard: 2).
+        :return: DataFrame mit den neuesten Datensätzen, neueste zuerst.
+        """
+        return self.frames[table].head(count)
+
+    def is_empty(self):
+        """
+        Prüft, ob für den Raum überhaupt Messwerte vorliegen.
+        """
+        return all(df.empty for df in self.frames.values())
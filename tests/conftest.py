@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Die Anwendung wird aus dem Verzeichnis SmartHomePi gestartet und importiert ihre Module von dort aus
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SmartHomePi"))
@@ -0,0 +1,395 @@
+import math
+import sqlite3
+import time
+import uuid
+import urllib.error
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.archive import archive_closed_days
+from database.batch_writer import BatchWriter
+from database.collector import Collector, STORED, DUPLICATE
+from database.compression import (TableCompressor, table_settings, fill_gaps, save_compression_settings,
+                                  set_room_compression)
+from database.db import Database
+from database.forwarder import Forwarder, check_collector_url, pack_payload, post_payload
+from database.migrations import MIGRATIONS, get_schema_version
+from database.readings import get_storage_engine, insert_readings, migrate_to_narrow, migration_progress
+from database.schema import DEFAULT_RETENTION, SENSOR_TABLES, from_epoch_ms, to_epoch_ms
+from utils.downsampling import lttb
+
+START = datetime(2024, 1, 10, 12, 0, 0)
+
+
+def _timestamp(seconds):
+    return (START + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _count(connection, table):
+    return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "sensors.db")
+
+
+@pytest.fixture
+def db(db_file):
+    database = Database(db_file)
+    yield database
+    database.connection.close()
+
+
+@pytest.fixture
+def room_id(db):
+    db.insert_room("Küche")
+    return db.get_room_id_by_name("Küche")
+
+
+def test_batch_writer_flushes_full_batch(db, db_file, room_id):
+    """Ein voller Batch wird sofort geschrieben, nicht erst nach flush_interval."""
+    writer = BatchWriter(db_file, max_batch_size=5, flush_interval=60)
+    for i in range(5):
+        writer.insert_data("gas_sensor_data", room_id, 80.0 + i, 0.1, _timestamp(i))
+    assert _wait_for(lambda: _count(db.connection, "gas_sensor_data") == 5)
+    writer.close()
+
+
+def test_batch_writer_close_writes_remaining(db, db_file, room_id):
+    """close() schreibt den Rest des Puffers samt Rollups."""
+    writer = BatchWriter(db_file, max_batch_size=100, flush_interval=60)
+    for i in range(3):
+        writer.insert_data("dht22_data", room_id, 21.0, 45.0, _timestamp(i))
+    writer.close()
+    assert _count(db.connection, "dht22_data") == 3
+    assert db.connection.execute("""
+        SELECT count FROM sensor_rollups WHERE resolution = 'day' AND metric = 'temperature'
+    """).fetchone()[0] == 3
+
+
+def test_batch_writer_retries_while_database_is_locked(db, db_file, room_id, monkeypatch):
+    """Ein fehlgeschlagener Flush verwirft den Puffer nicht, er wird nach dem Entsperren geschrieben."""
+    monkeypatch.setattr("database.db.BUSY_TIMEOUT_MS", 100)
+    writer = BatchWriter(db_file, max_batch_size=2, flush_interval=60, max_backoff=0.2)
+    blocker = sqlite3.connect(db_file, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        for i in range(4):
+            writer.insert_data("gas_sensor_data", room_id, 80.0, 0.1, _timestamp(i))
+        time.sleep(1.0)
+        assert blocker.execute("SELECT COUNT(*) FROM gas_sensor_data").fetchone()[0] == 0
+    finally:
+        blocker.execute("COMMIT")
+        blocker.close()
+    assert _wait_for(lambda: _count(db.connection, "gas_sensor_data") == 4)
+    writer.close()
+    assert _count(db.connection, "gas_sensor_data") == 4
+
+
+def test_migrations_upgrade_version_0_database(db_file):
+    """Eine Datenbank im ursprünglichen Schema wird bis zur aktuellen Version migriert, Rollups werden befüllt."""
+    connection = sqlite3.connect(db_file)
+    connection.execute("CREATE TABLE rooms (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)")
+    for table, (column1, column2) in SENSOR_TABLES.items():
+        connection.execute(f"""
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                room_id INTEGER,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                {column1} REAL,
+                {column2} REAL,
+                FOREIGN KEY (room_id) REFERENCES rooms(id)
+            )
+        """)
+    connection.execute("INSERT INTO rooms (name) VALUES ('Bad')")
+    connection.executemany("INSERT INTO dht22_data (room_id, timestamp, temperature, humidity) VALUES (1, ?, ?, 50)",
+                           [(_timestamp(i * 30), 20.0 + i) for i in range(3)])
+    connection.commit()
+    assert get_schema_version(connection) == 0
+    connection.close()
+
+    db = Database(db_file)
+    assert get_schema_version(db.connection) == MIGRATIONS[-1][0]
+    assert db.connection.execute("""
+        SELECT min_value, max_value, count FROM sensor_rollups
+        WHERE resolution = 'day' AND room_id = 1 AND metric = 'temperature'
+    """).fetchone() == (20.0, 22.0, 3)
+    assert [row[1] for row in db.get_raw_rows("dht22_data", 1)] == [20.0, 21.0, 22.0]
+    # Bestehende Rohdaten werden erst nach ausdrücklich eingestellter Aufbewahrungsdauer gelöscht
+    assert all(db.get_retention_policies()[table] is None for table in SENSOR_TABLES)
+    db.connection.close()
+
+
+def test_new_database_uses_default_retention(db):
+    """Eine neue Datenbank übernimmt die Standard-Aufbewahrungsdauern."""
+    assert db.get_retention_policies() == DEFAULT_RETENTION
+
+
+def test_rollup_upsert_merges_batches(db, room_id):
+    """Zwei Batches im selben Bucket ergeben dasselbe Rollup wie ein gemeinsamer Batch."""
+    db.insert_batch({"dht22_data": [(room_id, _timestamp(0), 20.0, 40.0), (room_id, _timestamp(10), 24.0, 40.0)]})
+    db.insert_batch({"dht22_data": [(room_id, _timestamp(20), 18.0, 40.0)]})
+    for resolution in ("minute", "hour", "day"):
+        assert db.connection.execute("""
+            SELECT min_value, max_value, sum_value, count FROM sensor_rollups
+            WHERE resolution = ? AND room_id = ? AND metric = 'temperature'
+        """, (resolution, room_id)).fetchall() == [(18.0, 24.0, 62.0, 3)]
+
+
+def test_lttb_keeps_endpoints_and_count():
+    """LTTB liefert genau threshold Indizes, aufsteigend, mit erstem und letztem Punkt."""
+    x = list(range(1000))
+    y = [math.sin(i / 20) for i in x]
+    indices = lttb(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert all(a < b for a, b in zip(indices, indices[1:]))
+    assert len(lttb(x[:50], y[:50], 100)) == 50
+
+
+@pytest.mark.parametrize("table, metric, method, tolerance", [
+    ("gas_sensor_data", "ppm", "swinging_door", 2.0),
+    ("light_sensor_data", "lux", "deadband", 5.0),
+])
+def test_compression_round_trip_within_tolerance(table, metric, method, tolerance):
+    """Die aufgefüllten Rohdaten weichen höchstens um die Toleranz von den gemessenen ab."""
+    settings = table_settings({metric: (method, tolerance)}, {table: 1})[table]
+    compressor = TableCompressor(table, settings)
+    t0 = to_epoch_ms(_timestamp(0))
+    original = [(t0 + i * 1000, 100 + 30 * math.sin(i / 60) + (i % 7) * 0.1, 0.5) for i in range(1200)]
+    stored = []
+    for row in original:
+        stored += compressor.add(row)
+    stored += compressor.flush()
+
+    assert len(stored) < len(original) / 5
+    restored = fill_gaps([row[:3] for row in stored], settings)
+    assert [row[0] for row in restored] == [row[0] for row in original]
+    assert max(abs(a[1] - b[1]) for a, b in zip(original, restored)) <= tolerance + 1e-9
+
+
+def test_compressed_reads_keep_recorded_outages(db, room_id):
+    """Komprimierte Abschnitte werden beim Lesen aufgefüllt, Ausfälle und Zeiten ohne Kompression nicht."""
+    settings = table_settings({"lux": ("swinging_door", 20.0)}, {"light_sensor_data": 10})
+    t0 = to_epoch_ms(_timestamp(0))
+    save_compression_settings(db.connection, room_id, settings, t0)
+    compressor = TableCompressor("light_sensor_data", settings["light_sensor_data"])
+    stored = []
+    # 10 Messwerte, 60 Sekunden Ausfall, 10 Messwerte
+    for i in [*range(10), *range(16, 26)]:
+        stored += compressor.add((t0 + i * 10000, 100.0, 0.5, from_epoch_ms(t0 + i * 10000)))
+    stored += compressor.flush()
+    gaps = compressor.take_gaps()
+    assert gaps == [(None, t0), (t0 + 90000, t0 + 160000)]
+    db.insert_batch({"light_sensor_data": [(room_id, timestamp, v1, v2) for _, v1, v2, timestamp in stored]}, {},
+                    gaps={"light_sensor_data": [(room_id, start, end) for start, end in gaps]})
+    assert len(stored) == 4
+    assert len(db.get_raw_rows("light_sensor_data", room_id)) == 20
+
+    # Ohne Kompression gespeicherte Lücken bleiben ebenfalls
+    save_compression_settings(db.connection, room_id, {}, t0 + 300000)
+    db.insert_batch({"light_sensor_data": [(room_id, from_epoch_ms(t0 + s * 1000), 100.0, 0.5) for s in (310, 340)]})
+    assert len(db.get_raw_rows("light_sensor_data", room_id)) == 22
+
+
+def test_narrow_migration_resumes_after_interruption(db, room_id):
+    """Eine unterbrochene Online-Migration setzt beim gespeicherten Fortschritt fort und verliert keine Zeile."""
+    class StopAfter:
+        def __init__(self, chunks):
+            self.chunks = chunks
+
+        def is_set(self):
+            self.chunks -= 1
+            return self.chunks < 0
+
+    db.insert_batch({"gas_sensor_data": [(room_id, _timestamp(i), 80.0 + i, 0.1) for i in range(50)]})
+    expected = db.get_raw_rows("gas_sensor_data", room_id)
+
+    assert not migrate_to_narrow(db.connection, chunk_size=10, pause=0, stop_event=StopAfter(2))
+    assert migration_progress(db.connection)["engine"] == "migrating"
+    assert migration_progress(db.connection)["copied"] == 20
+
+    # Während der Migration wird in beide Speicherarten geschrieben
+    db.insert_batch({"gas_sensor_data": [(room_id, _timestamp(50), 130.0, 0.1)]})
+    assert migrate_to_narrow(db.connection, chunk_size=10, pause=0)
+    assert get_storage_engine(db.connection) == "narrow"
+    assert db.get_raw_rows("gas_sensor_data", room_id) == expected + [(to_epoch_ms(_timestamp(50)), 130.0, 0.1)]
+
+
+def test_enable_clustered_storage(db, room_id):
+    """Die geclusterte Speicherung übernimmt alle Messwerte in die WITHOUT-ROWID-Tabelle readings."""
+    db.insert_batch({"dht22_data": [(room_id, _timestamp(i), 20.0 + i, 40.0) for i in range(20)]})
+    expected = db.get_raw_rows("dht22_data", room_id)
+    assert not db.is_clustered_storage()
+
+    db.enable_clustered_storage().join(timeout=30)
+    assert db.is_clustered_storage()
+    sql = db.connection.execute("SELECT sql FROM sqlite_master WHERE name = 'readings'").fetchone()[0]
+    assert "WITHOUT ROWID" in sql
+    assert db.get_raw_rows("dht22_data", room_id) == expected
+    assert _count(db.connection, "dht22_data") == 0
+
+
+def test_narrow_insert_shifts_reading_with_taken_key(db, room_id):
+    """Ein Messwert mit bereits belegtem Schlüssel wird um eine Millisekunde verschoben statt verworfen."""
+    assert migrate_to_narrow(db.connection, pause=0)
+    with db.connection:
+        assert insert_readings(db.connection, "gas_sensor_data", [(room_id, _timestamp(0), 80.0, 0.1)]) == 0
+        assert insert_readings(db.connection, "gas_sensor_data", [(room_id, _timestamp(0), 95.0, 0.2)]) == 1
+    ts = to_epoch_ms(_timestamp(0))
+    assert db.get_raw_rows("gas_sensor_data", room_id) == [(ts, 80.0, 0.1), (ts + 1, 95.0, 0.2)]
+
+
+def test_narrow_migration_keeps_colliding_and_uncopyable_rows(db, room_id):
+    """Zeilen derselben Sekunde landen alle in readings; nicht übernehmbare Zeilen bleiben in der Sensor-Tabelle."""
+    column1, column2 = SENSOR_TABLES["gas_sensor_data"]
+    with db.connection:
+        db.connection.executemany(f"""
+            INSERT INTO gas_sensor_data (room_id, timestamp, {column1}, {column2}) VALUES (?, ?, ?, ?)
+        """, [(room_id, _timestamp(0), 80.0, 0.1), (room_id, _timestamp(0), 81.0, 0.2),
+              (room_id, "kein Zeitstempel", 82.0, 0.3)])
+
+    assert migrate_to_narrow(db.connection, pause=0)
+    ts = to_epoch_ms(_timestamp(0))
+    assert db.get_raw_rows("gas_sensor_data", room_id) == [(ts, 80.0, 0.1), (ts + 1, 81.0, 0.2)]
+    assert db.connection.execute("SELECT timestamp FROM gas_sensor_data").fetchall() == [("kein Zeitstempel",)]
+
+
+def test_archive_round_trip(db, room_id):
+    """Archivierte Tage verschwinden aus SQLite und werden unverändert aus dem Parquet-Archiv gelesen."""
+    pytest.importorskip("pyarrow")
+    old = [(room_id, (START - timedelta(days=3, seconds=-i * 60)).strftime("%Y-%m-%d %H:%M:%S"), 21.0 + i, 40.0)
+           for i in range(5)]
+    recent = [(room_id, _timestamp(i * 60), 22.0, 41.0) for i in range(3)]
+    db.insert_batch({"dht22_data": old + recent})
+    expected = db.get_raw_rows("dht22_data", room_id)
+
+    archived = archive_closed_days(db.connection, db.archive_dir, pause=0, now=START, min_age_days=1)
+    assert sum(archived.values()) == 5
+    assert _count(db.connection, "dht22_data") == 3
+    assert db.get_raw_rows("dht22_data", room_id) == expected
+    assert db.get_raw_rows("dht22_data", room_id, limit=4, newest_first=True) == expected[::-1][:4]
+
+
+def test_delete_room_removes_all_derived_data(db, room_id):
+    """delete_room entfernt Rohdaten, Rollups, Sketches, Einstellungen und vermerkte Ausfälle des Raums."""
+    db.insert_room("Bad")
+    other = db.get_room_id_by_name("Bad")
+    settings = table_settings({"ppm": ("swinging_door", 10.0)}, {"gas_sensor_data": 1})
+    for room in (room_id, other):
+        save_compression_settings(db.connection, room, settings)
+        set_room_compression(db.connection, room, {"ppm": ("swinging_door", 10.0)})
+        db.insert_batch({"gas_sensor_data": [(room, _timestamp(0), 80.0, 0.1)]},
+                        gaps={"gas_sensor_data": [(room, None, to_epoch_ms(_timestamp(0)))]})
+
+    db.delete_room(room_id)
+    for table in ("gas_sensor_data", "sensor_rollups", "sensor_sketches", "sensor_gaps"):
+        assert db.connection.execute(f"SELECT COUNT(*) FROM {table} WHERE room_id = ?", (room_id,)).fetchone()[0] == 0
+        assert db.connection.execute(f"SELECT COUNT(*) FROM {table} WHERE room_id = ?", (other,)).fetchone()[0] > 0
+    keys = {key for key, in db.connection.execute("SELECT key FROM storage_settings")}
+    assert not {f"compression:{room_id}", f"compression_config:{room_id}"} & keys
+    assert {f"compression:{other}", f"compression_config:{other}"} <= keys
+    assert db.get_room_name_by_id(room_id) is None
+
+
+def _gas_payload(offset, count, settings=None):
+    rows = [[_timestamp(offset + i), 80.0 + (offset + i) % 37, 0.1] for i in range(count)]
+    return pack_payload({"Flur": {"gas_sensor_data": rows}}, {"Flur": settings} if settings else None)
+
+
+def test_collector_writes_each_sequence_once(db_file):
+    """Wiederholt gesendete Lieferungen werden bestätigt, aber nicht erneut geschrieben."""
+    collector = Collector(db_file, port=0, host="127.0.0.1")
+    stream = uuid.uuid4().hex
+    try:
+        assert post_payload(collector.url, "pi-1", stream, 1, _gas_payload(0, 10))["status"] == STORED
+        assert post_payload(collector.url, "pi-1", stream, 1, _gas_payload(0, 10))["status"] == DUPLICATE
+        assert post_payload(collector.url, "pi-1", stream, 2, _gas_payload(10, 10))["status"] == STORED
+        assert post_payload(collector.url, "pi-1", stream, 2, _gas_payload(10, 10))["status"] == DUPLICATE
+    finally:
+        collector.close()
+
+    db = Database(db_file)
+    assert _count(db.connection, "gas_sensor_data") == 20
+    assert db.connection.execute("SELECT seq FROM ingest_sequences WHERE stream = ?", (stream,)).fetchone() == (2,)
+    db.connection.close()
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_forwarder_keeps_deliveries_not_rejected_by_collector(db_file, tmp_path):
+    """Nur vom Collector abgelehnte Lieferungen kommen in dead_letter; ein 404 wird wiederholt."""
+    assert check_collector_url("http://zentrale:8770/ingest")
+    for url in ("http://zentrale:8770", "http://zentrale:8770/", "zentrale:8770/ingest"):
+        with pytest.raises(ValueError):
+            check_collector_url(url)
+
+    collector = Collector(db_file, port=0, host="127.0.0.1")
+    wrong_path = Forwarder(collector.url.replace("/ingest", "/api/ingest"), "pi-1", str(tmp_path / "wrong.db"))
+    forwarder = Forwarder(collector.url, "pi-2", str(tmp_path / "outbox.db"))
+    try:
+        wrong_path.outbox.put(_gas_payload(0, 10), 10)
+        forwarder.outbox.put(pack_payload({"Flur": {"gas_sensor_data": "kaputt"}}), 1)
+        forwarder.outbox.put(_gas_payload(0, 10), 10)
+        assert _wait_for(lambda: forwarder.outbox.pending() == (0, 0))
+        assert forwarder.outbox.dead_letters() == (1, 1)
+        assert wrong_path.outbox.pending() == (1, 10)
+    finally:
+        wrong_path.close()
+        forwarder.close()
+        collector.close()
+
+
+def _collect(db_file, fail_commit):
+    # Drei Lieferungen mit Kompression; bei fail_commit schlägt der Commit der zweiten einmal fehl
+    settings = table_settings({"ppm": ("swinging_door", 10.0)}, {"gas_sensor_data": 1})
+    insert_batch, calls = Database.insert_batch, []
+
+    def flaky_insert_batch(self, *args, **kwargs):
+        calls.append(1)
+        if fail_commit and len(calls) == 2:
+            raise sqlite3.OperationalError("disk I/O error")
+        return insert_batch(self, *args, **kwargs)
+
+    Database.insert_batch = flaky_insert_batch
+    collector = Collector(db_file, port=0, host="127.0.0.1")
+    stream = uuid.uuid4().hex
+    try:
+        for seq in range(1, 4):
+            payload = _gas_payload((seq - 1) * 50, 50, settings if seq == 1 else None)
+            try:
+                post_payload(collector.url, "pi-1", stream, seq, payload)
+            except urllib.error.HTTPError as e:
+                assert e.code == 503
+                post_payload(collector.url, "pi-1", stream, seq, payload)
+    finally:
+        collector.close()
+        Database.insert_batch = insert_batch
+
+    db = Database(db_file)
+    rows = db.connection.execute("SELECT timestamp, ppm FROM gas_sensor_data ORDER BY timestamp").fetchall()
+    db.connection.close()
+    return rows
+
+
+def test_collector_restores_compressors_after_failed_commit(tmp_path):
+    """Nach einem fehlgeschlagenen Commit speichert die erneut gesendete Lieferung dieselben Messwerte."""
+    expected = _collect(str(tmp_path / "ok.db"), fail_commit=False)
+    assert 0 < len(expected) < 150
+    assert _collect(str(tmp_path / "retry.db"), fail_commit=True) == expected
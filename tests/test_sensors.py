@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from main import create_readers
+from sensors.backends import Clock, SyntheticBackend
+from sensors.flame_sensor import FlameSensor
+from sensors.gas_sensor import GasSensor
+from sensors.light_sensor import LightSensor
+from sensors.mcp3008 import MCP3008Reader, MCP3008Sensor
+
+
+class _SequenceBackend:
+    # Liefert für jeden Kanal nacheinander die vorgegebenen Rohwerte
+    def __init__(self, values):
+        self.values = iter(values)
+
+    def mcp3008(self, channel):
+        backend = self
+
+        class Channel:
+            @property
+            def value(self):
+                return next(backend.values)
+
+        return Channel()
+
+
+def _dht22_readings(seed, clock, count=50):
+    dht22 = SyntheticBackend(seed=seed, dht_failure_rate=0.5, clock=clock).dht22("D4")
+    readings = []
+    for _ in range(count):
+        try:
+            readings.append((dht22.temperature, dht22.humidity))
+        except RuntimeError:
+            readings.append(None)
+    return readings
+
+
+def test_synthetic_dht22_is_reproducible_with_seed():
+    """Derselbe Startwert ergibt dieselben Messwerte und dieselben fehlgeschlagenen Lesevorgänge."""
+    clock = Clock(start=datetime(2024, 1, 10, 12, 0, 0))
+    first, second = _dht22_readings(7, clock), _dht22_readings(7, clock)
+    assert first == second
+    assert None in first and any(first)
+    assert _dht22_readings(8, clock) != first
+
+
+def test_mcp3008_reader_median_ignores_outlier():
+    """Beim Oversampling mit Median fällt ein einzelner Ausreißer nicht ins Gewicht."""
+    sensor = MCP3008Sensor(0, backend=_SequenceBackend([0.5, 0.5, 1.0, 0.5]))
+    reader = MCP3008Reader([sensor], oversampling=4, filter="median")
+    assert reader.scan() == {0: 0.5}
+    assert reader.conversions == 4
+
+
+def test_mcp3008_reader_ewma_smooths_across_scans():
+    """Der Filter "ewma" glättet über aufeinanderfolgende Scans."""
+    sensor = MCP3008Sensor(0, backend=_SequenceBackend([0.0, 1.0]))
+    reader = MCP3008Reader([sensor], filter="ewma", alpha=0.25)
+    assert reader.scan() == {0: 0.0}
+    assert reader.scan() == {0: 0.25}
+
+
+def test_adc_sampling_stays_on_grid_after_skipped_scan():
+    """Ein ausgelassener Scan holt den Termin nach, ohne die folgenden Termine zu verschieben."""
+    now = [0.0]
+    backend = SyntheticBackend(seed=1)
+    readers = create_readers(None, FlameSensor(1, backend=backend), GasSensor(2, backend=backend),
+                             LightSensor(0, backend=backend), clock=lambda: now[0])
+    _, _, read_adc = readers["adc"]
+
+    light = []
+    for second in range(31):
+        if second == 10:
+            # Der Scan um 10 s fällt aus (z.B. Zeitüberschreitung)
+            continue
+        now[0] = second + 0.1
+        readings = read_adc()
+        assert {"flame_sensor_data", "gas_sensor_data"} <= readings.keys()
+        if "light_sensor_data" in readings:
+            light.append(second)
+    assert light == [0, 11, 20, 30]